@@ -30,7 +30,10 @@ from optparse import OptionParser
 import time
 
 import modules.config as gc
+import modules.machif as machif
 import modules.machif_progexec as mi_progexec
+import modules.machif_reactor as mi_reactor
+import modules.profiler as prof
 
 __appname__ = "Gcode Step and Alignment Tool"
 
@@ -65,15 +68,63 @@ def get_cli_params():
                       help="gcode file.",
                       metavar="FILE")
 
+    parser.add_option("--capture",
+                      dest="capture",
+                      default=None,
+                      help="capture serial port traffic to FILE, replay "
+                      "with tools/replay_capture.py",
+                      metavar="FILE")
+
+    parser.add_option("--profile",
+                      dest="profile",
+                      default=None,
+                      help="sample all threads, write flame graph collapsed "
+                      "stacks to FILE on exit",
+                      metavar="FILE")
+
     parser.add_option("--vm", "--verbose_mask",
                       dest="verbose_mask",
                       default=None,
                       help="select verbose mask. UI, MACHIF, MACHIF_MOD, "
-                      "MACHIF_EXEC, SERIALIF, SERIALIF_STR, SERIALIF_HEX",
+                      "MACHIF_EXEC, SERIALIF, SERIALIF_STR, SERIALIF_HEX, "
+                      "SERIALIF_RT",
                       metavar="")
 
+    parser.add_option("--fo", "--feed_override",
+                      dest="feed_override",
+                      default=None,
+                      type="int",
+                      help="feed override percent (grbl 1.1, 10-200).",
+                      metavar="PRCNT")
+
+    parser.add_option("--ro", "--rapid_override",
+                      dest="rapid_override",
+                      default=None,
+                      help="rapid override percent (grbl 1.1, 100, 50, 25).",
+                      metavar="PRCNT")
+
+    parser.add_option("--so", "--spindle_override",
+                      dest="spindle_override",
+                      default=None,
+                      type="int",
+                      help="spindle override percent (grbl 1.1, 10-200).",
+                      metavar="PRCNT")
+
+    parser.add_option("--st", "--single_thread",
+                      dest="single_thread",
+                      action="store_true",
+                      default=False,
+                      help="run serial I/O and program execution in one "
+                      "select() loop (POSIX only).")
+
     (options, args) = parser.parse_args()
 
+    if options.capture is not None:
+        gc.SERIAL_CAPTURE_FILE = os.path.abspath(options.capture)
+
+    if options.profile is not None:
+        gc.PROFILE_FILE = os.path.abspath(options.profile)
+
     if options.verbose_mask is not None:
         options.verbose_mask = gc.decode_verbose_mask_string(
             options.verbose_mask)
@@ -81,12 +132,49 @@ def get_cli_params():
     return (options, args)
 
 
+# console cmd prefix -> override event
+CONSOLE_OVERRIDE_CMDS = {
+    'f': gc.EV_CMD_FEED_OVERRIDE,
+    'r': gc.EV_CMD_RAPID_OVERRIDE,
+    's': gc.EV_CMD_SPINDLE_OVERRIDE,
+}
+
+
+def console_loop(machif_prog_exec):
+    ''' interactive console, realtime cmds while program is running
+
+        f<step>, r<step>, s<step>: feed, rapid, spindle override, step is
+        one of 100, +10, -10, +1, -1 (rapid 100, 50, 25)
+        !: feed hold, ~: cycle start, q: quit
+    '''
+    while True:
+        line = sys.stdin.readline()
+
+        if not line:
+            break
+
+        cmd = line.strip()
+
+        if cmd == 'q':
+            break
+        elif cmd == '!':
+            machif_prog_exec.eventPut(gc.EV_CMD_FEED_HOLD)
+        elif cmd == '~':
+            machif_prog_exec.eventPut(gc.EV_CMD_CYCLE_START)
+        elif len(cmd) > 1 and cmd[0] in CONSOLE_OVERRIDE_CMDS:
+            machif_prog_exec.eventPut(CONSOLE_OVERRIDE_CMDS[cmd[0]], cmd[1:])
+        elif cmd:
+            print "unknown cmd [%s], use f<step>, r<step>, s<step>, !, ~, "\
+                "or q" % cmd
+
+
 """----------------------------------------------------------------------------
    main
 ----------------------------------------------------------------------------"""
 if __name__ == '__main__':
 
     machifProgExec = None
+    profiler = None
     gcodeFileLines = []
     (cmd_line_options, cli_args) = get_cli_params()
 
@@ -97,7 +185,11 @@ if __name__ == '__main__':
             config_fname = os.path.abspath(os.path.abspath(os.path.expanduser(
                 "~/.gsat.json")))
 
-        gc.init_config(cmd_line_options, config_fname, "foo")
+        gc.init_config(cmd_line_options, config_fname, None)
+
+        if gc.PROFILE_FILE is not None:
+            profiler = prof.SamplingProfiler(gc.PROFILE_FILE)
+            profiler.start()
 
         if os.path.exists(cmd_line_options.gcode):
             gcode_file = file(cmd_line_options.gcode)
@@ -105,17 +197,41 @@ if __name__ == '__main__':
 
             gcodeFileLines = gcode_data.splitlines(True)
 
-        machifProgExec = mi_progexec.MachIfExecuteThread(None)
+        if cmd_line_options.single_thread:
+            machifProgExec = mi_reactor.MachIfReactor(None)
+        else:
+            machifProgExec = mi_progexec.MachIfExecuteThread(None)
 
         # TODO: need code to check port is open
         time.sleep(2)
 
         machifProgExec.eventPut(gc.EV_CMD_CLEAR_ALARM)
 
+        if cmd_line_options.feed_override is not None:
+            for step in machif.get_override_steps(
+               cmd_line_options.feed_override):
+                machifProgExec.eventPut(gc.EV_CMD_FEED_OVERRIDE, step)
+
+        if cmd_line_options.rapid_override is not None:
+            machifProgExec.eventPut(gc.EV_CMD_RAPID_OVERRIDE,
+                                    cmd_line_options.rapid_override)
+
+        if cmd_line_options.spindle_override is not None:
+            for step in machif.get_override_steps(
+               cmd_line_options.spindle_override):
+                machifProgExec.eventPut(gc.EV_CMD_SPINDLE_OVERRIDE, step)
+
         machifProgExec.eventPut(gc.EV_CMD_RUN, [gcodeFileLines, 0, set()])
 
-        time.sleep(20)
+        if sys.stdin.isatty():
+            console_loop(machifProgExec)
+        else:
+            time.sleep(20)
 
     finally:
         if machifProgExec is not None:
             machifProgExec.eventPut(gc.EV_CMD_EXIT)
+
+        if profiler is not None:
+            for line in profiler.stop():
+                print line
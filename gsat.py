@@ -55,6 +55,12 @@ def get_cli_params():
                       "will be in HOME folder regardless of file name.",
                       metavar="FILE")
 
+    parser.add_option("-l", "--log",
+                      dest="log",
+                      help="Log to FILE, rotated when it gets large "
+                      "(default ~/.gsat.log)",
+                      metavar="FILE")
+
     parser.add_option("-v", "--verbose",
                       dest="verbose",
                       action="store_true",
@@ -69,15 +75,36 @@ def get_cli_params():
                       help="print extra extra information while processing "
                       "input file.")
 
+    parser.add_option("--capture",
+                      dest="capture",
+                      default=None,
+                      help="capture serial port traffic to FILE, replay "
+                      "with tools/replay_capture.py",
+                      metavar="FILE")
+
+    parser.add_option("--profile",
+                      dest="profile",
+                      default=None,
+                      help="sample all threads, write flame graph collapsed "
+                      "stacks to FILE on exit",
+                      metavar="FILE")
+
     parser.add_option("--vm", "--verbose_mask",
                       dest="verbose_mask",
                       default=None,
                       help="select verbose mask. UI, MACHIF, MACHIF_MOD, "
-                      "MACHIF_EXEC, SERIALIF, SERIALIF_STR, SERIALIF_HEX",
+                      "MACHIF_EXEC, SERIALIF, SERIALIF_STR, SERIALIF_HEX, "
+                      "SERIALIF_RT",
                       metavar="")
 
     (options, args) = parser.parse_args()
 
+    if options.capture is not None:
+        gc.SERIAL_CAPTURE_FILE = os.path.abspath(options.capture)
+
+    if options.profile is not None:
+        gc.PROFILE_FILE = os.path.abspath(options.profile)
+
     if options.verbose_mask is not None:
         options.verbose_mask = gc.decode_verbose_mask_string(
             options.verbose_mask)
@@ -119,7 +146,12 @@ if __name__ == '__main__':
         config_fname = os.path.abspath(os.path.abspath(os.path.expanduser(
             "~/.gsat.json")))
 
-    gc.init_config(cmd_line_options, config_fname, "foo")
+    log_fname = cmd_line_options.log
+
+    if log_fname is None:
+        log_fname = os.path.abspath(os.path.expanduser("~/.gsat.log"))
+
+    gc.init_config(cmd_line_options, config_fname, log_fname)
 
     app = wx.App(0)
     mw.gsatMainWindow(None, title=__appname__,
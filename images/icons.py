@@ -34,7 +34,44 @@
    Attribution-ShareAlike 3.0 United States (CC BY-SA 3.0)
 ----------------------------------------------------------------------------"""
 
-from wx.lib.embeddedimage import PyEmbeddedImage
+import wx
+from wx.lib import embeddedimage
+
+
+class PyEmbeddedImage(embeddedimage.PyEmbeddedImage):
+    """ Embedded image decoded on first use only, then cached. Bitmaps and
+        icons are shared by every user, images are copied as they can be
+        changed in place.
+    """
+
+    def __init__(self, data, isBase64=True):
+        embeddedimage.PyEmbeddedImage.__init__(self, data, isBase64)
+        self._image = None
+        self._bitmap = None
+        self._icon = None
+
+    def GetImage(self):
+        if self._image is None:
+            self._image = embeddedimage.PyEmbeddedImage.GetImage(self)
+
+        return self._image.Copy()
+
+    def GetBitmap(self):
+        if self._bitmap is None:
+            self._bitmap = wx.BitmapFromImage(self.GetImage())
+
+        return self._bitmap
+
+    def GetIcon(self):
+        if self._icon is None:
+            self._icon = wx.EmptyIcon()
+            self._icon.CopyFromBitmap(self.GetBitmap())
+
+        return self._icon
+
+    Bitmap = property(GetBitmap)
+    Icon = property(GetIcon)
+    Image = property(GetImage)
 
 #------------------------------------------------------------------------------
 # imgGCS
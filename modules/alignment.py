@@ -0,0 +1,253 @@
+"""----------------------------------------------------------------------------
+   alignment.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import math
+import re
+
+import modules.height_map as hm
+
+# -----------------------------------------------------------------------------
+# regular expressions
+# -----------------------------------------------------------------------------
+
+# words replaced with transformed values
+gReGcodeXYWord = re.compile(r'\s*[XY]\s*[-+]?(?:\d+\.?\d*|\.\d+)', re.I)
+gReGcodeIJWord = re.compile(r'\s*[IJ]\s*[-+]?(?:\d+\.?\d*|\.\d+)', re.I)
+
+# arcs, I and J are center offsets
+ARC_GCODES = [2.0, 3.0]
+
+
+def solve_alignment(fiducials):
+    """ Alignment that best maps program points to measured machine points,
+        fiducials is list of ((program x, y), (machine x, y)). Two fiducials
+        give an exact fit, more a least squares fit. Returns (alignment, rms
+        distance of fiducials to their fit).
+    """
+    if len(fiducials) < 2:
+        raise ValueError("alignment needs at least two fiducials")
+
+    # points as complex numbers, the transform is w = a * z + b
+    zs = [complex(*program) for program, machine in fiducials]
+    ws = [complex(*machine) for program, machine in fiducials]
+
+    zMean = sum(zs) / len(zs)
+    wMean = sum(ws) / len(ws)
+
+    spread = sum([abs(z - zMean) ** 2 for z in zs])
+    if spread < 1e-12:
+        raise ValueError("fiducials are at the same program position")
+
+    a = sum([(w - wMean) * (z - zMean).conjugate()
+             for z, w in zip(zs, ws)]) / spread
+    b = wMean - a * zMean
+
+    rms = math.sqrt(
+        sum([abs(a * z + b - w) ** 2 for z, w in zip(zs, ws)]) / len(zs))
+
+    return (Alignment(a.real, a.imag, b.real, b.imag), rms)
+
+
+def align_program(alignment, gcode_lines):
+    """ Whole program in machine coordinates, lines are parsed first then
+        all their coordinates transformed in one numpy pass. Lines that
+        don't move in XY are returned as they are.
+    """
+    if not hm.import_numpy():
+        raise ImportError("program alignment needs numpy")
+
+    aligner = GcodeAligner(alignment)
+    parsed = [aligner.parse(gcode) for gcode in gcode_lines]
+
+    # one row per transformed pair, translate is 0 for deltas and offsets
+    xs = []
+    ys = []
+    translate = []
+
+    for gcode, xy, xyAbsolute, ij in parsed:
+        if xy is not None:
+            xs.append(xy[0])
+            ys.append(xy[1])
+            translate.append(float(xyAbsolute))
+
+        if ij is not None:
+            xs.append(ij[0])
+            ys.append(ij[1])
+            translate.append(0.0)
+
+    np = hm.np
+    mxs, mys = alignment.transformArrays(
+        np.array(xs), np.array(ys), np.array(translate))
+
+    alignedLines = []
+    row = 0
+
+    for line, (gcode, xy, xyAbsolute, ij) in zip(gcode_lines, parsed):
+        if xy is None and ij is None:
+            alignedLines.append(line)
+            continue
+
+        if xy is not None:
+            xy = (mxs[row], mys[row])
+            row += 1
+
+        if ij is not None:
+            ij = (mxs[row], mys[row])
+            row += 1
+
+        lineEnd = line[len(line.rstrip("\r\n")):]
+        alignedLines.append(
+            "%s%s" % (aligner.format(line.rstrip("\r\n"), xy, ij), lineEnd))
+
+    return alignedLines
+
+
+class Alignment(object):
+    """ Program XY to machine XY: rotation, uniform scale and translation,
+        x' = a * x - b * y + tx, y' = b * x + a * y + ty
+    """
+
+    def __init__(self, a, b, tx, ty):
+        self.a = a
+        self.b = b
+        self.tx = tx
+        self.ty = ty
+
+    def __str__(self):
+        return "rotation %.4f deg, scale %.6f, offset X%s Y%s" % (
+            self.rotation(), self.scale(),
+            hm.COORD_FORMAT % self.tx, hm.COORD_FORMAT % self.ty)
+
+    def rotation(self):
+        """ Rotation in degrees, counter clockwise
+        """
+        return math.degrees(math.atan2(self.b, self.a))
+
+    def scale(self):
+        return math.hypot(self.a, self.b)
+
+    def transformPoint(self, x, y, translate=True):
+        """ Machine point of program point, translate False for deltas and
+            arc center offsets
+        """
+        mx = self.a * x - self.b * y
+        my = self.b * x + self.a * y
+
+        if translate:
+            mx += self.tx
+            my += self.ty
+
+        return (mx, my)
+
+    def transformArrays(self, xs, ys, translate):
+        """ transformPoint on numpy arrays, translate is array of 1 (point)
+            or 0 (delta, offset)
+        """
+        mxs = self.a * xs - self.b * ys + self.tx * translate
+        mys = self.b * xs + self.a * ys + self.ty * translate
+
+        return (mxs, mys)
+
+
+class GcodeAligner(object):
+    """ Rewrites X, Y (and arc I, J) of g-code lines from program to machine
+        coordinates as they are streamed. Absolute moves always get both X
+        and Y, a rotated axis depends on the other one; a move before both
+        axes have a position can't be aligned and is sent as it is. Relative
+        moves and arc center offsets are rotated and scaled, not moved.
+    """
+
+    def __init__(self, alignment):
+        self.alignment = alignment
+        self.state = hm.GcodeState()
+
+    def reset(self):
+        """ Forget modal state and position, machine may have moved
+        """
+        self.state = hm.GcodeState()
+
+    def align(self, gcode):
+        """ Line in machine coordinates
+        """
+        gcode, xy, xyAbsolute, ij = self.parse(gcode)
+
+        if xy is not None:
+            xy = self.alignment.transformPoint(xy[0], xy[1], xyAbsolute)
+
+        if ij is not None:
+            ij = self.alignment.transformPoint(ij[0], ij[1], False)
+
+        if xy is None and ij is None:
+            return gcode
+
+        return self.format(gcode, xy, ij)
+
+    def format(self, gcode, xy, ij):
+        """ Line with X, Y and I, J words replaced, comments go at the end
+        """
+        comments = " ".join(hm.gReGcodeComment.findall(gcode))
+        gcode = hm.gReGcodeComment.sub("", gcode)
+
+        if xy is not None:
+            gcode = "%s X%s Y%s" % (
+                gReGcodeXYWord.sub("", gcode).strip(),
+                hm.COORD_FORMAT % xy[0], hm.COORD_FORMAT % xy[1])
+
+        if ij is not None:
+            gcode = "%s I%s J%s" % (
+                gReGcodeIJWord.sub("", gcode).strip(),
+                hm.COORD_FORMAT % ij[0], hm.COORD_FORMAT % ij[1])
+
+        gcode = gcode.strip()
+
+        if comments:
+            gcode = "%s %s" % (gcode, comments)
+
+        return gcode
+
+    def parse(self, gcode):
+        """ Update modal state with line, returns (line, program XY or None,
+            XY is absolute, program IJ or None)
+        """
+        target = self.state.update(gcode)
+
+        # G90/G91 on the line applies to its own move
+        absolute = self.state.absolute
+
+        words = dict(hm.parse_gcode(hm.gReGcodeComment.sub("", gcode)))
+
+        xy = None
+        if target is not None and ('X' in words or 'Y' in words):
+            if absolute:
+                if None not in target[:2]:
+                    xy = list(target[:2])
+            else:
+                xy = [words.get('X', 0.0), words.get('Y', 0.0)]
+
+        ij = None
+        if self.state.motion in ARC_GCODES and ('I' in words or 'J' in words):
+            ij = [words.get('I', 0.0), words.get('J', 0.0)]
+
+        return (gcode.strip(), xy, absolute, ij)
@@ -24,9 +24,16 @@
 ----------------------------------------------------------------------------"""
 import logging
 from logging import handlers, Formatter
+import copy
+import operator
 
 import Queue
-import wx
+
+try:
+    import wx
+except ImportError:
+    # machine interface modules, console and tools don't need wx
+    wx = None
 
 try:
     import simplejson as json
@@ -34,13 +41,17 @@ except ImportError:
     import json
 
 import os
+import select
+import sys
+import threading
 import time
 
 """----------------------------------------------------------------------------
    Globals:
 ----------------------------------------------------------------------------"""
-EDIT_BK_COLOR = wx.WHITE
-READ_ONLY_BK_COLOR = wx.Colour(242, 241, 240)
+if wx is not None:
+    EDIT_BK_COLOR = wx.WHITE
+    READ_ONLY_BK_COLOR = wx.Colour(242, 241, 240)
 
 FILE_WILDCARD = \
     "gcode (*.ngc; *.nc; *.gcode)|*.ngc;*.nc;*.gcode|"\
@@ -58,6 +69,12 @@ CMD_LINE_OPTIONS = {}
 CONFIG_DATA = None
 STATE_DATA = None
 
+# file to capture serial port traffic to, None no capture
+SERIAL_CAPTURE_FILE = None
+
+# file to write sampling profile to, None no profiling at start up
+PROFILE_FILE = None
+
 # --------------------------------------------------------------------------
 # device commands
 # --------------------------------------------------------------------------
@@ -151,6 +168,14 @@ EV_CMD_JOG_MOVE_RELATIVE = 1230
 EV_CMD_JOG_RAPID_MOVE = 1240
 EV_CMD_JOG_RAPID_MOVE_RELATIVE = 1250
 EV_CMD_JOG_STOP = 1260
+EV_CMD_SER_TXDATA_FLUSH = 1270
+EV_CMD_FEED_OVERRIDE = 1280
+EV_CMD_RAPID_OVERRIDE = 1290
+EV_CMD_SPINDLE_OVERRIDE = 1300
+EV_CMD_JOG_CONTINUOUS = 1310
+EV_CMD_PROFILE = 1320
+EV_CMD_PROBE_GRID = 1330
+EV_CMD_ALIGNMENT = 1340
 
 
 EV_NULL = 100
@@ -172,6 +197,10 @@ EV_SER_PORT_CLOSE = 2110
 EV_TIMER = 2120
 EV_DATA_STATUS = 2130
 EV_DEVICE_DETECTED = 2140
+EV_PC_EXEC_UPDATE = 2150
+EV_STALL = 2160
+EV_HEIGHT_MAP = 2170
+EV_LOG_RECORD = 2180
 
 # --------------------------------------------------------------------------
 # VERBOSE MASK
@@ -191,6 +220,7 @@ VERBOSE_MASK_SERIALIF = 0x000F0000
 VERBOSE_MASK_SERIALIF_STR = 0x00010000
 VERBOSE_MASK_SERIALIF_HEX = 0x00020000
 VERBOSE_MASK_SERIALIF_EV = 0x00040000
+VERBOSE_MASK_SERIALIF_RT = 0x00080000
 VERBOSE_MASK_EVENTIF = \
     VERBOSE_MASK_MACHIF_EXEC_EV | VERBOSE_MASK_MACHIF_MOD_EV |\
     VERBOSE_MASK_SERIALIF_EV
@@ -241,6 +271,9 @@ def decode_verbose_mask_string(verbose_mask_str):
         if "serialif_ev" == mask:
             VERBOSE_MASK |= VERBOSE_MASK_SERIALIF_EV
 
+        if "serialif_rt" == mask:
+            VERBOSE_MASK |= VERBOSE_MASK_SERIALIF_RT
+
         if "eventif" == mask:
             VERBOSE_MASK |= VERBOSE_MASK_EVENTIF
 
@@ -251,9 +284,98 @@ def decode_verbose_mask_string(verbose_mask_str):
 # LOGGING MASK
 # --------------------------------------------------------------------------
 
-def init_logger(filename):
-    log_path = filename
+# log file size before rotating, and number of old files kept
+LOG_FILE_MAX_BYTES = 5000000
+LOG_FILE_BACKUP_COUNT = 4
+
+# records waiting for log writer thread, more than this are dropped
+LOG_QUEUE_SIZE = 10000
+
+
+class AsyncLogHandler(logging.Handler):
+    """ Logging handler that only queues records, a writer thread formats
+        them and does the output (console, rotating files). Threads that log
+        don't wait on I/O; if the writer falls behind records are dropped
+        and counted rather than blocking the thread that logs.
+    """
+
+    def __init__(self, log_handlers, maxsize=LOG_QUEUE_SIZE):
+        logging.Handler.__init__(self)
+
+        self.logHandlers = log_handlers
+        self.maxsize = maxsize
+        self.dropCount = 0
+
+        self._startWriter()
+
+    def _startWriter(self):
+        # after a fork the writer thread is gone, child needs its own
+        self._pid = os.getpid()
+        self._queue = Queue.Queue(self.maxsize)
+        self._writer = threading.Thread(target=self._writerLoop)
+        self._writer.daemon = True
+        self._writer.start()
+
+    def _writerLoop(self):
+        while True:
+            record = self._queue.get()
+
+            try:
+                if record is None:
+                    break
+
+                if self.dropCount:
+                    dropCount, self.dropCount = self.dropCount, 0
+                    self._output(logging.makeLogRecord({
+                        'name': record.name,
+                        'levelno': logging.WARNING,
+                        'levelname': logging.getLevelName(logging.WARNING),
+                        'msg': "log queue full, %d records dropped" %
+                        dropCount}))
+
+                self._output(record)
+
+            finally:
+                self._queue.task_done()
+
+    def _output(self, record):
+        for handler in self.logHandlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self._startWriter()
+
+        try:
+            self._queue.put_nowait(record)
+
+        except Queue.Full:
+            self.dropCount += 1
+
+    def flush(self):
+        """ Wait for queued records to be written
+        """
+        if self._pid == os.getpid() and self._writer.isAlive():
+            self._queue.join()
+
+        for handler in self.logHandlers:
+            handler.flush()
+
+    def close(self):
+        if self._pid == os.getpid() and self._writer.isAlive():
+            self._queue.put(None)
+            self._writer.join()
+
+        for handler in self.logHandlers:
+            handler.close()
+
+        logging.Handler.close(self)
 
+
+def init_logger(filename=None):
+    """ Log to console and, if filename is given, to size rotated files
+    """
     logger = logging.getLogger()
 
     ch = logging.StreamHandler()
@@ -263,16 +385,30 @@ def init_logger(filename):
                           "%(message)s",
                           datefmt='%Y%m%d %I:%M:%S %p')
     ch.setFormatter(ch_format)
-    logger.addHandler(ch)
-
-    # create a rotating file handler and add it to the logger
-    # fh = handlers.RotatingFileHandler(log_path,
-    #   maxBytes=5000000, backupCount=4)
-    # fh_format = Formatter("%(asctime)s - m:%(module)s l:%(lineno)d "
-    #                       "t:%(thread)d >> %(levelname)s : %(message)s",
-    #                       datefmt='%Y%m%d %I:%M:%S %p')
-    # fh.setFormatter(log_format)
-    # logger.addHandler(handler)
+    logHandlers = [ch]
+
+    # create a rotating file handler
+    if filename is not None:
+        try:
+            fh = handlers.RotatingFileHandler(
+                filename, maxBytes=LOG_FILE_MAX_BYTES,
+                backupCount=LOG_FILE_BACKUP_COUNT)
+
+        except IOError, e:
+            fh = None
+            sys.stderr.write("** can't open log file %s: %s\n" % (
+                filename, str(e)))
+
+        if fh is not None:
+            fh_format = Formatter("%(asctime)s - m:%(module)s "
+                                  "l:%(lineno)d t:%(thread)d >> "
+                                  "%(levelname)s : %(message)s",
+                                  datefmt='%Y%m%d %I:%M:%S %p')
+            fh.setFormatter(fh_format)
+            logHandlers.append(fh)
+
+    # formatting and output happen in log writer thread
+    logger.addHandler(AsyncLogHandler(logHandlers))
 
     # set the root logging level
     logger.setLevel(logging.INFO)
@@ -289,7 +425,7 @@ def init_config(cmd_line_options, config_file, log_file):
 
     CMD_LINE_OPTIONS = cmd_line_options
 
-    init_logger('log_file')
+    init_logger(log_file)
 
     CONFIG_DATA = gsatConfigData(config_file)
     CONFIG_DATA.load()
@@ -319,12 +455,47 @@ class gsatStateData():
 
         # program status
         self.programCounter = 0
+        self.executingProgramCounter = -1
         self.breakPoints = set()
         self.fileIsOpen = False
         self.gcodeFileName = ""
         self.gcodeFileLines = []
 
 
+class ConfigHandle(object):
+    """ Config value with key path split once, value is cached until config
+        data changes (set, load, new datastore). Cheap enough for loops
+        that run every tick.
+    """
+    __slots__ = ('configData', 'keyList', 'defaultValue', 'valueType',
+                 '_value', '_version')
+
+    def __init__(self, config_data, key_path, default_rv=None,
+                 value_type=None):
+        self.configData = config_data
+        self.keyList = [key for key in key_path.split("/") if key]
+        self.defaultValue = default_rv
+        self.valueType = value_type
+        self._value = None
+        self._version = None
+
+    def get(self):
+        """ Get value, converted to value_type if given
+        """
+        version = self.configData.version
+
+        if self._version != version:
+            value = self.configData.get(self.keyList, self.defaultValue)
+
+            if self.valueType is not None and value is not None:
+                value = self.valueType(value)
+
+            self._value = value
+            self._version = version
+
+        return self._value
+
+
 class ConfigData(object):
     """ Provides various data information
     """
@@ -334,6 +505,14 @@ class ConfigData(object):
 
         self.datastore = dict()
 
+        # bumped on every change, config handles re-read when it moves
+        self.version = 0
+
+        # change subscribers (key path, callback), and data as of last
+        # change notification
+        self._subscribers = []
+        self._snapshot = None
+
     def add(self, key_path, val):
         """ Add new key value pair
         """
@@ -359,6 +538,8 @@ class ConfigData(object):
 
         node[key_list[-1:][0]] = val
 
+        self.version += 1
+
     def get(self, key_path, default_rv=None):
         """ Get value for a given key
         """
@@ -387,11 +568,61 @@ class ConfigData(object):
 
         return return_val
 
+    def getHandle(self, key_path, default_rv=None, value_type=None):
+        """ Get pre resolved handle for a given key
+        """
+        return ConfigHandle(self, key_path, default_rv, value_type)
+
     def set(self, key_path, val):
         """ Set value for a given key
         """
         self.add(key_path, val)
 
+    def setDatastore(self, datastore):
+        """ Replace all data, i.e. data sent from another process, and
+            notify subscribers of what changed
+        """
+        self.datastore = datastore
+        self.version += 1
+        self.notifyChanges()
+
+    def subscribe(self, key_path, callback):
+        """ callback(changed_key_paths) is called when data under key_path
+            changed, on save or new datastore. It runs in the thread that
+            saved, callbacks of other threads should just queue an event.
+        """
+        self._subscribers.append(("/%s" % key_path.strip("/"), callback))
+
+    def unsubscribe(self, callback):
+        self._subscribers = [
+            s for s in self._subscribers if s[1] != callback]
+
+    def notifyChanges(self):
+        """ Tell subscribers which key paths changed since last notification
+        """
+        changed = []
+
+        def diff(key_path, old, new):
+            if isinstance(old, dict) and isinstance(new, dict):
+                for key in set(old.keys()) | set(new.keys()):
+                    diff("%s/%s" % (key_path, key), old.get(key),
+                         new.get(key))
+
+            elif old != new:
+                changed.append(key_path)
+
+        diff("", self._snapshot or dict(), self.datastore)
+        self._snapshot = copy.deepcopy(self.datastore)
+
+        for key_path, callback in list(self._subscribers):
+            changedKeys = [
+                k for k in changed
+                if k == key_path or k.startswith(key_path + "/") or
+                key_path == "/"]
+
+            if changedKeys:
+                callback(sorted(changedKeys))
+
     def load(self):
         """ Load data from config file
         """
@@ -414,6 +645,9 @@ class ConfigData(object):
 
                 deep_update(self.datastore, datastore)
 
+        self.version += 1
+        self._snapshot = copy.deepcopy(self.datastore)
+
     def save(self):
         """ Save data to config file
         """
@@ -421,6 +655,8 @@ class ConfigData(object):
             with open(self.configFileName, 'w') as f:
                 json.dump(self.datastore, f, indent=3, sort_keys=True)
 
+        self.notifyChanges()
+
     def dump(self):
         """ dumps config to stdout
         """
@@ -468,6 +704,8 @@ class gsatConfigData(ConfigData):
             "CapturePeriod": 100,
             "CaptureWidth": 640,
             "Crosshair": True,
+            "CrosshairOffsetX": 0.0,
+            "CrosshairOffsetY": 0.0,
             "Enable": False
         },
         "jogging": {
@@ -496,6 +734,9 @@ class gsatConfigData(ConfigData):
             "NumKeypadPendant": False,
             "ProbeDistance": 19.6,
             "ProbeFeedRate": 100.0,
+            "ProbeGridClearance": 2.0,
+            "ProbeGridPointsX": 5,
+            "ProbeGridPointsY": 5,
             "ProbeMaxDistance": -40.0,
             "ReqUpdateOnJogSetOp": True,
             "SpindleSpeed": 12000,
@@ -520,7 +761,12 @@ class gsatConfigData(ConfigData):
             "FilterGcodes": "",
             "InitScript": "",
             "InitScriptEnable": False,
+            "InjectLineNumbers": False,
             "Port": "",
+            "RapidFeedRate": 1000.0,
+            "SeparateProcess": False,
+            "SingleThreadCore": False,
+            "StatusReportTuning": False,
             "MachIfSpecific": {
                 "grbl": {
                     "AutoRefreshPeriod": {
@@ -530,8 +776,34 @@ class gsatConfigData(ConfigData):
                     }
                 },
                 "TinyG": {
+                    "AutoRefreshPeriod": {
+                        "Value": 250,
+                        "Name": "Auto Refresh Period (msec)",
+                        "ToolTip": "Status report interval (si) set on "
+                                   "connect when status report tuning is on",
+                    },
+                    "QueueReportFlowControl": {
+                        "Value": False,
+                        "Name": "Queue report flow control",
+                        "ToolTip": "Turn on queue reports (qr) on connect "
+                                   "and hold lines while the planner queue "
+                                   "is full, not only the serial buffer",
+                    }
                 },
                 "g2core": {
+                    "AutoRefreshPeriod": {
+                        "Value": 250,
+                        "Name": "Auto Refresh Period (msec)",
+                        "ToolTip": "Status report interval (si) set on "
+                                   "connect when status report tuning is on",
+                    },
+                    "QueueReportFlowControl": {
+                        "Value": False,
+                        "Name": "Queue report flow control",
+                        "ToolTip": "Turn on queue reports (qr) on connect "
+                                   "and hold lines while the planner queue "
+                                   "is full, not only the serial buffer",
+                    }
                 },
                 "Smoothie":{
                     "AutoRefreshPeriod": {
@@ -539,6 +811,20 @@ class gsatConfigData(ConfigData):
                         "Name": "Auto Refresh Period (msec)",
                         "ToolTip": "How often so send status request",
                     }
+                },
+                "Marlin": {
+                    "AutoRefreshPeriod": {
+                        "Value": 1000,
+                        "Name": "Auto Refresh Period (msec)",
+                        "ToolTip": "How often so send M114 while running, "
+                                   "M114 takes a command queue slot",
+                    },
+                    "LineChecksum": {
+                        "Value": True,
+                        "Name": "Line number and checksum",
+                        "ToolTip": "Send N line numbers and checksums, "
+                                   "resend lines the device asks for",
+                    }
                 }
             }
         },
@@ -547,6 +833,8 @@ class gsatConfigData(ConfigData):
             "DisplayRunTimeDialog": True,
             "RoundInch2mm": 4,
             "Roundmm2Inch": 4,
+            "StallThreshold": 250,
+            "AckWaitThreshold": 5000,
             "FileHistory": {
                 "FilesMaxHistory": 10,
             },
@@ -585,25 +873,60 @@ def reg_thread_queue_data_event(win, func):
     win.Connect(-1, -1, EVT_THREAD_QUEQUE_EVENT_ID, func)
 
 
-class ThreadQueueEvent(wx.PyEvent):
-    """ Simple event to carry arbitrary data.
+if wx is not None:
+    class ThreadQueueEvent(wx.PyEvent):
+        """ Simple event to carry arbitrary data.
+        """
+
+        def __init__(self, data):
+            """Init Result Event."""
+            wx.PyEvent.__init__(self)
+            self.SetEventType(EVT_THREAD_QUEQUE_EVENT_ID)
+            self.data = data
+
+
+class SimpleEvent(tuple):
+    """ Simple event to carry arbitrary data. Events can't be changed, the
+        same event is handed to every listener.
     """
+    __slots__ = ()
+
+    def __new__(cls, event_id, data, sender=None, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+
+        return tuple.__new__(cls, (event_id, data, sender, timestamp))
 
-    def __init__(self, data):
-        """Init Result Event."""
-        wx.PyEvent.__init__(self)
-        self.SetEventType(EVT_THREAD_QUEQUE_EVENT_ID)
-        self.data = data
+    event_id = property(operator.itemgetter(0))
+    data = property(operator.itemgetter(1))
+    sender = property(operator.itemgetter(2))
+    timestamp = property(operator.itemgetter(3))
 
 
-class SimpleEvent(object):
-    """ Simple event to carry arbitrary data.
+class EventQueue(Queue.Queue):
+    """ Event queue that keeps how long events waited in queue (put to get)
+        per event id, as [count, total seconds, max seconds]
     """
 
-    def __init__(self, event_id, data, sender=None):
-        self.event_id = event_id
-        self.data = data
-        self.sender = sender
+    def __init__(self, maxsize=0):
+        Queue.Queue.__init__(self, maxsize)
+        self.waitStats = dict()
+
+    def _get(self):
+        e = Queue.Queue._get(self)
+
+        wait = time.time() - e.timestamp
+        stats = self.waitStats.get(e.event_id)
+
+        if stats is None:
+            self.waitStats[e.event_id] = [1, wait, wait]
+        else:
+            stats[0] += 1
+            stats[1] += wait
+            if wait > stats[2]:
+                stats[2] = wait
+
+        return e
 
 
 class EventQueueIf():
@@ -611,22 +934,172 @@ class EventQueueIf():
     """
 
     def __init__(self):
+        # listeners of all events, and listeners by event id
         self._eventListeners = dict()
-        self._eventQueue = Queue.Queue()
+        self._eventSubscribers = dict()
+
+        self._eventQueue = EventQueue()
+
+        # realtime commands (feed hold, reset, etc.) bypass bulk traffic
+        self._priorityEventQueue = EventQueue()
+
+        # optional wake up signal, set every time an event is queued
+        self._wakeUp = None
+
+    def addEventListener(self, listener, event_ids=None):
+        """ Listener gets events with ids in event_ids, or all events if
+            None
+        """
+        self.removeEventListener(listener)
+
+        # queue objects take shared event as is, others get eventPut
+        post = getattr(listener, 'eventPost', None)
+        if post is None:
+            post = lambda e: listener.eventPut(e.event_id, e.data, e.sender)
+
+        if event_ids is None:
+            self._eventListeners[id(listener)] = post
+        else:
+            for event_id in event_ids:
+                self._eventSubscribers.setdefault(
+                    event_id, dict())[id(listener)] = post
+
+    def eventPost(self, e):
+        """ Queue event as is
+        """
+        self._eventQueue.put(e)
 
-    def addEventListener(self, listener):
-        self._eventListeners[id(listener)] = listener
+        if self._wakeUp is not None:
+            self._wakeUp.set()
 
     def eventPut(self, event_id, event_data=None, sender=None):
-        self._eventQueue.put(SimpleEvent(event_id, event_data, sender))
+        self.eventPost(SimpleEvent(event_id, event_data, sender))
+
+    def eventPutPriority(self, event_id, event_data=None, sender=None,
+                         timestamp=None):
+        self._priorityEventQueue.put(
+            SimpleEvent(event_id, event_data, sender, timestamp))
+
+        if self._wakeUp is not None:
+            self._wakeUp.set()
+
+    def eventWaitStats(self):
+        """ Queue wait per event id, {event_id: (count, avg s, max s)}
+        """
+        stats = dict()
+
+        for queue in [self._priorityEventQueue, self._eventQueue]:
+            for event_id, (count, total, maxWait) in \
+               queue.waitStats.items():
+                stats[event_id] = (count, total / count, maxWait)
+
+        return stats
+
+    def logEventWaitStats(self, logger):
+        stats = self.eventWaitStats()
+
+        for event_id in sorted(stats.keys()):
+            count, avgWait, maxWait = stats[event_id]
+            logger.info("event [%s] count %d, queue wait avg %.3f ms, "
+                        "max %.3f ms" % (
+                            str(event_id), count, avgWait * 1000,
+                            maxWait * 1000))
+
+    def setWakeUp(self, wake_up):
+        self._wakeUp = wake_up
 
     def notifyEventListeners(self, event_id, data=None):
-        for listener in self._eventListeners.keys():
-            self._eventListeners[listener].eventPut(event_id, data, self)
+        """ One event for all listeners of event_id
+        """
+        subscribers = self._eventSubscribers.get(event_id)
+
+        if not self._eventListeners and not subscribers:
+            return
+
+        e = SimpleEvent(event_id, data, self)
+
+        for post in self._eventListeners.values():
+            post(e)
+
+        if subscribers:
+            for post in subscribers.values():
+                post(e)
 
     def removeEventListener(self, listener):
-        if id(listener) in self._eventListeners:
-            self._eventListeners.pop(id(listener))
+        self._eventListeners.pop(id(listener), None)
+
+        for subscribers in self._eventSubscribers.values():
+            subscribers.pop(id(listener), None)
+
+
+class WakeUp(object):
+    """ Wake up signal shared by several producers (event queues, timers)
+        and a single consumer thread that blocks until there is work to do
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._pending = False
+
+    def set(self):
+        self._condition.acquire()
+        self._pending = True
+        self._condition.notify()
+        self._condition.release()
+
+    def wait(self):
+        """ Block until set, no timeout on purpose, python 2 timed waits
+            poll in steps of up to 50ms, use a timer thread to set instead
+        """
+        self._condition.acquire()
+
+        while not self._pending:
+            self._condition.wait()
+
+        self._pending = False
+        self._condition.release()
+
+
+class PipeWakeUp(object):
+    """ Same API as WakeUp but backed by a pipe, so it can be waited on
+        with select() together with a serial port or socket. POSIX only,
+        select() on Windows only works with sockets.
+    """
+
+    def __init__(self):
+        self._rfd, self._wfd = os.pipe()
+        self._lock = threading.Lock()
+        self._pending = False
+        self._closed = False
+
+    def fileno(self):
+        return self._rfd
+
+    def set(self):
+        with self._lock:
+            if not self._pending and not self._closed:
+                self._pending = True
+                os.write(self._wfd, 'w')
+
+    def clear(self):
+        with self._lock:
+            if self._pending and not self._closed:
+                self._pending = False
+                os.read(self._rfd, 1)
+
+    def wait(self, timeout=None):
+        select.select([self._rfd], [], [], timeout)
+        self.clear()
+
+    def close(self):
+        """ Producers may still set after the consumer is gone, that is
+            ignored
+        """
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                os.close(self._rfd)
+                os.close(self._wfd)
 
 
 class TimeOut(object):
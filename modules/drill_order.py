@@ -0,0 +1,340 @@
+"""----------------------------------------------------------------------------
+   drill_order.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import copy
+import re
+
+import modules.height_map as hm
+
+# -----------------------------------------------------------------------------
+# regular expressions
+# -----------------------------------------------------------------------------
+
+# words replaced when a hole line is moved
+gReGcodeXYWord = re.compile(r'\s*[XY]\s*[-+]?(?:\d+\.?\d*|\.\d+)', re.I)
+gReGcodeLineNumber = re.compile(r'^\s*N\s*\d+\s*', re.I)
+
+# kind of hole block
+DRILL_CANNED = "canned"
+DRILL_PLUNGE = "plunge"
+
+# 2-opt passes over a block, each pass is O(n^2) but improvements after
+# the first few passes are small
+DRILL_2OPT_MAX_PASSES = 50
+
+
+def optimize_drill_order(gcode_lines):
+    """ Reorder holes of drill programs for shorter rapid travel. Holes are
+        canned cycle lines (G73-G89) or "G0 X Y" followed by Z only lines
+        that return to the Z they started at. Only holes next to each other
+        with the same cycle or plunge lines are reordered, anything else
+        between them, like a tool change, stays where it is, and the last
+        hole of a block stays last so the program goes on from where it
+        did. Returns
+        (lines, holes, rapid distance before, rapid distance after).
+    """
+    if not hm.import_numpy():
+        raise ImportError("drill order needs numpy")
+
+    np = hm.np
+
+    optimizedLines = list(gcode_lines)
+    holes = 0
+    before = 0.0
+    after = 0.0
+
+    # last block first, replacing lines keeps earlier indexes valid
+    for block in reversed(drill_blocks(gcode_lines)):
+        points = np.array([(hole['x'], hole['y']) for hole in block['holes']])
+        start = block['start']
+        if start is None:
+            start = points[0]
+
+        start = np.array(start, dtype=float)
+
+        # block ends at its last hole as in the program, the lines after
+        # it may move relative to there or only in X or Y
+        inner = points[:-1]
+        order = two_opt(start, inner, nearest_neighbour(start, inner),
+                        points[-1])
+        order.append(len(points) - 1)
+
+        blockBefore = path_length(start, points)
+        blockAfter = path_length(start, points[order])
+
+        holes += len(points)
+        before += blockBefore
+
+        if blockAfter >= blockBefore:
+            after += blockBefore
+            continue
+
+        after += blockAfter
+
+        optimizedLines[block['first']:block['end']] = block_lines(
+            block, [block['holes'][k] for k in order],
+            gcode_lines[block['first']:block['end']])
+
+    return (optimizedLines, holes, before, after)
+
+
+def drill_blocks(gcode_lines):
+    """ Runs of holes that can be reordered, list of dict with first and
+        end line index, start XY (None if not known), holes and for canned
+        cycles the head words
+    """
+    state = hm.GcodeState()
+    blocks = []
+    block = None
+    i = 0
+
+    while i < len(gcode_lines):
+        gcode = hm.gReGcodeComment.sub("", gcode_lines[i])
+        start = state.pos[:2]
+        target = state.update(gcode_lines[i])
+        absolute = state.absolute
+
+        words = hm.parse_gcode(gcode)
+        letters = set([letter for letter, value in words]) - set(['N'])
+
+        hole = None
+        kind = None
+        key = None
+        end = i + 1
+
+        if target is not None and absolute and None not in target[:2] and \
+           ('X' in letters or 'Y' in letters):
+            if state.motion not in hm.MOTION_GCODES:
+                # more holes of the same cycle have nothing but X and Y
+                kind = DRILL_CANNED
+                key = state.motion
+                hole = dict({'x': target[0], 'y': target[1], 'line': i})
+                if not letters <= set(['X', 'Y']):
+                    block = None
+
+            elif letters <= set(['G', 'X', 'Y']) and \
+                    [value for letter, value in words
+                     if letter == 'G'] == [0.0]:
+                plunge = plunge_lines(state, gcode_lines, i + 1)
+
+                if plunge is not None:
+                    kind = DRILL_PLUNGE
+                    end, key = plunge
+                    hole = dict({'x': target[0], 'y': target[1], 'line': i,
+                                 'end': end})
+
+                    for plungeLine in gcode_lines[i + 1:end]:
+                        state.update(plungeLine)
+
+        if hole is None:
+            block = None
+
+        elif block is not None and block['end'] == i and \
+                block['kind'] == kind and block['key'] == key:
+            block['holes'].append(hole)
+            block['end'] = end
+
+        else:
+            block = dict({
+                'kind': kind, 'key': key, 'first': i, 'end': end,
+                'start': None if None in start else tuple(start),
+                'holes': [hole],
+                'head': gReGcodeXYWord.sub("", gcode).strip()})
+            blocks.append(block)
+
+        i = end
+
+    return [block for block in blocks if len(block['holes']) > 1]
+
+
+def plunge_lines(state, gcode_lines, first):
+    """ Z only lines of a plunge hole starting at first, they have to end
+        at the Z they started from. Returns (end line index, lines without
+        comments as key) or None.
+    """
+    state = copy.deepcopy(state)
+    startZ = state.pos[2]
+    key = []
+    end = first
+
+    if startZ is None:
+        return None
+
+    while end < len(gcode_lines):
+        gcode = hm.gReGcodeComment.sub("", gcode_lines[end]).strip()
+        letters = set([letter for letter, value in hm.parse_gcode(gcode)])
+
+        if 'Z' not in letters or not letters <= set(['G', 'Z', 'F', 'N']):
+            break
+
+        if state.update(gcode) is None:
+            break
+
+        key.append(gReGcodeLineNumber.sub("", gcode).upper())
+        end += 1
+
+    if not key or state.pos[2] != startZ or state.motion not in [0.0, 1.0]:
+        return None
+
+    return (end, tuple(key))
+
+
+def block_lines(block, holes, original_lines):
+    """ Lines of block with holes in new order, hole lines that have both X
+        and Y move as they are
+    """
+    lines = []
+    first = block['first']
+
+    for k, hole in enumerate(holes):
+        original = original_lines[hole['line'] - first]
+        gcode = original.rstrip("\r\n")
+        lineEnd = original[len(gcode):]
+
+        letters = set([letter for letter, value in hm.parse_gcode(
+            hm.gReGcodeComment.sub("", gcode))])
+        hasXY = 'X' in letters and 'Y' in letters
+
+        if block['kind'] == DRILL_CANNED:
+            # cycle words go with the first hole
+            if k == 0 and hole['line'] != first:
+                gcode = xy_line(block['head'], hole, gcode)
+            elif k != 0 and (hole['line'] == first or not hasXY):
+                gcode = xy_line("", hole, gcode)
+
+        elif not hasXY:
+            gcode = xy_line(gReGcodeXYWord.sub(
+                "", hm.gReGcodeComment.sub("", gcode)).strip(), hole, gcode)
+
+        lines.append("%s%s" % (gcode, lineEnd))
+
+        if block['kind'] == DRILL_PLUNGE:
+            lines.extend(
+                original_lines[hole['line'] - first + 1:hole['end'] - first])
+
+    return lines
+
+
+def xy_line(head, hole, gcode):
+    """ head words with hole X Y, comments of gcode go at the end
+    """
+    comments = " ".join(hm.gReGcodeComment.findall(gcode))
+    xy = "X%s Y%s" % (hm.COORD_FORMAT % hole['x'],
+                      hm.COORD_FORMAT % hole['y'])
+
+    gcode = xy
+    if head:
+        gcode = "%s %s" % (head, xy)
+
+    if comments:
+        gcode = "%s %s" % (gcode, comments)
+
+    return gcode
+
+
+def path_length(start, points):
+    """ Length of path from start through points array in order
+    """
+    np = hm.np
+    path = np.vstack([start, points])
+    delta = np.diff(path, axis=0)
+
+    return float(np.hypot(delta[:, 0], delta[:, 1]).sum())
+
+
+def nearest_neighbour(start, points):
+    """ Order of points, always to the closest point not visited yet
+    """
+    np = hm.np
+    xs = points[:, 0].copy()
+    ys = points[:, 1].copy()
+    x, y = start
+
+    order = []
+    for step in range(len(points)):
+        k = int(np.argmin(np.hypot(xs - x, ys - y)))
+        order.append(k)
+
+        x, y = points[k]
+        xs[k] = np.inf
+        ys[k] = np.inf
+
+    return order
+
+
+def two_opt(start, points, order, end=None):
+    """ Improve path from fixed start, and fixed end if not None, by
+        reversing sub paths while that shortens it, all reversals from one
+        point are tried at once
+    """
+    np = hm.np
+    order = np.array(order)
+
+    path = [start, points[order]]
+    if end is not None:
+        path.append(end)
+
+    path = np.vstack(path)
+    n = len(path)
+
+    # last point that can move
+    last = n - 1 if end is None else n - 2
+
+    for passes in range(DRILL_2OPT_MAX_PASSES):
+        improved = False
+        delta = np.diff(path, axis=0)
+        segment = np.hypot(delta[:, 0], delta[:, 1])
+
+        for i in range(1, last):
+            # reverse path[i..j] for every j > i, j at the open end has no
+            # edge after it
+            a = path[i - 1]
+            b = path[i]
+            j = np.arange(i + 1, last + 1)
+            after = np.minimum(j + 1, n - 1)
+            hasAfter = j + 1 < n
+
+            oldLength = segment[i - 1] + \
+                np.where(hasAfter, segment[np.minimum(j, n - 2)], 0.0)
+            newLength = np.hypot(path[j, 0] - a[0], path[j, 1] - a[1]) + \
+                np.where(hasAfter, np.hypot(path[after, 0] - b[0],
+                                            path[after, 1] - b[1]), 0.0)
+
+            gain = oldLength - newLength
+            k = int(np.argmax(gain))
+
+            if gain[k] > 1e-9:
+                jk = j[k]
+                path[i:jk + 1] = path[i:jk + 1][::-1].copy()
+                order[i - 1:jk] = order[i - 1:jk][::-1].copy()
+
+                delta = np.diff(path, axis=0)
+                segment = np.hypot(delta[:, 0], delta[:, 1])
+                improved = True
+
+        if not improved:
+            break
+
+    return list(order)
@@ -0,0 +1,381 @@
+"""----------------------------------------------------------------------------
+   height_map.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import math
+import re
+
+# numpy is slow to import, it is imported with the first height map
+np = None
+
+# -----------------------------------------------------------------------------
+# regular expressions
+# -----------------------------------------------------------------------------
+
+# g-code word example "X-1.5", "G1", "F300"
+gReGcodeWord = re.compile(r'([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))', re.I)
+
+# axis words, removed from lines when new coordinates are put in
+gReGcodeAxisWord = re.compile(r'\s*[XYZ]\s*[-+]?(?:\d+\.?\d*|\.\d+)', re.I)
+gReGcodeZWord = re.compile(r'\s*Z\s*[-+]?(?:\d+\.?\d*|\.\d+)', re.I)
+
+# comments example "( comment string )" or "; comment string"
+gReGcodeComment = re.compile(r'\(.*?\)|;.*')
+
+# coordinates written out, same for every split segment
+COORD_FORMAT = "%.4f"
+
+# moves followed by position, others are canned cycles
+MOTION_GCODES = [0.0, 1.0, 2.0, 3.0]
+
+# G codes with axis words that are not a move in the current coordinates
+# (G10, G28, G30, G38.x, G53, G92), these lines are sent as they are
+NON_MOTION_AXIS_GCODES = set([10.0, 28.0, 30.0, 38.2, 38.3, 38.4, 38.5, 53.0,
+                              92.0])
+
+
+def import_numpy():
+    """ Import numpy for height maps, returns False if it's not installed
+    """
+    global np
+
+    if np is None:
+        try:
+            import numpy
+            np = numpy
+
+        except ImportError:
+            return False
+
+    return True
+
+
+def parse_gcode(gcode):
+    """ Words of a g-code line, as (letter, value) pairs with upper case
+        letter and float value
+    """
+    return [(letter.upper(), float(value))
+            for letter, value in gReGcodeWord.findall(gcode)]
+
+
+def gcode_bounds(gcode_lines):
+    """ XY extents (x min, y min, x max, y max) of absolute moves in the
+        g-code lines, None if there are none
+    """
+    state = GcodeState()
+    xs = []
+    ys = []
+
+    for gcode in gcode_lines:
+        target = state.update(gcode)
+
+        if target is not None and state.absolute and \
+           target[0] is not None and target[1] is not None:
+            xs.append(target[0])
+            ys.append(target[1])
+
+    if not xs:
+        return None
+
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+class GcodeState(object):
+    """ Modal state of streamed lines: distance mode, motion mode (G0-G3
+        or canned cycle G73-G89) and position, None for axes not known yet
+    """
+
+    def __init__(self):
+        self.absolute = True
+        self.motion = 0.0
+        self.pos = [None, None, None]
+
+    def update(self, gcode):
+        """ Update state with g-code line, returns move target [x, y, z] or
+            None if line doesn't move in current coordinates. Target of a
+            relative move is None for axes with unknown position.
+        """
+        gcode = gcode.strip()
+
+        # device commands ($H, $J=...) and program markers
+        if gcode[:1] in ['$', '%']:
+            return None
+
+        words = parse_gcode(gReGcodeComment.sub("", gcode))
+
+        axes = dict()
+        moveCodes = True
+
+        for letter, value in words:
+            if letter == 'G':
+                if value == 90.0:
+                    self.absolute = True
+                elif value == 91.0:
+                    self.absolute = False
+                elif value == 80.0:
+                    self.motion = None
+                elif value in [0.0, 1.0, 2.0, 3.0] or 73.0 <= value <= 89.0:
+                    self.motion = value
+                elif value in NON_MOTION_AXIS_GCODES:
+                    moveCodes = False
+
+            elif letter in 'XYZ':
+                axes['XYZ'.index(letter)] = value
+
+        if not axes:
+            return None
+
+        if not moveCodes or self.motion is None:
+            # position after these isn't known here
+            for axis in axes:
+                self.pos[axis] = None
+
+            return None
+
+        target = list(self.pos)
+
+        for axis, value in axes.items():
+            if self.absolute:
+                target[axis] = value
+            elif target[axis] is not None:
+                target[axis] = target[axis] + value
+
+        self.pos = list(target)
+
+        if self.motion not in MOTION_GCODES:
+            # canned cycle Z is hole bottom, it ends at retract height
+            self.pos[2] = None
+
+        return target
+
+
+class HeightMap(object):
+    """ Z of the work surface probed on a regular XY grid, z[j, i] is the
+        height at x min + i * x step, y min + j * y step
+    """
+
+    def __init__(self, x_min, y_min, x_max, y_max, x_points, y_points):
+        if not import_numpy():
+            raise ImportError("height map needs numpy")
+
+        self.xMin = float(x_min)
+        self.yMin = float(y_min)
+        self.xPoints = max(int(x_points), 2)
+        self.yPoints = max(int(y_points), 2)
+
+        # zero size area still needs a cell to interpolate in
+        self.xStep = max(float(x_max) - self.xMin, 1e-6) / (self.xPoints - 1)
+        self.yStep = max(float(y_max) - self.yMin, 1e-6) / (self.yPoints - 1)
+
+        self.z = np.empty((self.yPoints, self.xPoints))
+        self.z.fill(np.nan)
+
+    def __str__(self):
+        return "%dx%d X%s..%s Y%s..%s" % (
+            self.xPoints, self.yPoints,
+            COORD_FORMAT % self.xMin,
+            COORD_FORMAT % (self.xMin + self.xStep * (self.xPoints - 1)),
+            COORD_FORMAT % self.yMin,
+            COORD_FORMAT % (self.yMin + self.yStep * (self.yPoints - 1)))
+
+    def isComplete(self):
+        return not np.isnan(self.z).any()
+
+    def points(self):
+        """ Probe points as (i, j, x, y), row by row, every other row
+            backwards to keep travel short
+        """
+        points = []
+
+        for j in range(self.yPoints):
+            columns = range(self.xPoints)
+            if j % 2:
+                columns.reverse()
+
+            for i in columns:
+                points.append((i, j, self.xMin + i * self.xStep,
+                               self.yMin + j * self.yStep))
+
+        return points
+
+    def setZ(self, i, j, z):
+        self.z[j, i] = z
+
+    def zAt(self, x, y):
+        """ Bilinear interpolated height at x, y arrays, points outside the
+            grid get the height of the nearest edge
+        """
+        # plain ufuncs, np.clip and 2D indexing cost more than the math
+        # on the few points of a split line
+        fx = (np.asarray(x, dtype=float) - self.xMin) * (1.0 / self.xStep)
+        fy = (np.asarray(y, dtype=float) - self.yMin) * (1.0 / self.yStep)
+        np.maximum(fx, 0, out=fx)
+        np.minimum(fx, self.xPoints - 1, out=fx)
+        np.maximum(fy, 0, out=fy)
+        np.minimum(fy, self.yPoints - 1, out=fy)
+
+        i = fx.astype(int)
+        j = fy.astype(int)
+        np.minimum(i, self.xPoints - 2, out=i)
+        np.minimum(j, self.yPoints - 2, out=j)
+        tx = fx - i
+        ty = fy - j
+
+        z = self.z.ravel()
+        k = j * self.xPoints + i
+        z0 = z.take(k) * (1 - tx) + z.take(k + 1) * tx
+        k += self.xPoints
+        z1 = z.take(k) * (1 - tx) + z.take(k + 1) * tx
+
+        return z0 + (z1 - z0) * ty
+
+    def zAtPoint(self, x, y):
+        """ zAt for one point, most lines end in the cell they start in and
+            numpy call overhead would be most of the cost
+        """
+        fx = min(max((x - self.xMin) / self.xStep, 0.0), self.xPoints - 1)
+        fy = min(max((y - self.yMin) / self.yStep, 0.0), self.yPoints - 1)
+
+        i = min(int(fx), self.xPoints - 2)
+        j = min(int(fy), self.yPoints - 2)
+        tx = fx - i
+        ty = fy - j
+
+        z = self.z
+        z0 = z[j, i] * (1 - tx) + z[j, i + 1] * tx
+        z1 = z[j + 1, i] * (1 - tx) + z[j + 1, i + 1] * tx
+
+        return float(z0 + (z1 - z0) * ty)
+
+    def splitPoints(self, start, end):
+        """ Fractions (0, 1] of the line start -> end where it crosses grid
+            lines, ends with 1. None if line doesn't cross any.
+        """
+        fractions = [1.0]
+
+        for axis, origin, step in [(0, self.xMin, self.xStep),
+                                   (1, self.yMin, self.yStep)]:
+            delta = end[axis] - start[axis]
+
+            if delta == 0:
+                continue
+
+            # grid lines strictly between start and end
+            first = math.floor((min(start[axis], end[axis]) - origin) / step)
+            last = math.ceil((max(start[axis], end[axis]) - origin) / step)
+
+            if last - first > 1:
+                lines = origin + np.arange(first + 1, last) * step
+                fractions.extend((lines - start[axis]) / delta)
+
+        if len(fractions) == 1:
+            return None
+
+        # line through a grid corner crosses both lines at the same point
+        t = np.sort(fractions)
+        keep = np.empty(len(t), dtype=bool)
+        keep[0] = t[0] > 1e-9
+        np.greater(np.diff(t), 1e-9, out=keep[1:])
+
+        return t[keep]
+
+
+class GcodeLeveler(object):
+    """ Rewrites g-code lines to follow the height map: Z of every move
+        gets the surface height at its XY added, linear moves are split
+        where they cross grid lines. Arcs get their end point corrected
+        only, relative moves get the height difference between start and
+        end. Height map and program are expected in the same units.
+    """
+
+    def __init__(self, height_map):
+        self.heightMap = height_map
+        self.state = GcodeState()
+
+    def reset(self):
+        """ Forget modal state and position, machine may have moved
+        """
+        self.state = GcodeState()
+
+    def level(self, gcode):
+        """ Leveled lines to send for g-code line, without line ends
+        """
+        start = list(self.state.pos)
+        target = self.state.update(gcode)
+
+        # G90/G91 on the line applies to its own move
+        absolute = self.state.absolute
+
+        if self.state.motion not in MOTION_GCODES:
+            # canned cycles are sent as they are
+            return [gcode]
+
+        # comments go with the rewrite, they could hold axis words
+        gcode = gReGcodeComment.sub("", gcode)
+
+        if target is None or None in start[:2] or None in target:
+            return [gcode]
+
+        hm = self.heightMap
+
+        if not absolute:
+            # relative Z move picks up height difference start -> end
+            words = parse_gcode(gcode)
+            dz = sum([value for letter, value in words if letter == 'Z'])
+            dz += hm.zAtPoint(target[0], target[1]) - \
+                hm.zAtPoint(start[0], start[1])
+
+            return ["%s Z%s" % (gReGcodeZWord.sub("", gcode).strip(),
+                                COORD_FORMAT % dz)]
+
+        t = None
+        if self.state.motion == 1.0:
+            t = hm.splitPoints(start, target)
+
+        if t is None:
+            points = [(target[0], target[1],
+                       target[2] + hm.zAtPoint(target[0], target[1]))]
+        else:
+            startZ = target[2] if start[2] is None else start[2]
+
+            xs = start[0] + (target[0] - start[0]) * t
+            ys = start[1] + (target[1] - start[1]) * t
+            zs = startZ + (target[2] - startZ) * t + hm.zAt(xs, ys)
+
+            points = zip(xs, ys, zs)
+
+        lines = []
+        head = gReGcodeAxisWord.sub("", gcode).strip()
+
+        for x, y, z in points:
+            coords = "X%s Y%s Z%s" % (
+                COORD_FORMAT % x, COORD_FORMAT % y, COORD_FORMAT % z)
+
+            if head:
+                lines.append("%s %s" % (head, coords))
+                head = ""
+            else:
+                lines.append(coords)
+
+        return lines
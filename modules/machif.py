@@ -31,6 +31,23 @@ import modules.config as gc
 import modules.serial_thread as st
 
 
+def get_override_steps(percent):
+    """ returns list of override steps ("100", "+10", "-1", etc.) to get
+        from the default 100% to the given percent
+    """
+    steps = ["100"]
+    delta = int(percent) - 100
+
+    if delta > 0:
+        steps.extend(["+10"] * (delta / 10))
+        steps.extend(["+1"] * (delta % 10))
+    elif delta < 0:
+        steps.extend(["-10"] * (-delta / 10))
+        steps.extend(["-1"] * (-delta % 10))
+
+    return steps
+
+
 class MachIf_Base(object, gc.EventQueueIf):
     """ Machine interface base class to provide a unified API for specific
         devices (g2core, TinyG, grbl, etc).
@@ -39,6 +56,12 @@ class MachIf_Base(object, gc.EventQueueIf):
 
     reMachiePositionMode = re.compile(r'.*(G9[0|1]).*')
 
+    # serial thread events read() handles
+    serialEventIds = [
+        gc.EV_SER_RXDATA, gc.EV_SER_PORT_OPEN, gc.EV_SER_PORT_CLOSE,
+        gc.EV_ABORT, gc.EV_EXIT
+    ]
+
     def __init__(
         self, if_id, name, input_buffer_max_size,
         input_buffer_init_val, input_buffer_watermark_prcnt
@@ -60,9 +83,27 @@ class MachIf_Base(object, gc.EventQueueIf):
 
         self._serialPortOpen = False
         self._serialTxRxThread = None
+
+        # class used for serial txrx, a thread unless the execute core
+        # services the port itself
+        self.serialTxRxClass = st.SerialPortThread
         self.serialName = None
         self.serialBaud = None
 
+        # time stamp of the UI event that originated the next realtime write
+        self._rtTimestamp = None
+
+        # continuous jog, axis direction dict while jog is active
+        self._jogContinuous = None
+
+        # executor waits for an acknowledge after each program line, devices
+        # that report their own queue state stream on okToSend alone
+        self.waitForAckOnWrite = True
+
+        # set device status reports to what gsat displays on connect, put
+        # device settings back on disconnect
+        self.statusReportTuning = False
+
         # machine
         self.machinePositionMode = "G90"
         self.machineStatus = -1
@@ -79,6 +120,11 @@ class MachIf_Base(object, gc.EventQueueIf):
         self.cmdSetAxis = 'G92'
         self.cmdStatus = ''
 
+        # realtime overrides, maps override step ("100", "+10", etc.) to cmd
+        self.cmdFeedOverride = {}
+        self.cmdRapidOverride = {}
+        self.cmdSpindleOverride = {}
+
     @abstractmethod
     def _init(self):
         pass
@@ -97,6 +143,21 @@ class MachIf_Base(object, gc.EventQueueIf):
             )
             self.write("".join([machine_current_position_mode, "\n"]))
 
+    def _override(self, override_name, cmd_dict, value):
+        """ sends realtime override cmd, these are out of band and don't
+            take space in the device input buffer
+        """
+        cmd = cmd_dict.get(str(value))
+
+        if cmd is None:
+            msg = "!! %s doesn't support %s override [%s].\n" % (
+                self.name, override_name, str(value))
+            self.eventPut(gc.EV_SER_RXDATA, msg)
+        else:
+            self.eventPut(gc.EV_SER_TXDATA, "[%s override %s, 0x%s]\n" % (
+                override_name, str(value), cmd.encode('hex')))
+            self.writeRealtime(cmd, raw_write=True)
+
     def _reset(
         self, input_buffer_max_size, input_buffer_init_val,
         input_buffer_watermark_prcnt
@@ -149,8 +210,35 @@ class MachIf_Base(object, gc.EventQueueIf):
         self.eventPut(gc.EV_SER_TXDATA, "%s\n" % machine_code)
         self.write("".join([machine_code, "\n"]))
 
+    def _statusReportAxes(self):
+        """ Axes enabled in DRO, status reports only need these positions
+        """
+        return [axis for axis in ['x', 'y', 'z', 'a', 'b', 'c']
+                if gc.CONFIG_DATA.get(
+                    '/machine/DRO/Enable%s' % axis.upper(), False)]
+
+    def _statusReportRestore(self):
+        """ Put back device status report settings changed on connect
+        """
+        pass
+
+    def _statusReportTuned(self, bytes_before, bytes_after):
+        """ Let user know status report bandwidth before and after tuning
+            (bytes per second)
+        """
+        msg = "[MSG: status reports %d -> %d bytes/s, %d bytes/s saved]\n" % (
+            bytes_before, bytes_after, bytes_before - bytes_after)
+
+        self.eventPut(gc.EV_SER_RXDATA, msg)
+
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+            self.logger.info(msg.strip())
+
     def close(self):
         if self._serialTxRxThread is not None:
+            if self.statusReportTuning:
+                self._statusReportRestore()
+
             self._serialTxRxThread.eventPut(gc.EV_CMD_EXIT, None)
 
     @abstractmethod
@@ -170,7 +258,7 @@ class MachIf_Base(object, gc.EventQueueIf):
         """ send cycle resume command
         """
         self.eventPut(gc.EV_SER_TXDATA, "%s\n" % self.cmdCycleStart.strip())
-        self.write(self.cmdCycleStart)
+        self.writeRealtime(self.cmdCycleStart)
 
     def doFastMove(self, dict_axis_coor):
         """ Fast (rapid) move to a coordinate in obsolete position mode
@@ -188,11 +276,16 @@ class MachIf_Base(object, gc.EventQueueIf):
         else:
             self._move("G91 G00", dict_axis_coor)
 
+    def doFeedOverride(self, value):
+        """ send feed override command
+        """
+        self._override("feed", self.cmdFeedOverride, value)
+
     def doFeedHold(self):
         """ send feed hold command
         """
         self.eventPut(gc.EV_SER_TXDATA, "%s\n" % self.cmdFeedHold.strip())
-        self.write(self.cmdFeedHold)
+        self.writeRealtime(self.cmdFeedHold)
 
     def doGetStatus(self):
         if self.okToSend(self.cmdStatus):
@@ -205,6 +298,28 @@ class MachIf_Base(object, gc.EventQueueIf):
     def doInitComm(self):
         self.write(self.cmdInitComm)
 
+    def doJogContinuous(self, dict_axis_dir):
+        """ Start (or keep alive) continuous jog, axis values are direction
+            (1 or -1), optional feed. Devices without a better option get a
+            long relative move that is stopped by doJogStop
+        """
+        if self._jogContinuous is not None:
+            return
+
+        self._jogContinuous = dict_axis_dir
+
+        dict_axis_coor = {}
+        for axis in ['x', 'y', 'z', 'a', 'b', 'c']:
+            if axis in dict_axis_dir:
+                dict_axis_coor[axis] = gc.NUMBER_FORMAT_STRING % (
+                    10000 * dict_axis_dir[axis])
+
+        if 'feed' in dict_axis_dir:
+            dict_axis_coor['feed'] = dict_axis_dir['feed']
+            self.doJogMoveRelative(dict_axis_coor)
+        else:
+            self.doJogFastMoveRelative(dict_axis_coor)
+
     def doJogFastMove(self, dict_axis_coor):
         self.doFastMove(dict_axis_coor)
 
@@ -218,6 +333,7 @@ class MachIf_Base(object, gc.EventQueueIf):
         self.doMoveRelative(dict_axis_coor)
 
     def doJogStop(self):
+        self._jogContinuous = None
         self.doFeedHold()
         self.doQueueFlush()
 
@@ -245,11 +361,16 @@ class MachIf_Base(object, gc.EventQueueIf):
 
     def doQueueFlush(self):
         self.eventPut(gc.EV_SER_TXDATA, "%s\n" % self.cmdQueueFlush.strip())
-        self.write(self.cmdQueueFlush)
+        self.writeRealtime(self.cmdQueueFlush, flush=True)
         self._init()
 
+    def doRapidOverride(self, value):
+        """ send rapid override command
+        """
+        self._override("rapid", self.cmdRapidOverride, value)
+
     def doReset(self):
-        self.write(self.cmdReset)
+        self.writeRealtime(self.cmdReset, flush=True)
         self._init()
 
     def doSetAxis(self, dict_axis_coor):
@@ -257,6 +378,11 @@ class MachIf_Base(object, gc.EventQueueIf):
         """
         self._sendAxisCmd(self.cmdSetAxis, dict_axis_coor)
 
+    def doSpindleOverride(self, value):
+        """ send spindle override command
+        """
+        self._override("spindle", self.cmdSpindleOverride, value)
+
     @abstractmethod
     def encode(self, data, bookeeping=True):
         """ encodes the data for the controller if needed
@@ -296,6 +422,9 @@ class MachIf_Base(object, gc.EventQueueIf):
     def getResetCmd(self):
         return self.cmdReset
 
+    def getSerialTxRx(self):
+        return self._serialTxRxThread
+
     def getSetAxisCmd(self):
         return self.cmdSetAxis
 
@@ -305,6 +434,14 @@ class MachIf_Base(object, gc.EventQueueIf):
     def init(self):
         self.serialName = gc.CONFIG_DATA.get('/machine/Port')
         self.serialBaud = gc.CONFIG_DATA.get('/machine/Baud')
+        self.statusReportTuning = gc.CONFIG_DATA.get(
+            '/machine/StatusReportTuning', False)
+
+    def setRealtimeTimestamp(self, timestamp):
+        """ time stamp of the event that will cause the next realtime
+            write, used to measure latency from UI to port
+        """
+        self._rtTimestamp = timestamp
 
     def isSerialPortOpen(self):
         return self._serialPortOpen
@@ -329,14 +466,20 @@ class MachIf_Base(object, gc.EventQueueIf):
         if self.serialName is not None and self.serialBaud is not None:
 
             # inti serial RX thread
-            self._serialTxRxThread = st.SerialPortThread(self,
-                                                         self.serialName,
-                                                         self.serialBaud)
+            self._serialTxRxThread = self.serialTxRxClass(
+                self, self.serialName, self.serialBaud, self.serialEventIds)
 
             if self._serialTxRxThread is not None:
-                self._serialTxRxThread.eventPut(gc.EV_HELLO, None, self)
+                self._serialTxRxThread.eventPut(
+                    gc.EV_HELLO, self.serialEventIds, self)
                 self.doInitComm()
 
+    def readPending(self):
+        """ True if there is data from txrx thread waiting to be read
+        """
+        return self._serialTxRxThread is not None and \
+            not self._eventQueue.empty()
+
     def read(self):
         """ Read and process data from txrx thread
         """
@@ -367,7 +510,8 @@ class MachIf_Base(object, gc.EventQueueIf):
                 if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD_EV:
                     self.logger.info("EV_HELLO from 0x%x" % id(e.sender))
 
-                self.addEventListener(e.sender)
+                # data is list of event ids listener wants, None for all
+                self.addEventListener(e.sender, e.data)
 
             elif e.event_id == gc.EV_GOODBY:
                 if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD_EV:
@@ -393,6 +537,9 @@ class MachIf_Base(object, gc.EventQueueIf):
 
                     self._serialPortOpen = False
 
+                    # lines in flight are lost, start accounting over
+                    self._init()
+
                 elif e.event_id == gc.EV_ABORT:
                     if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD_EV:
                         self.logger.info("EV_ABORT")
@@ -439,3 +586,29 @@ class MachIf_Base(object, gc.EventQueueIf):
                     bytesSent = bytesSent + len(line)
 
         return bytesSent
+
+    def writeRealtime(self, txData, flush=False, raw_write=False,
+                      bookeeping=False):
+        """ write data to txrx thread priority queue, ahead of any bulk
+            data, if flush is set pending bulk data is dropped first
+        """
+        bytesSent = 0
+
+        if self._serialTxRxThread is not None and len(txData) > 0:
+
+            if flush:
+                self._serialTxRxThread.eventPutPriority(
+                    gc.EV_CMD_SER_TXDATA_FLUSH, None, None, self._rtTimestamp)
+
+            data = txData
+            if not raw_write:
+                data = self.encode(txData, bookeeping=bookeeping)
+
+            self._serialTxRxThread.eventPutPriority(
+                gc.EV_CMD_SER_TXDATA, data, None, self._rtTimestamp)
+
+            bytesSent = len(data)
+
+        self._rtTimestamp = None
+
+        return bytesSent
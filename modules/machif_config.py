@@ -23,11 +23,10 @@
 
 ----------------------------------------------------------------------------"""
 
+import importlib
+import logging
+
 import modules.config as gc
-import modules.machif_g2core as mi_g2core
-import modules.machif_tinyg as mi_tinyg
-import modules.machif_grbl as mi_grbl
-import modules.machif_smoothie as mi_smoothie
 
 # --------------------------------------------------------------------------
 # Device type, this data needs to be in sync with the machif_* files
@@ -37,20 +36,177 @@ MACHIF_NONE = None
 # gMACHIF_TINYG           = 1100
 # gMACHIF_G2CORE          = 1200
 # gMACHIF_SMOOTHIE        = 1300
+# gMACHIF_MARLIN          = 1400
+
+# entry point group for third party machine interfaces, entry point name is
+# the device name, example in plugin setup.py
+#   entry_points={'gsat.machif': ['MyCNC = mycnc.machif:MachIf_MyCNC']}
+MACHIF_ENTRY_POINT_GROUP = 'gsat.machif'
+
+
+class MachIfDescriptor(object):
+    """ Device ID and name, and where to find its machine interface class,
+        module is only imported when the device is used
+    """
+
+    def __init__(self, machif_id, name, module_name, class_name,
+                 entry_point=None):
+        self.id = machif_id
+        self.name = name
+        self.moduleName = module_name
+        self.className = class_name
+        self.entryPoint = entry_point
+        self.machIfClass = None
+
+    def load(self):
+        """ Import module and get machine interface class
+        """
+        if self.machIfClass is None:
+            if self.entryPoint is not None:
+                self.machIfClass = self.entryPoint.load()
+            else:
+                module = importlib.import_module(self.moduleName)
+                self.machIfClass = getattr(module, self.className)
+
+        return self.machIfClass
+
+    def factory(self):
+        return self.load()()
+
+
+class MachIfRegistry(object):
+    """ Machine interfaces by ID and name, plugins are only looked up when a
+        name is not found or the full list is needed
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger()
+
+        self.byId = dict()
+        self.byName = dict()
+        self.aliases = dict()
+        self.pluginsScanned = False
+
+    def register(self, descriptor):
+        if descriptor.name in self.byName or descriptor.id in self.byId:
+            self.logger.error("machine interface [%s] id [%s] already "
+                              "registered, ignored" % (
+                                descriptor.name, str(descriptor.id)))
+            return False
+
+        self.byName[descriptor.name] = descriptor
+
+        if descriptor.id is not None:
+            self.byId[descriptor.id] = descriptor
+
+        return True
+
+    def alias(self, name, device_name):
+        """ other names for same device, backward compatibility
+        """
+        self.aliases[name] = device_name
+
+    def scanPlugins(self):
+        self.pluginsScanned = True
+
+        try:
+            import pkg_resources
+        except ImportError:
+            return
+
+        for entryPoint in pkg_resources.iter_entry_points(
+           MACHIF_ENTRY_POINT_GROUP):
+
+            if entryPoint.name in self.byName:
+                continue
+
+            # plugin ID is only known once its class is loaded
+            self.register(MachIfDescriptor(
+                None, entryPoint.name, entryPoint.module_name,
+                entryPoint.attrs[0], entryPoint))
+
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF:
+                self.logger.info("machine interface plugin [%s] from %s" % (
+                    entryPoint.name, str(entryPoint.dist)))
+
+    def getByName(self, name):
+        name = self.aliases.get(name, name)
+        descriptor = self.byName.get(name)
 
-MACHIF_GRBL = mi_grbl.MachIf_GRBL()
-MACHIF_TINYG = mi_tinyg.MachIf_TinyG()
-MACHIF_G2CORE = mi_g2core.MachIf_g2core()
-MACHIF_SMOOTHIE = mi_smoothie.MachIf_Smoothie()
+        if descriptor is None and not self.pluginsScanned:
+            self.scanPlugins()
+            descriptor = self.byName.get(name)
 
-MACHIF_CLS_LIST = [
-    MACHIF_GRBL,
-    MACHIF_TINYG,
-    MACHIF_G2CORE,
-    MACHIF_SMOOTHIE
-]
+        if descriptor is not None and descriptor.id is None:
+            descriptor = self.loadPlugin(descriptor)
 
-MACHIF_LIST = [mach_if_cls.getName() for mach_if_cls in MACHIF_CLS_LIST]
+        return descriptor
+
+    def getById(self, machif_id):
+        return self.byId.get(machif_id)
+
+    def getNames(self):
+        if not self.pluginsScanned:
+            self.scanPlugins()
+
+        return self.byName.keys()
+
+    def loadPlugin(self, descriptor):
+        """ load plugin class to learn its ID
+        """
+        try:
+            machIfId = descriptor.factory().getId()
+
+        except Exception, e:
+            self.logger.error("machine interface plugin [%s] failed to "
+                              "load, %s" % (descriptor.name, str(e)))
+            del self.byName[descriptor.name]
+            return None
+
+        if machIfId in self.byId:
+            self.logger.error("machine interface plugin [%s] id [%s] "
+                              "already in use by [%s], ignored" % (
+                                descriptor.name, str(machIfId),
+                                self.byId[machIfId].name))
+            del self.byName[descriptor.name]
+            return None
+
+        descriptor.id = machIfId
+        self.byId[machIfId] = descriptor
+
+        return descriptor
+
+
+MACHIF_REGISTRY = MachIfRegistry()
+
+MACHIF_REGISTRY.register(MachIfDescriptor(
+    1000, "grbl", "modules.machif_grbl", "MachIf_GRBL"))
+MACHIF_REGISTRY.register(MachIfDescriptor(
+    1100, "TinyG", "modules.machif_tinyg", "MachIf_TinyG"))
+MACHIF_REGISTRY.register(MachIfDescriptor(
+    1200, "g2core", "modules.machif_g2core", "MachIf_g2core"))
+MACHIF_REGISTRY.register(MachIfDescriptor(
+    1300, "Smoothie", "modules.machif_smoothie", "MachIf_Smoothie"))
+MACHIF_REGISTRY.register(MachIfDescriptor(
+    1400, "Marlin", "modules.machif_marlin", "MachIf_Marlin"))
+
+# special backward compatibility
+MACHIF_REGISTRY.alias("TinyG2", "g2core")
+MACHIF_REGISTRY.alias("Grbl", "grbl")
+MACHIF_REGISTRY.alias("GRBL", "grbl")
+
+
+def RegisterMachIf(machIfId, name, moduleName, className):
+    """ add machine interface to registry, module is imported on first use
+    """
+    return MACHIF_REGISTRY.register(
+        MachIfDescriptor(machIfId, name, moduleName, className))
+
+
+def GetMachIfList():
+    """ device names, including plugins
+    """
+    return MACHIF_REGISTRY.getNames()
 
 
 def GetMachIfName(machIfId):
@@ -58,10 +214,9 @@ def GetMachIfName(machIfId):
     """
     machIfName = "None"
 
-    for mach_if in MACHIF_CLS_LIST:
-        if machIfId == mach_if.getId():
-            machIfName = mach_if.getName()
-            break
+    descriptor = MACHIF_REGISTRY.getById(machIfId)
+    if descriptor is not None:
+        machIfName = descriptor.name
 
     return machIfName
 
@@ -71,30 +226,20 @@ def GetMachIfId(deviceStr):
     """
     machIfId = MACHIF_NONE
 
-    for mach_if in MACHIF_CLS_LIST:
-        if deviceStr == mach_if.getName():
-            machIfId = mach_if.getId()
-            break
-
-    # special backward compatibility
-    if machIfId == MACHIF_NONE:
-        if deviceStr in ["TinyG2"]:
-            machIfId = MACHIF_G2CORE.getId()
-
-        elif deviceStr in ["Grbl", "GRBL"]:
-            machIfId = MACHIF_GRBL.getId()
+    descriptor = MACHIF_REGISTRY.getByName(deviceStr)
+    if descriptor is not None:
+        machIfId = descriptor.id
 
     return machIfId
 
 
 def GetMachIfModule(machIfId):
-    """ translate string to ID.
+    """ new machine interface object for ID, imports module on first use
     """
     machIfModule = None
 
-    for mach_if in MACHIF_CLS_LIST:
-        if machIfId == mach_if.getId():
-            machIfModule = mach_if.factory()
-            break
+    descriptor = MACHIF_REGISTRY.getById(machIfId)
+    if descriptor is not None:
+        machIfModule = descriptor.factory()
 
     return machIfModule
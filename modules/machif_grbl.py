@@ -24,7 +24,9 @@
 ----------------------------------------------------------------------------"""
 
 import datetime as dt
+import math
 import re
+import time
 
 import modules.config as gc
 import modules.machif as mi
@@ -195,6 +197,31 @@ BUFFER_MAX_SIZE = 127
 BUFFER_INIT_VAL = 0
 BUFFER_WATERMARK_PRCNT = 0.90
 
+# once the device reports its buffer state (Bf:) accounting is kept in sync
+# and we can stream up to the full buffer
+BUFFER_WATERMARK_PRCNT_BF = 1.0
+
+# time with no new data sent before we trust device reported buffer state
+# over local accounting (seconds)
+BUFFER_RESYNC_QUIET_TIME = 0.5
+
+# continuous jog, segments are sized to take at least this long (seconds)
+# or the measured round trip time, which ever is bigger
+JOG_SEGMENT_MIN_TIME = 0.025
+
+# jog segments sent ahead of acknowledge, keeps planner from starving
+JOG_SEGMENTS_AHEAD = 3
+
+# stop jogging if UI doesn't keep jog alive (seconds)
+JOG_KEEP_ALIVE_TIMEOUT = 0.5
+
+# feed used when jogging at rapid speeds, grbl will clamp to max rate
+JOG_RAPID_FEED = 10000
+
+# status report mask ($10) bits, grbl 1.1
+GRBL_STATUS_MASK_MPOS = 1
+GRBL_STATUS_MASK_BUFFER = 2
+
 
 class MachIf_GRBL(mi.MachIf_Base):
     """-----------------------------------------------------------------------
@@ -217,8 +244,11 @@ class MachIf_GRBL(mi.MachIf_Base):
     per GRBL 0.9 and 1.1 grbl input buffer is 127 bytes (buffer includes
     all characters including nulls and new line)
 
-    To be able to track working position changet GRBL settings to display work
-    position as oppose to machine position from 1.1f use $10=0 to configure...
+    grbl 1.1 reports either work (WPos:) or machine (MPos:) position, per
+    $10, and the work coordinate offset (WCO:) only every 10 to 30 reports or
+    when it changes. Last offset is cached and both positions are computed
+    for every report, work position in pos[xyzabc] and machine position in
+    mpo[xyzabc], so there is no need to change $10 to see both.
 
     -----------------------------------------------------------------------"""
 
@@ -264,11 +294,19 @@ class MachIf_GRBL(mi.MachIf_Base):
     reGrblAxes = re.compile(
         r'([+-]{0,1}\d+\.\d+),')
 
-    """
-        To be able to track working position changet GRBL settings to display
-        work position as oppose to machine position from 1.1f use $10=0 to
-        configure...
-    """
+    # grbl 1.1 overrides feed, rapid, spindle in percent, example
+    #   "<Idle|MPos:0.000,0.000,0.000|FS:0,0|Ov:100,100,100>"
+    reGrblOverrides = re.compile(r'\|Ov:(\d+),(\d+),(\d+)')
+
+    # grbl 1.1 buffer state, planner blocks and rx bytes available, and line
+    # number (if line numbers are sent), example
+    #   "<Run|MPos:0.000,0.000,0.000|Bf:15,128|Ln:99|FS:0,0>"
+    reGrblBufferState = re.compile(r'\|Bf:(\d+),(\d+)')
+    reGrblLineNumber = re.compile(r'\|Ln:(\d+)')
+
+    # grbl 1.1 work coordinate offset, not on every status report, example
+    #   "<Idle|MPos:0.000,0.000,0.000|FS:0,0|WCO:0.000,0.000,0.000>"
+    reGrblWco = re.compile(r'\|WCO:([^|>]+)')
 
     # grbl ack, example  "ok"
     reGrblMachineAck = re.compile(r'^ok\s$')
@@ -282,6 +320,11 @@ class MachIf_GRBL(mi.MachIf_Base):
     # grbl config settings
     reGrblConfig = re.compile(r'^\$(\d+)=\d+.*\s*')
 
+    # commands that leave the rx buffer but are not acknowledged until they
+    # are done: dwell, homing, probe, program pause/end
+    reGrblSyncCmd = re.compile(
+        r'^\$H|G0*4(?![\d.])|G38\.\d|M0*(?:[0-2]|30)(?![\d.])', re.I)
+
     def __init__(self):
         super(MachIf_GRBL, self).__init__(ID, NAME,
                                           BUFFER_MAX_SIZE, BUFFER_INIT_VAL,
@@ -289,6 +332,11 @@ class MachIf_GRBL(mi.MachIf_Base):
 
         self._inputBufferPart = list()
 
+        # parallel to _inputBufferPart, True for continuous jog segments
+        # and for sync commands
+        self._inputBufferJog = list()
+        self._inputBufferSync = list()
+
         self.machineAutoRefreshPeriod = 200
         self.machineStatus = GRBL_STATE_UNKNOWN
 
@@ -296,6 +344,26 @@ class MachIf_GRBL(mi.MachIf_Base):
 
         self.initStringDetectFlag = False
 
+        # status report tuning, waiting for first status after connect and
+        # device status report mask ($10) before tuning
+        self._statusTune = False
+        self._statusMaskOrig = None
+
+        # last work coordinate offset (WCO:) reported by device
+        self._wco = None
+
+        # continuous jog, segment send time stamps waiting for acknowledge
+        # and smoothed round trip time
+        self._jogSegmentTimes = list()
+        self._jogRtt = JOG_SEGMENT_MIN_TIME
+        self._jogKeepAlive = 0
+
+        # device reported buffer state, used to correct local accounting
+        self._bfRxAvailMax = 0
+        self._bfPlannerAvailMax = 0
+        self._bfResyncCount = 0
+        self._lastBookkeepingTime = 0
+
         # list of commads
         self.cmdClearAlarm = '$X\n'
         self.cmdHome = '$H\n'
@@ -308,6 +376,21 @@ class MachIf_GRBL(mi.MachIf_Base):
         self.cmdPostInit = '$I\n'
         self.cmdStatus = '?'
 
+        # grbl 1.1 realtime overrides, single byte out of band commands
+        self.cmdJogCancel = '\x85'
+
+        self.cmdFeedOverride = {
+            "100": '\x90', "+10": '\x91', "-10": '\x92', "+1": '\x93',
+            "-1": '\x94'
+        }
+
+        self.cmdRapidOverride = {"100": '\x95', "50": '\x96', "25": '\x97'}
+
+        self.cmdSpindleOverride = {
+            "100": '\x99', "+10": '\x9A', "-10": '\x9B', "+1": '\x9C',
+            "-1": '\x9D'
+        }
+
     def _init(self):
         """ Init object variables, ala soft-reset in hw
         """
@@ -316,6 +399,190 @@ class MachIf_GRBL(mi.MachIf_Base):
         )
 
         self._inputBufferPart = list()
+        self._inputBufferJog = list()
+        self._inputBufferSync = list()
+
+        self._jogContinuous = None
+        self._jogSegmentTimes = list()
+
+        # G92 offset is lost on reset, device reports WCO on next status
+        self._wco = None
+
+        # same device after reset, keep what we learn from buffer state
+        if self._bfRxAvailMax:
+            super(MachIf_GRBL, self)._reset(
+                self._bfRxAvailMax, BUFFER_INIT_VAL, BUFFER_WATERMARK_PRCNT_BF
+            )
+
+    def _bufferResync(self, stat, planner_avail, rx_avail):
+        """ Correct local input buffer accounting from device reported
+            buffer state. Only done when device is idle with rx buffer and
+            planner empty, no sync command (dwell, homing, probe) waiting for
+            its acknowledge and nothing was sent recently, at that point any
+            outstanding accounting is drift (missed or extra acknowledge)
+        """
+        if planner_avail > self._bfPlannerAvailMax:
+            self._bfPlannerAvailMax = planner_avail
+
+        if rx_avail > self._bfRxAvailMax:
+            # largest rx available seen is the device rx buffer size
+            self._bfRxAvailMax = rx_avail
+            self._inputBufferMaxSize = rx_avail
+            self._inputBufferWatermark = float(
+                rx_avail) * BUFFER_WATERMARK_PRCNT_BF
+
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+                self.logger.info("device rx buffer size %d" % rx_avail)
+
+        # a line can sit in grbl's protocol loop (out of the rx buffer but
+        # not yet acknowledged) while the planner is full, or while a sync
+        # command runs
+        if rx_avail < self._bfRxAvailMax or \
+           planner_avail < self._bfPlannerAvailMax or \
+           self.stat_dict.get(stat) != GRBL_STATE_IDLE or \
+           True in self._inputBufferSync:
+            return
+
+        if time.time() - self._lastBookkeepingTime < \
+           BUFFER_RESYNC_QUIET_TIME:
+            return
+
+        if self._inputBufferSize != 0 or len(self._inputBufferPart) > 0:
+            self._bfResyncCount += 1
+
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+                self.logger.info("buffer resync, local size %d parts %d, "
+                                 "device rx empty, corrections %d" % (
+                                    self._inputBufferSize,
+                                    len(self._inputBufferPart),
+                                    self._bfResyncCount))
+
+            self._inputBufferSize = 0
+            self._inputBufferPart = list()
+            self._inputBufferJog = list()
+            self._inputBufferSync = list()
+            self._jogSegmentTimes = list()
+
+    def _jogAck(self, error=False):
+        """ acknowledge of a continuous jog segment, update round trip time
+        """
+        if len(self._jogSegmentTimes) > 0:
+            rtt = time.time() - self._jogSegmentTimes.pop(0)
+            self._jogRtt = 0.8 * self._jogRtt + 0.2 * rtt
+
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+                self.logger.info("jog segment rtt %.3f ms, avg %.3f ms" % (
+                    rtt * 1000, self._jogRtt * 1000))
+
+            if error and self._jogContinuous is not None:
+                # most likely jog target exceeds travel, stop streaming
+                self._jogContinuous = None
+
+    def _jogStream(self):
+        """ keep JOG_SEGMENTS_AHEAD short jog segments in flight, segment
+            length is feed rate times segment time
+        """
+        feed = self._jogContinuous.get('feed', JOG_RAPID_FEED)
+        axes = [a for a in self.axes_list if a in self._jogContinuous]
+
+        if not axes:
+            return
+
+        segmentTime = max(JOG_SEGMENT_MIN_TIME, self._jogRtt)
+
+        # distance along the path, split evenly across jogged axes
+        dist = float(feed) / 60 * segmentTime / math.sqrt(len(axes))
+
+        while len(self._jogSegmentTimes) < JOG_SEGMENTS_AHEAD:
+            segment = "$J=G91"
+
+            for axis in axes:
+                segment = "".join([
+                    segment, " ", axis.upper(),
+                    gc.NUMBER_FORMAT_STRING % (
+                        dist * self._jogContinuous[axis])
+                ])
+
+            segment = "".join([segment, " F", str(feed), "\n"])
+
+            if not self.okToSend(segment):
+                break
+
+            # in order with other lines, a segment ahead of queued lines
+            # would get their acknowledge
+            if self.write(segment) == 0:
+                break
+
+            self._inputBufferJog[-1] = True
+            self._jogSegmentTimes.append(time.time())
+
+    def _statusPositions(self, axes, machine_pos, sr):
+        """ Work and machine position from reported position and cached
+            work coordinate offset, WPos = MPos - WCO
+        """
+        if self._wco is None:
+            # offset not known yet, only what device reported
+            key = 'mpo%s' if machine_pos else 'pos%s'
+
+            for i in range(len(axes)):
+                sr[key % self.axes_list[i]] = axes[i]
+
+            return
+
+        for i in range(len(axes)):
+            axis = self.axes_list[i]
+            offset = self._wco[i] if i < len(self._wco) else 0.0
+
+            if machine_pos:
+                sr['mpo%s' % axis] = axes[i]
+                sr['pos%s' % axis] = axes[i] - offset
+            else:
+                sr['pos%s' % axis] = axes[i]
+                sr['mpo%s' % axis] = axes[i] + offset
+
+    def _statusReportRestore(self):
+        """ Put back status report mask changed on connect
+        """
+        if self._statusMaskOrig is not None:
+            self.write("$10=%d\n" % self._statusMaskOrig)
+            self._statusMaskOrig = None
+
+    def _statusReportTune(self, data):
+        """ Learn status report mask ($10) from first status report after
+            connect, drop what is not needed, only if different
+        """
+        self._statusTune = False
+
+        # grbl 0.9 reports and mask bits are different
+        if '|' not in data:
+            return
+
+        mask = 0
+        if 'MPos:' in data:
+            mask |= GRBL_STATUS_MASK_MPOS
+        if self.reGrblBufferState.search(data) is not None:
+            mask |= GRBL_STATUS_MASK_BUFFER
+
+        # both positions are computed from cached WCO, keep the device
+        # position type, buffer state is only needed to track executing line
+        # when there are no line numbers (Ln:)
+        maskTuned = mask & GRBL_STATUS_MASK_MPOS
+        if not gc.CONFIG_DATA.get('/machine/InjectLineNumbers', False):
+            maskTuned |= GRBL_STATUS_MASK_BUFFER
+
+        if mask == maskTuned:
+            return
+
+        self._statusMaskOrig = mask
+        self.write("$10=%d\n" % maskTuned)
+
+        tunedData = data
+        if not maskTuned & GRBL_STATUS_MASK_BUFFER:
+            tunedData = self.reGrblBufferState.sub("", data)
+
+        # reports are only polled while running, once per refresh period
+        rate = 1000.0 / self.machineAutoRefreshPeriod
+        self._statusReportTuned(len(data) * rate, len(tunedData) * rate)
 
     def decode(self, data):
         dataDict = {}
@@ -346,11 +613,39 @@ class MachIf_GRBL(mi.MachIf_Base):
             sr['stat'] = statusData[0]
             sr['vel'] = float(statusData[2])
 
-            axes = self.reGrblAxes.findall('%s,' % statusData[1])
-            if len(axes):
+            wco = self.reGrblWco.search(data)
+            if wco is not None:
+                self._wco = [float(offset) for offset in
+                             self.reGrblAxes.findall('%s,' % wco.group(1))]
 
-                for i in range(len(axes)):
-                    sr['pos%s' % self.axes_list[i]] = float(axes[i])
+            # position field ends at next field (Bf:, Ln:)
+            axes = self.reGrblAxes.findall(
+                '%s,' % statusData[1].split('|')[0])
+            if len(axes):
+                self._statusPositions(
+                    [float(axis) for axis in axes], '|MPos:' in data, sr)
+
+            # buffer state, only if enabled in status report mask ($10)
+            bufferState = self.reGrblBufferState.search(data)
+            if bufferState is not None:
+                planner_avail = int(bufferState.group(1))
+                rx_avail = int(bufferState.group(2))
+                sr['bf'] = [planner_avail, rx_avail]
+                self._bufferResync(sr['stat'], planner_avail, rx_avail)
+
+                # planner blocks queued
+                sr['pq'] = self._bfPlannerAvailMax - planner_avail
+
+            lineNumber = self.reGrblLineNumber.search(data)
+            if lineNumber is not None:
+                sr['ln'] = int(lineNumber.group(1))
+
+            # overrides are not on every status report
+            overrides = self.reGrblOverrides.search(data)
+            if overrides is not None:
+                sr['ovf'] = int(overrides.group(1))
+                sr['ovr'] = int(overrides.group(2))
+                sr['ovs'] = int(overrides.group(3))
 
             dataDict['sr'] = sr
 
@@ -376,16 +671,27 @@ class MachIf_GRBL(mi.MachIf_Base):
                 self.machineStatus = decodedStatus
 
             sr['ib'] = [self._inputBufferMaxSize, self._inputBufferSize]
+            sr['ibsync'] = self._bfResyncCount
+
+            if self._statusTune:
+                self._statusReportTune(data)
 
         ack = self.reGrblMachineAck.search(data)
         if ack is not None:
             bufferPart = 0
 
+            jogSegment = False
+
             if len(self._inputBufferPart) > 0:
                 bufferPart = self._inputBufferPart.pop(0)
+                jogSegment = self._inputBufferJog.pop(0)
+                self._inputBufferSync.pop(0)
 
             self._inputBufferSize = self._inputBufferSize - bufferPart
 
+            if jogSegment:
+                self._jogAck()
+
             if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
                 self.logger.info("founf acknowledge [%s]" % data.strip())
 
@@ -430,11 +736,18 @@ class MachIf_GRBL(mi.MachIf_Base):
         if error is not None:
             bufferPart = 0
 
+            jogSegment = False
+
             if len(self._inputBufferPart) > 0:
                 bufferPart = self._inputBufferPart.pop(0)
+                jogSegment = self._inputBufferJog.pop(0)
+                self._inputBufferSync.pop(0)
 
             self._inputBufferSize = self._inputBufferSize - bufferPart
 
+            if jogSegment:
+                self._jogAck(error=True)
+
             if 'r' not in dataDict:
                 r = {}
                 dataDict['r'] = r
@@ -525,6 +838,22 @@ class MachIf_GRBL(mi.MachIf_Base):
         self.write(self.cmdInitComm)
         self._init()
 
+    def doJogContinuous(self, dict_axis_dir):
+        """ Start or keep alive continuous jog, short jog segments are
+            streamed from tick while the UI keeps the jog alive
+        """
+        if self._jogContinuous != dict_axis_dir:
+            jog_str = "".join(
+                ["%s%s" % (a.upper(), "+" if dict_axis_dir[a] > 0 else "-")
+                 for a in self.axes_list if a in dict_axis_dir])
+            self.eventPut(gc.EV_SER_TXDATA, "[jog continuous %s F%s]\n" % (
+                jog_str, str(dict_axis_dir.get('feed', JOG_RAPID_FEED))))
+
+            self._jogContinuous = dict_axis_dir
+
+        self._jogKeepAlive = time.time()
+        self._jogStream()
+
     def doJogFastMove(self, dict_axis_coor):
         """ Jog Fast (rapid) move to a coordinate in obsolete position mode
         """
@@ -552,7 +881,17 @@ class MachIf_GRBL(mi.MachIf_Base):
         self._move("$J=G91", dict_axis_coor, resert_pos_mode=False)
 
     def doJogStop(self):
-        self.doFeedHold()
+        """ grbl 1.1 jog cancel, stops and flushes jog motions without
+            going through hold state
+        """
+        self._jogContinuous = None
+        self.eventPut(gc.EV_SER_TXDATA, "[jog cancel, 0x%s]\n" %
+                      self.cmdJogCancel.encode('hex'))
+
+        # behind jog segments still queued, on the priority lane it could
+        # pass them and they would run after the cancel. Nothing else is
+        # queued while jogging.
+        self.write(self.cmdJogCancel, raw_write=True)
 
     def encode(self, data, bookeeping=True):
         """ Encodes data properly to be sent to controller
@@ -596,6 +935,10 @@ class MachIf_GRBL(mi.MachIf_Base):
             self._inputBufferSize = self._inputBufferSize + dataLen
 
             self._inputBufferPart.append(dataLen)
+            self._inputBufferJog.append(False)
+            self._inputBufferSync.append(
+                self.reGrblSyncCmd.search(data) is not None)
+            self._lastBookkeepingTime = time.time()
 
             if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
                 prcnt = float(self._inputBufferSize)/self._inputBufferMaxSize
@@ -611,10 +954,21 @@ class MachIf_GRBL(mi.MachIf_Base):
 
     def init(self):
         super(MachIf_GRBL, self).init()
-        self.machineAutoRefreshPeriod = gc.CONFIG_DATA.get(
+        self.machineAutoRefreshPeriodCfg = gc.CONFIG_DATA.getHandle(
             '/machine/MachIfSpecific/%s/AutoRefreshPeriod/Value' % self.name)
+        self.machineAutoRefreshPeriod = self.machineAutoRefreshPeriodCfg.get()
 
     def tick(self):
+        # continuous jog, stream segments while UI keeps it alive
+        if self._jogContinuous is not None:
+            if time.time() - self._jogKeepAlive > JOG_KEEP_ALIVE_TIMEOUT:
+                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+                    self.logger.info("jog keep alive timeout, jog cancel")
+
+                self.doJogStop()
+            else:
+                self._jogStream()
+
         # check if is time for auto-refresh and send get status cmd and
         # prepare next refresh time
         if self.autoStatusNextMicro is not None:
@@ -633,12 +987,8 @@ class MachIf_GRBL(mi.MachIf_Base):
             else:
                 self.autoStatusNextMicro = None
 
-        if self.machineAutoRefreshPeriod != gc.CONFIG_DATA.get(
-                '/machine/MachIfSpecific/%s/AutoRefreshPeriod/Value'
-                % self.name):
-            self.machineAutoRefreshPeriod = gc.CONFIG_DATA.get(
-                '/machine/MachIfSpecific/%s/AutoRefreshPeriod/Value'
-                % self.name)
+        # cached, only looked up again after config changes
+        self.machineAutoRefreshPeriod = self.machineAutoRefreshPeriodCfg.get()
 
         # check for init condition, take action, and reset init condition
         if (self.initStringDetectFlag):
@@ -646,6 +996,10 @@ class MachIf_GRBL(mi.MachIf_Base):
             self.write(self.cmdPostInit)
             self._init()
 
+            if self.statusReportTuning and self._statusMaskOrig is None:
+                self._statusTune = True
+                self.write(self.cmdStatus)
+
     def write(self, txData, raw_write=False):
         askForStatus = False
         bytesSent = 0
@@ -669,3 +1023,28 @@ class MachIf_GRBL(mi.MachIf_Base):
                 dt.timedelta(microseconds=msec)
 
         return bytesSent
+
+    def writeRealtime(self, txData, flush=False, raw_write=False,
+                      bookeeping=False):
+        askForStatus = False
+        bytesSent = 0
+
+        # resume from hold, etc, get at least one status msg
+        if self.machineStatus in [
+            GRBL_STATE_IDLE, GRBL_STATE_STOP, GRBL_STATE_HOME,
+            GRBL_STATE_SLEEP, GRBL_STATE_HOLD
+        ]:
+            askForStatus = True
+
+        bytesSent = super(MachIf_GRBL, self).writeRealtime(
+            txData, flush, raw_write, bookeeping)
+
+        if askForStatus:
+            if self.okToSend(self.cmdStatus):
+                super(MachIf_GRBL, self).write(self.cmdStatus)
+
+            msec = self.machineAutoRefreshPeriod * 1000
+            self.autoStatusNextMicro = dt.datetime.now() + \
+                dt.timedelta(microseconds=msec)
+
+        return bytesSent
@@ -0,0 +1,512 @@
+"""----------------------------------------------------------------------------
+   machif_marlin.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import re
+import time
+
+import modules.config as gc
+import modules.machif as mi
+
+""" Global values for this module
+"""
+# This values are only use to initialize or reset base class.
+# base class has internal variables tor track these
+ID = 1400
+NAME = "Marlin"
+BUFFER_MAX_SIZE = 127
+BUFFER_INIT_VAL = 0
+BUFFER_WATERMARK_PRCNT = 0.90
+
+# Marlin command queue slots (BUFSIZE), default until device reports it
+# with ADVANCED_OK
+CMD_SLOTS_INIT = 4
+
+# sent lines kept for resend requests
+RESEND_HISTORY_MAX = 64
+
+# nothing heard after a resend, lines lost again, send them once more
+# (seconds), longer than Marlin HOST_KEEPALIVE "busy:" interval
+RESEND_TIMEOUT = 5.0
+
+# commands Marlin EMERGENCY_PARSER handles as they arrive, sent without line
+# number or checksum
+EMERGENCY_CMDS = ['M108', 'M112', 'M410', 'M876', 'P000', 'R000', 'S000']
+
+# transport errors, followed by a resend request
+TRANSPORT_ERRORS = ['checksum', 'line number', 'no line number']
+
+
+class MachIf_Marlin(mi.MachIf_Base):
+    """-------------------------------------------------------------------------
+    MachIf_Marlin:
+
+    Marlin machine interface
+
+    ID = 1400
+    Name = "Marlin"
+
+    -------------------------------------------------------------------------"""
+
+    """-------------------------------------------------------------------------
+    Notes:
+
+    Marlin sends one "ok" per line when it leaves the command queue, with
+    ADVANCED_OK enabled the ok reports planner and command queue free slots,
+    example "ok N10 P15 B3". Lines in flight are limited to command queue
+    slots, that is enough to keep the queue full without overflowing the rx
+    buffer, so the executor streams on okToSend instead of waiting for an ok
+    after each line.
+
+    Lines are sent with line number and checksum, "N10 G1 X1*85", lines lost
+    or corrupted on the link are asked back with "Resend: 10" followed by an
+    ok, lines after it are dropped or rejected (one "Resend" and ok each)
+    and all are sent again.
+
+    Feed hold and resume use REALTIME_REPORTING_COMMANDS (P000, R000) and
+    queue flush uses M410 quick stop, these need EMERGENCY_PARSER.
+    -------------------------------------------------------------------------"""
+
+    # Marlin ack, example "ok", "ok N10 P15 B3", "ok T:20.0 /0.0"
+    reMarlinMachineAck = re.compile(r'^ok\b')
+    reMarlinAdvancedOk = re.compile(r'\bP(\d+)\s+B(\d+)')
+    reMarlinAckLineNumber = re.compile(r'^ok\s+N(\d+)')
+
+    # Marlin resend request, example "Resend: 10", "rs N10"
+    reMarlinResend = re.compile(r'^(?:Resend|rs)[:\s]\s*N?(\d+)', re.I)
+
+    # Marlin error, example "Error:checksum mismatch, Last Line: 9"
+    reMarlinMachineError = re.compile(r'^Error:\s*(.*)\s$')
+
+    # Marlin fatal error, example "!! kill() called!"
+    reMarlinMachineFatal = re.compile(r'^!!\s*(.*)\s$')
+
+    # Marlin boot, example "start"
+    reMarlinInitStr = re.compile(r'^start\s$')
+
+    # M115 firmware info, example
+    #   "FIRMWARE_NAME:Marlin 2.0.7.2 (Oct 23 2020) SOURCE_CODE_URL:..."
+    reMarlinVersion = re.compile(r'FIRMWARE_NAME:\s*(.*?)(?:\s+[A-Z_]+:|\s$)')
+
+    # M114 position, example "X:10.00 Y:0.00 Z:5.00 E:0.00 Count X:800 ..."
+    reMarlinPosition = re.compile(
+        r'^X:\s*([+-]?\d+\.?\d*)\s+Y:\s*([+-]?\d+\.?\d*)\s+'
+        r'Z:\s*([+-]?\d+\.?\d*)')
+
+    # line number already in line, i.e. injected by executor
+    reGcodeLineNumber = re.compile(r'^\s*N\d+\s*', re.I)
+
+    def __init__(self):
+        super(MachIf_Marlin, self).__init__(ID, NAME,
+                                            BUFFER_MAX_SIZE, BUFFER_INIT_VAL,
+                                            BUFFER_WATERMARK_PRCNT)
+
+        # Marlin acknowledges when a line leaves the command queue, stream
+        # on okToSend, don't wait for ok after each line
+        self.waitForAckOnWrite = False
+
+        # command queue accounting, numbered lines in flight are the ones
+        # after the last line the device accepted
+        self._cmdSlots = CMD_SLOTS_INIT
+        self._unnumberedInFlight = 0
+        self._okWithLineNumber = False
+
+        # planner free slots reported by ok, largest seen is planner size
+        self._plannerFree = 0
+        self._plannerFreeMax = 0
+
+        # line number and checksum
+        self.lineChecksum = True
+        self._lineNumber = 0
+        self._lineAccepted = 0
+        self._lineNumberReset = True
+        self._sentLines = dict()
+        self._resendFrom = None
+        self._resendTo = 0
+        self._resendCount = 0
+        self._rejectOk = False
+        self._lastErrorChecksum = False
+
+        # every line sent gets one ok (or error, resend and ok), lines sent
+        # before a resend are answered before the resent ones
+        self._txCount = 0
+        self._okCount = 0
+        self._staleCount = 0
+        self._lastRxTime = 0
+
+        self.initStringDetectFlag = False
+        self.deviceDetectFlag = False
+
+        # M114 position waiting for its ok
+        self._positionSr = None
+
+        self.machineAutoRefreshPeriod = 1000
+        self.autoStatusNextTime = None
+
+        # list of commads
+        self.cmdClearAlarm = 'M999\n'
+        self.cmdCycleStart = 'R000\n'
+        self.cmdFeedHold = 'P000\n'
+        self.cmdHome = 'G28'
+        self.cmdInitComm = 'M115\n'
+        self.cmdPostInit = 'M115\n'
+        self.cmdQueueFlush = 'M410\n'
+        self.cmdReset = 'M410\n'
+        self.cmdStatus = 'M114\n'
+
+    def _init(self):
+        """ Init object variables, ala soft-reset in hw
+        """
+        super(MachIf_Marlin, self)._reset(
+            BUFFER_MAX_SIZE, BUFFER_INIT_VAL, BUFFER_WATERMARK_PRCNT)
+
+        self._unnumberedInFlight = 0
+        self._lineNumber = 0
+        self._lineAccepted = 0
+        self._lineNumberReset = True
+        self._sentLines = dict()
+        self._resendFrom = None
+        self._resendTo = 0
+        self._rejectOk = False
+        self._txCount = 0
+        self._okCount = 0
+        self._staleCount = 0
+        self._positionSr = None
+
+        self._jogContinuous = None
+
+    def _checksum(self, line):
+        cs = 0
+        for c in line:
+            cs ^= ord(c)
+
+        return cs
+
+    def _getLinesInFlight(self):
+        return self._lineNumber - self._lineAccepted + \
+            self._unnumberedInFlight
+
+    def _getStatus(self):
+        """ Marlin has no machine state, idle when nothing is queued
+        """
+        plannerUsed = self._plannerFreeMax - self._plannerFree
+
+        if self._getLinesInFlight() or plannerUsed > 0:
+            return "Run"
+
+        return "Idle"
+
+    def _numberLine(self, line):
+        """ Add line number and checksum, keep for resend
+        """
+        line = "N%d %s" % (self._lineNumber, line)
+        line = "%s*%d\n" % (line, self._checksum(line))
+
+        self._sentLines[self._lineNumber] = line
+        self._sentLines.pop(self._lineNumber - RESEND_HISTORY_MAX, None)
+
+        return line
+
+    def _resend(self, line_number):
+        """ Send lines again from line_number on, lines before it are done
+        """
+        lines = [self._sentLines[n] for n in
+                 range(line_number, self._lineNumber + 1)
+                 if n in self._sentLines]
+
+        if len(lines) != self._lineNumber + 1 - line_number:
+            self.logger.error("resend N%d, line no longer in history" %
+                              line_number)
+            return
+
+        self._resendFrom = line_number
+        self._resendTo = self._lineNumber
+        self._resendCount += 1
+        self._staleCount = self._txCount
+        self._txCount += len(lines)
+
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+            self.logger.info("resend N%d to N%d" % (
+                line_number, self._lineNumber))
+
+        if lines:
+            super(MachIf_Marlin, self).write("".join(lines), raw_write=True)
+
+    def _resendRequest(self, line_number):
+        """ Device has all lines before line_number. Lines that were already
+            on the way at the last resend are rejected with a request for the
+            same line, already answered by that resend. A resent line has the
+            right line number, only a checksum error can be for it
+        """
+        self._lineAccepted = min(line_number - 1, self._lineNumber)
+
+        if line_number != self._resendFrom or \
+           (self._lastErrorChecksum and self._okCount >= self._staleCount):
+            self._resend(line_number)
+
+    def decode(self, data):
+        dataDict = {}
+
+        self._lastRxTime = time.time()
+
+        ack = self.reMarlinMachineAck.search(data)
+        if ack is not None:
+            ackLineNumber = self.reMarlinAckLineNumber.search(data)
+
+            self._okCount += 1
+
+            # ok after resend request is for the rejected line, already
+            # accounted by the resend
+            if self._rejectOk:
+                self._rejectOk = False
+
+            # ADVANCED_OK, line number of the numbered line that left the
+            # command queue
+            elif ackLineNumber is not None:
+                self._okWithLineNumber = True
+                lineNumber = int(ackLineNumber.group(1))
+
+                if self._lineAccepted < lineNumber <= self._lineNumber:
+                    self._lineAccepted = lineNumber
+
+            elif self._unnumberedInFlight > 0:
+                self._unnumberedInFlight -= 1
+
+            elif not self._okWithLineNumber and \
+                    self._lineAccepted < self._lineNumber:
+                self._lineAccepted += 1
+
+            advancedOk = self.reMarlinAdvancedOk.search(data)
+            if advancedOk is not None:
+                self._plannerFree = int(advancedOk.group(1))
+                if self._plannerFree > self._plannerFreeMax:
+                    self._plannerFreeMax = self._plannerFree
+
+                # free slots don't count the line just processed
+                cmdSlots = int(advancedOk.group(2)) + 1
+                if cmdSlots > self._cmdSlots:
+                    self._cmdSlots = cmdSlots
+
+            dataDict['r'] = {}
+            dataDict['f'] = [0, 0, 1]
+            dataDict['ib'] = [self._cmdSlots, self._getLinesInFlight()]
+
+            # M114 ok, report position with queue state after M114
+            if self._positionSr is not None:
+                sr = self._positionSr
+                self._positionSr = None
+
+                sr['stat'] = self._getStatus()
+                sr['pq'] = self._plannerFreeMax - self._plannerFree
+                sr['ib'] = [self._cmdSlots, self._getLinesInFlight()]
+
+                if self._resendCount:
+                    sr['ibsync'] = self._resendCount
+
+                dataDict['sr'] = sr
+
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+                self.logger.info("decode, lines in flight: %d/%d, planner "
+                                 "free: %d" % (
+                                    self._getLinesInFlight(),
+                                    self._cmdSlots, self._plannerFree))
+
+        resend = self.reMarlinResend.search(data)
+        if resend is not None:
+            self._rejectOk = True
+            self._resendRequest(int(resend.group(1)))
+
+            dataDict['rx_data_info'] = "resend %d\n" % self._resendCount
+
+        error = self.reMarlinMachineError.search(data)
+        if error is None:
+            error = self.reMarlinMachineFatal.search(data)
+
+        if error is not None:
+            msg = error.group(1).strip()
+            transportError = [e for e in TRANSPORT_ERRORS if e in msg.lower()]
+            self._lastErrorChecksum = 'checksum' in msg.lower()
+
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+                self.logger.info("found error [%s]" % data.strip())
+
+            # link errors are fixed by resend, the rest stop the program
+            if not transportError:
+                dataDict['r'] = {}
+                dataDict['f'] = [0, -1, 0, msg]
+                dataDict['ib'] = [self._cmdSlots, self._getLinesInFlight()]
+
+        position = self.reMarlinPosition.search(data)
+        if position is not None:
+            # reported with the ok that follows
+            self._positionSr = {
+                'posx': float(position.group(1)),
+                'posy': float(position.group(2)),
+                'posz': float(position.group(3)),
+            }
+
+        version = self.reMarlinVersion.search(data)
+        if version is not None:
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+                self.logger.info("found version [%s]" %
+                                 version.group(1).strip())
+
+            if 'r' not in dataDict:
+                dataDict['r'] = {}
+
+            dataDict['r']['fb'] = version.group(1).strip()
+
+            # device that doesn't reset on connect, no "start"
+            if not self.deviceDetectFlag:
+                self.deviceDetectFlag = True
+                dataDict['r']['init'] = version.group(1).strip()
+
+        initStr = self.reMarlinInitStr.search(data)
+        if initStr is not None:
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+                self.logger.info("found device init string [%s]" %
+                                 data.strip())
+
+            self.initStringDetectFlag = True
+            self.deviceDetectFlag = True
+
+            if 'r' not in dataDict:
+                dataDict['r'] = {}
+
+            dataDict['r']['init'] = data.strip()
+
+        return dataDict
+
+    def encode(self, data, bookeeping=True):
+        """ Encodes data properly to be sent to controller
+        """
+        if len(data) == 0:
+            return data
+
+        data = data.encode('ascii')
+
+        data = super(MachIf_Marlin, self).encode(data)
+
+        line = data.strip()
+
+        # Marlin ignores empty lines, no ok
+        if not line:
+            return ""
+
+        if line.upper() in EMERGENCY_CMDS or not self.lineChecksum:
+            if bookeeping:
+                self._unnumberedInFlight += 1
+                self._txCount += 1
+
+            return "%s\n" % line
+
+        if not bookeeping:
+            # okToSend only needs the size
+            return "N%d %s*255\n" % (self._lineNumber + 1, line)
+
+        lines = []
+
+        # restart line numbers after connect or reset, M110 is a numbered
+        # line too so it can be asked back
+        if self._lineNumberReset:
+            self._lineNumberReset = False
+            self._lineNumber = 0
+            self._lineAccepted = -1
+            self._sentLines = dict()
+            self._resendFrom = None
+            self._resendTo = 0
+            self._txCount += 1
+            lines.append(self._numberLine("M110 N0"))
+
+        self._lineNumber += 1
+        self._txCount += 1
+
+        # line number comes from here, drop any injected by executor
+        line = self.reGcodeLineNumber.sub("", line)
+        lines.append(self._numberLine(line))
+
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+            self.logger.info("encode, lines in flight: %d/%d" % (
+                self._getLinesInFlight(), self._cmdSlots))
+
+        return "".join(lines)
+
+    def factory(self):
+        return MachIf_Marlin()
+
+    def init(self):
+        super(MachIf_Marlin, self).init()
+        self.machineAutoRefreshPeriod = gc.CONFIG_DATA.get(
+            '/machine/MachIfSpecific/%s/AutoRefreshPeriod/Value' % self.name,
+            self.machineAutoRefreshPeriod)
+        self.lineChecksum = gc.CONFIG_DATA.get(
+            '/machine/MachIfSpecific/%s/LineChecksum/Value' % self.name,
+            self.lineChecksum)
+
+    def okToSend(self, data):
+        """ Room in command queue for all lines in data
+        """
+        lines = len([line for line in data.splitlines() if line.strip()])
+
+        if self._lineNumberReset and self.lineChecksum:
+            lines += 1
+
+        return self._getLinesInFlight() + lines <= self._cmdSlots
+
+    def tick(self):
+        # resent lines lost too, device waiting for them
+        if self._resendFrom is not None and \
+           self._lineAccepted < self._resendTo and \
+           time.time() - self._lastRxTime > RESEND_TIMEOUT:
+            self._lastRxTime = time.time()
+            self._resend(self._lineAccepted + 1)
+
+        # position during motion, M114 is queued with the moves
+        if self.autoStatusNextTime is not None and \
+           time.time() >= self.autoStatusNextTime:
+
+            if self._getStatus() == "Run":
+                if self.okToSend(self.cmdStatus):
+                    super(MachIf_Marlin, self).write(self.cmdStatus)
+
+                self.autoStatusNextTime = time.time() + \
+                    self.machineAutoRefreshPeriod / 1000.0
+            else:
+                self.autoStatusNextTime = None
+
+        # check for init condition, take action, and reset init condition
+        if self.initStringDetectFlag:
+            self.initStringDetectFlag = False
+            self._init()
+            self.write(self.cmdPostInit)
+
+    def write(self, txData, raw_write=False):
+        bytesSent = super(MachIf_Marlin, self).write(txData, raw_write)
+
+        # moving to active state, get position updates
+        if self.autoStatusNextTime is None and bytesSent:
+            self.autoStatusNextTime = time.time() + \
+                self.machineAutoRefreshPeriod / 1000.0
+
+        return bytesSent
@@ -0,0 +1,275 @@
+"""----------------------------------------------------------------------------
+   machif_process.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import logging
+import multiprocessing
+import threading
+
+import modules.config as gc
+import modules.machif_progexec as mi_progexec
+import modules.machif_reactor as mi_reactor
+import modules.profiler as prof
+import modules.watchdog as wd
+
+# how often the child process checks the execute thread is still alive
+# while waiting for events (seconds)
+PROCESS_POLL_PERIOD = 0.1
+
+
+class PipeEventForwarder(object):
+    """ Listener of the execute thread in the child process, forwards
+        events over the pipe to the GUI process
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._lock = threading.Lock()
+
+    def eventPut(self, event_id, data=None, sender=None):
+        with self._lock:
+            self._conn.send((event_id, data))
+
+
+class PipeLogHandler(logging.Handler):
+    """ Log handler of the child process, records go over the pipe and the
+        GUI process handlers write them, so there is one writer per log file
+    """
+
+    def __init__(self, forwarder):
+        logging.Handler.__init__(self)
+        self._forwarder = forwarder
+
+    def emit(self, record):
+        try:
+            # message is formatted here, args may not pickle
+            data = dict(record.__dict__)
+            data['msg'] = record.getMessage()
+            data['args'] = None
+            data['exc_info'] = None
+
+            if record.exc_info:
+                data['exc_text'] = logging.Formatter().formatException(
+                    record.exc_info)
+
+            self._forwarder.eventPut(gc.EV_LOG_RECORD, data)
+
+        except (EOFError, IOError):
+            # GUI process is gone, nowhere to log to
+            pass
+
+        except Exception:
+            self.handleError(record)
+
+
+def init_child_logger(forwarder):
+    """ Handlers inherited on fork write to the GUI process log file (same
+        file offset and rotation), replace them with one that forwards
+        records to the GUI process
+    """
+    logger = logging.getLogger()
+
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    logger.addHandler(PipeLogHandler(forwarder))
+    logger.setLevel(logging.INFO)
+
+
+def machif_process_main(conn, config_datastore, verbose_mask,
+                        capture_file=None, event_ids=None, profile_file=None):
+    """ Child process entry, runs MachIfExecuteThread (and through it the
+        serial thread) and relays events between it and the pipe, only
+        events with ids in event_ids (all if None) go over the pipe
+    """
+    prof.after_fork(profile_file is not None)
+    wd.after_fork()
+
+    gc.VERBOSE_MASK = verbose_mask
+    gc.SERIAL_CAPTURE_FILE = capture_file
+    gc.PROFILE_FILE = profile_file
+
+    # threads of this process are profiled here, GUI process can't see them
+    profiler = None
+
+    forwarder = PipeEventForwarder(conn)
+    init_child_logger(forwarder)
+
+    if gc.CONFIG_DATA is None:
+        gc.CONFIG_DATA = gc.gsatConfigData(None)
+
+    gc.CONFIG_DATA.setDatastore(config_datastore)
+
+    logger = logging.getLogger()
+    if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC:
+        logger.info("machif process start")
+
+    if gc.CONFIG_DATA.get('/machine/SingleThreadCore', False):
+        machifProgExecClass = mi_reactor.MachIfReactor
+    else:
+        machifProgExecClass = mi_progexec.MachIfExecuteThread
+
+    # stalls of this process show up in the GUI status panel
+    wd.STALL_WATCHDOG.addStallListener(
+        lambda counts: forwarder.eventPut(gc.EV_STALL, counts))
+
+    # receive thread of GUI process ends on exit
+    if event_ids is not None:
+        event_ids = list(set(event_ids) | set([gc.EV_EXIT]))
+
+    machifProgExec = machifProgExecClass(forwarder, event_ids)
+
+    while machifProgExec.isAlive():
+        try:
+            if not conn.poll(PROCESS_POLL_PERIOD):
+                continue
+
+            event_id, data = conn.recv()
+
+        except (EOFError, IOError):
+            # GUI process is gone, shut down
+            machifProgExec.eventPut(gc.EV_CMD_EXIT)
+            break
+
+        if event_id == gc.EV_CMD_UPDATE_CONFIG:
+            # execute thread is subscribed to config changes
+            gc.CONFIG_DATA.setDatastore(data)
+            continue
+
+        if event_id == gc.EV_CMD_PROFILE:
+            # data is profile file to start, None to stop
+            if profiler is not None:
+                for line in profiler.stop():
+                    logger.info(line)
+                profiler = None
+
+            if data is not None:
+                profiler = prof.SamplingProfiler(data)
+                profiler.start()
+            continue
+
+        machifProgExec.eventPut(event_id, data)
+
+    machifProgExec.join()
+
+    if profiler is not None:
+        for line in profiler.stop():
+            logger.info(line)
+
+    if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC:
+        logger.info("machif process exit")
+
+
+class MachIfProcess(gc.EventQueueIf):
+    """ Runs the machine interface stack (MachIfExecuteThread,
+        SerialPortThread) in its own process so GUI work can't hold the GIL
+        while streaming. Same eventPut API as MachIfExecuteThread, events
+        from the machine interface are delivered to listeners from a
+        receive thread.
+    """
+
+    def __init__(self, event_handler, event_ids=None):
+        gc.EventQueueIf.__init__(self)
+
+        self.logger = logging.getLogger()
+
+        self._conn, childConn = multiprocessing.Pipe()
+        self._sendLock = threading.Lock()
+
+        if event_handler is not None:
+            self.addEventListener(event_handler, event_ids)
+
+        # settings saves push config to child process
+        gc.CONFIG_DATA.subscribe('/machine', self.onConfigChange)
+
+        self.process = multiprocessing.Process(
+            target=machif_process_main,
+            args=(childConn, gc.CONFIG_DATA.datastore, gc.VERBOSE_MASK,
+                  gc.SERIAL_CAPTURE_FILE, event_ids, gc.PROFILE_FILE))
+        self.process.daemon = True
+        self.process.start()
+
+        # child end belongs to child process now, closing it here lets recv
+        # see EOF if the child dies
+        childConn.close()
+
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC:
+            self.logger.info("machif process pid:%d" % self.process.pid)
+
+        self.rxThread = threading.Thread(target=self.rxLoop)
+        self.rxThread.daemon = True
+        self.rxThread.start()
+
+    def eventPut(self, event_id, event_data=None, sender=None):
+        # sender objects can't cross the process boundary
+        if event_id == gc.EV_CMD_UPDATE_CONFIG:
+            event_data = gc.CONFIG_DATA.datastore
+
+        try:
+            with self._sendLock:
+                self._conn.send((event_id, event_data))
+
+        except (EOFError, IOError):
+            self.logger.error("machif process pipe closed, event [%s] "
+                              "dropped" % str(event_id))
+
+    def eventPost(self, e):
+        self.eventPut(e.event_id, e.data, e.sender)
+
+    def onConfigChange(self, changed_keys):
+        self.eventPut(gc.EV_CMD_UPDATE_CONFIG)
+
+    def eventPutPriority(self, event_id, event_data=None, sender=None,
+                         timestamp=None):
+        # child execute thread routes realtime events to its priority lane
+        self.eventPut(event_id, event_data, sender)
+
+    def rxLoop(self):
+        """ Deliver events from child process to listeners
+        """
+        while True:
+            try:
+                event_id, data = self._conn.recv()
+
+            except (EOFError, IOError):
+                if self.process.exitcode not in [None, 0]:
+                    self.notifyEventListeners(
+                        gc.EV_ABORT, "** machif process exit code %s\n" %
+                        str(self.process.exitcode))
+
+                self.notifyEventListeners(gc.EV_EXIT)
+                break
+
+            if event_id == gc.EV_LOG_RECORD:
+                # child process log record, our handlers write it
+                self.logger.handle(logging.makeLogRecord(data))
+                continue
+
+            self.notifyEventListeners(event_id, data)
+
+            if event_id == gc.EV_EXIT:
+                break
+
+        gc.CONFIG_DATA.unsubscribe(self.onConfigChange)
+        self.process.join()
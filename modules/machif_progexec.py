@@ -30,6 +30,7 @@ import logging
 
 import modules.config as gc
 import modules.machif_config as mi
+import modules.watchdog as wd
 
 # -----------------------------------------------------------------------------
 # regular expressions
@@ -42,6 +43,22 @@ gReGcodeComments = [re.compile(r'\(.*\)'), re.compile(r';.*')]
 # message example "(MSG, CHANGE TOOL BIT: to drill size 0.81300 mm)"
 gReGcodeMsg = re.compile(r'^\s*\(MSG,(.+)\)')
 
+# line number example "N120 G1 X10"
+gReGcodeLineNumber = re.compile(r'^\s*N(\d+)', re.IGNORECASE)
+
+# machine status strings for when all sent lines are done executing
+gMachineIdleStatus = ['Idle', 'Ready', 'Stop', 'End']
+
+# max number of sent lines tracked while waiting to execute
+EXEC_PC_TRACK_MAX = 1024
+
+# thread loop blocks until there is work to do, at most this long (seconds)
+# so machine IF modules get their periodic tick (auto status refresh, etc.)
+TICK_PERIOD = 0.05
+
+# status request period while waiting for a probe to finish (seconds)
+PROBE_STATUS_PERIOD = 0.2
+
 
 class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
     """  Threads that executes the gcode sending code to serial port. This
@@ -51,21 +68,46 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
     of data sent to the serial port.
     """
 
-    def __init__(self, event_handler):
-        """Init Worker Thread Class."""
+    # realtime commands, these skip the bulk queue and go out ahead of any
+    # pending data
+    priorityEventIds = set([
+        gc.EV_CMD_CYCLE_START, gc.EV_CMD_FEED_HOLD, gc.EV_CMD_QUEUE_FLUSH,
+        gc.EV_CMD_RESET, gc.EV_CMD_JOG_STOP, gc.EV_CMD_FEED_OVERRIDE,
+        gc.EV_CMD_RAPID_OVERRIDE, gc.EV_CMD_SPINDLE_OVERRIDE,
+        gc.EV_CMD_JOG_CONTINUOUS
+    ])
+
+    # wake up signal, and whether a timer thread provides the periodic tick
+    wakeUpClass = gc.WakeUp
+    useTickTimer = True
+
+    def __init__(self, event_handler, event_ids=None):
+        """ Init Worker Thread Class, event_handler gets events with ids in
+            event_ids, or all events if None
+        """
         threading.Thread.__init__(self)
         gc.EventQueueIf.__init__(self)
 
+        # UI events, device data and tick timer all wake up this thread
+        self.setWakeUp(self.wakeUpClass())
+
         # init local variables
         self.initConfig()
         self.okToPostEvents = True
+        self.deviceBusy = False
 
         self.gcodeDataLines = []
         self.breakPointSet = set()
         self.initialProgramCounter = 0
         self.workingCounterWorking = 0
+        self.workingProgramCounter = 0
         self.lastWorkingCounterWorking = -1
 
+        # lines sent and acknowledged, not yet known to be executed
+        self.sentProgramCounters = []
+        self.lineNumberMap = {}
+        self.executingProgramCounter = -1
+
         self.swState = gc.STATE_IDLE
         self.lastEventID = gc.EV_CMD_NULL
 
@@ -73,8 +115,26 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
 
         self.machIfModule = None
 
+        # loop heartbeat for the stall watchdog, set while thread runs
+        self.heartbeat = None
+
+        # height map probing job, height map and Z compensation of program
+        # lines, fiducial alignment of program lines, (PC, line) rewritten
+        # and lines it was rewritten into
+        self.probeGrid = None
+        self.heightMap = None
+        self.leveler = None
+        self.aligner = None
+        self.rewriteKey = None
+        self.rewriteLines = []
+
+        self.initEventHandlers()
+
         if event_handler is not None:
-            self.addEventListener(event_handler)
+            self.addEventListener(event_handler, event_ids)
+
+        # settings saves push machine config changes to this thread
+        gc.CONFIG_DATA.subscribe('/machine', self.onConfigChange)
 
         self.logger = logging.getLogger()
         if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC:
@@ -98,213 +158,276 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
         filterGcodeList = self.filterGCodes.split(',')
         self.filterGCodesList = [x.strip() for x in filterGcodeList]
 
-    def processQueue(self):
-        """ Handle events coming from main UI
-        """
-        # process events from queue
-        if not self._eventQueue.empty():
-            # get item from queue
-            e = self._eventQueue.get()
-
-        # check output queue and notify UI if is not empty
-        # if not self.progExecOutQueue.empty():
-        #     # if self.okToPostEvents:
-        #     #   self.okToPostEvents = False
-        #     #   wx.PostEvent(self.notifyWindow, gc.threadQueueEvent(None))
-        #     wx.PostEvent(self.notifyWindow, gc.ThreadQueueEvent(None))
-
-            self.lastEventID = e.event_id
-
-            if e.event_id == gc.EV_CMD_STEP:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_STEP")
-
-                self.gcodeDataLines = e.data[0]
-                self.initialProgramCounter = e.data[1]
-                self.workingProgramCounter = self.initialProgramCounter
-                self.breakPointSet = e.data[2]
-                self.swState = gc.STATE_STEP
-
-            elif e.event_id == gc.EV_CMD_RUN:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_RUN")
-
-                self.gcodeDataLines = e.data[0]
-                self.initialProgramCounter = e.data[1]
-                self.workingProgramCounter = self.initialProgramCounter
-                self.breakPointSet = e.data[2]
-                self.swState = gc.STATE_RUN
+        self.injectLineNumbers = gc.CONFIG_DATA.get(
+            '/machine/InjectLineNumbers', False)
 
-            elif e.event_id == gc.EV_CMD_STOP:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_STOP")
-
-                self.swState = gc.STATE_IDLE
-
-            elif e.event_id == gc.EV_CMD_SEND:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_SEND %s" % e.data)
-
-                self.serialWriteQueue.append((e.data, False))
-
-            elif e.event_id == gc.EV_CMD_SEND_W_ACK:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_SEND_W_ACK %s" % e.data)
-
-                self.serialWriteQueue.append((e.data, True))
-
-            elif e.event_id == gc.EV_CMD_OK_TO_POST:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_OK_TO_POST")
-                pass
-
-            elif e.event_id == gc.EV_CMD_GET_STATUS:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_GET_STATUS")
+    def eventPost(self, e):
+        if e.event_id in self.priorityEventIds:
+            self._priorityEventQueue.put(e)
 
-                self.machIfModule.doGetStatus()
-
-            elif e.event_id == gc.EV_CMD_CYCLE_START:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_CYCLE_START")
+            if self._wakeUp is not None:
+                self._wakeUp.set()
+        else:
+            gc.EventQueueIf.eventPost(self, e)
 
-                # this command is usually use for resume after a machine stop
-                # thus, queues most probably full send without checking if ok..
-                self.machIfModule.doCycleStartResume()
+    def initEventHandlers(self):
+        """ Event id to (name, handler) tables, table driven dispatch
+        """
+        mim = self.machIfModuleCall
+
+        self.priorityEventHandlers = {
+            gc.EV_CMD_CYCLE_START: (
+                "EV_CMD_CYCLE_START", mim('doCycleStartResume', False)),
+            gc.EV_CMD_FEED_HOLD: ("EV_CMD_FEED_HOLD", mim('doFeedHold', False)),
+            gc.EV_CMD_QUEUE_FLUSH: (
+                "EV_CMD_QUEUE_FLUSH", self.onPriorityQueueFlush),
+            gc.EV_CMD_RESET: ("EV_CMD_RESET", self.onPriorityReset),
+            gc.EV_CMD_JOG_STOP: ("EV_CMD_JOG_STOP", mim('doJogStop', False)),
+            gc.EV_CMD_JOG_CONTINUOUS: (
+                "EV_CMD_JOG_CONTINUOUS", mim('doJogContinuous')),
+            gc.EV_CMD_FEED_OVERRIDE: (
+                "EV_CMD_FEED_OVERRIDE", mim('doFeedOverride')),
+            gc.EV_CMD_RAPID_OVERRIDE: (
+                "EV_CMD_RAPID_OVERRIDE", mim('doRapidOverride')),
+            gc.EV_CMD_SPINDLE_OVERRIDE: (
+                "EV_CMD_SPINDLE_OVERRIDE", mim('doSpindleOverride')),
+        }
+
+        self.eventHandlers = {
+            gc.EV_CMD_STEP: ("EV_CMD_STEP", self.onCmdStepRun),
+            gc.EV_CMD_RUN: ("EV_CMD_RUN", self.onCmdStepRun),
+            gc.EV_CMD_STOP: ("EV_CMD_STOP", self.onCmdStop),
+            gc.EV_CMD_SEND: ("EV_CMD_SEND", self.onCmdSend),
+            gc.EV_CMD_SEND_W_ACK: ("EV_CMD_SEND_W_ACK", self.onCmdSend),
+            gc.EV_CMD_OK_TO_POST: ("EV_CMD_OK_TO_POST", lambda e: None),
+            gc.EV_CMD_GET_STATUS: (
+                "EV_CMD_GET_STATUS", mim('doGetStatus', False)),
+            # usually resume after a machine stop, queues are most probably
+            # full, send without checking if ok
+            gc.EV_CMD_CYCLE_START: (
+                "EV_CMD_CYCLE_START", mim('doCycleStartResume', False)),
+            # usually abort and machine stop, we can't afford to skip this
+            # action, send without checking if ok
+            gc.EV_CMD_FEED_HOLD: ("EV_CMD_FEED_HOLD", mim('doFeedHold', False)),
+            gc.EV_CMD_QUEUE_FLUSH: (
+                "EV_CMD_QUEUE_FLUSH", mim('doQueueFlush', False)),
+            gc.EV_CMD_RESET: ("EV_CMD_RESET", mim('doReset', False)),
+            gc.EV_CMD_CLEAR_ALARM: (
+                "EV_CMD_CLEAR_ALARM", mim('doClearAlarm', False)),
+            gc.EV_CMD_MOVE: ("EV_CMD_MOVE", mim('doMove')),
+            gc.EV_CMD_MOVE_RELATIVE: (
+                "EV_CMD_MOVE_RELATIVE", mim('doMoveRelative')),
+            gc.EV_CMD_RAPID_MOVE: ("EV_CMD_RAPID_MOVE", mim('doFastMove')),
+            gc.EV_CMD_RAPID_MOVE_RELATIVE: (
+                "EV_CMD_RAPID_MOVE_RELATIVE", mim('doFastMoveRelative')),
+            gc.EV_CMD_JOG_MOVE: ("EV_CMD_JOG_MOVE", mim('doJogMove')),
+            gc.EV_CMD_JOG_MOVE_RELATIVE: (
+                "EV_CMD_JOG_MOVE_RELATIVE", mim('doJogMoveRelative')),
+            gc.EV_CMD_JOG_RAPID_MOVE: (
+                "EV_CMD_JOG_RAPID_MOVE", mim('doJogFastMove')),
+            gc.EV_CMD_JOG_RAPID_MOVE_RELATIVE: (
+                "EV_CMD_JOG_RAPID_MOVE_RELATIVE", mim('doJogFastMoveRelative')),
+            gc.EV_CMD_JOG_STOP: ("EV_CMD_JOG_STOP", mim('doJogStop', False)),
+            gc.EV_CMD_SET_AXIS: ("EV_CMD_SET_AXIS", mim('doSetAxis')),
+            gc.EV_CMD_HOME: ("EV_CMD_HOME", mim('doHome')),
+            gc.EV_CMD_EXIT: ("EV_CMD_EXIT", self.onCmdExit),
+            gc.EV_HELLO: ("EV_HELLO", self.onHello),
+            gc.EV_GOODBY: ("EV_GOODBY", self.onGoodby),
+            gc.EV_CMD_PROBE: ("EV_CMD_PROBE", mim('doProbe')),
+            gc.EV_CMD_PROBE_GRID: ("EV_CMD_PROBE_GRID", self.onCmdProbeGrid),
+            gc.EV_CMD_ALIGNMENT: ("EV_CMD_ALIGNMENT", self.onCmdAlignment),
+            gc.EV_CMD_UPDATE_CONFIG: (
+                "EV_CMD_UPDATE_CONFIG", self.onCmdUpdateConfig),
+        }
+
+    def machIfModuleCall(self, method, with_data=True):
+        """ Handler that calls machine interface module method, looked up
+            at call time as module can be replaced
+        """
+        if with_data:
+            return lambda e: getattr(self.machIfModule, method)(e.data)
 
-            elif e.event_id == gc.EV_CMD_FEED_HOLD:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_FEED_HOLD")
+        return lambda e: getattr(self.machIfModule, method)()
 
-                # this command is usually use for abort and machine stop
-                # we can't afford to skip this action, send without checking
-                # if ok...
-                self.machIfModule.doFeedHold()
+    def onPriorityQueueFlush(self, e):
+        # data not sent yet is part of what is being flushed
+        self.serialWriteQueue = []
+        self.probeGrid = None
+        self.machIfModule.doQueueFlush()
+        self.resetExecutingPC()
 
-            elif e.event_id == gc.EV_CMD_QUEUE_FLUSH:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_QUEUE_FLUSH")
+    def onPriorityReset(self, e):
+        self.serialWriteQueue = []
+        self.probeGrid = None
+        self.machIfModule.doReset()
+        self.resetExecutingPC()
 
-                self.machIfModule.doQueueFlush()
+    def onCmdStepRun(self, e):
+        self.gcodeDataLines = e.data[0]
+        self.initialProgramCounter = e.data[1]
 
-            elif e.event_id == gc.EV_CMD_RESET:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_RESET")
+        # PC moved, not a continue from break, stop tracking old lines
+        if self.initialProgramCounter != self.workingProgramCounter:
+            self.resetExecutingPC()
 
-                self.machIfModule.doReset()
+            # machine may have moved since, rewrites start over
+            self.rewriteKey = None
+            self.rewriteLines = []
+            if self.leveler is not None:
+                self.leveler.reset()
+            if self.aligner is not None:
+                self.aligner.reset()
 
-            elif e.event_id == gc.EV_CMD_CLEAR_ALARM:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_CLEAR_ALARM")
+        self.probeGrid = None
 
-                self.machIfModule.doClearAlarm()
+        self.workingProgramCounter = self.initialProgramCounter
+        self.breakPointSet = e.data[2]
 
-            elif e.event_id == gc.EV_CMD_MOVE:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_MOVE %s" % e.data)
+        if e.event_id == gc.EV_CMD_RUN:
+            self.swState = gc.STATE_RUN
+        else:
+            self.swState = gc.STATE_STEP
 
-                self.machIfModule.doMove(e.data)
+    def onCmdStop(self, e):
+        self.swState = gc.STATE_IDLE
+        self.probeGrid = None
 
-            elif e.event_id == gc.EV_CMD_MOVE_RELATIVE:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_MOVE_RELATIVE %s" % e.data)
+    def stopOnPortClose(self):
+        """ Port closed under a running program, forget lines in flight
+        """
+        if self.swState not in [gc.STATE_ABORT]:
+            self.swState = gc.STATE_IDLE
 
-                self.machIfModule.doMoveRelative(e.data)
+        self.serialWriteQueue = []
+        self.probeGrid = None
+        self.rewriteKey = None
+        self.rewriteLines = []
+        self.resetExecutingPC()
+
+    def onCmdAlignment(self, e):
+        """ Align program lines to fiducials, data is alignment.Alignment,
+            None turns alignment off
+        """
+        self.aligner = None
+        self.rewriteKey = None
+        self.rewriteLines = []
 
-            elif e.event_id == gc.EV_CMD_RAPID_MOVE:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_RAPID_MOVE %s" % e.data)
+        if e.data is not None:
+            # only loaded once alignment is used
+            import modules.alignment as al
+            self.aligner = al.GcodeAligner(e.data)
 
-                self.machIfModule.doFastMove(e.data)
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC:
+            self.logger.info("alignment %s" % str(e.data))
 
-            elif e.event_id == gc.EV_CMD_RAPID_MOVE_RELATIVE:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_RAPID_MOVE_RELATIVE %s" % e.data)
+    def onCmdProbeGrid(self, e):
+        """ Probe height map, data is dict with area (x min, y min, x max,
+            y max), points (x, y), clearance, depth and feed. None clears
+            height map, which turns Z compensation off.
+        """
+        self.probeGrid = None
+        self.heightMap = None
+        self.leveler = None
 
-                self.machIfModule.doFastMoveRelative(e.data)
+        if e.data is None:
+            self.notifyEventListeners(gc.EV_HEIGHT_MAP, None)
+            return
 
-            elif e.event_id == gc.EV_CMD_JOG_MOVE:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_JOG_MOVE %s" % e.data)
+        # only loaded once height map is used
+        import modules.height_map as hm
 
-                self.machIfModule.doJogMove(e.data)
+        try:
+            heightMap = hm.HeightMap(*(e.data['area'] + e.data['points']))
 
-            elif e.event_id == gc.EV_CMD_JOG_MOVE_RELATIVE:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_JOG_MOVE_RELATIVE %s" % e.data)
+        except ImportError, ex:
+            self.logger.error(str(ex))
+            self.notifyEventListeners(gc.EV_HEIGHT_MAP, None)
+            return
 
-                self.machIfModule.doJogMoveRelative(e.data)
+        self.probeGrid = dict(e.data)
+        self.probeGrid['map'] = heightMap
+        self.probeGrid['todo'] = heightMap.points()
 
-            elif e.event_id == gc.EV_CMD_JOG_RAPID_MOVE:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_JOG_RAPID_MOVE %s" % e.data)
+    def onCmdSend(self, e):
+        self.serialWriteQueue.append(
+            (e.data, e.event_id == gc.EV_CMD_SEND_W_ACK))
 
-                self.machIfModule.doJogFastMove(e.data)
+    def onCmdExit(self, e):
+        if self.machIfModule.isSerialPortOpen():
+            self.machIfModule.close()
+        else:
+            self.endThread = True
+            self.swState = gc.STATE_IDLE
 
-            elif e.event_id == gc.EV_CMD_JOG_RAPID_MOVE_RELATIVE:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info(
-                        "EV_CMD_JOG_RAPID_MOVE_RELATIVE %s" % e.data)
+    def onHello(self, e):
+        # data is list of event ids listener wants, None for all
+        self.addEventListener(e.sender, e.data)
 
-                self.machIfModule.doJogFastMoveRelative(e.data)
+    def onGoodby(self, e):
+        self.removeEventListener(e.sender)
 
-            elif e.event_id == gc.EV_CMD_JOG_STOP:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_JOG_STOP %s" % e.data)
+    def onConfigChange(self, changed_keys):
+        # caller's thread, handle in this thread
+        self.eventPut(gc.EV_CMD_UPDATE_CONFIG, changed_keys)
 
-                self.machIfModule.doJogStop()
+    def onCmdUpdateConfig(self, e):
+        self.initConfig(run_time_safe_only=True)
 
-            elif e.event_id == gc.EV_CMD_SET_AXIS:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_SET_AXIS")
+    def processPriorityQueue(self):
+        """ Handle realtime events coming from main UI, all pending
+            events are handled before any bulk event
+        """
+        while not self._priorityEventQueue.empty():
+            e = self._priorityEventQueue.get()
 
-                self.machIfModule.doSetAxis(e.data)
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
+                self.logger.info("priority event [%s] waited %.3f ms" % (
+                    str(e.event_id), (time.time() - e.timestamp) * 1000))
 
-            elif e.event_id == gc.EV_CMD_HOME:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_HOME")
+            self.machIfModule.setRealtimeTimestamp(e.timestamp)
 
-                self.machIfModule.doHome(e.data)
+            handler = self.priorityEventHandlers.get(e.event_id)
 
-            elif e.event_id == gc.EV_CMD_EXIT:
+            if handler is not None:
                 if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_EXIT")
+                    self.logger.info("%s %s" % (handler[0], str(e.data)))
 
-                if self.machIfModule.isSerialPortOpen():
-                    self.machIfModule.close()
-                else:
-                    self.endThread = True
-                    self.swState = gc.STATE_IDLE
+                handler[1](e)
 
-            elif e.event_id == gc.EV_HELLO:
+            else:
                 if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_HELLO from 0x%x" % id(e.sender))
-
-                self.addEventListener(e.sender)
+                    self.logger.error("got unknown priority event!! [%s]." %
+                                      str(e.event_id))
 
-            elif e.event_id == gc.EV_GOODBY:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_GOODBY from 0x%x" % id(e.sender))
+            self.machIfModule.setRealtimeTimestamp(None)
 
-                self.removeEventListener(e.sender)
+    def processQueue(self):
+        """ Handle events coming from main UI
+        """
+        # process all events from queue
+        while not self._eventQueue.empty():
+            # get item from queue
+            e = self._eventQueue.get()
 
-            elif e.event_id == gc.EV_CMD_PROBE:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_PROBE %s" % e.data)
+            self.lastEventID = e.event_id
 
-                self.machIfModule.doProbe(e.data)
+            handler = self.eventHandlers.get(e.event_id)
 
-            elif e.event_id == gc.EV_CMD_UPDATE_CONFIG:
+            if handler is not None:
                 if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
-                    self.logger.info("EV_CMD_UPDATE_CONFIG")
+                    self.logger.info("%s %s" % (handler[0], str(e.data)))
 
-                self.initConfig(run_time_safe_only=True)
+                handler[1](e)
 
             else:
                 if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
                     self.logger.error("got unknown event!! [%s]." %
                                       str(e.event_id))
 
+            # callers check lastEventID for stop, don't overwrite it
+            if e.event_id in [gc.EV_CMD_STOP, gc.EV_CMD_EXIT]:
+                break
+
     """-------------------------------------------------------------------------
    programExecuteThread: General Functions
    -------------------------------------------------------------------------"""
@@ -316,6 +439,7 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
             msg = "init MachIf Module (%s)." % self.machIfModule.getName()
             self.logger.info(msg)
 
+        self.machIfModule.setWakeUp(self._wakeUp)
         self.machIfModule.init()
 
     def serialRead(self):
@@ -328,6 +452,11 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
                 # make sure we stop processing any states...
                 self.swState = gc.STATE_ABORT
 
+            if e['id'] == gc.EV_SER_PORT_CLOSE:
+                # lost connection, device may not have seen every line sent
+                # so running on could skip lines, stop
+                self.stopOnPortClose()
+
             if e['id'] == gc.EV_EXIT:
                 self.endThread = True
                 self.swState = gc.STATE_IDLE
@@ -364,6 +493,8 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
                 # notify listeners
                 self.notifyEventListeners(gc.EV_DATA_STATUS, rxData['sr'])
 
+                self.updateExecutingPC(rxData['sr'])
+
             if 'r' in rxData:
                 if 'fb' in rxData['r']:
                     # notify listeners
@@ -374,6 +505,10 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
                     self.notifyEventListeners(gc.EV_DATA_STATUS, rxData['r'])
 
                 if 'f' in rxData:
+                    if rxData['f'][1] != 0 and \
+                       not self.machIfModule.waitForAckOnWrite:
+                        self.streamError()
+
                     if (rxData['f'][1] != 0 and
                        gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC):
                         msg = "acknowledgement state ERROR[%d]" % \
@@ -390,6 +525,30 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
 
         return rxData
 
+    def streamError(self):
+        """ Error acknowledge while streaming without waiting for each
+            acknowledge, stop like sendRunStepGcode error would
+        """
+        if self.swState == gc.STATE_RUN:
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC:
+                self.logger.info("error event, moving to gc.STATE_BREAK")
+
+            self.swState = gc.STATE_BREAK
+
+            # notify listeners
+            self.notifyEventListeners(gc.EV_PC_UPDATE,
+                                      self.workingProgramCounter)
+            self.notifyEventListeners(gc.EV_HIT_BRK_PT)
+
+        elif self.swState == gc.STATE_STEP:
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC:
+                self.logger.info("error event, moving to gc.STATE_IDLE")
+
+            self.swState = gc.STATE_IDLE
+
+            # notify listeners
+            self.notifyEventListeners(gc.EV_STEP_END)
+
     def serialWrite(self, serial_data):
         bytesSent = 0
 
@@ -408,9 +567,33 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
         return bytesSent
 
     def tick(self):
+        self.processPriorityQueue()
         self.machIfModule.tick()
         self.processQueue()
 
+    def tickTimer(self):
+        """ Periodic wake up for the thread loop
+        """
+        while not self.endThread:
+            time.sleep(TICK_PERIOD)
+            self._wakeUp.set()
+
+    def waitForWakeUp(self):
+        """ Block until there is something to do: UI event, device data or
+            tick timer, returns right away if there is work pending
+        """
+        if self._priorityEventQueue.empty() and \
+           self._eventQueue.empty() and \
+           not self.machIfModule.readPending():
+            # waiting for work is not a stall
+            if self.heartbeat is not None:
+                self.heartbeat.idle()
+
+            self._wakeUp.wait()
+
+            if self.heartbeat is not None:
+                self.heartbeat.beat()
+
     def waitForAcknowledge(self):
         """ waits for a ack kind of response also check for errors
             and signal calling function
@@ -418,6 +601,11 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
         rc_error = False
         wait_for_acknowledge = True
 
+        # wait for work in here is idle time for the stall watchdog, the
+        # acknowledge wait as a whole is tracked on its own
+        if self.heartbeat is not None:
+            self.heartbeat.ackWait()
+
         while (wait_for_acknowledge):
             rxDataDict = self.waitForResponse()
 
@@ -465,6 +653,9 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
                 wait_for_acknowledge = False
                 break
 
+        if self.heartbeat is not None:
+            self.heartbeat.ackDone()
+
         return rc_error
 
     def waitForResponse(self):
@@ -489,16 +680,124 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
             if self.lastEventID == gc.EV_CMD_STOP:
                 waitForResponse = False
 
-            time.sleep(0.01)
+            if waitForResponse:
+                self.waitForWakeUp()
 
         return rxDataDict
 
+    def resetExecutingPC(self):
+        """ Forget lines waiting to execute, device queue was flushed or
+            program counter moved
+        """
+        self.sentProgramCounters = []
+        self.lineNumberMap = {}
+
+        if self.executingProgramCounter != -1:
+            self.executingProgramCounter = -1
+
+            # notify listeners
+            self.notifyEventListeners(gc.EV_PC_EXEC_UPDATE, -1)
+
+    def updateExecutingPC(self, sr):
+        """ Estimate the program line the device is executing from status
+            report, using in order of preference: reported line number (grbl
+            Ln, TinyG/g2core line), planner queue depth, machine status
+        """
+        if not self.sentProgramCounters:
+            return
+
+        pc = None
+        line = sr.get('ln', sr.get('line'))
+
+        if line is not None and line in self.lineNumberMap:
+            pc = self.lineNumberMap[line]
+
+        elif 'pq' in sr:
+            # oldest line still in planner is the one executing
+            queued = sr['pq']
+            if queued == 0:
+                pc = self.sentProgramCounters[-1]
+            elif queued <= len(self.sentProgramCounters):
+                pc = self.sentProgramCounters[-queued]
+            else:
+                pc = self.sentProgramCounters[0]
+
+        elif sr.get('stat') in gMachineIdleStatus:
+            pc = self.sentProgramCounters[-1]
+
+        if pc is None or pc not in self.sentProgramCounters:
+            return
+
+        # lines before the executing one are done
+        del self.sentProgramCounters[:self.sentProgramCounters.index(pc)]
+
+        if pc != self.executingProgramCounter:
+            self.executingProgramCounter = pc
+
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC:
+                self.logger.info("executing PC[%d], sent PC[%d]" % (
+                    pc + 1, self.workingProgramCounter))
+
+            # notify listeners
+            self.notifyEventListeners(gc.EV_PC_EXEC_UPDATE, pc)
+
+    def trackSentPC(self, gcode):
+        """ Keep track of program line sent, for executing line estimate
+        """
+        pc = self.workingProgramCounter
+
+        lineNumber = gReGcodeLineNumber.search(gcode)
+        if lineNumber is not None:
+            self.lineNumberMap[int(lineNumber.group(1))] = pc
+
+        self.sentProgramCounters.append(pc)
+
+        if len(self.sentProgramCounters) > EXEC_PC_TRACK_MAX:
+            self.sentProgramCounters.pop(0)
+
     def sendRunStepGcode(self, gcode_data):
         write_to_device = True
         rc_error = False
         gcode = gcode_data.strip()
 
+        # alignment to fiducials then height map Z compensation, which is
+        # probed in machine XY, a line can become several
+        if (self.aligner is not None or self.leveler is not None) and \
+           len(gcode) > 0:
+            # rewrite is kept while its line is sent in parts (steps or
+            # device busy), a new run with a different line at this PC
+            # needs a new one
+            rewriteKey = (self.workingProgramCounter, gcode)
+
+            if self.rewriteKey != rewriteKey:
+                if self.rewriteKey is not None and \
+                   self.rewriteKey[0] == self.workingProgramCounter:
+                    # line changed under us, part of the old one may have
+                    # been sent, position at its start is not known
+                    if self.leveler is not None:
+                        self.leveler.reset()
+                    if self.aligner is not None:
+                        self.aligner.reset()
+
+                self.rewriteKey = rewriteKey
+
+                if self.aligner is not None:
+                    gcode = self.aligner.align(gcode)
+
+                if self.leveler is not None:
+                    self.rewriteLines = self.leveler.level(gcode)
+                else:
+                    self.rewriteLines = [gcode]
+
+            gcode = self.rewriteLines[0]
+
         if len(gcode) > 0:
+            # line numbers allow device to report executing line
+            if self.injectLineNumbers and \
+               gReGcodeLineNumber.search(gcode) is None and \
+               gcode[0] not in ['$', '%']:
+                gcode = "N%d%s" % (self.workingProgramCounter + 1, gcode)
+
             gcode = "%s\n" % (gcode)
 
             if self.machIfModule.okToSend(gcode):
@@ -509,17 +808,30 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
                 machine IF object will track the device queue
                 all will manage whether or not we can send more
                 commands to the IF'''
-                # wait for response
-                rc_error = self.waitForAcknowledge()
-                # self.SerialRead()
+                if self.machIfModule.waitForAckOnWrite:
+                    # wait for response
+                    rc_error = self.waitForAcknowledge()
+                else:
+                    # errors come later, serialRead stops the program
+                    self.serialRead()
+
+                if not rc_error:
+                    self.trackSentPC(gcode)
 
             else:
                 write_to_device = False
+                self.deviceBusy = True
                 self.serialRead()
 
         if write_to_device:
             if not rc_error:
-                self.workingProgramCounter += 1
+                if len(self.rewriteLines) > 1:
+                    # rest of the split line before moving on
+                    self.rewriteLines.pop(0)
+                else:
+                    self.rewriteKey = None
+                    self.rewriteLines = []
+                    self.workingProgramCounter += 1
 
             # if we stop early make sure to update PC to main UI
             if self.swState == gc.STATE_IDLE:
@@ -659,6 +971,116 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
     def processIdleSate(self):
         self.serialRead()
 
+    def sendWithAcknowledge(self, gcode):
+        """ Send line once device can take it and wait for its
+            acknowledge, returns True on error
+        """
+        while not self.machIfModule.okToSend(gcode):
+            self.serialRead()
+
+            if self.endThread or self.swState == gc.STATE_ABORT:
+                return True
+
+            self.waitForWakeUp()
+
+        self.serialWrite(gcode)
+
+        return self.waitForAcknowledge()
+
+    def waitForProbeZ(self, job):
+        """ Ask for status until device is idle after a probe, returns
+            work Z or None if probe failed or job was stopped
+        """
+        nextStatus = 0
+
+        while self.probeGrid is job and not self.endThread and \
+                self.swState != gc.STATE_ABORT:
+            if time.time() >= nextStatus:
+                self.machIfModule.doGetStatus()
+                nextStatus = time.time() + PROBE_STATUS_PERIOD
+
+            sr = self.serialRead().get('sr', {})
+
+            if sr.get('stat') == 'Alarm':
+                break
+
+            if sr.get('stat') in gMachineIdleStatus and 'posz' in sr:
+                return sr['posz']
+
+            self.tick()
+            self.waitForWakeUp()
+
+        return None
+
+    def processProbeGrid(self):
+        """ Probe next height map point, one point per loop so events are
+            handled in between
+        """
+        import modules.height_map as hm
+
+        job = self.probeGrid
+        heightMap = job['map']
+        cf = hm.COORD_FORMAT
+
+        if not job['todo']:
+            self.probeGrid = None
+
+            # height map goes live only once probe is back up
+            if self.sendWithAcknowledge("G0 Z%s\n" % (cf % job['clearance'])):
+                self.notifyEventListeners(gc.EV_HEIGHT_MAP, None)
+                return
+
+            self.heightMap = heightMap
+            self.leveler = hm.GcodeLeveler(heightMap)
+            self.rewriteKey = None
+            self.rewriteLines = []
+
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC:
+                self.logger.info("height map %s done" % str(heightMap))
+
+            # notify listeners
+            self.notifyEventListeners(gc.EV_HEIGHT_MAP, heightMap)
+            return
+
+        i, j, x, y = job['todo'][0]
+
+        z = None
+        rc_error = False
+        gcodes = [
+            "G90 G0 Z%s\n" % (cf % job['clearance']),
+            "G0 X%s Y%s\n" % (cf % x, cf % y),
+            "%s Z%s F%s\n" % (self.machIfModule.getProbeAxisCmd(),
+                              cf % job['depth'], cf % job['feed'])]
+
+        for gcode in gcodes:
+            rc_error = self.sendWithAcknowledge(gcode)
+
+            if rc_error or self.probeGrid is not job:
+                break
+
+        if not rc_error and self.probeGrid is job:
+            z = self.waitForProbeZ(job)
+
+        if self.probeGrid is not job:
+            # stopped
+            return
+
+        if z is None:
+            self.probeGrid = None
+            self.logger.error("height map probe failed at X%s Y%s" % (
+                cf % x, cf % y))
+
+            # notify listeners
+            self.notifyEventListeners(gc.EV_HEIGHT_MAP, None)
+            return
+
+        job['todo'].pop(0)
+        heightMap.setZ(i, j, z)
+
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC:
+            self.logger.info("height map X%s Y%s Z%s" % (
+                cf % x, cf % y, cf % z))
+
     def processSerialWriteQueue(self):
         if self.serialWriteQueue:
 
@@ -670,6 +1092,8 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
 
                 if data[1]:
                     self.waitForAcknowledge()
+            else:
+                self.deviceBusy = True
 
     def run(self):
         """Run Worker Thread."""
@@ -682,7 +1106,17 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
         # inti machine interface
         self.machIfModule.open()
 
+        self.heartbeat = wd.STALL_WATCHDOG.heartbeat("exec", self)
+
+        tickTimerThread = None
+        if self.useTickTimer:
+            tickTimerThread = threading.Thread(target=self.tickTimer)
+            tickTimerThread.daemon = True
+            tickTimerThread.start()
+
         while not self.endThread:
+            self.heartbeat.beat()
+            self.deviceBusy = False
 
             # process bookeeping input queue for new commands or actions
             self.tick()
@@ -690,6 +1124,10 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
             # process write queue from UI cmds
             self.processSerialWriteQueue()
 
+            if self.probeGrid is not None and \
+               self.swState == gc.STATE_IDLE and not self.serialWriteQueue:
+                self.processProbeGrid()
+
             # check if we need to exit now
             if self.endThread:
                 break
@@ -715,10 +1153,26 @@ class MachIfExecuteThread(threading.Thread, gc.EventQueueIf):
                 self.processIdleSate()
                 self.swState = gc.STATE_IDLE
 
-            time.sleep(0.01)
+            # keep going while there are lines to send and device can take
+            # them, otherwise sleep until something happens
+            if self.deviceBusy or (
+               self.swState not in [gc.STATE_RUN, gc.STATE_STEP] and
+               not self.serialWriteQueue and self.probeGrid is None):
+                self.waitForWakeUp()
+
+        if tickTimerThread is not None:
+            tickTimerThread.join()
+
+        self.heartbeat.close()
+        self.heartbeat = None
+
+        gc.CONFIG_DATA.unsubscribe(self.onConfigChange)
 
         if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC:
             self.logger.info("thread exit")
 
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_EXEC_EV:
+            self.logEventWaitStats(self.logger)
+
         # notify listeners
         self.notifyEventListeners(gc.EV_EXIT)
@@ -0,0 +1,146 @@
+"""----------------------------------------------------------------------------
+   machif_reactor.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import select
+
+import modules.config as gc
+import modules.serial_thread as st
+import modules.socket_port as sp
+import modules.machif_progexec as mi_progexec
+
+
+class SerialTransport(st.SerialPortThread):
+    """ SerialPortThread handlers without the thread. Writes go out as soon
+        as they are queued and the reactor reads the port when select()
+        says it is readable
+    """
+
+    # reactor select() waits on the port, events are handled when queued
+    wakeUpClass = None
+
+    def start(self):
+        """ No thread to start, open port now
+        """
+        self.endThread = False
+        self.exitNotified = False
+        self.serialOpen()
+
+    def fileno(self):
+        """ serial port file descriptor, None if port is not open
+        """
+        if self.serialPort is not None and self.serialPort.isOpen():
+            return self.serialPort.fileno()
+
+        return None
+
+    def eventPost(self, e):
+        gc.EventQueueIf.eventPost(self, e)
+        self.process()
+
+    def eventPutPriority(self, event_id, event_data=None, sender=None,
+                         timestamp=None):
+        gc.EventQueueIf.eventPutPriority(
+            self, event_id, event_data, sender, timestamp)
+        self.process()
+
+    def process(self):
+        """ Handle queued events right away
+        """
+        self.processPriorityQueue()
+
+        while not self._eventQueue.empty() and not self.endThread:
+            self.processQueue()
+
+        if self.endThread and not self.exitNotified:
+            self.exitNotified = True
+            self.notifyEventListeners(gc.EV_EXIT, "")
+
+
+class MachIfReactor(mi_progexec.MachIfExecuteThread):
+    """ Single threaded machine interface core. Python 2 has no asyncio,
+        this is the same idea with select(): one loop waits on the serial
+        port and a wake up pipe for UI events, then runs the program
+        executor and the MachIf protocol handlers. Same event API and
+        RUN/STEP/BREAK/PAUSE handling as MachIfExecuteThread, whose serial
+        thread and tick timer thread are not used here. POSIX only, select()
+        on Windows only works with sockets.
+    """
+
+    wakeUpClass = gc.PipeWakeUp
+    useTickTimer = False
+
+    def initMachineIfModule(self):
+        mi_progexec.MachIfExecuteThread.initMachineIfModule(self)
+        self.machIfModule.serialTxRxClass = SerialTransport
+
+    def serviceTransport(self, timeout):
+        """ Wait up to timeout for serial data or wake up, read serial data
+        """
+        transport = self.machIfModule.getSerialTxRx()
+        rlist = [self._wakeUp]
+
+        if transport is not None and transport.serialReconnecting():
+            # lost socket connection, poll reconnect between waits
+            transport.serialReconnect()
+            timeout = min(timeout, sp.RECONNECT_POLL_PERIOD)
+
+        if transport is not None and transport.fileno() is not None:
+            rlist.append(transport)
+
+        # waiting for work is not a stall
+        if timeout and self.heartbeat is not None:
+            self.heartbeat.idle()
+
+        try:
+            readable = select.select(rlist, [], [], timeout)[0]
+        except (select.error, ValueError):
+            # port closed under us, serialRead will report it
+            readable = rlist[1:]
+
+        if timeout and self.heartbeat is not None:
+            self.heartbeat.beat()
+
+        if self._wakeUp in readable:
+            self._wakeUp.clear()
+
+        if transport in readable:
+            transport.serialRead()
+
+    def tick(self):
+        self.serviceTransport(0)
+        mi_progexec.MachIfExecuteThread.tick(self)
+
+    def waitForWakeUp(self):
+        """ Block until there is something to do: UI event, device data or
+            tick period, returns right away if there is work pending
+        """
+        if self._priorityEventQueue.empty() and \
+           self._eventQueue.empty() and \
+           not self.machIfModule.readPending():
+            self.serviceTransport(mi_progexec.TICK_PERIOD)
+
+    def run(self):
+        mi_progexec.MachIfExecuteThread.run(self)
+        self._wakeUp.close()
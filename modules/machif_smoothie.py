@@ -173,14 +173,15 @@ class MachIf_Smoothie(mi.MachIf_Base):
 
             dataDict['sr'] = sr
 
-            if self.cmdLineOptions.vverbose:
-                print "** MachIf_Smoothie re Smoothie status match %s" % str(
-                    statusData)
-                print "** MachIf_Smoothie str match from %s" % str(
-                    data.strip())
-                print "** MachIf_Smoothie input buffer decode returned: %d, buffer size: %d, %.2f%% full" % \
-                    (bufferPart, self._inputBufferSize,
-                     (100 * (float(self._inputBufferSize)/self._inputBufferMaxSize)))
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+                self.logger.info("status match %s" % str(statusData))
+                self.logger.info("str match from %s" % str(data.strip()))
+                prcnt = float(self._inputBufferSize)/self._inputBufferMaxSize
+                self.logger.info("decode, input buffer free: %d, buffer "
+                                 "size: %d, %.2f%% full" % (
+                                    bufferPart,
+                                    self._inputBufferSize,
+                                    (100*prcnt)))
 
             # check on status change
             decodedStatus = self.stat_dict.get(
@@ -202,19 +203,21 @@ class MachIf_Smoothie(mi.MachIf_Base):
 
             self._inputBufferSize = self._inputBufferSize - bufferPart
 
-            if self.cmdLineOptions.vverbose:
-                print "** MachIf_Smoothie found acknowledgement [%s]" % data.strip(
-                )
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+                self.logger.info("found acknowledgement [%s]" % data.strip())
 
             r = {}
             dataDict['r'] = r
             dataDict['f'] = [0, 0, bufferPart]
             dataDict['ib'] = [self._inputBufferMaxSize, self._inputBufferSize]
 
-            if self.cmdLineOptions.vverbose:
-                print "** MachIf_Smoothie input buffer decode returned: %d, buffer size: %d, %.2f%% full" % \
-                    (bufferPart, self._inputBufferSize,
-                     (100 * (float(self._inputBufferSize)/self._inputBufferMaxSize)))
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+                prcnt = float(self._inputBufferSize)/self._inputBufferMaxSize
+                self.logger.info("decode, input buffer free: %d, buffer "
+                                 "size: %d, %.2f%% full" % (
+                                    bufferPart,
+                                    self._inputBufferSize,
+                                    (100*prcnt)))
 
         error = self.reSmoothieMachineError.search(data)
         if error is not None:
@@ -225,8 +228,8 @@ class MachIf_Smoothie(mi.MachIf_Base):
 
             self._inputBufferSize = self._inputBufferSize - bufferPart
 
-            if self.cmdLineOptions.vverbose:
-                print "** MachIf_Smoothie found error [%s]" % data.strip()
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+                self.logger.info("found error [%s]" % data.strip())
 
             if 'r' not in dataDict:
                 r = {}
@@ -241,16 +244,19 @@ class MachIf_Smoothie(mi.MachIf_Base):
             dataDict['f'] = [0, error_code, bufferPart, error.group(1).strip()]
             dataDict['ib'] = [self._inputBufferMaxSize, self._inputBufferSize]
 
-            if self.cmdLineOptions.vverbose:
-                print "** MachIf_Smoothie input buffer decode returned: %d, buffer size: %d, %.2f%% full" % \
-                    (bufferPart, self._inputBufferSize,
-                     (100 * (float(self._inputBufferSize)/self._inputBufferMaxSize)))
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+                prcnt = float(self._inputBufferSize)/self._inputBufferMaxSize
+                self.logger.info("decode, input buffer free: %d, buffer "
+                                 "size: %d, %.2f%% full" % (
+                                    bufferPart,
+                                    self._inputBufferSize,
+                                    (100*prcnt)))
 
         version = self.reSmoothieVersion.match(data)
         if version is not None:
-            if self.cmdLineOptions.vverbose:
-                print "** MachIf_Smoothie found device version [%s]" % version.group(
-                    1).strip()
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+                self.logger.info("found device version [%s]" %
+                                 version.group(1).strip())
 
             if 'r' not in dataDict:
                 r = {}
@@ -296,10 +302,13 @@ class MachIf_Smoothie(mi.MachIf_Base):
                 self._inputBufferSize = self._inputBufferSize + 1
 
         if data == self.cmdStatus and bookeeping:
-            if self.cmdLineOptions.vverbose:
-                print "** MachIf_Smoothie input buffer encode used: %d, buffer size: %d, %.2f%% full" % \
-                    (1, self._inputBufferSize,
-                     (100 * (float(self._inputBufferSize)/self._inputBufferMaxSize)))
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+                prcnt = float(self._inputBufferSize)/self._inputBufferMaxSize
+                self.logger.info("encode, input buffer used: %d, buffer "
+                                 "size: %d, %.2f%% full" % (
+                                    1,
+                                    self._inputBufferSize,
+                                    (100*prcnt)))
 
         elif data in [self.getCycleStartCmd(), self.getFeedHoldCmd()]:
             pass
@@ -309,10 +318,13 @@ class MachIf_Smoothie(mi.MachIf_Base):
 
             self._inputBufferPart.append(dataLen)
 
-            if self.cmdLineOptions.vverbose:
-                print "** MachIf_Smoothie input buffer encode used: %d, buffer size: %d, %.2f%% full" % \
-                    (dataLen, self._inputBufferSize,
-                     (100 * (float(self._inputBufferSize)/self._inputBufferMaxSize)))
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+                prcnt = float(self._inputBufferSize)/self._inputBufferMaxSize
+                self.logger.info("encode, input buffer used: %d, buffer "
+                                 "size: %d, %.2f%% full" % (
+                                    dataLen,
+                                    self._inputBufferSize,
+                                    (100*prcnt)))
 
         return data
 
@@ -321,8 +333,9 @@ class MachIf_Smoothie(mi.MachIf_Base):
 
     def init(self):
         super(MachIf_Smoothie, self).init()
-        self.machineAutoRefreshPeriod = gc.CONFIG_DATA.get(
+        self.machineAutoRefreshPeriodCfg = gc.CONFIG_DATA.getHandle(
             '/machine/MachIfSpecific/%s/AutoRefreshPeriod/Value' % self.name)
+        self.machineAutoRefreshPeriod = self.machineAutoRefreshPeriodCfg.get()
 
     def tick(self):
         # check if is time for autorefresh and send get status cmd and prepare next refresh time
@@ -344,12 +357,8 @@ class MachIf_Smoothie(mi.MachIf_Base):
             SMOOTHIE_STATE_RUN, SMOOTHIE_STATE_JOG]:
             self.autoStatusNextMicro = None
 
-        if self.machineAutoRefreshPeriod != gc.CONFIG_DATA.get(
-                '/machine/MachIfSpecific/%s/AutoRefreshPeriod/Value'
-                % self.name):
-            self.machineAutoRefreshPeriod = gc.CONFIG_DATA.get(
-                '/machine/MachIfSpecific/%s/AutoRefreshPeriod/Value'
-                % self.name)
+        # cached, only looked up again after config changes
+        self.machineAutoRefreshPeriod = self.machineAutoRefreshPeriodCfg.get()
 
     def write(self, txData, raw_write=False):
         askForStatus = False
@@ -373,3 +382,27 @@ class MachIf_Smoothie(mi.MachIf_Base):
                     microseconds=self.machineAutoRefreshPeriod * 1000)
 
         return bytesSent
+
+    def writeRealtime(self, txData, flush=False, raw_write=False,
+                      bookeeping=False):
+        askForStatus = False
+        bytesSent = 0
+
+        # resume from hold, etc, get at least one status msg
+        if self.currentStatus in [SMOOTHIE_STATE_IDLE, SMOOTHIE_STATE_STOP,
+                                  SMOOTHIE_STATE_HOME, SMOOTHIE_STATE_SLEEP,
+                                  SMOOTHIE_STATE_HOLD]:
+            askForStatus = True
+
+        bytesSent = super(MachIf_Smoothie, self).writeRealtime(
+            txData, flush, raw_write, bookeeping)
+
+        if askForStatus:
+            if self.okToSend(self.cmdStatus):
+                super(MachIf_Smoothie, self).write(self.cmdStatus)
+
+            self.autoStatusNextMicro = dt.datetime.now() + \
+                dt.timedelta(
+                    microseconds=self.machineAutoRefreshPeriod * 1000)
+
+        return bytesSent
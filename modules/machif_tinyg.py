@@ -44,6 +44,20 @@ BUFFER_MAX_SIZE = 255
 BUFFER_INIT_VAL = 0
 BUFFER_WATERMARK_PRCNT = 0.90
 
+# planner queue size, default until device reports a larger queue report
+PLANNER_BUFFER_SIZE = 28
+
+# planner buffers kept free with queue report flow control, room for lines
+# on the way when the last queue report was sent
+PLANNER_BUFFER_RESERVE = 4
+
+# machine states with motion done, no queue report comes for acks of
+# lines that never reached the planner (reports, settings, modal lines)
+PLANNER_IDLE_STATS = ['Ready', 'Stop', 'End']
+
+# shortest status report interval (si) device takes (msec)
+STATUS_INTERVAL_MIN = 100
+
 TINYG_STAT_CODE_2_STR_DICT = {
     0: "OK",
     1: "ERROR",
@@ -232,6 +246,13 @@ class MachIf_TinyG(mi.MachIf_Base):
 
     Init buffer to (-1) when connecting it needs a initial '\n' that
     should not be counted
+
+    With queue report flow control, queue reports are turned on after
+    connect ({"qv":2}) and lines are held while the planner free buffers in
+    the last "qr", less lines sent or acknowledged since, drops below
+    reserve. Many tiny segments fill the planner long before 255 bytes.
+    Acknowledged lines only count while the planner is busy, an idle
+    status report clears them, an idle planner sends no new "qr".
     ------------------------------------------------------------------------"""
 
     # text mode re expressions
@@ -268,12 +289,30 @@ class MachIf_TinyG(mi.MachIf_Base):
 
         self._inputBufferPart = list()
 
+        # queue report (qr) flow control, planner free buffers from last
+        # report and lines acknowledged since
+        self.queueReportFlowControl = False
+        self.initStringDetectFlag = False
+        self._plannerFree = None
+        self._plannerFreeMax = PLANNER_BUFFER_SIZE
+        self._plannerAckSinceQr = 0
+
+        # status report tuning, device status report fields (sr) and
+        # interval (si) before tuning, fields set on connect
+        self.machineAutoRefreshPeriod = 250
+        self._statusTune = False
+        self._srOrig = None
+        self._siOrig = None
+        self._srTuned = list()
+
         # list of commands
         self.cmdClearAlarm = '{"clear":true}\n'
         self.cmdInitComm = '{"sys":null}\n'
         self.cmdQueueFlushCmd = "%"
+        self.cmdQueueReport = '{"qv":2}\n'
         self.cmdSetAxisCmd = "G28.3"
         self.cmdStatus = '{"sr":null}\n'
+        self.cmdStatusInterval = '{"si":null}\n'
 
     def _init(self):
         """ Init object variables, ala soft-reset in hw
@@ -283,6 +322,73 @@ class MachIf_TinyG(mi.MachIf_Base):
                                          BUFFER_WATERMARK_PRCNT)
 
         self._inputBufferPart = list()
+        self._plannerFree = None
+        self._plannerAckSinceQr = 0
+
+    def _statusReportRestore(self):
+        """ Put back status report fields and interval changed on connect
+        """
+        if self._srOrig is not None:
+            sr = dict([(f, True) for f in self._srOrig])
+            sr.update([(f, False) for f in self._srTuned
+                       if f not in self._srOrig])
+
+            self.write('{"sr":%s}\n' % json.dumps(
+                sr, sort_keys=True, separators=(',', ':')))
+            self.write('{"si":%d}\n' % self._siOrig)
+
+            self._srOrig = None
+            self._siOrig = None
+
+    def _statusReportSize(self, sr):
+        return len('{"sr":%s}\n' % json.dumps(sr, separators=(',', ':')))
+
+    def _statusReportTune(self):
+        """ Set status report to the fields gsat displays at auto refresh
+            period
+        """
+        self._statusTune = False
+
+        self._srTuned = ['stat', 'vel'] + \
+            ['pos%s' % axis for axis in self._statusReportAxes()]
+
+        if gc.CONFIG_DATA.get('/machine/InjectLineNumbers', False):
+            self._srTuned.append('line')
+
+        si = max(STATUS_INTERVAL_MIN, self.machineAutoRefreshPeriod)
+
+        sr = dict([(f, True) for f in self._srTuned])
+        sr.update([(f, False) for f in self._srOrig if f not in sr])
+
+        self.write('{"sr":%s}\n' % json.dumps(
+            sr, sort_keys=True, separators=(',', ':')))
+        self.write('{"si":%d}\n' % si)
+
+        # reports are sent at most once per interval while moving
+        srTuned = dict([(f, self._srOrig.get(f, 0)) for f in self._srTuned])
+        self._statusReportTuned(
+            self._statusReportSize(self._srOrig) * 1000.0 /
+            max(1, self._siOrig),
+            self._statusReportSize(srTuned) * 1000.0 / si)
+
+    def _queueReport(self, qr, data_dict):
+        """ Planner free buffers from queue report, report queued buffers
+            with status
+        """
+        self._plannerFree = qr
+        self._plannerAckSinceQr = 0
+
+        if qr > self._plannerFreeMax:
+            self._plannerFreeMax = qr
+
+        if 'sr' not in data_dict:
+            data_dict['sr'] = {}
+
+        data_dict['sr']['pq'] = self._plannerFreeMax - qr
+
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
+            self.logger.info("decode, planner free: %d/%d" % (
+                qr, self._plannerFreeMax))
 
     def decode(self, data):
         dataDict = {}
@@ -324,6 +430,7 @@ class MachIf_TinyG(mi.MachIf_Base):
                                              ("id:"+sys['id']))
 
                         dataDict['r']['init'] = "id:"+sys['id']
+                        self.initStringDetectFlag = True
 
                 if 'id' in r:
                     if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
@@ -331,6 +438,26 @@ class MachIf_TinyG(mi.MachIf_Base):
                                          ("id:"+r['id']))
 
                     dataDict['r']['init'] = "id:"+r['id']
+                    self.initStringDetectFlag = True
+
+                # status report fields and interval before tuning
+                if self._statusTune:
+                    if 'sr' in r:
+                        self._srOrig = dict(r['sr'])
+
+                    if 'si' in r:
+                        self._siOrig = r['si']
+
+                    if self._srOrig is not None and self._siOrig is not None:
+                        self._statusReportTune()
+
+                # queue report, response to {"qr":null}
+                if 'qr' in r:
+                    self._queueReport(r['qr'], dataDict)
+
+            # queue report, sent by device as planner queue changes
+            if 'qr' in dataDict:
+                self._queueReport(dataDict['qr'], dataDict)
 
             if 'sr' in dataDict:
                 sr = dataDict['sr']
@@ -339,6 +466,9 @@ class MachIf_TinyG(mi.MachIf_Base):
                     status = sr['stat']
                     sr['stat'] = self.stat_dict.get(status, "Uknown")
 
+                    if sr['stat'] in PLANNER_IDLE_STATS:
+                        self._plannerAckSinceQr = 0
+
                 # deal with old versions of tinyG
                 if 'mpox' in sr:
                     sr['posx'] = sr['mpox']
@@ -415,6 +545,12 @@ class MachIf_TinyG(mi.MachIf_Base):
 
                 self._inputBufferSize = self._inputBufferSize - bufferPart
 
+                # with planner empty at last queue report, a line that
+                # goes to the planner brings a new report
+                if self._plannerFree is not None and \
+                   self._plannerFree < self._plannerFreeMax:
+                    self._plannerAckSinceQr += 1
+
                 if gc.VERBOSE_MASK & gc.VERBOSE_MASK_MACHIF_MOD:
                     prcnt = float(self._inputBufferSize) / \
                             self._inputBufferMaxSize
@@ -464,3 +600,41 @@ class MachIf_TinyG(mi.MachIf_Base):
 
     def factory(self):
         return MachIf_TinyG()
+
+    def init(self):
+        super(MachIf_TinyG, self).init()
+        self.machineAutoRefreshPeriod = gc.CONFIG_DATA.get(
+            '/machine/MachIfSpecific/%s/AutoRefreshPeriod/Value' % self.name,
+            self.machineAutoRefreshPeriod)
+        self.queueReportFlowControl = gc.CONFIG_DATA.get(
+            '/machine/MachIfSpecific/%s/QueueReportFlowControl/Value' %
+            self.name, False)
+
+    def okToSend(self, data):
+        """ Room in input buffer, with queue report flow control also room
+            in planner queue for lines on the way
+        """
+        bufferHasRoom = super(MachIf_TinyG, self).okToSend(data)
+
+        if bufferHasRoom and self.queueReportFlowControl and \
+           self._plannerFree is not None:
+            lines = len(self._inputBufferPart) + self._plannerAckSinceQr + \
+                len(data.splitlines())
+
+            bufferHasRoom = \
+                self._plannerFree - lines >= PLANNER_BUFFER_RESERVE
+
+        return bufferHasRoom
+
+    def tick(self):
+        # check for init condition, take action, and reset init condition
+        if self.initStringDetectFlag:
+            self.initStringDetectFlag = False
+
+            if self.queueReportFlowControl:
+                self.write(self.cmdQueueReport)
+
+            if self.statusReportTuning and self._srOrig is None:
+                self._statusTune = True
+                self.write(self.cmdStatusInterval)
+                self.write(self.cmdStatus)
@@ -0,0 +1,224 @@
+"""----------------------------------------------------------------------------
+   profiler.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import logging
+import os
+import sys
+import threading
+import time
+
+import modules.config as gc
+
+# time between samples (seconds)
+PROFILE_SAMPLE_PERIOD = 0.005
+
+# profile file when profiling is started from the GUI without --profile
+PROFILE_FILE_DEFAULT = "~/.gsat-profile.txt"
+
+# functions reported as named regions, the per line hot spots
+PROFILE_REGIONS = [
+    'decode', 'encode', 'okToSend', 'onStyleNeeded', 'AppendText']
+
+# ids of threads that didn't make it across fork
+FORK_GHOST_THREAD_IDS = set()
+
+
+def after_fork(profiling=False):
+    """ Call first thing in a forked child process. Python 2 keeps
+        reporting frames of the parent threads (gone in the child) under
+        their old ids, remember those to skip them. New threads would
+        reuse their stacks and with that their ids, hiding the new thread,
+        so if the child is profiled new threads get bigger stacks than the
+        parent ones. Without profiling thread stacks are left alone.
+    """
+    global FORK_GHOST_THREAD_IDS
+
+    FORK_GHOST_THREAD_IDS = set(sys._current_frames().keys()) - \
+        set([threading.current_thread().ident])
+
+    if not profiling or not FORK_GHOST_THREAD_IDS:
+        return
+
+    try:
+        import resource
+        stackSize = resource.getrlimit(resource.RLIMIT_STACK)[0]
+
+        if stackSize > 0:
+            threading.stack_size(2 * stackSize)
+
+    except (ImportError, ValueError, threading.ThreadError):
+        pass
+
+
+def child_file_name(file_name, name):
+    """ Profile file of another process, i.e. "gsat.txt" -> "gsat-machif.txt"
+    """
+    base, ext = os.path.splitext(file_name)
+    return "%s-%s%s" % (base, name, ext)
+
+
+class SamplingProfiler(object):
+    """ Samples the stacks of all threads from its own thread, nothing is
+        added to the code being profiled. On stop writes collapsed stacks,
+        one "thread;frame;...;frame count" line per stack, which
+        flamegraph.pl and speedscope read. Region functions get a "[name]"
+        frame above them so they are easy to find in the graph.
+    """
+
+    def __init__(self, file_name, period=PROFILE_SAMPLE_PERIOD,
+                 regions=PROFILE_REGIONS):
+        self.logger = logging.getLogger()
+
+        self.fileName = file_name
+        self.period = period
+        self.regions = set(regions)
+
+        self.stacks = dict()
+        self.samples = 0
+        self.startTime = None
+        self.stopTime = None
+
+        self._codeLabels = dict()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _codeLabel(self, code):
+        label = self._codeLabels.get(code)
+
+        if label is None:
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            label = "%s:%s" % (module, code.co_name)
+
+            if code.co_name in self.regions:
+                label = "[%s];%s" % (code.co_name, label)
+
+            self._codeLabels[code] = label
+
+        return label
+
+    def _sampleLoop(self):
+        ownId = threading.current_thread().ident
+
+        while not self._stop.wait(self.period):
+            # execute, serial and CV threads are Thread sub classes, their
+            # class tells them apart better than "Thread-N"
+            threadNames = dict()
+            for thread in threading.enumerate():
+                name = thread.name
+                if type(thread) not in [threading.Thread,
+                                        threading._MainThread]:
+                    name = type(thread).__name__
+
+                threadNames[thread.ident] = name
+
+            for threadId, frame in sys._current_frames().items():
+                if threadId == ownId or (
+                   threadId in FORK_GHOST_THREAD_IDS and
+                   threadId not in threadNames):
+                    continue
+
+                labels = []
+                while frame is not None:
+                    labels.append(self._codeLabel(frame.f_code))
+                    frame = frame.f_back
+
+                labels.append(threadNames.get(threadId, str(threadId)))
+                labels.reverse()
+
+                stack = ";".join(labels)
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+            self.samples += 1
+
+    def isRunning(self):
+        return self._thread is not None
+
+    def regionSamples(self):
+        """ dict of region name to samples with region on stack
+        """
+        regionSamples = dict()
+
+        for region in self.regions:
+            marker = "[%s]" % region
+            samples = sum([count for stack, count in self.stacks.items()
+                           if marker in stack.split(";")])
+
+            if samples:
+                regionSamples[region] = samples
+
+        return regionSamples
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        self.stacks = dict()
+        self.samples = 0
+        self.startTime = time.time()
+        self.stopTime = None
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sampleLoop)
+        self._thread.daemon = True
+        self._thread.start()
+
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI:
+            self.logger.info("profiler start, %s" % self.fileName)
+
+    def stop(self):
+        """ Stop sampling and write profile, returns summary lines
+        """
+        if self._thread is None:
+            return []
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.stopTime = time.time()
+
+        self.write()
+
+        summary = ["profile %d samples in %.1f s written to %s" % (
+            self.samples, self.stopTime - self.startTime, self.fileName)]
+
+        # percent of sample times, a region running in two threads at the
+        # same time counts twice
+        regionSamples = self.regionSamples()
+        for region in sorted(regionSamples.keys()):
+            summary.append("    %-14s %6.2f%%" % (
+                region, 100.0 * regionSamples[region] /
+                max(self.samples, 1)))
+
+        return summary
+
+    def write(self):
+        try:
+            with open(self.fileName, 'w') as f:
+                for stack in sorted(self.stacks.keys()):
+                    f.write("%s %d\n" % (stack, self.stacks[stack]))
+
+        except IOError, e:
+            self.logger.error("can't write profile %s, %s" % (
+                self.fileName, str(e)))
@@ -0,0 +1,119 @@
+"""----------------------------------------------------------------------------
+   serial_capture.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import struct
+import threading
+import time
+
+""" Capture file format
+
+    "GSATCAP1" magic, followed by records:
+
+        header: little endian double time, unsigned char type, unsigned int
+        data length, followed by data bytes
+
+    Each port open starts a session with a REC_OPEN record, its time is
+    the wall clock time and its data the port name. TX and RX records
+    time is seconds since session open, never decreasing. Sessions are
+    appended, one file can hold several connects.
+"""
+CAPTURE_MAGIC = "GSATCAP1"
+
+REC_OPEN = 0
+REC_TX = 1
+REC_RX = 2
+
+REC_NAMES = {REC_OPEN: "open", REC_TX: "tx", REC_RX: "rx"}
+
+recordHeader = struct.Struct("<dBI")
+
+
+class SerialCapture(object):
+    """ Writes every chunk sent to and read from the port to a capture file
+    """
+
+    def __init__(self, file_name, port_name):
+        self.fileName = file_name
+
+        self._lock = threading.Lock()
+        self._file = open(file_name, 'ab')
+
+        if self._file.tell() == 0:
+            self._file.write(CAPTURE_MAGIC)
+
+        self._startTime = time.time()
+        self._lastTime = 0.0
+
+        self._write(REC_OPEN, self._startTime, str(port_name))
+
+    def _write(self, rec_type, rec_time, data):
+        self._file.write(recordHeader.pack(rec_time, rec_type, len(data)))
+        self._file.write(data)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def write(self, rec_type, data):
+        with self._lock:
+            if self._file is None:
+                return
+
+            # wall clock can step back, keep record times in order
+            recTime = max(time.time() - self._startTime, self._lastTime)
+            self._lastTime = recTime
+
+            self._write(rec_type, recTime, data)
+
+    def rx(self, data):
+        self.write(REC_RX, data)
+
+    def tx(self, data):
+        self.write(REC_TX, data)
+
+
+def read_capture(file_name):
+    """ Generator of (time, type, data) records, a record cut short (gsat
+        killed while capturing) ends the capture
+    """
+    with open(file_name, 'rb') as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError("%s is not a gsat capture file" % file_name)
+
+        while True:
+            header = f.read(recordHeader.size)
+
+            if len(header) < recordHeader.size:
+                break
+
+            recTime, recType, dataLen = recordHeader.unpack(header)
+            data = f.read(dataLen)
+
+            if len(data) < dataLen:
+                break
+
+            yield (recTime, recType, data)
@@ -24,6 +24,7 @@
 ----------------------------------------------------------------------------"""
 
 import os
+import select
 import serial
 import tty
 import threading
@@ -31,6 +32,9 @@ import time
 import logging
 
 import modules.config as gc
+import modules.serial_capture as sc
+import modules.socket_port as sp
+import modules.watchdog as wd
 
 
 def verbose_data_ascii(direction, data):
@@ -46,12 +50,36 @@ def verbose_data_hex(direction, data):
     )
 
 
+class VerboseData(object):
+    """ Serial trace log message, formatted when log writer thread outputs
+        it, not on the thread streaming data
+    """
+    __slots__ = ('formatter', 'direction', 'data')
+
+    def __init__(self, formatter, direction, data):
+        self.formatter = formatter
+        self.direction = direction
+        self.data = data
+
+    def __str__(self):
+        return self.formatter(self.direction, self.data)
+
+
+# longest wait for port data or events (seconds)
+SERIAL_WAIT_TIMEOUT = 0.5
+
+
 class SerialPortThread(threading.Thread, gc.EventQueueIf):
     """ Threads to send and monitor serial port for new data.
     """
 
-    def __init__(self, event_handler, port_name, port_baud):
-        """ Init serial class
+    # waited on with select() together with the port, so queued events
+    # (realtime commands first) wake the thread right away. None polls
+    wakeUpClass = gc.PipeWakeUp
+
+    def __init__(self, event_handler, port_name, port_baud, event_ids=None):
+        """ Init serial class, event_handler gets events with ids in
+            event_ids, or all events if None
         """
         threading.Thread.__init__(self)
         gc.EventQueueIf.__init__(self)
@@ -63,6 +91,14 @@ class SerialPortThread(threading.Thread, gc.EventQueueIf):
 
         self.rxBuffer = ""
 
+        # tx/rx capture file, while port is open
+        self.capture = None
+
+        # realtime latency stats, from UI event to port write (seconds)
+        self.rtWriteCount = 0
+        self.rtLatencyMax = 0.0
+        self.rtLatencySum = 0.0
+
         self.swState = gc.STATE_RUN
 
         self.logger = logging.getLogger()
@@ -71,11 +107,47 @@ class SerialPortThread(threading.Thread, gc.EventQueueIf):
             self.logger.info("init logging id:0x%x" % id(self))
 
         if event_handler is not None:
-            self.addEventListener(event_handler)
+            self.addEventListener(event_handler, event_ids)
+
+        if self.wakeUpClass is not None and os.name != 'nt':
+            self.setWakeUp(self.wakeUpClass())
 
         # start thread
         self.start()
 
+    def processPriorityQueue(self):
+        """ Realtime event handlers, these are written to the port ahead of
+            any pending bulk data
+        """
+        while not self._priorityEventQueue.empty():
+            e = self._priorityEventQueue.get()
+
+            if e.event_id == gc.EV_CMD_SER_TXDATA:
+                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_EV:
+                    self.logger.info("EV_CMD_SER_TXDATA (rt)")
+
+                self.serialWrite(e.data)
+
+                latency = time.time() - e.timestamp
+                self.rtWriteCount += 1
+                self.rtLatencySum += latency
+                if latency > self.rtLatencyMax:
+                    self.rtLatencyMax = latency
+
+                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_RT:
+                    self.logger.info("rt write [%s] latency %.3f ms" % (
+                        e.data.encode('string_escape'), latency * 1000))
+
+            elif e.event_id == gc.EV_CMD_SER_TXDATA_FLUSH:
+                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_EV:
+                    self.logger.info("EV_CMD_SER_TXDATA_FLUSH")
+
+                self.serialTxDataFlush()
+
+            else:
+                self.logger.error("EV_?? got unknown priority event!! [%s]" %
+                                  str(e.event_id))
+
     def processQueue(self):
         """ Event handlers
         """
@@ -83,51 +155,158 @@ class SerialPortThread(threading.Thread, gc.EventQueueIf):
         if not self._eventQueue.empty():
             # get item from queue
             e = self._eventQueue.get()
+            nextEvent = None
 
             if e.event_id == gc.EV_CMD_SER_TXDATA:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_EV:
-                    self.logger.info("EV_CMD_SER_TXDATA")
+                # back to back tx data goes out in one port write, fewer
+                # syscalls and on a socket fewer TCP segments
+                txData = [e.data]
 
-                self.serialWrite(e.data)
+                while not self._eventQueue.empty():
+                    nextEvent = self._eventQueue.get()
 
-            elif e.event_id == gc.EV_HELLO:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_EV:
-                    self.logger.info("EV_HELLO from 0x%x" % id(e.sender))
+                    if nextEvent.event_id != gc.EV_CMD_SER_TXDATA:
+                        break
 
-                self.addEventListener(e.sender)
+                    txData.append(nextEvent.data)
+                    nextEvent = None
 
-            elif e.event_id == gc.EV_GOODBY:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_EV:
-                    self.logger.info("EV_GOODBY from 0x%x" % id(e.sender))
+                # events are shared with other listeners, don't modify
+                e = gc.SimpleEvent(
+                    e.event_id, "".join(txData), e.sender, e.timestamp)
 
-                self.removeEventListener(e.sender)
+            self.processEvent(e)
 
-            elif e.event_id == gc.EV_CMD_EXIT:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_EV:
-                    self.logger.info("EV_CMD_EXIT")
+            if nextEvent is not None:
+                self.processEvent(nextEvent)
 
-                self.serialClose()
+    def processEvent(self, e):
+        """ Event handler
+        """
+        if e.event_id == gc.EV_CMD_SER_TXDATA:
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_EV:
+                self.logger.info("EV_CMD_SER_TXDATA")
+
+            self.serialWrite(e.data)
+
+        elif e.event_id == gc.EV_HELLO:
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_EV:
+                self.logger.info("EV_HELLO from 0x%x" % id(e.sender))
+
+            # data is list of event ids listener wants, None for all
+            self.addEventListener(e.sender, e.data)
+
+        elif e.event_id == gc.EV_GOODBY:
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_EV:
+                self.logger.info("EV_GOODBY from 0x%x" % id(e.sender))
+
+            self.removeEventListener(e.sender)
+
+        elif e.event_id == gc.EV_CMD_EXIT:
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_EV:
+                self.logger.info("EV_CMD_EXIT")
+
+            self.serialClose()
+
+            self.endThread = True
 
-                self.endThread = True
+        else:
+            # if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_EV:
+            self.logger.error("EV_?? got unknown event!! [%s]" %
+                              str(e.event_id))
+
+    def serialTxDataFlush(self):
+        """ Drop bulk data not yet written to the port, other events are
+            kept in order
+        """
+        keep = []
+        dropCount = 0
 
+        while not self._eventQueue.empty():
+            e = self._eventQueue.get()
+
+            if e.event_id == gc.EV_CMD_SER_TXDATA:
+                dropCount += 1
             else:
-                # if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_EV:
-                self.logger.error("EV_?? got unknown event!! [%s]" %
-                                  str(e.event_id))
+                keep.append(e)
+
+        for e in keep:
+            self._eventQueue.put(e)
+
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_RT:
+            self.logger.info("flush dropped %d pending tx data" % dropCount)
+
+    def captureOpen(self, port):
+        """ Start capturing port traffic, capture problems don't stop the
+            port from opening
+        """
+        try:
+            self.capture = sc.SerialCapture(gc.SERIAL_CAPTURE_FILE, port)
+
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF:
+                self.logger.info("capture port traffic to %s" %
+                                 gc.SERIAL_CAPTURE_FILE)
+
+        except IOError, e:
+            self.capture = None
+            self.logger.error("can't open capture file: %s" % str(e))
 
     def serialClose(self):
         """ Close serial port
         """
         if self.serialPort is not None:
-            if self.serialPort.isOpen():
+            if self.serialPort.isOpen() or self.serialReconnecting():
                 # self.serialPort.flushInput()
                 self.serialPort.close()
 
+                if self.capture is not None:
+                    self.capture.close()
+                    self.capture = None
+
                 if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF:
                     self.logger.info("close serial port")
 
                 self.notifyEventListeners(gc.EV_SER_PORT_CLOSE, 0)
 
+    def serialLinkLost(self, e):
+        """ Socket port lost its connection and is reconnecting. Data sent
+            may or may not have reached the device, so nothing is sent
+            again: pending tx data is dropped and listeners see the port
+            close, which stops the program and resets buffer accounting
+        """
+        self.logger.error("** %s" % str(e))
+
+        self.rxBuffer = ""
+        self.serialTxDataFlush()
+
+        self.notifyEventListeners(gc.EV_SER_PORT_CLOSE, str(e))
+
+    def serialReconnecting(self):
+        """ True while socket port reconnects after a lost connection
+        """
+        return isinstance(self.serialPort, sp.SocketPort) and \
+            self.serialPort.isReconnecting()
+
+    def serialReconnect(self):
+        """ Advance socket port reconnect, doesn't block
+        """
+        try:
+            if self.serialPort.reconnectPoll():
+                self.rxBuffer = ""
+                self.notifyEventListeners(
+                    gc.EV_SER_PORT_OPEN, self.serialPortName)
+
+        except IOError, e:
+            exMsg = "** IOError exception: %s\n" % str(e)
+
+            # make sure we stop processing any states...
+            self.swState = gc.STATE_ABORT
+
+            self.logger.error(exMsg.strip())
+
+            self.notifyEventListeners(gc.EV_ABORT, exMsg)
+            self.serialClose()
+
     def serialOpen(self):
         """ Open serial port
         """
@@ -141,19 +320,23 @@ class SerialPortThread(threading.Thread, gc.EventQueueIf):
 
         if port != "None":
             portName = port
-            if os.name == 'nt':
+            if os.name == 'nt' and not sp.is_socket_port(port):
                 portName = r"\\.\%s" % (str(port))
 
             try:
-                self.serialPort = serial.Serial(port=portName,
-                                                baudrate=baud,
-                                                timeout=0.001,
-                                                bytesize=serial.EIGHTBITS,
-                                                parity=serial.PARITY_NONE,
-                                                stopbits=serial.STOPBITS_ONE,
-                                                xonxoff=False,
-                                                rtscts=False,
-                                                dsrdtr=False)
+                if sp.is_socket_port(port):
+                    self.serialPort = sp.SocketPort(portName)
+                else:
+                    self.serialPort = serial.Serial(
+                        port=portName,
+                        baudrate=baud,
+                        timeout=0.001,
+                        bytesize=serial.EIGHTBITS,
+                        parity=serial.PARITY_NONE,
+                        stopbits=serial.STOPBITS_ONE,
+                        xonxoff=False,
+                        rtscts=False,
+                        dsrdtr=False)
 
             except serial.SerialException, e:
                 exMsg = "** PySerial exception: %s\n" % str(e)
@@ -172,8 +355,18 @@ class SerialPortThread(threading.Thread, gc.EventQueueIf):
             #     exMsg = "** Unexpected exception: %s\n" % str(e)
             #     exFlag = True
 
+            if self.serialPort is not None and self.serialPort.isOpen() and \
+               gc.SERIAL_CAPTURE_FILE is not None:
+                self.captureOpen(port)
+
             if self.serialPort is not None:
-                if self.serialPort.isOpen():
+                if self.serialPort.isOpen() and sp.is_socket_port(port):
+                    if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF:
+                        self.logger.info("open socket port [%s]" % portName)
+
+                    self.notifyEventListeners(gc.EV_SER_PORT_OPEN, port)
+
+                elif self.serialPort.isOpen():
                     # change tty mode, this is strange and not doing it
                     # was causing issues reconnecting to GRBL if disconnected
                     # because exception, it was fine other wise.
@@ -222,8 +415,12 @@ class SerialPortThread(threading.Thread, gc.EventQueueIf):
                 # # then "+="
                 # serialData = self.serialPort.readline()
                 # self.rxBuffer += self.serialPort.read(inDataCnt)
-                self.rxBuffer = "".join(
-                    [self.rxBuffer, self.serialPort.read(inDataCnt)])
+                rxData = self.serialPort.read(inDataCnt)
+
+                if self.capture is not None:
+                    self.capture.rx(rxData)
+
+                self.rxBuffer = "".join([self.rxBuffer, rxData])
 
                 while '\n' in self.rxBuffer:
                     serialData, self.rxBuffer = self.rxBuffer.split('\n', 1)
@@ -232,23 +429,26 @@ class SerialPortThread(threading.Thread, gc.EventQueueIf):
                         if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF:
 
                             if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_HEX:
-                                self.logger.info(verbose_data_hex("<-",
-                                                 serialData))
+                                self.logger.info(VerboseData(
+                                    verbose_data_hex, "<-", serialData))
 
                             elif (gc.VERBOSE_MASK &
                                   gc.VERBOSE_MASK_SERIALIF_STR):
-                                self.logger.info(verbose_data_ascii("<-",
-                                                 serialData))
+                                self.logger.info(VerboseData(
+                                    verbose_data_ascii, "<-", serialData))
 
                         self.notifyEventListeners(gc.EV_SER_RXDATA,
                                                   "%s\n" % serialData)
 
-                        # attempt to reduce starvation on other threads
-                        # when serial traffic is constant
-                        time.sleep(0.01)
+                        # don't let a realtime command wait behind
+                        # constant rx traffic
+                        self.processPriorityQueue()
 
                 inDataCnt = self.serialPort.inWaiting()
 
+        except sp.SocketLinkLost, e:
+            self.serialLinkLost(e)
+
         except serial.SerialException, e:
             exMsg = "** PySerial exception: %s\n" % e.message
             exFlag = True
@@ -277,6 +477,40 @@ class SerialPortThread(threading.Thread, gc.EventQueueIf):
             self.notifyEventListeners(gc.EV_ABORT, exMsg)
             self.serialClose()
 
+    def waitForWork(self, heartbeat):
+        """ Block until port has data or an event is queued, returns right
+            away if events are pending
+        """
+        if not self._priorityEventQueue.empty() or \
+           not self._eventQueue.empty():
+            return
+
+        if self._wakeUp is None:
+            time.sleep(0.01)
+            return
+
+        timeout = SERIAL_WAIT_TIMEOUT
+        rlist = [self._wakeUp]
+
+        if self.serialReconnecting():
+            timeout = sp.RECONNECT_POLL_PERIOD
+
+        elif self.swState == gc.STATE_RUN and self.serialPort.isOpen():
+            rlist.append(self.serialPort)
+
+        # waiting for work is not a stall
+        heartbeat.idle()
+
+        try:
+            select.select(rlist, [], [], timeout)
+        except (select.error, ValueError):
+            # port closed under us, serialRead will report it
+            pass
+
+        heartbeat.beat()
+
+        self._wakeUp.clear()
+
     def serialWrite(self, serialData):
         exFlag = False
         exMsg = ""
@@ -290,14 +524,22 @@ class SerialPortThread(threading.Thread, gc.EventQueueIf):
                 # send command
                 if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF:
                     if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_HEX:
-                        self.logger.info(verbose_data_hex("->", serialData))
+                        self.logger.info(VerboseData(
+                            verbose_data_hex, "->", serialData))
 
                     elif (gc.VERBOSE_MASK &
                           gc.VERBOSE_MASK_SERIALIF_STR):
-                        self.logger.info(verbose_data_ascii("->", serialData))
+                        self.logger.info(VerboseData(
+                            verbose_data_ascii, "->", serialData))
 
                 self.serialPort.write(serialData)
 
+                if self.capture is not None:
+                    self.capture.tx(serialData)
+
+            except sp.SocketLinkLost, e:
+                self.serialLinkLost(e)
+
             except serial.SerialException, e:
                 exMsg = "** PySerial exception: %s\n" % e.message
                 exFlag = True
@@ -336,7 +578,13 @@ class SerialPortThread(threading.Thread, gc.EventQueueIf):
 
         self.serialOpen()
 
+        heartbeat = wd.STALL_WATCHDOG.heartbeat("serial", self)
+
         while (not self.endThread) and (self.serialPort is not None):
+            heartbeat.beat()
+
+            # realtime commands go first, ahead of any bulk data
+            self.processPriorityQueue()
 
             # process input queue for new commands or actions
             self.processQueue()
@@ -360,6 +608,8 @@ class SerialPortThread(threading.Thread, gc.EventQueueIf):
 
                     self.notifyEventListeners(gc.EV_ABORT, exMsg)
                     break
+            elif self.serialReconnecting():
+                self.serialReconnect()
             else:
                 message = "serial port is close, terminating.\n"
 
@@ -374,7 +624,22 @@ class SerialPortThread(threading.Thread, gc.EventQueueIf):
                 # wx.LogMessage(message)
                 break
 
-            time.sleep(0.01)
+            self.waitForWork(heartbeat)
+
+        heartbeat.close()
+
+        if self._wakeUp is not None:
+            wakeUp = self._wakeUp
+            self.setWakeUp(None)
+            wakeUp.close()
+
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF_RT and \
+           self.rtWriteCount:
+            self.logger.info("rt writes: %d, latency avg %.3f ms, "
+                             "max %.3f ms" % (
+                                self.rtWriteCount,
+                                self.rtLatencySum * 1000 / self.rtWriteCount,
+                                self.rtLatencyMax * 1000))
 
         if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF:
             self.logger.info("thread exit")
@@ -0,0 +1,256 @@
+"""----------------------------------------------------------------------------
+   socket_port.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import errno
+import logging
+import select
+import socket
+import time
+
+import modules.config as gc
+
+# port name prefix for networked controllers, "tcp://host:port"
+TCP_PORT_PREFIX = "tcp://"
+
+# connect and write timeout (seconds)
+SOCKET_TIMEOUT = 5.0
+
+# wait before each reconnect attempt (seconds), one attempt per entry
+RECONNECT_BACKOFF = [0.1, 0.2, 0.5, 1.0, 2.0, 4.0]
+
+# longest wait of a caller that polls a reconnect in progress (seconds)
+RECONNECT_POLL_PERIOD = 0.05
+
+
+class SocketLinkLost(IOError):
+    """ Connection lost, port is reconnecting. Data written before may or
+        may not have reached the device.
+    """
+    pass
+
+
+def is_socket_port(port_name):
+    """ True if port name selects the TCP transport
+    """
+    return str(port_name).lower().startswith(TCP_PORT_PREFIX)
+
+
+def parse_socket_port(port_name):
+    """ "tcp://host:port" -> (host, port)
+    """
+    address = str(port_name)[len(TCP_PORT_PREFIX):].strip("/")
+    host, sep, port = address.rpartition(":")
+
+    if not sep or not host or not port.isdigit():
+        raise ValueError("invalid port [%s], expected tcp://host:port" %
+                         port_name)
+
+    return (host.strip("[]"), int(port))
+
+
+class SocketPort(object):
+    """ TCP connection with the subset of the pyserial Serial API used by
+        SerialPortThread, for controllers behind ser2net (raw mode) or with
+        network firmware. Nagle is off so each write goes out right away.
+        A lost connection raises SocketLinkLost, nothing is sent again;
+        reconnectPoll() then reconnects with backoff without blocking.
+    """
+
+    def __init__(self, port_name, timeout=SOCKET_TIMEOUT):
+        try:
+            self.address = parse_socket_port(port_name)
+        except ValueError, e:
+            raise IOError(str(e))
+
+        self.portName = port_name
+        self.timeout = timeout
+        self.sock = None
+        self.rxBuffer = ""
+        self.reconnectCount = 0
+        self.reconnectBackoff = RECONNECT_BACKOFF
+
+        # reconnect in progress, connecting socket, next attempt and time
+        self._reconnecting = False
+        self._pendingSock = None
+        self._attempt = 0
+        self._attemptTime = 0
+
+        self.logger = logging.getLogger()
+
+        self.connect()
+
+    def _connected(self, sock):
+        sock.settimeout(self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+        self.sock = sock
+        self.rxBuffer = ""
+
+    def _linkLost(self, reason):
+        """ Drop connection and start reconnecting, raises SocketLinkLost
+        """
+        self.logger.error("%s connection lost (%s), reconnecting" % (
+            self.portName, reason))
+
+        self.close()
+
+        self._reconnecting = True
+        self._attempt = 0
+        self._attemptTime = time.time() + self.reconnectBackoff[0]
+
+        raise SocketLinkLost("%s connection lost (%s)" % (
+            self.portName, reason))
+
+    def _nextAttempt(self, reason):
+        if self._pendingSock is not None:
+            self._pendingSock.close()
+            self._pendingSock = None
+
+        self._attempt += 1
+
+        if self._attempt >= len(self.reconnectBackoff):
+            self._reconnecting = False
+            raise IOError("%s connection lost (%s)" % (
+                self.portName, reason))
+
+        self._attemptTime = time.time() + self.reconnectBackoff[self._attempt]
+
+    def connect(self):
+        self._connected(socket.create_connection(self.address, self.timeout))
+
+    def reconnectPoll(self):
+        """ Advance reconnect without blocking, True once connected again.
+            IOError when all attempts failed.
+        """
+        if not self._reconnecting:
+            return self.sock is not None
+
+        if self._pendingSock is None:
+            if time.time() < self._attemptTime:
+                return False
+
+            try:
+                family, socktype, proto, name, address = \
+                    socket.getaddrinfo(self.address[0], self.address[1],
+                                       0, socket.SOCK_STREAM)[0]
+                sock = socket.socket(family, socktype, proto)
+
+            except socket.error, e:
+                self._nextAttempt(str(e))
+                return False
+
+            sock.setblocking(0)
+            rc = sock.connect_ex(address)
+
+            if rc not in [0, errno.EINPROGRESS, errno.EWOULDBLOCK]:
+                sock.close()
+                self._nextAttempt(errno.errorcode.get(rc, str(rc)))
+                return False
+
+            self._pendingSock = sock
+
+        if not select.select([], [self._pendingSock], [], 0)[1]:
+            return False
+
+        sock, self._pendingSock = self._pendingSock, None
+        rc = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+
+        if rc != 0:
+            self._pendingSock = sock
+            self._nextAttempt(errno.errorcode.get(rc, str(rc)))
+            return False
+
+        self._connected(sock)
+        self._reconnecting = False
+        self.reconnectCount += 1
+
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_SERIALIF:
+            self.logger.info("%s reconnected" % self.portName)
+
+        return True
+
+    def isOpen(self):
+        return self.sock is not None
+
+    def isReconnecting(self):
+        return self._reconnecting
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def write(self, data):
+        if self.sock is None:
+            raise IOError("%s not connected" % self.portName)
+
+        try:
+            self.sock.sendall(data)
+
+        except socket.error, e:
+            # part of data may have been sent, never send it again
+            self._linkLost(str(e))
+
+        return len(data)
+
+    def inWaiting(self):
+        if self.sock is None:
+            return 0
+
+        if not self.rxBuffer and \
+           select.select([self.sock], [], [], 0)[0]:
+
+            try:
+                data = self.sock.recv(4096)
+
+            except socket.error, e:
+                self._linkLost(str(e))
+
+            if not data:
+                self._linkLost("closed by peer")
+
+            self.rxBuffer = data
+
+        return len(self.rxBuffer)
+
+    def read(self, size=1):
+        data = self.rxBuffer[:size]
+        self.rxBuffer = self.rxBuffer[size:]
+        return data
+
+    def close(self):
+        self._reconnecting = False
+
+        if self._pendingSock is not None:
+            self._pendingSock.close()
+            self._pendingSock = None
+
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+            self.sock.close()
+            self.sock = None
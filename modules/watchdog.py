@@ -0,0 +1,280 @@
+"""----------------------------------------------------------------------------
+   watchdog.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import atexit
+import logging
+import sys
+import threading
+import time
+import traceback
+
+import modules.config as gc
+
+# loop gap or event queue wait that counts as a stall (seconds), used when
+# there is no config
+STALL_THRESHOLD = 0.25
+
+# device acknowledge wait that gets reported (seconds), used when there is
+# no config
+ACK_WAIT_THRESHOLD = 5.0
+
+
+class Heartbeat(object):
+    """ Loop heartbeat of one thread. Loop calls beat() every time around
+        and idle() before waiting for work, a wait for work is not a stall.
+        If the thread owns an event queue, events waiting in it longer than
+        the threshold are a stall too. A wait for device acknowledge is
+        tracked apart from that, ackWait() to ackDone(), it idles while
+        waiting for work but is reported once it takes too long.
+    """
+
+    def __init__(self, watchdog, name, event_queue_if=None):
+        self.watchdog = watchdog
+        self.name = name
+        self.threadId = threading.current_thread().ident
+        self.eventQueueIf = event_queue_if
+
+        self.lastBeat = time.time()
+        self.ackWaitStart = None
+
+        # kept by watchdog thread
+        self.stalls = 0
+        self.stallStart = None
+        self.maxStall = 0.0
+        self.ackWaits = 0
+        self.ackWaitReported = None
+
+    def beat(self):
+        self.lastBeat = time.time()
+
+    def idle(self):
+        self.lastBeat = None
+
+    def ackWait(self):
+        self.ackWaitStart = time.time()
+
+    def ackDone(self):
+        self.ackWaitStart = None
+
+    def close(self):
+        self.watchdog.remove(self)
+
+    def oldestEventWait(self, now):
+        """ How long oldest queued event has been waiting, 0 if none
+        """
+        if self.eventQueueIf is None:
+            return 0.0
+
+        queue = self.eventQueueIf._eventQueue
+
+        with queue.mutex:
+            if not queue.queue:
+                return 0.0
+
+            return now - queue.queue[0].timestamp
+
+
+class StallWatchdog(object):
+    """ Checks heartbeats from its own thread, logs stalls with the stack
+        of the stalled thread and counts them per heartbeat
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger()
+
+        self.heartbeats = []
+        self.stallListeners = []
+        self.threshold = STALL_THRESHOLD
+        self.ackWaitThreshold = ACK_WAIT_THRESHOLD
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _checkAckWait(self, hb, now):
+        """ Report each acknowledge wait longer than threshold once
+        """
+        ackWaitStart = hb.ackWaitStart
+
+        if ackWaitStart is None or hb.ackWaitReported == ackWaitStart or \
+           now - ackWaitStart <= self.ackWaitThreshold:
+            return False
+
+        hb.ackWaitReported = ackWaitStart
+        hb.ackWaits += 1
+
+        self.logger.error("%s waiting for device acknowledge for %.3f s" % (
+            hb.name, now - ackWaitStart))
+
+        return True
+
+    def _check(self, hb, now):
+        gap = 0.0
+        lastBeat = hb.lastBeat
+        if lastBeat is not None:
+            gap = now - lastBeat
+
+        wait = hb.oldestEventWait(now)
+
+        if gap > self.threshold or wait > self.threshold:
+            if hb.stallStart is None:
+                hb.stallStart = now - max(gap, wait)
+                hb.stalls += 1
+
+                if gap > self.threshold:
+                    cause = "no loop heartbeat for %.3f s" % gap
+                else:
+                    cause = "event waiting in queue for %.3f s" % wait
+
+                self.logger.error("stall in %s, %s, stack:\n%s" % (
+                    hb.name, cause, self.threadStack(hb.threadId)))
+
+                return True
+
+        elif hb.stallStart is not None:
+            duration = now - hb.stallStart
+            hb.stallStart = None
+            hb.maxStall = max(hb.maxStall, duration)
+
+            self.logger.info("stall in %s ended after %.3f s" % (
+                hb.name, duration))
+
+        return False
+
+    def _watchLoop(self):
+        while not self._stop.wait(self.threshold / 2):
+            with self._lock:
+                heartbeats = list(self.heartbeats)
+
+            now = time.time()
+            newStall = False
+
+            for hb in heartbeats:
+                if self._check(hb, now):
+                    newStall = True
+
+                if self._checkAckWait(hb, now):
+                    newStall = True
+
+            if newStall:
+                counts = self.stallCounts()
+
+                for listener in list(self.stallListeners):
+                    listener(counts)
+
+    def addStallListener(self, listener):
+        """ listener(stall counts) called from watchdog thread on every new
+            stall
+        """
+        self.stallListeners.append(listener)
+
+    def removeStallListener(self, listener):
+        if listener in self.stallListeners:
+            self.stallListeners.remove(listener)
+
+    def heartbeat(self, name, event_queue_if=None):
+        """ New heartbeat for calling thread, watchdog thread starts with
+            first one
+        """
+        hb = Heartbeat(self, name, event_queue_if)
+
+        with self._lock:
+            self.heartbeats.append(hb)
+
+            if self._thread is None or not self._thread.isAlive():
+                if gc.CONFIG_DATA is not None:
+                    self.threshold = gc.CONFIG_DATA.get(
+                        '/mainApp/StallThreshold', 250) / 1000.0
+                    self.ackWaitThreshold = gc.CONFIG_DATA.get(
+                        '/mainApp/AckWaitThreshold', 5000) / 1000.0
+
+                self._thread = threading.Thread(target=self._watchLoop)
+                self._thread.daemon = True
+                self._thread.start()
+
+        return hb
+
+    def stop(self):
+        """ Stop watchdog thread, next heartbeat starts it again
+        """
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+            self._stop.clear()
+
+    def remove(self, hb):
+        with self._lock:
+            if hb in self.heartbeats:
+                self.heartbeats.remove(hb)
+
+    def stallCounts(self):
+        """ dict of heartbeat name to stalls, long acknowledge waits count
+            under "<name> ack"
+        """
+        counts = dict()
+
+        with self._lock:
+            for hb in self.heartbeats:
+                counts[hb.name] = hb.stalls
+
+                if hb.ackWaits:
+                    counts["%s ack" % hb.name] = hb.ackWaits
+
+        return counts
+
+    def threadStack(self, thread_id):
+        frame = sys._current_frames().get(thread_id)
+
+        if frame is None:
+            return "    thread gone\n"
+
+        return "".join(traceback.format_stack(frame))
+
+
+# one per process
+STALL_WATCHDOG = StallWatchdog()
+
+
+def after_fork():
+    """ Call first thing in a forked child process, heartbeats and
+        listeners of the parent threads don't belong to the child
+    """
+    global STALL_WATCHDOG
+
+    STALL_WATCHDOG = StallWatchdog()
+
+
+def stop_at_exit():
+    """ Watchdog thread is a daemon, stop it before interpreter tear down
+        pulls modules from under it
+    """
+    STALL_WATCHDOG.stop()
+
+
+atexit.register(stop_at_exit)
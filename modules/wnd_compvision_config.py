@@ -28,6 +28,7 @@ import Queue
 import time
 import wx
 from wx.lib import scrolledpanel as scrolled
+from wx.lib.agw import floatspin as fs
 
 import modules.config as gc
 
@@ -65,7 +66,7 @@ class gsatCV2SettingsPanel(scrolled.ScrolledPanel):
 
     def InitUI(self):
         vBoxSizer = wx.BoxSizer(wx.VERTICAL)
-        flexGridSizer = wx.FlexGridSizer(7, 2)
+        flexGridSizer = wx.FlexGridSizer(8, 2)
 
         # Add enable check box
         # , style=wx.ALIGN_RIGHT)
@@ -147,6 +148,39 @@ class gsatCV2SettingsPanel(scrolled.ScrolledPanel):
         st = wx.StaticText(self, wx.ID_ANY, "CV2 Capture Height")
         flexGridSizer.Add(st, flag=wx.ALIGN_LEFT | wx.ALIGN_CENTER_VERTICAL)
 
+        # Add float spin ctrls for crosshair offset from tool
+        self.fsOffsetX = fs.FloatSpin(
+            self, -1, min_val=-99999, max_val=99999, increment=0.1,
+            value=self.configData.get('/cv2/CrosshairOffsetX'),
+            size=(-1, -1), agwStyle=fs.FS_LEFT)
+        self.fsOffsetX.SetFormat("%f")
+        self.fsOffsetX.SetDigits(4)
+        self.fsOffsetX.SetToolTip(
+            wx.ToolTip("Crosshair X position relative to tool"))
+        flexGridSizer.Add(
+            self.fsOffsetX, flag=wx.ALL | wx.LEFT | wx.ALIGN_CENTER_VERTICAL,
+            border=5
+        )
+
+        st = wx.StaticText(self, wx.ID_ANY, "CV2 Crosshair Offset X")
+        flexGridSizer.Add(st, flag=wx.ALIGN_LEFT | wx.ALIGN_CENTER_VERTICAL)
+
+        self.fsOffsetY = fs.FloatSpin(
+            self, -1, min_val=-99999, max_val=99999, increment=0.1,
+            value=self.configData.get('/cv2/CrosshairOffsetY'),
+            size=(-1, -1), agwStyle=fs.FS_LEFT)
+        self.fsOffsetY.SetFormat("%f")
+        self.fsOffsetY.SetDigits(4)
+        self.fsOffsetY.SetToolTip(
+            wx.ToolTip("Crosshair Y position relative to tool"))
+        flexGridSizer.Add(
+            self.fsOffsetY, flag=wx.ALL | wx.LEFT | wx.ALIGN_CENTER_VERTICAL,
+            border=5
+        )
+
+        st = wx.StaticText(self, wx.ID_ANY, "CV2 Crosshair Offset Y")
+        flexGridSizer.Add(st, flag=wx.ALIGN_LEFT | wx.ALIGN_CENTER_VERTICAL)
+
         vBoxSizer.Add(flexGridSizer, 0, flag=wx.ALL | wx.EXPAND, border=20)
         self.SetSizer(vBoxSizer)
 
@@ -157,5 +191,9 @@ class gsatCV2SettingsPanel(scrolled.ScrolledPanel):
         self.configData.set('/cv2/CapturePeriod', self.scPeriod.GetValue())
         self.configData.set('/cv2/CaptureWidth', self.scWidth.GetValue())
         self.configData.set('/cv2/CaptureHeight', self.scHeight.GetValue())
+        self.configData.set(
+            '/cv2/CrosshairOffsetX', self.fsOffsetX.GetValue())
+        self.configData.set(
+            '/cv2/CrosshairOffsetY', self.fsOffsetY.GetValue())
 
 
@@ -364,7 +364,10 @@ class gsatGcodeStcStyledTextCtrl(gsatStcStyledTextCtrl):
         self.markerPC = 0
         self.markerBreakpoint = 1
         self.markerCaretLine = 2
+        self.markerExecPC = 3
         self.MarkerDefine(self.markerPC, stc.STC_MARK_ARROW, "BLACK", "GREEN")
+        self.MarkerDefine(
+            self.markerExecPC, stc.STC_MARK_SHORTARROW, "BLACK", "ORANGE")
         self.MarkerDefine(
             self.markerBreakpoint, stc.STC_MARK_CIRCLE, "BLACK", "RED")
         self.MarkerDefine(
@@ -372,7 +375,8 @@ class gsatGcodeStcStyledTextCtrl(gsatStcStyledTextCtrl):
             self.configCaretLineForeground, self.configCaretLineBackground)
 
         self.SetMarginMask(1, pow(2, self.markerBreakpoint))
-        self.SetMarginMask(2, pow(2, self.markerPC))
+        self.SetMarginMask(
+            2, pow(2, self.markerPC) | pow(2, self.markerExecPC))
 
         self.SetLexer(stc.STC_LEX_CONTAINER)
 
@@ -517,6 +521,15 @@ class gsatGcodeStcStyledTextCtrl(gsatStcStyledTextCtrl):
             if self.autoScroll:
                 self.GotoLine(pc)
 
+    def UpdateExecPC(self, pc):
+        """ executing line marker, sent line marker (PC) may be ahead
+            while device queue is full
+        """
+        self.MarkerDeleteAll(self.markerExecPC)
+
+        if pc > -1:
+            self.MarkerAdd(pc, self.markerExecPC)
+
     def GoToPC(self):
         pc = self.MarkerLineFromHandle(self.handlePC)
 
@@ -57,6 +57,9 @@ class gsatJoggingPanel(wx.ScrolledWindow):
         self.machPosB = 0
         self.machPosC = 0
 
+        # machine position, when device reports it (mpo[xyzabc])
+        self.machMPos = dict()
+
         self.memoX = gc.ZERO_STRING
         self.memoY = gc.ZERO_STRING
         self.memoZ = gc.ZERO_STRING
@@ -80,6 +83,7 @@ class gsatJoggingPanel(wx.ScrolledWindow):
 
         self.keyCache = None
         self.jogInteractiveState = False
+        self.jogContinuousData = None
 
         self.numKeypadPendantKeys = [
             wx.WXK_NUMPAD_UP,
@@ -171,6 +175,12 @@ class gsatJoggingPanel(wx.ScrolledWindow):
         vPanelBoxSizer2.Add(
             joggingControls, 0, flag=wx.ALL | wx.EXPAND, border=5)
 
+        self.positionStatus = wx.StaticText(self, label="")
+        self.positionStatus.SetToolTip(
+            wx.ToolTip("Work (W) and machine (M) position"))
+        vPanelBoxSizer2.Add(
+            self.positionStatus, 0, flag=wx.LEFT | wx.RIGHT, border=5)
+
         utilControls = self.CreateUtilControls()
         vPanelBoxSizer2.Add(utilControls, 0, flag=wx.ALL | wx.EXPAND, border=5)
 
@@ -223,6 +233,14 @@ class gsatJoggingPanel(wx.ScrolledWindow):
             if z is not None:
                 self.machPosC = c
 
+            for axis in ['x', 'y', 'z']:
+                mpos = statusData.get('mpo%s' % axis)
+                if mpos is not None:
+                    self.machMPos[axis] = mpos
+
+            if x is not None or y is not None or z is not None:
+                self.UpdatePositionStatus()
+
             stat = statusData.get('stat')
             if stat is not None:
                 self.machStat = stat
@@ -287,6 +305,20 @@ class gsatJoggingPanel(wx.ScrolledWindow):
             for customButton in self.customButtonsObjDict:
                 customButton.Disable()
 
+    def UpdatePositionStatus(self):
+        """ Show work and machine position, machine position only if
+            device reports it
+        """
+        status = "W  X:%.3f  Y:%.3f  Z:%.3f" % (
+            self.machPosX, self.machPosY, self.machPosZ)
+
+        if len(self.machMPos):
+            status = "".join([status, "\nM  X:%.3f  Y:%.3f  Z:%.3f" % (
+                self.machMPos.get('x', 0), self.machMPos.get('y', 0),
+                self.machMPos.get('z', 0))])
+
+        self.positionStatus.SetLabel(status)
+
     def CreateJoggingControls(self):
         # Add Buttons ---------------------------------------------------------
         gbzJoggingGridSizer = wx.GridBagSizer(0, 0)
@@ -617,9 +649,17 @@ class gsatJoggingPanel(wx.ScrolledWindow):
         fAxisPos = self.stepSpinCtrl.GetValue()
 
         if self.configJogInteractive and self.jogInteractiveState:
-            # make this a very large number, we will jog will be
-            # cancel when user lets go of key
-            fAxisPos = 10000
+            # continuous jog, machine IF streams short jog moves until
+            # user lets go of key
+            self.jogContinuousData = {str(axis).lower(): 1 if opAdd else -1}
+
+            if not self.configJogRapid:
+                self.jogContinuousData['feed'] = \
+                    self.feedRateSpinCtrl.GetValue()
+
+            self.mainWindow.eventForward2Machif(
+                gc.EV_CMD_JOG_CONTINUOUS, self.jogContinuousData)
+            return
 
         if opAdd:
             pass
@@ -848,6 +888,12 @@ class gsatJoggingPanel(wx.ScrolledWindow):
 
     def OnKeyUp(self, e):
         # print "key up event"
+        # key released, stop continuous jog now instead of when key timer
+        # runs out
+        if self.jogInteractiveState:
+            self.keyTimer.Stop()
+            self.OnKeyTimer(e)
+
         e.Skip()
 
     def OnKeyDown(self, e):
@@ -863,6 +909,7 @@ class gsatJoggingPanel(wx.ScrolledWindow):
             gc_cmd = gc.EV_CMD_JOG_STOP
             self.mainWindow.eventForward2Machif(gc_cmd)
             self.jogInteractiveState = False
+            self.jogContinuousData = None
 
     def OnKeyPress(self, e):
         '''
@@ -890,6 +937,11 @@ class gsatJoggingPanel(wx.ScrolledWindow):
                 self.jogInteractiveState = True
             elif self.keyCache == key and self.jogInteractiveState:
                 self.keyTimer.Start(milliseconds=100, oneShot=True)
+
+                # key auto repeat keeps continuous jog alive
+                if self.jogContinuousData is not None:
+                    self.mainWindow.eventForward2Machif(
+                        gc.EV_CMD_JOG_CONTINUOUS, self.jogContinuousData)
                 return
             else:
                 if self.cmdLineOptions.vverbose:
@@ -244,6 +244,48 @@ class gsatJoggingSettingsPanel(scrolled.ScrolledPanel):
         hBoxSizer.Add(st, flag=wx.ALL | wx.ALIGN_CENTER_VERTICAL, border=5)
         vBoxSizer.Add(hBoxSizer, 0, flag=wx.LEFT | wx.EXPAND, border=20)
 
+        # height map probe grid
+        hBoxSizer = wx.BoxSizer(wx.HORIZONTAL)
+        self.probeGridClearanceSpinCtrl = fs.FloatSpin(self, -1,
+                                                       min_val=0, max_val=99999, increment=0.1,
+                                                       value=self.configData.get(
+                                                           '/jogging/ProbeGridClearance'),
+                                                       size=(-1, -1), agwStyle=fs.FS_LEFT)
+        self.probeGridClearanceSpinCtrl.SetFormat("%f")
+        self.probeGridClearanceSpinCtrl.SetDigits(6)
+        self.probeGridClearanceSpinCtrl.SetToolTip(wx.ToolTip(
+            "Z height of moves between height map points\n"
+            "Shift + mouse wheel = 2 * increment\n"
+            "Ctrl + mouse wheel = 10 * increment\n"
+            "Alt + mouse wheel = 100 * increment"))
+        hBoxSizer.Add(self.probeGridClearanceSpinCtrl, flag=wx.ALL |
+                      wx.ALIGN_CENTER_VERTICAL, border=5)
+        st = wx.StaticText(self, wx.ID_ANY, "Probe grid clearance")
+        hBoxSizer.Add(st, flag=wx.ALL | wx.ALIGN_CENTER_VERTICAL, border=5)
+        vBoxSizer.Add(hBoxSizer, 0, flag=wx.LEFT | wx.EXPAND, border=20)
+
+        hBoxSizer = wx.BoxSizer(wx.HORIZONTAL)
+        self.scProbeGridPointsX = wx.SpinCtrl(self, wx.ID_ANY, "")
+        self.scProbeGridPointsX.SetRange(2, 100)
+        self.scProbeGridPointsX.SetValue(
+            self.configData.get('/jogging/ProbeGridPointsX'))
+        hBoxSizer.Add(self.scProbeGridPointsX, flag=wx.ALL |
+                      wx.ALIGN_CENTER_VERTICAL, border=5)
+        st = wx.StaticText(self, wx.ID_ANY, "X")
+        hBoxSizer.Add(st, flag=wx.ALL | wx.ALIGN_CENTER_VERTICAL, border=5)
+        self.scProbeGridPointsY = wx.SpinCtrl(self, wx.ID_ANY, "")
+        self.scProbeGridPointsY.SetRange(2, 100)
+        self.scProbeGridPointsY.SetValue(
+            self.configData.get('/jogging/ProbeGridPointsY'))
+        self.scProbeGridPointsY.SetToolTip(wx.ToolTip(
+            "Height map points along X and Y, over the XY extents of the "
+            "program"))
+        hBoxSizer.Add(self.scProbeGridPointsY, flag=wx.ALL |
+                      wx.ALIGN_CENTER_VERTICAL, border=5)
+        st = wx.StaticText(self, wx.ID_ANY, "Probe grid points")
+        hBoxSizer.Add(st, flag=wx.ALL | wx.ALIGN_CENTER_VERTICAL, border=5)
+        vBoxSizer.Add(hBoxSizer, 0, flag=wx.LEFT | wx.EXPAND, border=20)
+
         vBoxSizer.AddSpacer(20)
 
         # Custom controls
@@ -323,6 +365,12 @@ class gsatJoggingSettingsPanel(scrolled.ScrolledPanel):
                             self.probeZMaxDistanceSpinCtrl.GetValue())
         self.configData.set('/jogging/ProbeFeedRate',
                             self.probeZFeedRateSpinCtrl.GetValue())
+        self.configData.set('/jogging/ProbeGridClearance',
+                            self.probeGridClearanceSpinCtrl.GetValue())
+        self.configData.set('/jogging/ProbeGridPointsX',
+                            self.scProbeGridPointsX.GetValue())
+        self.configData.set('/jogging/ProbeGridPointsY',
+                            self.scProbeGridPointsY.GetValue())
 
         self.configData.set('/jogging/JogInteractive',
                             self.cbJogInteractive.GetValue())
@@ -0,0 +1,102 @@
+"""----------------------------------------------------------------------------
+   wnd_lazy_panel.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import importlib
+import logging
+import time
+import wx
+
+import modules.config as gc
+
+
+class gsatLazyPanel(wx.Panel):
+    """ Place holder for a panel that is only built when first shown, its
+        module is imported at that time too. Stands in for the panel in
+        AUI panes and notebook pages, so names and layouts don't change.
+    """
+
+    def __init__(self, parent, module_name, class_name, *args, **kwargs):
+        wx.Panel.__init__(self, parent)
+
+        self.logger = logging.getLogger()
+
+        self.moduleName = module_name
+        self.className = class_name
+        self.panelArgs = args
+        self.panelKwargs = kwargs
+        self.panel = None
+
+        self.SetSizer(wx.BoxSizer(wx.VERTICAL))
+
+        self.Bind(wx.EVT_SHOW, self.OnShow)
+
+    def GetPanel(self):
+        """ Build panel if not done yet
+        """
+        if self.panel is None:
+            startTime = time.time()
+
+            module = importlib.import_module(self.moduleName)
+            panelClass = getattr(module, self.className)
+
+            self.panel = panelClass(
+                self, *self.panelArgs, **self.panelKwargs)
+
+            self.GetSizer().Add(self.panel, 1, flag=wx.EXPAND)
+            self.Layout()
+
+            if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI:
+                self.logger.info("lazy panel %s.%s built in %.3f s" % (
+                    self.moduleName, self.className,
+                    time.time() - startTime))
+
+        return self.panel
+
+    def IsBuilt(self):
+        return self.panel is not None
+
+    def OnShow(self, e):
+        if e.GetShow() and self.panel is None:
+            self.GetPanel()
+
+        elif self.panel is not None:
+            # panel is what used to get shown and hidden, let it know
+            showEvent = wx.ShowEvent(self.panel.GetId(), e.GetShow())
+            showEvent.SetEventObject(self.panel)
+            self.panel.GetEventHandler().ProcessEvent(showEvent)
+
+        e.Skip()
+
+    def UpdateConfigData(self):
+        if self.panel is not None:
+            self.panel.UpdateConfigData()
+
+    def UpdateSettings(self, config_data):
+        if self.panel is not None:
+            self.panel.UpdateSettings(config_data)
+
+    def UpdateUI(self, state_data, status_data=None):
+        if self.panel is not None:
+            self.panel.UpdateUI(state_data, status_data)
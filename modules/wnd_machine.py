@@ -52,6 +52,9 @@ class gsatMachineStatusPanel(wx.ScrolledWindow):
 
         self.machineDataColor = wx.RED
 
+        # last known overrides feed, rapid, spindle
+        self.overrides = [100, 100, 100]
+
         self.InitConfig()
 
         self.InitUI()
@@ -80,6 +83,10 @@ class gsatMachineStatusPanel(wx.ScrolledWindow):
         self.configDroFontSize = self.configData.get('/machine/DRO/FontSize')
         self.configDroFontStyle = self.configData.get('/machine/DRO/FontStyle')
 
+        # shown with every status update, resolve once per settings change
+        self.configMachIfName = mi.GetMachIfName(
+            mi.GetMachIfId(self.configData.get('/machine/Device')))
+
     def test(self):
         print self.GetClientSize()
         print self.sDroBoxSz.ComputeFittingWindowSize(self)
@@ -217,6 +224,10 @@ class gsatMachineStatusPanel(wx.ScrolledWindow):
             if rtime is not None:
                 self.runTimeStatus.SetLabel(rtime)
 
+            stalls = statusData.get('stalls')
+            if stalls is not None:
+                self.stallStatus.SetLabel(stalls)
+
             if self.configDroEnX:
                 x = statusData.get('posx')
                 if x is not None:
@@ -260,7 +271,31 @@ class gsatMachineStatusPanel(wx.ScrolledWindow):
 
             ib = statusData.get('ib')
             if ib is not None:
-                self.bufferStatus.SetLabel("%d/%d" % (ib[1], ib[0]))
+                ibsync = statusData.get('ibsync')
+                if ibsync:
+                    self.bufferStatus.SetLabel("%d/%d (resync %d)" % (
+                        ib[1], ib[0], ibsync))
+                else:
+                    self.bufferStatus.SetLabel("%d/%d" % (ib[1], ib[0]))
+
+            ovf = statusData.get('ovf')
+            if ovf is not None:
+                self.overrides = [
+                    ovf, statusData.get('ovr'), statusData.get('ovs')]
+                self.overrideStatus.SetLabel(
+                    "F:%d%% R:%d%% S:%d%%" % tuple(self.overrides))
+
+            mpos = []
+            for axis, enabled in [
+               ('x', self.configDroEnX), ('y', self.configDroEnY),
+               ('z', self.configDroEnZ), ('a', self.configDroEnA),
+               ('b', self.configDroEnB), ('c', self.configDroEnC)]:
+                pos = statusData.get('mpo%s' % axis)
+                if enabled and pos is not None:
+                    mpos.append("%s:%.3f" % (axis.upper(), pos))
+
+            if len(mpos):
+                self.machinePosStatus.SetLabel(" ".join(mpos))
 
         if stateData.serialPortIsOpen:
             # self.refreshButton.Enable()
@@ -273,10 +308,12 @@ class gsatMachineStatusPanel(wx.ScrolledWindow):
             # self.refreshButton.Disable()
             self.version.SetLabel("")
             self.bufferStatus.SetLabel("")
+            self.overrideStatus.SetLabel("")
+            self.machinePosStatus.SetLabel("")
             self.runStatus.SetValue("")
 
-        machIfId = mi.GetMachIfId(self.configData.get('/machine/Device'))
-        self.machIfStatus.SetLabel(mi.GetMachIfName(machIfId))
+        if self.machIfStatus.GetLabel() != self.configMachIfName:
+            self.machIfStatus.SetLabel(self.configMachIfName)
 
         self.Update()
 
@@ -418,7 +455,7 @@ class gsatMachineStatusPanel(wx.ScrolledWindow):
         sz.Add(fGridSizer, 0, flag=wx.EXPAND)
 
     def CreateStatusStaticBox(self, sz):
-        flexGridSizer = wx.FlexGridSizer(7, 2, 1, 5)
+        flexGridSizer = wx.FlexGridSizer(8, 2, 1, 5)
         sz.Add(flexGridSizer, 1, flag=wx.LEFT | wx.EXPAND, border=10)
 
         # set font properties
@@ -453,6 +490,24 @@ class gsatMachineStatusPanel(wx.ScrolledWindow):
         flexGridSizer.Add(st, 0, flag=wx.ALIGN_LEFT)
         flexGridSizer.Add(self.bufferStatus, 0, flag=wx.ALIGN_LEFT)
 
+        # Add MachIf overrides
+        st = wx.StaticText(self, label="Overrides")
+        st.SetFont(font)
+        self.overrideStatus = wx.StaticText(self, label="-")
+        self.overrideStatus.SetForegroundColour(self.machineDataColor)
+        self.overrideStatus.SetFont(font)
+        flexGridSizer.Add(st, 0, flag=wx.ALIGN_LEFT)
+        flexGridSizer.Add(self.overrideStatus, 0, flag=wx.ALIGN_LEFT)
+
+        # Add machine position, DRO shows work position
+        st = wx.StaticText(self, label="Machine pos")
+        st.SetFont(font)
+        self.machinePosStatus = wx.StaticText(self, label="-")
+        self.machinePosStatus.SetForegroundColour(self.machineDataColor)
+        self.machinePosStatus.SetFont(font)
+        flexGridSizer.Add(st, 0, flag=wx.ALIGN_LEFT)
+        flexGridSizer.Add(self.machinePosStatus, 0, flag=wx.ALIGN_LEFT)
+
         # Add Percent sent status
         st = wx.StaticText(self, label="G-code lines")
         st.SetFont(font)
@@ -471,5 +526,14 @@ class gsatMachineStatusPanel(wx.ScrolledWindow):
         flexGridSizer.Add(st, 0, flag=wx.ALIGN_LEFT)
         flexGridSizer.Add(self.runTimeStatus, 0, flag=wx.ALIGN_LEFT)
 
+        # Add stall counts, UI and machine interface threads
+        st = wx.StaticText(self, label="Stalls")
+        st.SetFont(font)
+        self.stallStatus = wx.StaticText(self, label="-")
+        self.stallStatus.SetForegroundColour(self.machineDataColor)
+        self.stallStatus.SetFont(font)
+        flexGridSizer.Add(st, 0, flag=wx.ALIGN_LEFT)
+        flexGridSizer.Add(self.stallStatus, 0, flag=wx.ALIGN_LEFT)
+
     def OnRefresh(self, e):
         self.mainWindow.GetMachineStatus()
@@ -30,6 +30,7 @@ import wx.propgrid as wxpg
 
 import modules.config as gc
 import modules.machif_config as mi
+import modules.socket_port as sp
 
 
 class gsatMachineSettingsPanel(scrolled.ScrolledPanel):
@@ -64,7 +65,7 @@ class gsatMachineSettingsPanel(scrolled.ScrolledPanel):
         st = wx.StaticText(self, label="Device")
         self.deviceComboBox = wx.ComboBox(
             self, -1, value=mi.GetMachIfName(self.machIfId),
-            choices=sorted(mi.MACHIF_LIST, key=str.lower),
+            choices=sorted(mi.GetMachIfList(), key=str.lower),
             style=wx.CB_DROPDOWN | wx.TE_PROCESS_ENTER | wx.CB_READONLY
         )
         flexGridSizer.Add(st, 0, flag=wx.ALIGN_CENTER_VERTICAL)
@@ -84,6 +85,9 @@ class gsatMachineSettingsPanel(scrolled.ScrolledPanel):
             self, -1, value=self.configData.get('/machine/Port'),
             choices=['None'], style=wx.CB_DROPDOWN | wx.TE_PROCESS_ENTER
         )
+        self.spComboBox.SetToolTip(wx.ToolTip(
+            "Serial port, or tcp://host:port for networked controllers "
+            "(ser2net raw mode, network firmware)"))
         flexGridSizer.Add(st, 0, flag=wx.ALIGN_CENTER_VERTICAL)
         flexGridSizer.Add(self.spComboBox, 1, flag=wx.EXPAND |
                           wx.ALIGN_CENTER_VERTICAL)
@@ -201,6 +205,47 @@ class gsatMachineSettingsPanel(scrolled.ScrolledPanel):
             "When enabled, If a line contains one of these G-codes it wil be "
             "skipped (',' separated)")
 
+        prop = "Inject line numbers"
+        self.cbInjectLineNumbers = self.pg.Append(wxpg.BoolProperty(
+            prop, value=self.configData.get('/machine/InjectLineNumbers')))
+        self.pg.SetPropertyAttribute(prop, "UseCheckbox", True)
+        self.pg.SetPropertyHelpString(
+            prop,
+            "When enabled, add N line numbers to sent lines so the device "
+            "can report the executing line (grbl needs Ln: in status report)")
+
+        prop = "Run machine interface in separate process"
+        self.cbSeparateProcess = self.pg.Append(wxpg.BoolProperty(
+            prop, value=self.configData.get('/machine/SeparateProcess')))
+        self.pg.SetPropertyAttribute(prop, "UseCheckbox", True)
+        self.pg.SetPropertyHelpString(
+            prop,
+            "When enabled, serial and program execution run in their own "
+            "process so GUI load can't slow down streaming (takes effect on "
+            "next connect)")
+
+        prop = "Single thread machine interface core"
+        self.cbSingleThreadCore = self.pg.Append(wxpg.BoolProperty(
+            prop, value=self.configData.get('/machine/SingleThreadCore')))
+        self.pg.SetPropertyAttribute(prop, "UseCheckbox", True)
+        self.pg.SetPropertyHelpString(
+            prop,
+            "When enabled, serial I/O and program execution share one "
+            "select() loop instead of a thread each, POSIX only (takes effect "
+            "on next connect)")
+
+        prop = "Tune status reports on connect"
+        self.cbStatusReportTuning = self.pg.Append(wxpg.BoolProperty(
+            prop, value=self.configData.get('/machine/StatusReportTuning')))
+        self.pg.SetPropertyAttribute(prop, "UseCheckbox", True)
+        self.pg.SetPropertyHelpString(
+            prop,
+            "When enabled, device status reports are set to the fields gsat "
+            "displays at the auto refresh period on connect, device settings "
+            "are put back on disconnect (grbl $10, TinyG/g2core sr and si). "
+            "These settings are stored on the device, if gsat exits without "
+            "disconnecting they stay changed")
+
         self.CreateMachIfSpecificCtrls()
 
         vBoxSizerRoot.Add(
@@ -320,6 +365,19 @@ class gsatMachineSettingsPanel(scrolled.ScrolledPanel):
         self.configData.set(
             '/machine/FilterGcodes', filterGcodeList)
 
+        self.configData.set(
+            '/machine/InjectLineNumbers', self.cbInjectLineNumbers.GetValue())
+
+        self.configData.set(
+            '/machine/SeparateProcess', self.cbSeparateProcess.GetValue())
+
+        self.configData.set(
+            '/machine/SingleThreadCore', self.cbSingleThreadCore.GetValue())
+
+        self.configData.set(
+            '/machine/StatusReportTuning',
+            self.cbStatusReportTuning.GetValue())
+
         self.configData.set(
             '/machine/InitScriptEnable', self.cbInitScript.GetValue())
         self.configData.set(
@@ -385,5 +443,13 @@ class gsatMachineSettingsPanel(scrolled.ScrolledPanel):
             if len(serList) < 1:
                 serList = ['None']
 
+        # network ports can't be discovered, keep the one in use
+        port = self.spComboBox.GetValue()
+        if sp.is_socket_port(port):
+            serList.insert(0, port)
+
         self.spComboBox.SetItems(serList)
 
+        if sp.is_socket_port(port):
+            self.spComboBox.SetValue(port)
+
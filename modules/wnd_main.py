@@ -45,13 +45,12 @@ from wx.lib import scrolledpanel as scrolled
 import modules.config as gc
 import modules.machif_config as mi
 import images.icons as ico
-import modules.wnd_main_config as mwc
 import modules.wnd_editor as ed
 import modules.wnd_machine as mc
 import modules.wnd_jogging as jog
-import modules.wnd_cli as cli
-import modules.wnd_compvision as compv
+import modules.wnd_lazy_panel as lazy
 import modules.machif_progexec as mi_progexec
+import modules.watchdog as wd
 
 __appname__ = "Gcode Step and Alignment Tool"
 
@@ -122,15 +121,38 @@ gID_MENU_MACHINE_QUEUE_FLUSH = wx.NewId()
 gID_MENU_MACHINE_RESET = wx.NewId()
 gID_MENU_MACHINE_CLEAR_ALARM = wx.NewId()
 gID_MENU_ABORT = wx.NewId()
+gID_MENU_FEED_OVR_RESET = wx.NewId()
+gID_MENU_FEED_OVR_INC10 = wx.NewId()
+gID_MENU_FEED_OVR_DEC10 = wx.NewId()
+gID_MENU_FEED_OVR_INC1 = wx.NewId()
+gID_MENU_FEED_OVR_DEC1 = wx.NewId()
+gID_MENU_RAPID_OVR_100 = wx.NewId()
+gID_MENU_RAPID_OVR_50 = wx.NewId()
+gID_MENU_RAPID_OVR_25 = wx.NewId()
+gID_MENU_SPINDLE_OVR_RESET = wx.NewId()
+gID_MENU_SPINDLE_OVR_INC10 = wx.NewId()
+gID_MENU_SPINDLE_OVR_DEC10 = wx.NewId()
+gID_MENU_SPINDLE_OVR_INC1 = wx.NewId()
+gID_MENU_SPINDLE_OVR_DEC1 = wx.NewId()
 gID_MENU_IN2MM = wx.NewId()
 gID_MENU_MM2IN = wx.NewId()
 gID_MENU_G812G01 = wx.NewId()
+gID_MENU_DRILL_ORDER = wx.NewId()
+gID_MENU_PROFILER = wx.NewId()
+gID_MENU_PROBE_HEIGHT_MAP = wx.NewId()
+gID_MENU_CLEAR_HEIGHT_MAP = wx.NewId()
+gID_MENU_ADD_FIDUCIAL = wx.NewId()
+gID_MENU_ADD_FIDUCIAL_CAMERA = wx.NewId()
+gID_MENU_ALIGN = wx.NewId()
+gID_MENU_ALIGN_PROGRAM = wx.NewId()
+gID_MENU_CLEAR_ALIGNMENT = wx.NewId()
 gID_MENU_FIND = wx.NewId()
 gID_MENU_GOTOLINE = wx.NewId()
 
 
 gID_TIMER_MACHINE_REFRESH = wx.NewId()
 gID_TIMER_RUN = wx.NewId()
+gID_TIMER_HEARTBEAT = wx.NewId()
 
 # -----------------------------------------------------------------------------
 # regular expressions
@@ -192,13 +214,41 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
 
         # init some variables
         self.machifProgExec = None
+        self.heightMap = None
+        self.fiducials = []
+        self.alignment = None
+        self.workPosXY = None
+        self.profiler = None
         self.runTimer = None
+        self.heartbeat = None
+        self.heartbeatTimer = None
+        self.stallCounts = dict()
         self.runStartTime = 0
         self.runEndTime = 0
         self.runEndWaitingForMachIfIdle = False
         self.eventInCount = 0
         self.eventHandleCount = 0
 
+        # machine interface events, event id to handler
+        self.threadEventHandlers = {
+            gc.EV_ABORT: self.OnEvAbort,
+            gc.EV_DATA_STATUS: self.OnEvDataStatus,
+            gc.EV_DATA_IN: self.OnEvDataIn,
+            gc.EV_DATA_OUT: self.OnEvDataOut,
+            gc.EV_PC_UPDATE: self.OnEvPcUpdate,
+            gc.EV_PC_EXEC_UPDATE: self.OnEvPcExecUpdate,
+            gc.EV_STALL: self.OnEvStall,
+            gc.EV_HEIGHT_MAP: self.OnEvHeightMap,
+            gc.EV_DEVICE_DETECTED: self.OnEvDeviceDetected,
+            gc.EV_RUN_END: self.OnEvRunEnd,
+            gc.EV_STEP_END: self.OnEvStepEnd,
+            gc.EV_HIT_BRK_PT: self.OnEvHitBrkPt,
+            gc.EV_HIT_MSG: self.OnEvHitMsg,
+            gc.EV_SER_PORT_OPEN: self.OnEvSerPortOpen,
+            gc.EV_SER_PORT_CLOSE: self.OnEvSerPortClose,
+            gc.EV_EXIT: self.OnEvExit,
+        }
+
         # register for close events
         self.Bind(wx.EVT_CLOSE, self.OnClose)
         # self.Bind(wx.EVT_IDLE, self.OnIdle)
@@ -261,8 +311,11 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
 
         self.machineStatusPanel = mc.gsatMachineStatusPanel(
             self, self.configData, self.stateData, self.cmdLineOptions)
-        self.CV2Panel = compv.gsatCV2Panel(
-            self, self.configData, self.stateData, self.cmdLineOptions)
+        # hidden by default, built (and OpenCV panel module imported) on
+        # first show
+        self.CV2Panel = lazy.gsatLazyPanel(
+            self, "modules.wnd_compvision", "gsatCV2Panel", self.configData,
+            self.stateData, self.cmdLineOptions)
         self.machineJoggingPanel = jog.gsatJoggingPanel(
             self, self.configData, self.stateData, self.cmdLineOptions)
         # self.machineJoggingPanel = jog.gsatJoggingObsoletePanel(
@@ -346,6 +399,11 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
         self.outputText.Bind(wx.EVT_CHAR_HOOK, self.OnKeyPress)
         self.gcText.Bind(wx.EVT_CHAR_HOOK, self.OnKeyPress)
 
+        if gc.PROFILE_FILE is not None:
+            self.ProfilerStart(gc.PROFILE_FILE)
+
+        self.HeartbeatStart()
+
     def CreateMenu(self):
 
         # Create the menubar
@@ -516,6 +574,41 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
             machineReset.SetBitmap(ico.imgClearAlarm.GetBitmap())
         runMenu.AppendItem(machineClearAlarm)
 
+        # realtime overrides, menu id -> (event, override step)
+        self.overrideMenuDict = {
+            gID_MENU_FEED_OVR_RESET: (gc.EV_CMD_FEED_OVERRIDE, "100"),
+            gID_MENU_FEED_OVR_INC10: (gc.EV_CMD_FEED_OVERRIDE, "+10"),
+            gID_MENU_FEED_OVR_DEC10: (gc.EV_CMD_FEED_OVERRIDE, "-10"),
+            gID_MENU_FEED_OVR_INC1: (gc.EV_CMD_FEED_OVERRIDE, "+1"),
+            gID_MENU_FEED_OVR_DEC1: (gc.EV_CMD_FEED_OVERRIDE, "-1"),
+            gID_MENU_RAPID_OVR_100: (gc.EV_CMD_RAPID_OVERRIDE, "100"),
+            gID_MENU_RAPID_OVR_50: (gc.EV_CMD_RAPID_OVERRIDE, "50"),
+            gID_MENU_RAPID_OVR_25: (gc.EV_CMD_RAPID_OVERRIDE, "25"),
+            gID_MENU_SPINDLE_OVR_RESET: (gc.EV_CMD_SPINDLE_OVERRIDE, "100"),
+            gID_MENU_SPINDLE_OVR_INC10: (gc.EV_CMD_SPINDLE_OVERRIDE, "+10"),
+            gID_MENU_SPINDLE_OVR_DEC10: (gc.EV_CMD_SPINDLE_OVERRIDE, "-10"),
+            gID_MENU_SPINDLE_OVR_INC1: (gc.EV_CMD_SPINDLE_OVERRIDE, "+1"),
+            gID_MENU_SPINDLE_OVR_DEC1: (gc.EV_CMD_SPINDLE_OVERRIDE, "-1"),
+        }
+
+        overrideMenu = wx.Menu()
+        overrideMenu.Append(gID_MENU_FEED_OVR_RESET, "Feed 100%")
+        overrideMenu.Append(gID_MENU_FEED_OVR_INC10, "Feed +10%")
+        overrideMenu.Append(gID_MENU_FEED_OVR_DEC10, "Feed -10%")
+        overrideMenu.Append(gID_MENU_FEED_OVR_INC1, "Feed +1%")
+        overrideMenu.Append(gID_MENU_FEED_OVR_DEC1, "Feed -1%")
+        overrideMenu.AppendSeparator()
+        overrideMenu.Append(gID_MENU_RAPID_OVR_100, "Rapid 100%")
+        overrideMenu.Append(gID_MENU_RAPID_OVR_50, "Rapid 50%")
+        overrideMenu.Append(gID_MENU_RAPID_OVR_25, "Rapid 25%")
+        overrideMenu.AppendSeparator()
+        overrideMenu.Append(gID_MENU_SPINDLE_OVR_RESET, "Spindle 100%")
+        overrideMenu.Append(gID_MENU_SPINDLE_OVR_INC10, "Spindle +10%")
+        overrideMenu.Append(gID_MENU_SPINDLE_OVR_DEC10, "Spindle -10%")
+        overrideMenu.Append(gID_MENU_SPINDLE_OVR_INC1, "Spindle +1%")
+        overrideMenu.Append(gID_MENU_SPINDLE_OVR_DEC1, "Spindle -1%")
+        runMenu.AppendMenu(wx.ID_ANY, "Machine &Overrides", overrideMenu)
+
         runMenu.AppendSeparator()
 
         abortItem = wx.MenuItem(runMenu, gID_MENU_ABORT, "&Abort")
@@ -532,6 +625,21 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
         toolMenu.Append(gID_MENU_MM2IN, "&mm to Inch")
         toolMenu.AppendSeparator()
         toolMenu.Append(gID_MENU_G812G01, "&G81 to G01")
+        toolMenu.Append(gID_MENU_DRILL_ORDER, "&Optimize Drill Order")
+        toolMenu.AppendSeparator()
+        toolMenu.Append(gID_MENU_PROBE_HEIGHT_MAP, "Probe &Height Map")
+        toolMenu.Append(gID_MENU_CLEAR_HEIGHT_MAP, "&Clear Height Map")
+
+        alignMenu = wx.Menu()
+        alignMenu.Append(gID_MENU_ADD_FIDUCIAL, "Add &Fiducial")
+        alignMenu.Append(gID_MENU_ADD_FIDUCIAL_CAMERA,
+                         "Add Fiducial at Ca&mera")
+        alignMenu.Append(gID_MENU_ALIGN, "&Align to Fiducials")
+        alignMenu.Append(gID_MENU_ALIGN_PROGRAM, "&Transform Program")
+        alignMenu.Append(gID_MENU_CLEAR_ALIGNMENT, "&Clear Alignment")
+        toolMenu.AppendMenu(wx.ID_ANY, "&Alignment", alignMenu)
+        toolMenu.AppendSeparator()
+        toolMenu.AppendCheckItem(gID_MENU_PROFILER, "&Profiler")
 
         # ---------------------------------------------------------------------
         # Help menu
@@ -693,6 +801,11 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
                   id=gID_MENU_MACHINE_CLEAR_ALARM)
         self.Bind(wx.EVT_UPDATE_UI, self.OnAbortUpdate, id=gID_MENU_ABORT)
 
+        for overrideId in self.overrideMenuDict.keys():
+            self.Bind(wx.EVT_MENU, self.OnMachineOverride, id=overrideId)
+            self.Bind(wx.EVT_UPDATE_UI, self.OnMachineOverrideUpdate,
+                      id=overrideId)
+
         # ---------------------------------------------------------------------
         # tools menu bind
         self.Bind(wx.EVT_MENU, self.OnInch2mm, id=gID_MENU_IN2MM)
@@ -703,6 +816,40 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
         self.Bind(wx.EVT_UPDATE_UI, self.Onmm2InchUpdate, id=gID_MENU_MM2IN)
         self.Bind(wx.EVT_UPDATE_UI, self.OnG812G01Update, id=gID_MENU_G812G01)
 
+        self.Bind(wx.EVT_MENU, self.OnDrillOrder, id=gID_MENU_DRILL_ORDER)
+        self.Bind(wx.EVT_UPDATE_UI, self.OnDrillOrderUpdate,
+                  id=gID_MENU_DRILL_ORDER)
+
+        self.Bind(wx.EVT_MENU, self.OnProbeHeightMap,
+                  id=gID_MENU_PROBE_HEIGHT_MAP)
+        self.Bind(wx.EVT_MENU, self.OnClearHeightMap,
+                  id=gID_MENU_CLEAR_HEIGHT_MAP)
+        self.Bind(wx.EVT_UPDATE_UI, self.OnProbeHeightMapUpdate,
+                  id=gID_MENU_PROBE_HEIGHT_MAP)
+        self.Bind(wx.EVT_UPDATE_UI, self.OnClearHeightMapUpdate,
+                  id=gID_MENU_CLEAR_HEIGHT_MAP)
+
+        self.Bind(wx.EVT_MENU, self.OnAddFiducial, id=gID_MENU_ADD_FIDUCIAL)
+        self.Bind(wx.EVT_MENU, self.OnAddFiducialCamera,
+                  id=gID_MENU_ADD_FIDUCIAL_CAMERA)
+        self.Bind(wx.EVT_MENU, self.OnAlign, id=gID_MENU_ALIGN)
+        self.Bind(wx.EVT_MENU, self.OnAlignProgram, id=gID_MENU_ALIGN_PROGRAM)
+        self.Bind(wx.EVT_MENU, self.OnClearAlignment,
+                  id=gID_MENU_CLEAR_ALIGNMENT)
+        self.Bind(wx.EVT_UPDATE_UI, self.OnAddFiducialUpdate,
+                  id=gID_MENU_ADD_FIDUCIAL)
+        self.Bind(wx.EVT_UPDATE_UI, self.OnAddFiducialUpdate,
+                  id=gID_MENU_ADD_FIDUCIAL_CAMERA)
+        self.Bind(wx.EVT_UPDATE_UI, self.OnAlignUpdate, id=gID_MENU_ALIGN)
+        self.Bind(wx.EVT_UPDATE_UI, self.OnAlignProgramUpdate,
+                  id=gID_MENU_ALIGN_PROGRAM)
+        self.Bind(wx.EVT_UPDATE_UI, self.OnClearAlignmentUpdate,
+                  id=gID_MENU_CLEAR_ALIGNMENT)
+
+        self.Bind(wx.EVT_MENU, self.OnProfiler, id=gID_MENU_PROFILER)
+        self.Bind(wx.EVT_UPDATE_UI, self.OnProfilerUpdate,
+                  id=gID_MENU_PROFILER)
+
         # ---------------------------------------------------------------------
         # Help menu bind
         self.Bind(wx.EVT_MENU, self.OnAbout, id=wx.ID_ABOUT)
@@ -1311,6 +1458,9 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
         self.SaveLayoutData('/mainApp/Layout/Default')
 
     def OnSettings(self, e):
+        # settings pages are only needed here
+        import modules.wnd_main_config as mwc
+
         # do settings dialog
         dlg = mwc.gsatSettingsDialog(self, self.configData)
 
@@ -1330,9 +1480,6 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
             self.machineJoggingPanel.UpdateSettings(self.configData)
             self.CV2Panel.UpdateSettings(self.configData)
 
-            if self.machifProgExec is not None:
-                self.machifProgExec.eventPut(gc.EV_CMD_UPDATE_CONFIG)
-
             # re open serial port if open
             if (self.stateData.serialPortIsOpen and (self.stateData
                .serialPort != self.machinePort or self.stateData
@@ -1644,6 +1791,19 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
 
         self.gcodeToolBar.EnableTool(gID_MENU_MACHINE_CLEAR_ALARM, state)
 
+    def OnMachineOverride(self, e):
+        if self.machifProgExec is not None:
+            event_id, step = self.overrideMenuDict[e.GetId()]
+            self.machifProgExec.eventPut(event_id, step)
+
+    def OnMachineOverrideUpdate(self, e=None):
+        state = False
+        if self.stateData.serialPortIsOpen:
+            state = True
+
+        if e is not None:
+            e.Enable(state)
+
     def OnAbort(self, e):
         if self.machifProgExec is not None:
             self.machifProgExec.eventPut(gc.EV_CMD_FEED_HOLD)
@@ -1754,6 +1914,198 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
     def OnG812G01Update(self, e):
         self.OnToolUpdateIdle(e)
 
+    def OnDrillOrder(self, e):
+        """ Reorder holes of drill program for shorter rapid travel, time
+            saved is estimated at machine rapid feed rate
+        """
+        # tools menu modules, not needed at startup
+        import modules.drill_order as drill
+        import modules.height_map as hm
+
+        if not hm.import_numpy():
+            self.outputText.AppendText("** drill order needs numpy\n")
+            return
+
+        dlg = wx.MessageDialog(self,
+                               "Your about to reorder the holes of the "
+                               "current file.\nThis is an experimental "
+                               "feature, do you want to continue?",
+                               "",
+                               wx.OK | wx.CANCEL | wx.ICON_WARNING)
+
+        if dlg.ShowModal() == wx.ID_OK:
+            rawText = self.gcText.GetText()
+            self.stateData.gcodeFileLines = rawText.splitlines(True)
+            lines, holes, before, after = drill.optimize_drill_order(
+                self.stateData.gcodeFileLines)
+
+            if after < before:
+                readOnly = self.gcText.GetReadOnly()
+                self.gcText.SetReadOnly(False)
+                self.gcText.SetText("".join(lines))
+                self.gcText.SetReadOnly(readOnly)
+
+            rapidFeedRate = self.configData.get('/machine/RapidFeedRate')
+
+            self.outputText.AppendText(
+                "** drill order %d holes, rapid travel %.4f -> %.4f, about "
+                "%.1f s saved at F%s\n" % (
+                    holes, before, after,
+                    60.0 * (before - after) / max(rapidFeedRate, 1e-6),
+                    str(rapidFeedRate)))
+
+        dlg.Destroy()
+
+    def OnDrillOrderUpdate(self, e):
+        self.OnToolUpdateIdle(e)
+
+    def OnProbeHeightMap(self, e):
+        """ Probe height map over XY extents of program, grid size and
+            probe moves from jogging probe settings
+        """
+        import modules.alignment as al
+        import modules.height_map as hm
+
+        if not hm.import_numpy():
+            self.outputText.AppendText("** height map needs numpy\n")
+            return
+
+        lines = self.gcText.GetText().splitlines()
+
+        # program is probed where it will run
+        if self.alignment is not None:
+            lines = al.align_program(self.alignment, lines)
+
+        area = hm.gcode_bounds(lines)
+
+        if area is None:
+            self.outputText.AppendText(
+                "** height map needs a program with absolute XY moves\n")
+            return
+
+        probeGrid = dict({
+            'area': area,
+            'points': (self.configData.get('/jogging/ProbeGridPointsX'),
+                       self.configData.get('/jogging/ProbeGridPointsY')),
+            'clearance': self.configData.get('/jogging/ProbeGridClearance'),
+            'depth': self.configData.get('/jogging/ProbeMaxDistance'),
+            'feed': self.configData.get('/jogging/ProbeFeedRate'),
+        })
+
+        self.outputText.AppendText(
+            "** height map probing %dx%d points X%.4f..%.4f Y%.4f..%.4f\n" % (
+                probeGrid['points'][0], probeGrid['points'][1],
+                area[0], area[2], area[1], area[3]))
+
+        self.eventForward2Machif(gc.EV_CMD_PROBE_GRID, probeGrid)
+
+    def OnProbeHeightMapUpdate(self, e):
+        state = False
+        if self.stateData.serialPortIsOpen and \
+           self.stateData.swState == gc.STATE_IDLE:
+            state = True
+
+        e.Enable(state)
+
+    def OnClearHeightMap(self, e):
+        self.eventForward2Machif(gc.EV_CMD_PROBE_GRID, None)
+
+    def OnClearHeightMapUpdate(self, e):
+        e.Enable(self.heightMap is not None and
+                 self.stateData.swState == gc.STATE_IDLE)
+
+    def OnAddFiducial(self, e):
+        self.AddFiducial(0.0, 0.0)
+
+    def OnAddFiducialCamera(self, e):
+        self.AddFiducial(self.configData.get('/cv2/CrosshairOffsetX'),
+                         self.configData.get('/cv2/CrosshairOffsetY'))
+
+    def OnAddFiducialUpdate(self, e):
+        state = False
+        if self.stateData.serialPortIsOpen and self.workPosXY is not None:
+            state = True
+
+        e.Enable(state)
+
+    def OnAlign(self, e):
+        import modules.alignment as al
+
+        try:
+            alignment, rms = al.solve_alignment(self.fiducials)
+
+        except ValueError, ex:
+            self.outputText.AppendText("** %s\n" % str(ex))
+            return
+
+        self.alignment = alignment
+
+        self.outputText.AppendText(
+            "** alignment %s, fiducial error %.4f, alignment on\n" % (
+                str(alignment), rms))
+
+        self.eventForward2Machif(gc.EV_CMD_ALIGNMENT, alignment)
+
+    def OnAlignUpdate(self, e):
+        e.Enable(len(self.fiducials) >= 2 and
+                 self.stateData.swState == gc.STATE_IDLE)
+
+    def OnAlignProgram(self, e):
+        """ Rewrite program in aligned coordinates, stream alignment is
+            turned off as program no longer needs it
+        """
+        import modules.alignment as al
+        import modules.height_map as hm
+
+        if not hm.import_numpy():
+            self.outputText.AppendText("** program transform needs numpy\n")
+            return
+
+        dlg = wx.MessageDialog(self,
+                               "Your about to transform the current file to "
+                               "the fiducial alignment.\nThis is an "
+                               "experimental feature, do you want to "
+                               "continue?",
+                               "",
+                               wx.OK | wx.CANCEL | wx.ICON_WARNING)
+
+        if dlg.ShowModal() == wx.ID_OK:
+            rawText = self.gcText.GetText()
+            self.stateData.gcodeFileLines = rawText.splitlines(True)
+            lines = al.align_program(self.alignment,
+                                     self.stateData.gcodeFileLines)
+
+            readOnly = self.gcText.GetReadOnly()
+            self.gcText.SetReadOnly(False)
+            self.gcText.SetText("".join(lines))
+            self.gcText.SetReadOnly(readOnly)
+
+            self.ClearAlignment()
+
+        dlg.Destroy()
+
+    def OnAlignProgramUpdate(self, e):
+        if self.alignment is None:
+            e.Enable(False)
+        else:
+            self.OnToolUpdateIdle(e)
+
+    def OnClearAlignment(self, e):
+        self.ClearAlignment()
+
+    def OnClearAlignmentUpdate(self, e):
+        e.Enable((len(self.fiducials) > 0 or self.alignment is not None) and
+                 self.stateData.swState == gc.STATE_IDLE)
+
+    def OnProfiler(self, e):
+        if self.profiler is None:
+            self.ProfilerStart(gc.PROFILE_FILE)
+        else:
+            self.ProfilerStop()
+
+    def OnProfilerUpdate(self, e):
+        e.Check(self.profiler is not None)
+
     # -------------------------------------------------------------------------
     # Status Menu/ToolBar Handlers
     # -------------------------------------------------------------------------
@@ -1823,6 +2175,9 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
     # Other UI Handlers
     # -------------------------------------------------------------------------
     def OnClose(self, e):
+        self.ProfilerStop()
+        self.HeartbeatStop()
+
         if self.machifProgExec is not None:
             self.machifProgExec.eventPut(gc.EV_CMD_EXIT)
 
@@ -1851,6 +2206,78 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
    gsatMainWindow: General Functions
    ------------------------------------------------------------------------"""
 
+    def ProfilerStart(self, file_name=None):
+        """ Sample all threads, machine interface process has its own
+            profiler and file
+        """
+        import modules.profiler as prof
+
+        if file_name is None:
+            file_name = os.path.abspath(
+                os.path.expanduser(prof.PROFILE_FILE_DEFAULT))
+
+        self.profiler = prof.SamplingProfiler(file_name)
+        self.profiler.start()
+
+        self.ProfilerMachIfProcess(
+            prof.child_file_name(file_name, "machif"))
+
+        self.outputText.AppendText("** profiler started\n")
+
+    def ProfilerStop(self):
+        """ Stop sampling and write profiles
+        """
+        if self.profiler is None:
+            return
+
+        summary = self.profiler.stop()
+        self.profiler = None
+
+        self.ProfilerMachIfProcess(None)
+
+        for line in summary:
+            self.outputText.AppendText("** %s\n" % line)
+
+    def ProfilerMachIfProcess(self, file_name):
+        """ Start (file name) or stop (None) profiler in machine interface
+            process, if there is one
+        """
+        if self.machifProgExec is None:
+            return
+
+        import modules.machif_process as mi_process
+        if isinstance(self.machifProgExec, mi_process.MachIfProcess):
+            self.machifProgExec.eventPut(gc.EV_CMD_PROFILE, file_name)
+
+    def HeartbeatStart(self):
+        """ UI loop heartbeat for the stall watchdog, beats from a timer so
+            a busy or blocked UI thread misses beats
+        """
+        self.heartbeat = wd.STALL_WATCHDOG.heartbeat("UI", self)
+        wd.STALL_WATCHDOG.addStallListener(self.OnStall)
+
+        t = self.heartbeatTimer = wx.Timer(self, gID_TIMER_HEARTBEAT)
+        self.Bind(wx.EVT_TIMER, self.OnHeartbeatTimerAction, t)
+        self.heartbeatTimer.Start(
+            max(int(wd.STALL_WATCHDOG.threshold * 1000 / 2), 1))
+
+    def HeartbeatStop(self):
+        if self.heartbeat is None:
+            return
+
+        self.heartbeatTimer.Stop()
+        wd.STALL_WATCHDOG.removeStallListener(self.OnStall)
+        self.heartbeat.close()
+        self.heartbeat = None
+
+    def OnHeartbeatTimerAction(self, e):
+        self.heartbeat.beat()
+
+    def OnStall(self, stall_counts):
+        """ Stall listener, called from watchdog thread
+        """
+        self.eventPut(gc.EV_STALL, stall_counts)
+
     def RunTimerStart(self):
         if self.runTimer is not None:
             self.runTimer.Stop()
@@ -1936,7 +2363,23 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
         self.machinePort = self.stateData.serialPort
         self.machineBaud = self.stateData.serialPortBaud
 
-        self.machifProgExec = mi_progexec.MachIfExecuteThread(self)
+        # only events with a handler, others would be queued for nothing
+        eventIds = self.threadEventHandlers.keys()
+
+        if self.configData.get('/machine/SeparateProcess', False):
+            import modules.machif_process as mi_process
+            self.machifProgExec = mi_process.MachIfProcess(self, eventIds)
+        elif self.configData.get('/machine/SingleThreadCore', False):
+            import modules.machif_reactor as mi_reactor
+            self.machifProgExec = mi_reactor.MachIfReactor(self, eventIds)
+        else:
+            self.machifProgExec = mi_progexec.MachIfExecuteThread(
+                self, eventIds)
+
+        if self.profiler is not None:
+            import modules.profiler as prof
+            self.ProfilerMachIfProcess(prof.child_file_name(
+                self.profiler.fileName, "machif"))
 
         self.UpdateUI()
 
@@ -2112,6 +2555,42 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
 
         return ret_lienes
 
+    def AddFiducial(self, offset_x, offset_y):
+        """ Fiducial from program XY at editor caret line and current
+            position plus offset, camera crosshair offset or none
+        """
+        import modules.height_map as hm
+
+        lines = self.gcText.GetText().splitlines()
+        state = hm.GcodeState()
+
+        for gcode in lines[:self.gcText.GetCurrentLine() + 1]:
+            state.update(gcode)
+
+        if None in state.pos[:2]:
+            self.outputText.AppendText(
+                "** fiducial needs a line with known program X and Y\n")
+            return
+
+        program = (state.pos[0], state.pos[1])
+        machine = (self.workPosXY[0] + offset_x,
+                   self.workPosXY[1] + offset_y)
+
+        self.fiducials.append((program, machine))
+
+        self.outputText.AppendText(
+            "** fiducial %d program X%.4f Y%.4f at X%.4f Y%.4f\n" % (
+                len(self.fiducials), program[0], program[1], machine[0],
+                machine[1]))
+
+    def ClearAlignment(self):
+        if self.alignment is not None:
+            self.eventForward2Machif(gc.EV_CMD_ALIGNMENT, None)
+            self.outputText.AppendText("** alignment off\n")
+
+        self.fiducials = []
+        self.alignment = None
+
     def OnIdle(self, e):
         """ process idel time
         """
@@ -2125,179 +2604,230 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
         # if not self._eventQueue.empty():
         #     e.RequestMore()
 
-    def OnThreadEvent(self, e):
-        """ program execution thread event handlers handle events
-        """
-        self.eventHandleCount = self.eventHandleCount + 1
-        # process events from queue
-        if not self._eventQueue.empty():
-            # get item from queue
-            te = self._eventQueue.get()
+    def OnEvAbort(self, te):
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
+            self.logger.info("EV_ABORT")
 
-            if te.event_id == gc.EV_ABORT:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
-                    self.logger.info("EV_ABORT")
+        self.outputText.AppendText(te.data)
+        self.machifProgExec = None
+        self.heightMap = None
+        self.alignment = None
+        self.stateData.serialPortIsOpen = False
+        self.stateData.deviceDetected = False
+        self.stateData.swState = gc.STATE_IDLE
+        self.UpdateUI()
 
-                self.outputText.AppendText(te.data)
-                self.machifProgExec = None
-                self.stateData.serialPortIsOpen = False
-                self.stateData.deviceDetected = False
-                self.stateData.swState = gc.STATE_IDLE
-                self.UpdateUI()
+    def OnEvDataStatus(self, te):
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
+            self.logger.info("EV_DATA_STATUS")
 
-            elif te.event_id == gc.EV_DATA_STATUS:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
-                    self.logger.info("EV_DATA_STATUS")
-
-                if 'stat' in te.data:
-                    self.stateData.machineStatusString = te.data['stat']
-
-                # TODO: this doesn't belong here put in machif_proexec
-                if 'init' in te.data:
-                    # if self.cmdLineOptions.vverbose:
-                    #     print "gsatMainWindow device detected via version " \
-                    #         "string [%s]." % te.data['fb']
-                    self.stateData.deviceDetected = True
-                    self.GetMachineStatus()
-                    self.RunDeviceInitScript()
-
-                if self.stateData.swState != gc.STATE_IDLE and len(
-                    self.stateData.gcodeFileLines):
-                    prcnt = "%d/%d (%.2f%%)" % (
-                        self.stateData.programCounter,
-                        len(self.stateData.gcodeFileLines),
-                        abs((float(self.stateData.programCounter)/float(len(
-                            self.stateData.gcodeFileLines)) * 100)))
-                    te.data['prcnt'] = prcnt
-
-                self.machineStatusPanel.UpdateUI(self.stateData, te.data)
-                self.machineJoggingPanel.UpdateUI(self.stateData, te.data)
-
-            elif te.event_id == gc.EV_DATA_IN:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
-                    self.logger.info("EV_DATA_IN")
+        if 'stat' in te.data:
+            self.stateData.machineStatusString = te.data['stat']
 
-                self.outputText.AppendText("%s" % te.data)
+        # fiducials are measured at current position
+        if 'posx' in te.data and 'posy' in te.data:
+            self.workPosXY = (te.data['posx'], te.data['posy'])
 
-            elif te.event_id == gc.EV_DATA_OUT:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
-                    self.logger.info("EV_DATA_OUT")
+        # TODO: this doesn't belong here put in machif_proexec
+        if 'init' in te.data:
+            # if self.cmdLineOptions.vverbose:
+            #     print "gsatMainWindow device detected via version " \
+            #         "string [%s]." % te.data['fb']
+            self.stateData.deviceDetected = True
+            self.GetMachineStatus()
+            self.RunDeviceInitScript()
 
-                self.outputText.AppendText("> %s" % te.data)
+        statusData = te.data
 
-                if te.data[-1:] != "\n":
-                    self.outputText.AppendText("\n")
+        if self.stateData.swState != gc.STATE_IDLE and len(
+            self.stateData.gcodeFileLines):
+            prcnt = "%d/%d (%.2f%%)" % (
+                self.stateData.programCounter,
+                len(self.stateData.gcodeFileLines),
+                abs((float(self.stateData.programCounter)/float(len(
+                    self.stateData.gcodeFileLines)) * 100)))
 
-            elif te.event_id == gc.EV_PC_UPDATE:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
-                    self.logger.info("EV_PC_UPDATE [%s]." % str(te.data))
+            # event data is shared with other listeners, add to a copy
+            statusData = dict(te.data)
+            statusData['prcnt'] = prcnt
 
-                self.SetPC(te.data)
+        self.machineStatusPanel.UpdateUI(self.stateData, statusData)
+        self.machineJoggingPanel.UpdateUI(self.stateData, statusData)
 
-            elif te.event_id == gc.EV_DEVICE_DETECTED:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
-                    self.logger.info("EV_DEVICE_DETECTED")
+    def OnEvDataIn(self, te):
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
+            self.logger.info("EV_DATA_IN")
 
-                self.stateData.deviceDetected = True
+        self.outputText.AppendText("%s" % te.data)
 
-                # TODO: this doesn't belong here put in machif_proexec
-                self.GetMachineStatus()
-                self.RunDeviceInitScript()
+    def OnEvDataOut(self, te):
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
+            self.logger.info("EV_DATA_OUT")
 
-            elif te.event_id == gc.EV_RUN_END:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
-                    self.logger.info("EV_RUN_END")
+        self.outputText.AppendText("> %s" % te.data)
 
-                self.stateData.swState = gc.STATE_IDLE
-                self.runEndWaitingForMachIfIdle = True
+        if te.data[-1:] != "\n":
+            self.outputText.AppendText("\n")
 
-                prcnt = "%d/%d (%.2f%%)" % (
-                    len(self.stateData.gcodeFileLines),
-                    len(self.stateData.gcodeFileLines),
-                    100)
+    def OnEvPcUpdate(self, te):
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
+            self.logger.info("EV_PC_UPDATE [%s]." % str(te.data))
 
-                self.machineStatusPanel.UpdateUI(
-                    self.stateData, dict({'prcnt': prcnt}))
+        self.SetPC(te.data)
 
+    def OnEvPcExecUpdate(self, te):
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
+            self.logger.info("EV_PC_EXEC_UPDATE [%s]." % str(te.data))
 
-            elif te.event_id == gc.EV_STEP_END:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
-                    self.logger.info("EV_STEP_END")
+        self.stateData.executingProgramCounter = te.data
+        self.gcText.UpdateExecPC(te.data)
 
-                self.stateData.swState = gc.STATE_IDLE
-                self.UpdateUI()
+    def OnEvStall(self, te):
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
+            self.logger.info("EV_STALL [%s]." % str(te.data))
 
-            elif te.event_id == gc.EV_HIT_BRK_PT:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
-                    self.logger.info("EV_HIT_BRK_PT")
+        # counts come from this process and machine interface process
+        self.stallCounts.update(te.data)
 
-                self.stateData.swState = gc.STATE_BREAK
-                self.UpdateUI()
+        stalls = " ".join(["%s:%d" % (name, self.stallCounts[name])
+                           for name in sorted(self.stallCounts.keys())])
 
-            elif te.event_id == gc.EV_HIT_MSG:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
-                    self.logger.info("EV_HIT_MSG [%s]" % te.data.strip())
+        self.machineStatusPanel.UpdateUI(
+            self.stateData, dict({'stalls': stalls}))
 
-                lastSwState = self.stateData.swState
-                self.stateData.swState = gc.STATE_PAUSE
-                self.UpdateUI()
+    def OnEvHeightMap(self, te):
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
+            self.logger.info("EV_HEIGHT_MAP [%s]." % str(te.data))
 
-                self.outputText.AppendText("** MSG: %s" % te.data.strip())
+        self.heightMap = te.data
 
-                if lastSwState == gc.STATE_RUN:
-                    if sys.platform in 'darwin':
-                        # because dialog icons where not working correctly in
-                        # Mac OS X
-                        dlg = gmd.GenericMessageDialog(
-                            self, te.data.strip() +
-                            "\n\nContinue program?", "G-Code Message",
-                            wx.YES_NO | wx.YES_DEFAULT |
-                            wx.ICON_INFORMATION)
-                    else:
-                        dlg = wx.MessageDialog(
-                            self, te.data.strip() +
-                            "\n\nContinue program?", "G-Code Message",
-                            wx.YES_NO | wx.YES_DEFAULT |
-                            wx.ICON_INFORMATION)
-                else:
-                    if sys.platform in 'darwin':
-                        # because dialog icons where not working correctly in
-                        # Mac OS X
-                        dlg = gmd.GenericMessageDialog(
-                            self, te.data.strip(),
-                            "G-Code Message", wx.OK | wx.ICON_INFORMATION)
-                    else:
-                        dlg = wx.MessageDialog(
-                            self, te.data.strip(),
-                            "G-Code Message", wx.OK | wx.ICON_INFORMATION)
+        if self.heightMap is None:
+            self.outputText.AppendText("** height map off\n")
+        else:
+            self.outputText.AppendText(
+                "** height map %s, Z%.4f..%.4f, Z compensation on\n" % (
+                    str(self.heightMap), self.heightMap.z.min(),
+                    self.heightMap.z.max()))
 
-                result = dlg.ShowModal()
-                dlg.Destroy()
+    def OnEvDeviceDetected(self, te):
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
+            self.logger.info("EV_DEVICE_DETECTED")
 
-                if result == wx.ID_YES:
-                    self.OnRun()
+        self.stateData.deviceDetected = True
 
-            elif te.event_id == gc.EV_SER_PORT_OPEN:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
-                    self.logger.info("EV_SER_PORT_OPEN")
+        # TODO: this doesn't belong here put in machif_proexec
+        self.GetMachineStatus()
+        self.RunDeviceInitScript()
 
-                self.stateData.serialPortIsOpen = True
-                self.UpdateUI()
+    def OnEvRunEnd(self, te):
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
+            self.logger.info("EV_RUN_END")
 
-            elif te.event_id == gc.EV_SER_PORT_CLOSE:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
-                    self.logger.info("EV_SER_PORT_CLOSE")
+        self.stateData.swState = gc.STATE_IDLE
+        self.runEndWaitingForMachIfIdle = True
 
-                self.stateData.serialPortIsOpen = False
-                self.stateData.deviceDetected = False
-                self.stateData.swState = gc.STATE_IDLE
-                self.UpdateUI()
+        prcnt = "%d/%d (%.2f%%)" % (
+            len(self.stateData.gcodeFileLines),
+            len(self.stateData.gcodeFileLines),
+            100)
 
-            elif te.event_id == gc.EV_EXIT:
-                if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
-                    self.logger.info("EV_EXIT")
+        self.machineStatusPanel.UpdateUI(
+            self.stateData, dict({'prcnt': prcnt}))
+
+    def OnEvStepEnd(self, te):
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
+            self.logger.info("EV_STEP_END")
+
+        self.stateData.swState = gc.STATE_IDLE
+        self.UpdateUI()
+
+    def OnEvHitBrkPt(self, te):
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
+            self.logger.info("EV_HIT_BRK_PT")
+
+        self.stateData.swState = gc.STATE_BREAK
+        self.UpdateUI()
+
+    def OnEvHitMsg(self, te):
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
+            self.logger.info("EV_HIT_MSG [%s]" % te.data.strip())
+
+        lastSwState = self.stateData.swState
+        self.stateData.swState = gc.STATE_PAUSE
+        self.UpdateUI()
+
+        self.outputText.AppendText("** MSG: %s" % te.data.strip())
+
+        if lastSwState == gc.STATE_RUN:
+            if sys.platform in 'darwin':
+                # because dialog icons where not working correctly in
+                # Mac OS X
+                dlg = gmd.GenericMessageDialog(
+                    self, te.data.strip() +
+                    "\n\nContinue program?", "G-Code Message",
+                    wx.YES_NO | wx.YES_DEFAULT |
+                    wx.ICON_INFORMATION)
+            else:
+                dlg = wx.MessageDialog(
+                    self, te.data.strip() +
+                    "\n\nContinue program?", "G-Code Message",
+                    wx.YES_NO | wx.YES_DEFAULT |
+                    wx.ICON_INFORMATION)
+        else:
+            if sys.platform in 'darwin':
+                # because dialog icons where not working correctly in
+                # Mac OS X
+                dlg = gmd.GenericMessageDialog(
+                    self, te.data.strip(),
+                    "G-Code Message", wx.OK | wx.ICON_INFORMATION)
+            else:
+                dlg = wx.MessageDialog(
+                    self, te.data.strip(),
+                    "G-Code Message", wx.OK | wx.ICON_INFORMATION)
+
+        result = dlg.ShowModal()
+        dlg.Destroy()
+
+        if result == wx.ID_YES:
+            self.OnRun()
+
+    def OnEvSerPortOpen(self, te):
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
+            self.logger.info("EV_SER_PORT_OPEN")
+
+        self.stateData.serialPortIsOpen = True
+        self.UpdateUI()
+
+    def OnEvSerPortClose(self, te):
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
+            self.logger.info("EV_SER_PORT_CLOSE")
+
+        self.stateData.serialPortIsOpen = False
+        self.stateData.deviceDetected = False
+        self.stateData.swState = gc.STATE_IDLE
+        self.UpdateUI()
+
+    def OnEvExit(self, te):
+        if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
+            self.logger.info("EV_EXIT")
+
+        self.machifProgExec = None
+        self.heightMap = None
+        self.alignment = None
+
+    def OnThreadEvent(self, e):
+        """ program execution thread event handlers handle events
+        """
+        self.eventHandleCount = self.eventHandleCount + 1
+        # process events from queue
+        if not self._eventQueue.empty():
+            # get item from queue
+            te = self._eventQueue.get()
+
+            handler = self.threadEventHandlers.get(te.event_id)
 
-                self.machifProgExec = None
+            if handler is not None:
+                handler(te)
 
             else:
                 if gc.VERBOSE_MASK & gc.VERBOSE_MASK_UI_EV:
@@ -2403,8 +2933,8 @@ class gsatMainWindow(wx.Frame, gc.EventQueueIf):
                         # self.SerialWriteWaitForAck(initLine)
                         self.outputText.AppendText(initLine)
 
-    def eventPut(self, id, data=None, sender=None):
-        gc.EventQueueIf.eventPut(self, id, data, sender)
+    def eventPost(self, e):
+        gc.EventQueueIf.eventPost(self, e)
         self.eventInCount = self.eventInCount + 1
         wx.PostEvent(self, gc.ThreadQueueEvent(None))
 
@@ -45,11 +45,7 @@ from wx.lib import scrolledpanel as scrolled
 import modules.config as gc
 import modules.machif_config as mi
 import images.icons as ico
-import modules.wnd_editor_config as edc
-import modules.wnd_machine_config as mcc
-import modules.wnd_jogging_config as jogc
-import modules.wnd_cli_config as clic
-import modules.wnd_compvision_config as compvc
+import modules.wnd_lazy_panel as lazy
 
 
 class gsatGeneralSettingsPanel(scrolled.ScrolledPanel):
@@ -194,6 +190,9 @@ class gsatSettingsDialog(wx.Dialog):
 
         self.noteBook.AssignImageList(self.imageList)
 
+        # pages other than general are built on first visit
+        self.noteBook.Bind(wx.EVT_NOTEBOOK_PAGE_CHANGED, self.OnPageChanged)
+
         # add pages
         self.AddGeneralPage(0)
         self.AddProgramPage(1)
@@ -235,40 +234,55 @@ class gsatSettingsDialog(wx.Dialog):
         self.noteBook.SetPageImage(page, page)
 
     def AddProgramPage(self, page):
-        self.programPage = edc.gsatStyledTextCtrlSettingsPanel(
-            self.noteBook, self.configData, "code")
+        self.programPage = lazy.gsatLazyPanel(
+            self.noteBook, "modules.wnd_editor_config",
+            "gsatStyledTextCtrlSettingsPanel", self.configData, "code")
         self.noteBook.AddPage(self.programPage, "Program")
         self.noteBook.SetPageImage(page, page)
 
     def AddOutputPage(self, page):
-        self.outputPage = edc.gsatStyledTextCtrlSettingsPanel(
-            self.noteBook, self.configData, "output")
+        self.outputPage = lazy.gsatLazyPanel(
+            self.noteBook, "modules.wnd_editor_config",
+            "gsatStyledTextCtrlSettingsPanel", self.configData, "output")
         self.noteBook.AddPage(self.outputPage, "Output")
         self.noteBook.SetPageImage(page, page)
 
     def AddCliPage(self, page):
-        self.cliPage = clic.gsatCliSettingsPanel(self.noteBook, self.configData)
+        self.cliPage = lazy.gsatLazyPanel(
+            self.noteBook, "modules.wnd_cli_config", "gsatCliSettingsPanel",
+            self.configData)
         self.noteBook.AddPage(self.cliPage, "Cli")
         self.noteBook.SetPageImage(page, page)
 
     def AddMachinePage(self, page):
-        self.machinePage = mcc.gsatMachineSettingsPanel(
-            self.noteBook, self.configData)
+        self.machinePage = lazy.gsatLazyPanel(
+            self.noteBook, "modules.wnd_machine_config",
+            "gsatMachineSettingsPanel", self.configData)
         self.noteBook.AddPage(self.machinePage, "Machine")
         self.noteBook.SetPageImage(page, page)
 
     def AddJoggingPage(self, page):
-        self.jogPage = jogc.gsatJoggingSettingsPanel(
-            self.noteBook, self.configData)
+        self.jogPage = lazy.gsatLazyPanel(
+            self.noteBook, "modules.wnd_jogging_config",
+            "gsatJoggingSettingsPanel", self.configData)
         self.noteBook.AddPage(self.jogPage, "Jogging")
         self.noteBook.SetPageImage(page, page)
 
     def AddCV2Panel(self, page):
-        self.CV2Page = compvc.gsatCV2SettingsPanel(
-            self.noteBook, self.configData)
+        self.CV2Page = lazy.gsatLazyPanel(
+            self.noteBook, "modules.wnd_compvision_config",
+            "gsatCV2SettingsPanel", self.configData)
         self.noteBook.AddPage(self.CV2Page, " OpenCV2")
         self.noteBook.SetPageImage(page, page)
 
+    def OnPageChanged(self, e):
+        page = self.noteBook.GetPage(e.GetSelection())
+
+        if isinstance(page, lazy.gsatLazyPanel):
+            page.GetPanel()
+
+        e.Skip()
+
     def UpdateConfigData(self):
         self.generalPage.UpdateConfigData()
         self.programPage.UpdateConfigData()
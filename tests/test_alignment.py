@@ -0,0 +1,134 @@
+"""----------------------------------------------------------------------------
+   test_alignment.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+
+import unittest
+
+import modules.alignment as al
+import modules.height_map as hm
+
+# program to machine, rotated 90 degrees and moved by X10 Y20
+FIDUCIALS_90 = [((0, 0), (10, 20)), ((10, 0), (10, 30))]
+
+
+class TestSolveAlignment(unittest.TestCase):
+
+    def test_two_fiducials_exact(self):
+        alignment, rms = al.solve_alignment(FIDUCIALS_90)
+
+        self.assertAlmostEqual(alignment.rotation(), 90.0)
+        self.assertAlmostEqual(alignment.scale(), 1.0)
+        self.assertAlmostEqual(rms, 0.0)
+
+        x, y = alignment.transformPoint(1, 2)
+        self.assertAlmostEqual(x, 8.0)
+        self.assertAlmostEqual(y, 21.0)
+
+        # deltas are only rotated
+        x, y = alignment.transformPoint(1, 0, False)
+        self.assertAlmostEqual(x, 0.0)
+        self.assertAlmostEqual(y, 1.0)
+
+    def test_least_squares(self):
+        # moved by X1 Y2, measured X off by 0.1 either way
+        fiducials = [((0, 0), (1.1, 2)), ((10, 0), (10.9, 2)),
+                     ((10, 10), (11.1, 12)), ((0, 10), (0.9, 12))]
+        alignment, rms = al.solve_alignment(fiducials)
+
+        self.assertAlmostEqual(alignment.rotation(), 0.0)
+        self.assertAlmostEqual(alignment.scale(), 1.0)
+        self.assertAlmostEqual(alignment.tx, 1.0)
+        self.assertAlmostEqual(alignment.ty, 2.0)
+        self.assertAlmostEqual(rms, 0.1)
+
+    def test_not_enough_fiducials(self):
+        self.assertRaises(ValueError, al.solve_alignment, [])
+        self.assertRaises(ValueError, al.solve_alignment, FIDUCIALS_90[:1])
+        self.assertRaises(ValueError, al.solve_alignment,
+                          [((1, 1), (0, 0)), ((1, 1), (5, 5))])
+
+
+class TestGcodeAligner(unittest.TestCase):
+
+    def setUp(self):
+        self.aligner = al.GcodeAligner(al.Alignment(0.0, 1.0, 10.0, 20.0))
+
+    def test_absolute_moves(self):
+        align = self.aligner.align
+
+        self.assertEqual(align("G0 X1 Y2 (hole)"),
+                         "G0 X8.0000 Y21.0000 (hole)")
+
+        # single axis move gets both words
+        self.assertEqual(align("G1 X3 F100"), "G1 F100 X8.0000 Y23.0000")
+        self.assertEqual(align("M3 S1000"), "M3 S1000")
+
+    def test_unknown_axis_not_aligned(self):
+        align = self.aligner.align
+
+        self.assertEqual(align("G0 X1"), "G0 X1")
+        self.assertEqual(align("G0 Z5"), "G0 Z5")
+        self.assertEqual(align("G0 Y2"), "G0 X8.0000 Y21.0000")
+
+        # position lost after offset change
+        self.assertEqual(align("G92 X0"), "G92 X0")
+        self.assertEqual(align("G0 Y3"), "G0 Y3")
+
+    def test_relative_moves(self):
+        align = self.aligner.align
+
+        self.assertEqual(align("G91 G1 X1"), "G91 G1 X0.0000 Y1.0000")
+        self.assertEqual(align("Y1"), "X-1.0000 Y0.0000")
+        self.assertEqual(align("G90 X1 Y2"), "G90 X8.0000 Y21.0000")
+
+    def test_arc_center_rotated(self):
+        self.aligner.align("G0 X1 Y2")
+
+        self.assertEqual(self.aligner.align("G2 X3 Y4 I1 J0"),
+                         "G2 X6.0000 Y23.0000 I0.0000 J1.0000")
+
+        # modal arc with center offset only
+        self.assertEqual(self.aligner.align("J2"), "I-2.0000 J0.0000")
+
+
+@unittest.skipUnless(hm.import_numpy(), "needs numpy")
+class TestAlignProgram(unittest.TestCase):
+
+    def test_align_program(self):
+        alignment = al.Alignment(0.0, 1.0, 10.0, 20.0)
+        lines = ["G0 X1\n", "G0 X1 Y2\r\n", "M3\n", "G2 X3 Y4 I1 J0\n",
+                 "G91 X1\n", "(end)"]
+
+        self.assertEqual(al.align_program(alignment, lines), [
+            "G0 X1\n",
+            "G0 X8.0000 Y21.0000\r\n",
+            "M3\n",
+            "G2 X6.0000 Y23.0000 I0.0000 J1.0000\n",
+            "G91 X0.0000 Y1.0000\n",
+            "(end)"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+"""----------------------------------------------------------------------------
+   test_drill_order.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+
+import unittest
+
+import modules.drill_order as do
+import modules.height_map as hm
+
+CANNED_PROGRAM = [
+    "T1 M6\n",
+    "G0 Z5\n",
+    "G81 X0 Y0 Z-1 R1 F100\n",
+    "X10 Y0\n",
+    "X1 Y0 (second)\n",
+    "X11 Y0\n",
+    "G80\n",
+    "T2 M6\n",
+    "G81 X1 Y1 Z-1 R1\n",
+    "X10 Y1\n",
+    "X2 Y1\n",
+]
+
+PLUNGE_PROGRAM = [
+    "G0 Z2",
+    "G0 X0 Y0",
+    "G1 Z-1 F50",
+    "G0 Z2",
+    "G0 X10 Y0",
+    "G1 Z-1 F50",
+    "G0 Z2",
+    "G0 X1 Y0",
+    "G1 Z-1 F50",
+    "G0 Z2",
+]
+
+
+@unittest.skipUnless(hm.import_numpy(), "needs numpy")
+class TestDrillBlocks(unittest.TestCase):
+
+    def test_canned_blocks(self):
+        blocks = do.drill_blocks(CANNED_PROGRAM)
+
+        # tool change between cycles splits them
+        self.assertEqual(len(blocks), 2)
+        self.assertEqual([(b['first'], b['end']) for b in blocks],
+                         [(2, 6), (8, 11)])
+        self.assertEqual([b['kind'] for b in blocks], [do.DRILL_CANNED] * 2)
+
+        self.assertIsNone(blocks[0]['start'])
+        self.assertEqual(blocks[1]['start'], (11.0, 0.0))
+        self.assertEqual(blocks[1]['head'], "G81 Z-1 R1")
+        self.assertEqual([(h['x'], h['y']) for h in blocks[0]['holes']],
+                         [(0, 0), (10, 0), (1, 0), (11, 0)])
+
+    def test_new_cycle_words_start_block(self):
+        lines = ["G81 X0 Y0 Z-1 R1", "X1 Y1",
+                 "G81 X2 Y2 Z-2 R1", "X3 Y3"]
+        blocks = do.drill_blocks(lines)
+
+        self.assertEqual([(b['first'], b['end']) for b in blocks],
+                         [(0, 2), (2, 4)])
+
+    def test_plunge_block(self):
+        blocks = do.drill_blocks(PLUNGE_PROGRAM + ["M5"])
+
+        self.assertEqual(len(blocks), 1)
+        self.assertEqual(blocks[0]['kind'], do.DRILL_PLUNGE)
+        self.assertEqual((blocks[0]['first'], blocks[0]['end']), (1, 10))
+        self.assertEqual(blocks[0]['key'], ("G1 Z-1 F50", "G0 Z2"))
+        self.assertEqual([h['end'] for h in blocks[0]['holes']], [4, 7, 10])
+
+    def test_plunge_block_boundaries(self):
+        # deeper hole isn't the same plunge
+        lines = PLUNGE_PROGRAM + ["G0 X2 Y0", "G1 Z-2 F50", "G0 Z2"]
+        blocks = do.drill_blocks(lines)
+        self.assertEqual([(b['first'], b['end']) for b in blocks], [(1, 10)])
+
+        # plunge that doesn't return to its start Z isn't a hole
+        lines = PLUNGE_PROGRAM[:7] + ["G0 X1 Y0", "G1 Z-1 F50", "G0 Z3"]
+        blocks = do.drill_blocks(lines)
+        self.assertEqual([(b['first'], b['end']) for b in blocks], [(1, 7)])
+
+        # start Z of first hole not known, it starts the block after it
+        blocks = do.drill_blocks(PLUNGE_PROGRAM[1:])
+        self.assertEqual([(b['first'], b['end']) for b in blocks], [(3, 9)])
+        self.assertEqual(blocks[0]['start'], (0.0, 0.0))
+
+    def test_relative_moves_are_not_holes(self):
+        lines = ["G81 X0 Y0 Z-1 R1", "G91 X1 Y1", "X1 Y1"]
+        self.assertEqual(do.drill_blocks(lines), [])
+
+
+@unittest.skipUnless(hm.import_numpy(), "needs numpy")
+class TestDrillPath(unittest.TestCase):
+
+    def test_path_length(self):
+        np = hm.np
+        self.assertAlmostEqual(do.path_length(
+            np.array([0.0, 0.0]), np.array([[3.0, 4.0], [3.0, 0.0]])), 9.0)
+
+    def test_two_opt_removes_backtrack(self):
+        np = hm.np
+        start = np.array([0.0, 0.0])
+        points = np.array([[1.0, 0.0], [2.0, 0.0], [3.0, 0.0]])
+
+        self.assertEqual(do.nearest_neighbour(start, points), [0, 1, 2])
+        self.assertEqual(do.two_opt(start, points, [1, 0, 2]), [0, 1, 2])
+
+    def test_two_opt_uncrosses(self):
+        np = hm.np
+        start = np.array([0.0, 0.0])
+        points = np.array([[0.0, 1.0], [1.0, 1.0], [1.0, 0.0], [2.0, 0.0],
+                           [2.0, 1.0]])
+
+        # 0 -> 2 -> 1 -> 3 crosses itself
+        order = do.two_opt(start, points, [0, 2, 1, 3, 4])
+        self.assertEqual(order, [0, 1, 2, 3, 4])
+        self.assertAlmostEqual(do.path_length(start, points[order]), 5.0)
+
+    def test_two_opt_fixed_end(self):
+        np = hm.np
+        start = np.array([0.0, 0.0])
+        end = np.array([3.0, 0.0])
+        points = np.array([[2.0, 0.0], [1.0, 0.0]])
+
+        self.assertEqual(do.two_opt(start, points, [0, 1], end), [1, 0])
+
+        # X4 before X2 passes the end and comes back
+        points = np.array([[1.0, 0.0], [4.0, 0.0], [2.0, 0.0]])
+        self.assertEqual(do.two_opt(start, points, [0, 1, 2], end),
+                         [0, 2, 1])
+
+
+@unittest.skipUnless(hm.import_numpy(), "needs numpy")
+class TestOptimizeDrillOrder(unittest.TestCase):
+
+    def test_canned_cycles(self):
+        lines, holes, before, after = do.optimize_drill_order(CANNED_PROGRAM)
+
+        self.assertEqual(holes, 7)
+        self.assertAlmostEqual(before, 29.0 + 10.0499 + 9.0 + 8.0, 3)
+        self.assertAlmostEqual(after, 11.0 + 1.4142 + 9.0 + 1.0, 3)
+
+        self.assertEqual(lines, [
+            "T1 M6\n",
+            "G0 Z5\n",
+            "G81 X0 Y0 Z-1 R1 F100\n",
+            "X1 Y0 (second)\n",
+            "X10 Y0\n",
+            "X11 Y0\n",
+            "G80\n",
+            "T2 M6\n",
+            # cycle words go with the hole drilled first
+            "G81 Z-1 R1 X10.0000 Y1.0000\n",
+            "X1.0000 Y1.0000\n",
+            "X2 Y1\n",
+        ])
+
+    def test_plunge_holes(self):
+        program = PLUNGE_PROGRAM + ["G0 X11 Y0", "G1 Z-1 F50", "G0 Z2"]
+        lines, holes, before, after = do.optimize_drill_order(program)
+
+        self.assertEqual(holes, 4)
+        self.assertEqual(lines, program[:4] + program[7:10] +
+                         program[4:7] + program[10:])
+
+    def test_last_hole_stays_last(self):
+        # single axis and relative moves after the block go on from the
+        # last hole, shortest open path would end at X10
+        lines = ["G81 X0 Y0 Z-1 R1", "X10 Y0", "X1 Y0", "X5 Y0", "G80",
+                 "G0 Y5", "G91 G0 X1"]
+        optimized, holes, before, after = do.optimize_drill_order(lines)
+
+        self.assertEqual(optimized, ["G81 X0 Y0 Z-1 R1", "X1 Y0", "X10 Y0",
+                                     "X5 Y0"] + lines[4:])
+        self.assertAlmostEqual(before, 23.0)
+        self.assertAlmostEqual(after, 15.0)
+
+    def test_nothing_to_improve(self):
+        # two holes, last one stays last
+        lines = ["G81 X0 Y0 Z-1 R1", "X10 Y0", "X1 Y0", "G80"]
+        self.assertEqual(do.optimize_drill_order(lines),
+                         (lines, 3, 19.0, 19.0))
+
+        lines = ["G81 X0 Y0 Z-1 R1", "X1 Y0", "X2 Y0"]
+        self.assertEqual(do.optimize_drill_order(lines),
+                         (lines, 3, 2.0, 2.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
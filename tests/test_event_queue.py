@@ -0,0 +1,106 @@
+"""----------------------------------------------------------------------------
+   test_event_queue.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import unittest
+
+import modules.config as gc
+import modules.machif_grbl as grbl
+
+
+class Recorder(object):
+
+    def __init__(self):
+        self.events = []
+
+    def eventPut(self, event_id, data=None, sender=None):
+        self.events.append(event_id)
+
+
+class SerialTxRx(gc.EventQueueIf):
+    """ Serial thread class without the thread, keeps its listeners
+    """
+
+    def __init__(self, event_handler, port_name, port_baud, event_ids=None):
+        gc.EventQueueIf.__init__(self)
+        self.addEventListener(event_handler, event_ids)
+
+
+class TestEventListeners(unittest.TestCase):
+
+    def test_all_events(self):
+        queue = gc.EventQueueIf()
+        listener = Recorder()
+        queue.addEventListener(listener)
+
+        queue.notifyEventListeners(gc.EV_SER_RXDATA, "ok\n")
+        queue.notifyEventListeners(gc.EV_TIMER)
+        self.assertEqual(listener.events, [gc.EV_SER_RXDATA, gc.EV_TIMER])
+
+    def test_event_ids(self):
+        queue = gc.EventQueueIf()
+        listener = Recorder()
+        queue.addEventListener(listener, [gc.EV_SER_RXDATA, gc.EV_EXIT])
+
+        queue.notifyEventListeners(gc.EV_SER_RXDATA, "ok\n")
+        queue.notifyEventListeners(gc.EV_TIMER)
+        queue.notifyEventListeners(gc.EV_EXIT)
+        self.assertEqual(listener.events, [gc.EV_SER_RXDATA, gc.EV_EXIT])
+
+        # adding again replaces subscription
+        queue.addEventListener(listener, [gc.EV_TIMER])
+        queue.notifyEventListeners(gc.EV_SER_RXDATA, "ok\n")
+        queue.notifyEventListeners(gc.EV_TIMER)
+        self.assertEqual(listener.events[2:], [gc.EV_TIMER])
+
+        queue.removeEventListener(listener)
+        queue.notifyEventListeners(gc.EV_TIMER)
+        self.assertEqual(listener.events[2:], [gc.EV_TIMER])
+
+    def test_machif_subscribes_to_serial_events(self):
+        machif = grbl.MachIf_GRBL()
+        machif.serialTxRxClass = SerialTxRx
+        machif.serialName = "tcp://localhost:2000"
+        machif.serialBaud = 115200
+        machif.open()
+
+        serial = machif.getSerialTxRx()
+        serial.notifyEventListeners(gc.EV_TIMER)
+        serial.notifyEventListeners(gc.EV_SER_RXDATA, "ok\n")
+        serial.notifyEventListeners(gc.EV_SER_PORT_CLOSE)
+
+        queued = []
+        while not machif._eventQueue.empty():
+            queued.append(machif._eventQueue.get().event_id)
+
+        # EV_HELLO and init writes go to serial queue, not ours
+        self.assertEqual(queued, [gc.EV_SER_RXDATA, gc.EV_SER_PORT_CLOSE])
+
+        hello = serial._eventQueue.get()
+        self.assertEqual(hello.event_id, gc.EV_HELLO)
+        self.assertEqual(hello.data, machif.serialEventIds)
+
+
+if __name__ == '__main__':
+    unittest.main()
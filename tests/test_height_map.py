@@ -0,0 +1,167 @@
+"""----------------------------------------------------------------------------
+   test_height_map.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+
+import unittest
+
+import modules.height_map as hm
+
+
+class TestGcodeState(unittest.TestCase):
+
+    def setUp(self):
+        self.state = hm.GcodeState()
+
+    def test_absolute_and_relative(self):
+        self.assertEqual(self.state.update("G1 X1 Y2 Z3"), [1.0, 2.0, 3.0])
+        self.assertEqual(self.state.update("G91 X1 Z-1"), [2.0, 2.0, 2.0])
+        self.assertFalse(self.state.absolute)
+        self.assertEqual(self.state.update("G90 Y5"), [2.0, 5.0, 2.0])
+
+    def test_unknown_axes(self):
+        self.assertEqual(self.state.update("G0 X1"), [1.0, None, None])
+
+        # relative move of an unknown axis stays unknown
+        self.assertEqual(self.state.update("G91 Y1"), [1.0, None, None])
+
+    def test_lines_that_dont_move(self):
+        self.state.update("G0 X1 Y1 Z1")
+
+        self.assertIsNone(self.state.update("$J=G91 X5 F100"))
+        self.assertIsNone(self.state.update("G4 P1"))
+        self.assertEqual(self.state.pos, [1.0, 1.0, 1.0])
+
+        # comments may hold axis words
+        self.assertEqual(self.state.update("G0 X2 (Y5)"), [2.0, 1.0, 1.0])
+        self.assertEqual(self.state.update("G0 X3 ; Y5"), [3.0, 1.0, 1.0])
+
+        # position after offsets and probing isn't known
+        self.assertIsNone(self.state.update("G92 X0"))
+        self.assertEqual(self.state.pos, [None, 1.0, 1.0])
+        self.assertIsNone(self.state.update("G38.2 Z-5 F10"))
+        self.assertEqual(self.state.pos, [None, 1.0, None])
+
+    def test_canned_cycle(self):
+        self.state.update("G0 X0 Y0 Z5")
+
+        self.assertEqual(self.state.update("G81 X1 Y2 Z-1 R1"),
+                         [1.0, 2.0, -1.0])
+        self.assertEqual(self.state.motion, 81.0)
+        self.assertEqual(self.state.pos, [1.0, 2.0, None])
+
+        # modal cycle, next hole
+        self.assertEqual(self.state.update("X3"), [3.0, 2.0, None])
+
+        self.assertIsNone(self.state.update("G80"))
+        self.assertIsNone(self.state.motion)
+        self.assertIsNone(self.state.update("X4"))
+        self.assertEqual(self.state.pos, [None, 2.0, None])
+
+
+@unittest.skipUnless(hm.import_numpy(), "needs numpy")
+class HeightMapTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # 3x3 grid over 0..10, surface rises 0.1 per unit of X
+        self.heightMap = hm.HeightMap(0, 0, 10, 10, 3, 3)
+
+        for i, j, x, y in self.heightMap.points():
+            self.heightMap.setZ(i, j, 0.1 * x)
+
+
+class TestHeightMap(HeightMapTestCase):
+
+    def test_interpolation(self):
+        self.assertTrue(self.heightMap.isComplete())
+        self.assertAlmostEqual(self.heightMap.zAtPoint(2.5, 7), 0.25)
+        self.assertAlmostEqual(self.heightMap.zAtPoint(12, -1), 1.0)
+
+        z = self.heightMap.zAt([0, 2.5, 10], [0, 7, 10])
+        self.assertEqual([round(v, 6) for v in z], [0.0, 0.25, 1.0])
+
+    def test_split_points(self):
+        splitPoints = self.heightMap.splitPoints
+
+        # inside one cell
+        self.assertIsNone(splitPoints([1, 1], [4, 4]))
+        self.assertIsNone(splitPoints([1, 1], [1, 1]))
+
+        self.assertEqual(list(splitPoints([1, 1], [9, 1])), [0.5, 1.0])
+        self.assertEqual(list(splitPoints([9, 1], [1, 1])), [0.5, 1.0])
+        self.assertEqual(list(splitPoints([-5, 1], [15, 1])),
+                         [0.25, 0.5, 0.75, 1.0])
+
+        # through the grid corner, crossing both lines at once
+        self.assertEqual(list(splitPoints([0, 0], [10, 10])), [0.5, 1.0])
+
+
+class TestGcodeLeveler(HeightMapTestCase):
+
+    def setUp(self):
+        HeightMapTestCase.setUp(self)
+        self.leveler = hm.GcodeLeveler(self.heightMap)
+
+    def test_start_unknown(self):
+        self.assertEqual(self.leveler.level("G0 X1 Y1 Z1"), ["G0 X1 Y1 Z1"])
+
+    def test_grid_split(self):
+        self.leveler.level("G0 X1 Y1 Z0")
+
+        self.assertEqual(self.leveler.level("G1 X9 Y1 Z-1 F100"), [
+            "G1 F100 X5.0000 Y1.0000 Z0.0000",
+            "X9.0000 Y1.0000 Z-0.1000"])
+
+        # rapids and arcs only get their end point corrected
+        self.assertEqual(self.leveler.level("G0 X1 Y1 Z1"),
+                         ["G0 X1.0000 Y1.0000 Z1.1000"])
+        self.assertEqual(self.leveler.level("G2 X9 Y1 I4 J0 (arc)"),
+                         ["G2 I4 J0 X9.0000 Y1.0000 Z1.9000"])
+
+    def test_relative_move(self):
+        self.leveler.level("G0 X1 Y1 Z1")
+
+        self.assertEqual(self.leveler.level("G91 G1 X1 Z-0.5"),
+                         ["G91 G1 X1 Z-0.4000"])
+
+    def test_canned_cycle_passthrough(self):
+        self.leveler.level("G0 X1 Y1 Z5")
+
+        for gcode in ["G81 X5 Y5 Z-1 R1 F100", "X6 Y6", "G80"]:
+            self.assertEqual(self.leveler.level(gcode), [gcode])
+
+        # cycle left Z unknown, XY known again
+        self.assertEqual(self.leveler.level("G0 X1 Y1 Z1"),
+                         ["G0 X1.0000 Y1.0000 Z1.1000"])
+
+    def test_reset(self):
+        self.leveler.level("G0 X1 Y1 Z0")
+        self.leveler.reset()
+
+        self.assertEqual(self.leveler.level("G1 X9 Y1 Z-1"),
+                         ["G1 X9 Y1 Z-1"])
+
+
+if __name__ == '__main__':
+    unittest.main()
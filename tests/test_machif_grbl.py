@@ -0,0 +1,193 @@
+"""----------------------------------------------------------------------------
+   test_machif_grbl.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import unittest
+
+import modules.config as gc
+import modules.machif_grbl as grbl
+
+
+class SerialRecorder(object):
+    """ Stands in for the serial thread, records what MachIf sends
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def eventPut(self, event_id, data=None, sender=None):
+        self.events.append(('bulk', event_id, data))
+
+    def eventPutPriority(self, event_id, data=None, sender=None,
+                         timestamp=None):
+        self.events.append(('rt', event_id, data))
+
+    def txData(self):
+        return [(lane, data) for lane, event_id, data in self.events
+                if event_id == gc.EV_CMD_SER_TXDATA]
+
+
+class GrblTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.machif = grbl.MachIf_GRBL()
+        self.machif._init()
+        self.serial = SerialRecorder()
+        self.machif._serialTxRxThread = self.serial
+
+
+class TestJogContinuous(GrblTestCase):
+
+    def startJog(self):
+        self.machif._jogContinuous = {'x': 1, 'feed': 1000}
+        self.machif._jogStream()
+
+    def test_segments_go_in_order_with_bulk_data(self):
+        self.machif.write("G1 X1 F100\n")
+        self.startJog()
+
+        txData = self.serial.txData()
+        self.assertEqual(txData[0], ('bulk', "G1 X1 F100\n"))
+        self.assertTrue(len(txData) > 1)
+
+        for lane, data in txData[1:]:
+            self.assertEqual(lane, 'bulk')
+            self.assertTrue(data.startswith("$J=G91 X"))
+
+        self.assertEqual(self.machif._inputBufferJog,
+                         [False] + [True] * (len(txData) - 1))
+
+    def test_ack_of_other_line_keeps_jog_segment_times(self):
+        self.machif.write("G1 X1 F100\n")
+        self.startJog()
+        segments = len(self.machif._jogSegmentTimes)
+
+        # ok for G1 line, no segment acknowledged yet
+        self.machif.decode("ok\n")
+        self.assertEqual(len(self.machif._jogSegmentTimes), segments)
+
+        self.machif.decode("ok\n")
+        self.assertEqual(len(self.machif._jogSegmentTimes), segments - 1)
+
+    def test_segment_error_stops_jog(self):
+        self.machif.write("G1 X1 F100\n")
+        self.startJog()
+
+        self.machif.decode("error:20\n")
+        self.assertIsNotNone(self.machif._jogContinuous)
+
+        self.machif.decode("error:15\n")
+        self.assertIsNone(self.machif._jogContinuous)
+
+    def test_stop_after_queued_segments(self):
+        self.startJog()
+        segments = len(self.serial.txData())
+
+        self.machif.doJogStop()
+        self.assertIsNone(self.machif._jogContinuous)
+
+        txData = self.serial.txData()
+        self.assertEqual(len(txData), segments + 1)
+        self.assertEqual(txData[-1], ('bulk', self.machif.cmdJogCancel))
+
+        for lane, data in txData[:-1]:
+            self.assertEqual(lane, 'bulk')
+            self.assertTrue(data.startswith("$J=G91 X"))
+
+        # no more segments once stopped
+        self.machif.decode("ok\n")
+        self.assertEqual(len(self.serial.txData()), segments + 1)
+
+    def test_accounting_drains(self):
+        self.startJog()
+        segments = len(self.machif._jogSegmentTimes)
+
+        for i in range(segments):
+            self.machif.decode("ok\n")
+
+        self.assertEqual(self.machif._inputBufferSize, 0)
+        self.assertEqual(self.machif._inputBufferPart, [])
+        self.assertEqual(self.machif._inputBufferJog, [])
+        self.assertEqual(self.machif._jogSegmentTimes, [])
+
+
+class TestBufferResync(GrblTestCase):
+
+    def status(self, stat, planner_avail, rx_avail):
+        # status request is accounted for, its report takes it out
+        self.machif.encode(self.machif.cmdStatus)
+        self.machif.decode("<%s|MPos:0.000,0.000,0.000|Bf:%d,%d|FS:0,0>\n" % (
+            stat, planner_avail, rx_avail))
+
+    def sendQuiet(self, line):
+        """ Line sent, acknowledge outstanding, nothing sent since
+        """
+        self.status("Idle", 15, 128)
+        self.machif.write(line)
+        self.machif._lastBookkeepingTime -= grbl.BUFFER_RESYNC_QUIET_TIME
+
+    def test_resync_when_idle(self):
+        self.sendQuiet("G1 X1\n")
+
+        self.status("Idle", 15, 128)
+        self.assertEqual(self.machif._inputBufferSize, 0)
+        self.assertEqual(self.machif._inputBufferPart, [])
+        self.assertEqual(self.machif._bfResyncCount, 1)
+
+    def test_no_resync_while_moving(self):
+        self.sendQuiet("G1 X1\n")
+
+        self.status("Run", 15, 128)
+        self.status("Idle", 14, 128)
+        self.assertEqual(self.machif._inputBufferPart, [6])
+        self.assertEqual(self.machif._bfResyncCount, 0)
+
+    def test_no_resync_while_sync_command_runs(self):
+        for line in ["G4 P5\n", "$H\n", "G38.2 Z-5 F10\n", "M0\n"]:
+            self.machif._init()
+            self.sendQuiet(line)
+
+            # command left rx buffer, planner empty, still no acknowledge
+            self.status("Idle", 15, 128)
+            self.assertEqual(self.machif._inputBufferPart, [len(line)])
+            self.assertEqual(self.machif._bfResyncCount, 0)
+
+            self.machif.decode("ok\n")
+            self.assertEqual(self.machif._inputBufferPart, [])
+            self.assertEqual(self.machif._inputBufferSync, [])
+
+    def test_resync_after_sync_command_acknowledged(self):
+        self.sendQuiet("G4 P5\n")
+        self.machif.write("G1 X1\n")
+        self.machif._lastBookkeepingTime -= grbl.BUFFER_RESYNC_QUIET_TIME
+
+        # dwell done, ok for G1 lost
+        self.machif.decode("ok\n")
+        self.status("Idle", 15, 128)
+        self.assertEqual(self.machif._inputBufferPart, [])
+        self.assertEqual(self.machif._bfResyncCount, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
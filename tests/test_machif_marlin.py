@@ -0,0 +1,210 @@
+"""----------------------------------------------------------------------------
+   test_machif_marlin.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+
+import unittest
+
+import modules.machif_marlin as marlin
+
+from tests.test_machif_grbl import SerialRecorder
+
+
+def numbered(line_number, line):
+    """ Line as Marlin expects it, with line number and checksum
+    """
+    line = "N%d %s" % (line_number, line)
+    cs = 0
+    for c in line:
+        cs ^= ord(c)
+
+    return "%s*%d\n" % (line, cs)
+
+
+class MarlinTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.machif = marlin.MachIf_Marlin()
+        self.machif._init()
+        self.serial = SerialRecorder()
+        self.machif._serialTxRxThread = self.serial
+
+    def txData(self):
+        return [data for lane, data in self.serial.txData()]
+
+    def connect(self):
+        """ First line goes with M110, both acknowledged
+        """
+        self.machif.write("G1 X1\n")
+        self.machif.decode("ok\n")
+        self.machif.decode("ok\n")
+        self.serial.events = []
+
+
+class TestLineAccounting(MarlinTestCase):
+
+    def test_line_numbers(self):
+        self.machif.write("G1 X1\n")
+        self.machif.write("N7 G1 X2\n")
+
+        self.assertEqual(self.txData(), [
+            numbered(0, "M110 N0") + numbered(1, "G1 X1"),
+            numbered(2, "G1 X2")])
+        self.assertEqual(self.machif._getLinesInFlight(), 3)
+
+        for inFlight in [2, 1, 0]:
+            self.machif.decode("ok\n")
+            self.assertEqual(self.machif._getLinesInFlight(), inFlight)
+
+        # more oks than lines don't go negative
+        self.machif.decode("ok\n")
+        self.assertEqual(self.machif._getLinesInFlight(), 0)
+        self.assertEqual(self.machif._getStatus(), "Idle")
+
+    def test_command_slots(self):
+        self.connect()
+
+        self.assertTrue(self.machif.okToSend("G1 X1\nG1 X2\nG1 X3\nG1 X4\n"))
+        self.assertFalse(self.machif.okToSend("G1 X1\n" * 5))
+
+        self.machif.write("G1 X1\nG1 X2\nG1 X3\n")
+        self.assertTrue(self.machif.okToSend("G1 X4\n"))
+        self.assertFalse(self.machif.okToSend("G1 X4\nG1 X5\n"))
+
+    def test_advanced_ok(self):
+        self.connect()
+        self.machif.write("G1 X1\nG1 X2\nG1 X3\n")
+
+        # line number in ok, planner and command queue free slots
+        self.machif.decode("ok N3 P15 B7\n")
+        self.assertEqual(self.machif._getLinesInFlight(), 1)
+        self.assertEqual(self.machif._cmdSlots, 8)
+
+        # planner size is the most free slots seen
+        self.machif.decode("ok N4 P12 B7\n")
+        self.assertEqual(self.machif._getLinesInFlight(), 0)
+        self.assertEqual(self.machif._getStatus(), "Run")
+
+        self.machif.decode("ok N4 P15 B7\n")
+        self.assertEqual(self.machif._getStatus(), "Idle")
+
+    def test_emergency_commands_unnumbered(self):
+        self.connect()
+        self.machif.write("G1 X1\n")
+        self.machif.write("M108\n")
+
+        self.assertEqual(self.txData(), [numbered(2, "G1 X1"), "M108\n"])
+        self.assertEqual(self.machif._getLinesInFlight(), 2)
+
+        self.machif.decode("ok\n")
+        self.machif.decode("ok\n")
+        self.assertEqual(self.machif._getLinesInFlight(), 0)
+
+    def test_errors(self):
+        self.connect()
+        self.machif.write("G1 X1\n")
+
+        # link errors are followed by a resend, not a program error
+        dataDict = self.machif.decode("Error:checksum mismatch, "
+                                      "Last Line: 1\n")
+        self.assertNotIn('f', dataDict)
+
+        dataDict = self.machif.decode("Error:Unknown command: \"G999\"\n")
+        self.assertEqual(dataDict['f'][:3], [0, -1, 0])
+
+
+class TestResend(MarlinTestCase):
+
+    def setUp(self):
+        MarlinTestCase.setUp(self)
+        self.connect()
+        self.machif.write("G1 X1\nG1 X2\n")
+        self.serial.events = []
+
+    def test_resend_checksum_error(self):
+        # N2 corrupted, N3 already on the way is rejected too
+        self.machif.decode("Error:checksum mismatch, Last Line: 1\n")
+        dataDict = self.machif.decode("Resend: 2\n")
+        self.assertEqual(dataDict['rx_data_info'], "resend 1\n")
+        self.machif.decode("ok\n")
+
+        self.assertEqual(self.txData(),
+                         [numbered(2, "G1 X1") + numbered(3, "G1 X2")])
+
+        self.machif.decode("Error:Line Number is not Last Line Number+1, "
+                           "Last Line: 1\n")
+        self.machif.decode("Resend: 2\n")
+        self.machif.decode("ok\n")
+
+        # already resent
+        self.assertEqual(len(self.txData()), 1)
+        self.assertEqual(self.machif._getLinesInFlight(), 2)
+
+        self.machif.decode("ok\n")
+        self.machif.decode("ok\n")
+        self.assertEqual(self.machif._getLinesInFlight(), 0)
+        self.assertEqual(self.machif._resendCount, 1)
+
+    def test_resent_line_corrupted_again(self):
+        self.machif.decode("Error:checksum mismatch, Last Line: 1\n")
+        self.machif.decode("Resend: 2\n")
+        self.machif.decode("ok\n")
+        self.machif.decode("Error:Line Number is not Last Line Number+1, "
+                           "Last Line: 1\n")
+        self.machif.decode("Resend: 2\n")
+        self.machif.decode("ok\n")
+
+        # resent N2 has a checksum error too, sent a third time
+        self.machif.decode("Error:checksum mismatch, Last Line: 1\n")
+        self.machif.decode("Resend: 2\n")
+        self.machif.decode("ok\n")
+
+        self.assertEqual(self.txData(),
+                         [numbered(2, "G1 X1") + numbered(3, "G1 X2")] * 2)
+        self.assertEqual(self.machif._resendCount, 2)
+
+    def test_resend_timeout(self):
+        self.machif.decode("Resend: 3\n")
+        self.machif.decode("ok\n")
+        self.assertEqual(self.txData(), [numbered(3, "G1 X2")])
+        self.assertEqual(self.machif._getLinesInFlight(), 1)
+
+        # nothing heard, resent line lost as well
+        self.machif.tick()
+        self.assertEqual(len(self.txData()), 1)
+
+        self.machif._lastRxTime -= marlin.RESEND_TIMEOUT + 1
+        self.machif.tick()
+        self.assertEqual(self.txData(), [numbered(3, "G1 X2")] * 2)
+
+    def test_resend_out_of_history(self):
+        self.machif._sentLines.pop(2)
+        self.machif.decode("Resend: 2\n")
+
+        self.assertEqual(self.txData(), [])
+        self.assertEqual(self.machif._resendCount, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""----------------------------------------------------------------------------
+   test_machif_process.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import unittest
+
+import modules.config as gc
+import modules.machif_process as mi_process
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def child_log(conn):
+    mi_process.init_child_logger(mi_process.PipeEventForwarder(conn))
+
+    logger = logging.getLogger()
+
+    # args that don't pickle, message is formatted in the child
+    logger.info("child %s pid %d", threading.Lock(), os.getpid())
+
+    try:
+        raise ValueError("bad value")
+    except ValueError:
+        logger.exception("child failed")
+
+    conn.send((gc.EV_EXIT, None))
+
+
+class TestChildLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger()
+        self.handler = RecordingHandler()
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+
+    def test_child_records_go_over_pipe(self):
+        conn, childConn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=child_log, args=(childConn,))
+        process.start()
+
+        received = []
+        while True:
+            self.assertTrue(conn.poll(5.0))
+            event_id, data = conn.recv()
+            if event_id == gc.EV_EXIT:
+                break
+
+            self.assertEqual(event_id, gc.EV_LOG_RECORD)
+            received.append(logging.makeLogRecord(data))
+
+        process.join(5.0)
+
+        # the child wrote nothing through the handlers it inherited
+        self.assertEqual(self.handler.records, [])
+
+        self.assertEqual(len(received), 2)
+        self.assertTrue(received[0].getMessage().startswith("child <"))
+        self.assertTrue(received[0].getMessage().endswith(
+            "pid %d" % process.pid))
+        self.assertEqual(received[0].process, process.pid)
+        self.assertEqual(received[0].levelno, logging.INFO)
+
+        self.assertEqual(received[1].levelno, logging.ERROR)
+        self.assertIn("ValueError: bad value", received[1].exc_text)
+
+        # GUI process handlers write forwarded records as their own
+        self.logger.handle(received[1])
+        self.assertEqual(self.handler.records, [received[1]])
+        self.assertIn("bad value",
+                      logging.Formatter().format(self.handler.records[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""----------------------------------------------------------------------------
+   test_machif_tinyg.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+
+import unittest
+
+import modules.machif_g2core as g2core
+import modules.machif_tinyg as tinyg
+
+from tests.test_machif_grbl import SerialRecorder
+
+ACK = '{"r":{},"f":[1,0,6]}\n'
+
+
+class TestQueueReportFlowControl(unittest.TestCase):
+
+    machIfClass = tinyg.MachIf_TinyG
+    plannerSize = tinyg.PLANNER_BUFFER_SIZE
+
+    def setUp(self):
+        self.machif = self.machIfClass()
+        self.machif._init()
+        self.machif.queueReportFlowControl = True
+        self.serial = SerialRecorder()
+        self.machif._serialTxRxThread = self.serial
+
+    def sendAcked(self, line, count):
+        for i in range(count):
+            self.machif.write(line)
+            self.machif.decode(ACK)
+
+    def test_acks_with_idle_planner(self):
+        self.machif.decode('{"qr":%d}\n' % self.plannerSize)
+
+        # status requests and modal lines never reach the planner, no new
+        # queue report comes for them
+        for i in range(self.plannerSize):
+            self.machif.write('{"sr":null}\n')
+            self.machif.decode('{"r":{"sr":{"posx":0.0}},"f":[1,0,9]}\n')
+
+        self.sendAcked("G90\n", self.plannerSize)
+
+        self.assertEqual(self.machif._plannerAckSinceQr, 0)
+        self.assertTrue(self.machif.okToSend("G1 X1\n"))
+
+    def test_acks_with_busy_planner(self):
+        free = self.plannerSize - 8
+        self.machif.decode('{"qr":%d}\n' % free)
+
+        reserve = tinyg.PLANNER_BUFFER_RESERVE
+        self.sendAcked("G1 X1\n", free - reserve - 1)
+        self.assertTrue(self.machif.okToSend("G1 X1\n"))
+
+        self.sendAcked("G1 X1\n", 1)
+        self.assertFalse(self.machif.okToSend("G1 X1\n"))
+
+        # queue report or idle status resyncs
+        self.machif.decode('{"qr":%d}\n' % free)
+        self.assertTrue(self.machif.okToSend("G1 X1\n"))
+
+        self.sendAcked("G1 X1\n", free - reserve)
+        self.assertFalse(self.machif.okToSend("G1 X1\n"))
+
+        self.machif.decode('{"sr":{"stat":5}}\n')
+        self.assertFalse(self.machif.okToSend("G1 X1\n"))
+
+        self.machif.decode('{"sr":{"stat":3}}\n')
+        self.assertTrue(self.machif.okToSend("G1 X1\n"))
+
+    def test_lines_in_flight(self):
+        # planner fills before input buffer
+        self.machif.decode('{"qr":12}\n')
+
+        lines = 12 - tinyg.PLANNER_BUFFER_RESERVE - 1
+        for i in range(lines):
+            self.machif.write("G1 X1\n")
+
+        self.assertTrue(self.machif.okToSend("G1 X1\n"))
+        self.machif.write("G1 X1\n")
+        self.assertFalse(self.machif.okToSend("G1 X1\n"))
+
+
+class TestQueueReportFlowControlG2core(TestQueueReportFlowControl):
+
+    machIfClass = g2core.MachIf_g2core
+    plannerSize = g2core.PLANNER_BUFFER_SIZE
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""----------------------------------------------------------------------------
+   test_profiler.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+
+import threading
+import unittest
+
+import modules.profiler as prof
+
+
+class TestAfterFork(unittest.TestCase):
+    """ after_fork here sees the threads of this process as the ones left
+        behind by fork
+    """
+
+    def setUp(self):
+        self.stackSize = threading.stack_size()
+
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.done.wait)
+        self.thread.start()
+
+    def tearDown(self):
+        self.done.set()
+        self.thread.join()
+
+        threading.stack_size(self.stackSize)
+        prof.FORK_GHOST_THREAD_IDS = set()
+
+    def test_not_profiling_keeps_stack_size(self):
+        prof.after_fork()
+
+        self.assertIn(self.thread.ident, prof.FORK_GHOST_THREAD_IDS)
+        self.assertNotIn(threading.current_thread().ident,
+                         prof.FORK_GHOST_THREAD_IDS)
+        self.assertEqual(threading.stack_size(), self.stackSize)
+
+    def test_profiling_grows_stacks(self):
+        try:
+            import resource
+            stackSize = resource.getrlimit(resource.RLIMIT_STACK)[0]
+        except ImportError:
+            stackSize = -1
+
+        if stackSize <= 0:
+            self.skipTest("no stack size limit")
+
+        prof.after_fork(True)
+
+        self.assertIn(self.thread.ident, prof.FORK_GHOST_THREAD_IDS)
+        self.assertEqual(threading.stack_size(), 2 * stackSize)
+
+
+if __name__ == '__main__':
+    unittest.main()
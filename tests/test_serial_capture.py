@@ -0,0 +1,150 @@
+"""----------------------------------------------------------------------------
+   test_serial_capture.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+
+import os
+import shutil
+import tempfile
+import time
+import tty
+import unittest
+
+import modules.config as gc
+import modules.serial_capture as sc
+import modules.serial_thread as st
+
+from tests.test_serial_thread import read_device
+from tests.test_socket_port import Listener
+
+
+class CaptureTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.tempDir, "capture.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+
+class TestSerialCapture(CaptureTestCase):
+
+    def test_round_trip(self):
+        startTime = time.time()
+
+        for port in ["/dev/ttyUSB0", "tcp://localhost:2000"]:
+            capture = sc.SerialCapture(self.fileName, port)
+            capture.tx("G0 X1\n")
+            capture.rx("ok\n")
+            capture.close()
+
+            # late writes after port close are dropped
+            capture.tx("G0 X2\n")
+
+        records = list(sc.read_capture(self.fileName))
+
+        self.assertEqual([(recType, data) for t, recType, data in records], [
+            (sc.REC_OPEN, "/dev/ttyUSB0"),
+            (sc.REC_TX, "G0 X1\n"),
+            (sc.REC_RX, "ok\n"),
+            (sc.REC_OPEN, "tcp://localhost:2000"),
+            (sc.REC_TX, "G0 X1\n"),
+            (sc.REC_RX, "ok\n")])
+
+        # open is wall clock time, the rest time since open
+        self.assertTrue(startTime <= records[0][0] <= time.time())
+        self.assertTrue(0 <= records[1][0] <= records[2][0] < 1.0)
+
+    def test_cut_short(self):
+        capture = sc.SerialCapture(self.fileName, "/dev/ttyUSB0")
+        capture.tx("G0 X1\n")
+        capture.rx("ok\n")
+        capture.close()
+
+        size = os.path.getsize(self.fileName)
+        with open(self.fileName, 'r+b') as f:
+            f.truncate(size - 1)
+
+        records = list(sc.read_capture(self.fileName))
+        self.assertEqual([data for t, recType, data in records],
+                         ["/dev/ttyUSB0", "G0 X1\n"])
+
+        with open(self.fileName, 'r+b') as f:
+            f.truncate(size - len("ok\n") - 2)
+
+        records = list(sc.read_capture(self.fileName))
+        self.assertEqual(len(records), 2)
+
+    def test_not_a_capture(self):
+        with open(self.fileName, 'wb') as f:
+            f.write("G0 X1\n")
+
+        self.assertRaises(ValueError, list, sc.read_capture(self.fileName))
+
+
+@unittest.skipIf(os.name == 'nt', "needs a pty")
+class TestSerialThreadCapture(CaptureTestCase):
+
+    def setUp(self):
+        CaptureTestCase.setUp(self)
+
+        self.captureFile = gc.SERIAL_CAPTURE_FILE
+        gc.SERIAL_CAPTURE_FILE = self.fileName
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+
+    def tearDown(self):
+        os.close(self.master)
+        os.close(self.slave)
+        gc.SERIAL_CAPTURE_FILE = self.captureFile
+
+        CaptureTestCase.tearDown(self)
+
+    def test_port_traffic_captured(self):
+        portName = os.ttyname(self.slave)
+        listener = Listener()
+        thread = st.SerialPortThread(listener, portName, 115200)
+        self.assertIsNotNone(listener.waitFor(gc.EV_SER_PORT_OPEN))
+
+        thread.eventPut(gc.EV_CMD_SER_TXDATA, "G0 X1\n")
+        self.assertEqual(read_device(self.master, 6), "G0 X1\n")
+
+        os.write(self.master, "ok\n")
+        self.assertIsNotNone(listener.waitFor(gc.EV_SER_RXDATA))
+
+        thread.eventPut(gc.EV_CMD_EXIT)
+        thread.join(5.0)
+        self.assertFalse(thread.isAlive())
+
+        records = list(sc.read_capture(self.fileName))
+        self.assertEqual([(recType, data) for t, recType, data in records], [
+            (sc.REC_OPEN, portName),
+            (sc.REC_TX, "G0 X1\n"),
+            (sc.REC_RX, "ok\n")])
+
+
+if __name__ == '__main__':
+    unittest.main()
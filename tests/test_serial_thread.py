@@ -0,0 +1,124 @@
+"""----------------------------------------------------------------------------
+   test_serial_thread.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import os
+import select
+import time
+import tty
+import unittest
+
+import modules.config as gc
+import modules.serial_thread as st
+
+from tests.test_socket_port import Listener
+
+
+def read_device(fd, size, timeout=5.0):
+    """ Read size bytes written by the serial thread to the pty
+    """
+    data = ""
+    end = time.time() + timeout
+
+    while len(data) < size and time.time() < end:
+        if select.select([fd], [], [], 0.05)[0]:
+            data += os.read(fd, size - len(data))
+
+    return data
+
+
+@unittest.skipIf(os.name == 'nt', "needs a pty")
+class TestSerialThreadWakeUp(unittest.TestCase):
+    """ Serial thread blocks on port and wake up pipe, queued events must
+        not wait for a poll period
+    """
+
+    def setUp(self):
+        self.waitTimeout = st.SERIAL_WAIT_TIMEOUT
+        st.SERIAL_WAIT_TIMEOUT = 30.0
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+
+        self.listener = Listener()
+        self.thread = st.SerialPortThread(
+            self.listener, os.ttyname(self.slave), 115200)
+        self.assertIsNotNone(self.listener.waitFor(gc.EV_SER_PORT_OPEN))
+
+        # let the thread block in select()
+        time.sleep(0.1)
+
+    def tearDown(self):
+        self.thread.eventPut(gc.EV_CMD_EXIT)
+        self.thread.join(5.0)
+        os.close(self.master)
+        os.close(self.slave)
+        st.SERIAL_WAIT_TIMEOUT = self.waitTimeout
+
+    def test_priority_event_wakes_thread(self):
+        latency = []
+
+        for i in range(20):
+            start = time.time()
+            self.thread.eventPutPriority(gc.EV_CMD_SER_TXDATA, "!")
+            self.assertEqual(read_device(self.master, 1, 1.0), "!")
+            latency.append(time.time() - start)
+
+            time.sleep(0.02)
+
+        self.assertLess(max(latency), 1.0)
+        self.assertLess(sum(latency) / len(latency), 0.005)
+
+        self.assertEqual(self.thread.rtWriteCount, 20)
+
+    def test_event_wakes_thread(self):
+        start = time.time()
+        self.thread.eventPut(gc.EV_CMD_SER_TXDATA, "G0 X1\n")
+        self.assertEqual(read_device(self.master, 6, 1.0), "G0 X1\n")
+        self.assertLess(time.time() - start, 1.0)
+
+    def test_port_data_wakes_thread(self):
+        start = time.time()
+        os.write(self.master, "ok\n")
+
+        e = self.listener.waitFor(gc.EV_SER_RXDATA, 1.0)
+        self.assertIsNotNone(e)
+        self.assertEqual(e.data, "ok\n")
+        self.assertLess(time.time() - start, 1.0)
+
+    def test_exit_closes_wake_up(self):
+        wakeUp = self.thread._wakeUp
+        self.thread.eventPut(gc.EV_CMD_EXIT)
+        self.thread.join(5.0)
+
+        self.assertFalse(self.thread.isAlive())
+        self.assertIsNotNone(self.listener.waitFor(gc.EV_EXIT))
+
+        # late producers don't fail on the closed pipe
+        wakeUp.set()
+        self.thread.eventPutPriority(gc.EV_CMD_SER_TXDATA, "!")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,276 @@
+"""----------------------------------------------------------------------------
+   test_socket_port.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import Queue
+import socket
+import time
+import unittest
+
+import modules.config as gc
+import modules.socket_port as sp
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.time() + timeout
+    while not condition():
+        if time.time() > end:
+            return False
+        time.sleep(0.005)
+
+    return True
+
+
+class LocalServer(object):
+    """ Listening socket on localhost standing in for ser2net
+    """
+
+    def __init__(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(1)
+        self.listener.settimeout(5.0)
+        self.port = self.listener.getsockname()[1]
+        self.portName = "tcp://127.0.0.1:%d" % self.port
+
+    def accept(self):
+        conn, address = self.listener.accept()
+        conn.settimeout(5.0)
+        return conn
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+
+
+def recv_all(conn, size):
+    data = ""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+
+    return data
+
+
+class TestParseSocketPort(unittest.TestCase):
+
+    def test_is_socket_port(self):
+        self.assertTrue(sp.is_socket_port("tcp://cnc:2000"))
+        self.assertTrue(sp.is_socket_port("TCP://cnc:2000"))
+        self.assertFalse(sp.is_socket_port("/dev/ttyUSB0"))
+        self.assertFalse(sp.is_socket_port("COM3"))
+
+    def test_parse(self):
+        self.assertEqual(sp.parse_socket_port("tcp://cnc.local:2000"),
+                         ("cnc.local", 2000))
+        self.assertEqual(sp.parse_socket_port("tcp://10.0.0.7:23/"),
+                         ("10.0.0.7", 23))
+        self.assertEqual(sp.parse_socket_port("tcp://[::1]:2000"),
+                         ("::1", 2000))
+
+    def test_parse_invalid(self):
+        for name in ["tcp://cnc", "tcp://:2000", "tcp://cnc:port", "tcp://"]:
+            self.assertRaises(ValueError, sp.parse_socket_port, name)
+
+    def test_invalid_port_is_io_error(self):
+        self.assertRaises(IOError, sp.SocketPort, "tcp://cnc")
+
+
+class TestSocketPort(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer()
+        self.port = sp.SocketPort(self.server.portName)
+        self.port.reconnectBackoff = [0.01, 0.01, 0.01]
+        self.conn = self.server.accept()
+
+    def tearDown(self):
+        self.port.close()
+        self.conn.close()
+        self.server.close()
+
+    def reconnect(self):
+        """ Poll reconnect until connected, each poll must not block
+        """
+        end = time.time() + 5.0
+        while time.time() < end:
+            start = time.time()
+            connected = self.port.reconnectPoll()
+            self.assertLess(time.time() - start, 0.05)
+
+            if connected:
+                return True
+
+            time.sleep(0.005)
+
+        return False
+
+    def test_read_write(self):
+        self.assertTrue(self.port.isOpen())
+        self.assertFalse(self.port.isReconnecting())
+
+        self.assertEqual(self.port.write("G0 X1\n"), 6)
+        self.assertEqual(recv_all(self.conn, 6), "G0 X1\n")
+
+        self.assertEqual(self.port.inWaiting(), 0)
+
+        self.conn.sendall("ok\nok\n")
+        self.assertTrue(wait_for(lambda: self.port.inWaiting() == 6))
+        self.assertEqual(self.port.read(3), "ok\n")
+        self.assertEqual(self.port.inWaiting(), 3)
+        self.assertEqual(self.port.read(3), "ok\n")
+        self.assertEqual(self.port.inWaiting(), 0)
+
+    def test_peer_close_reconnects(self):
+        self.conn.close()
+
+        self.assertRaises(sp.SocketLinkLost, wait_for,
+                          lambda: self.port.inWaiting() and False)
+        self.assertFalse(self.port.isOpen())
+        self.assertTrue(self.port.isReconnecting())
+        self.assertEqual(self.port.inWaiting(), 0)
+
+        self.assertTrue(self.reconnect())
+        self.conn = self.server.accept()
+
+        self.assertTrue(self.port.isOpen())
+        self.assertFalse(self.port.isReconnecting())
+        self.assertEqual(self.port.reconnectCount, 1)
+
+        self.port.write("$X\n")
+        self.assertEqual(recv_all(self.conn, 3), "$X\n")
+
+    def test_write_error_is_not_resent(self):
+        self.conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER,
+                             "\x01\x00\x00\x00\x00\x00\x00\x00")
+        self.conn.close()
+
+        def write_lines():
+            for i in range(100):
+                self.port.write("G1 X%d\n" % i)
+                time.sleep(0.001)
+            return False
+
+        self.assertRaises(sp.SocketLinkLost, wait_for, write_lines)
+        self.assertTrue(self.port.isReconnecting())
+        self.assertRaises(IOError, self.port.write, "G1 X0\n")
+
+        self.assertTrue(self.reconnect())
+        self.conn = self.server.accept()
+
+        # nothing from before the lost connection shows up again
+        self.port.write("?")
+        self.assertEqual(self.conn.recv(100), "?")
+
+    def test_reconnect_gives_up(self):
+        self.conn.close()
+        self.server.close()
+
+        self.assertRaises(sp.SocketLinkLost, wait_for,
+                          lambda: self.port.inWaiting() and False)
+
+        def poll():
+            while True:
+                start = time.time()
+                self.port.reconnectPoll()
+                self.assertLess(time.time() - start, 0.05)
+                time.sleep(0.005)
+
+        self.assertRaises(IOError, poll)
+        self.assertFalse(self.port.isReconnecting())
+        self.assertFalse(self.port.isOpen())
+
+
+class Listener(gc.EventQueueIf):
+    """ Collects events sent by the serial thread
+    """
+
+    def __init__(self):
+        gc.EventQueueIf.__init__(self)
+        self.events = Queue.Queue()
+
+    def eventPost(self, e):
+        self.events.put(e)
+
+    def waitFor(self, event_id, timeout=5.0):
+        end = time.time() + timeout
+        while time.time() < end:
+            try:
+                e = self.events.get(timeout=0.05)
+            except Queue.Empty:
+                continue
+
+            if e.event_id == event_id:
+                return e
+
+        return None
+
+
+class TestSerialThreadSocketPort(unittest.TestCase):
+
+    def setUp(self):
+        import modules.serial_thread as st
+
+        self.server = LocalServer()
+        self.listener = Listener()
+        self.thread = st.SerialPortThread(
+            self.listener, self.server.portName, 115200)
+        self.conn = self.server.accept()
+
+        self.assertIsNotNone(self.listener.waitFor(gc.EV_SER_PORT_OPEN))
+        self.thread.serialPort.reconnectBackoff = [0.01, 0.01, 0.01]
+
+    def tearDown(self):
+        self.thread.eventPut(gc.EV_CMD_EXIT)
+        self.thread.join(5.0)
+        self.conn.close()
+        self.server.close()
+
+    def test_link_lost_reconnects(self):
+        self.thread.eventPut(gc.EV_CMD_SER_TXDATA, "G0 X1\n")
+        self.assertEqual(recv_all(self.conn, 6), "G0 X1\n")
+
+        self.conn.sendall("ok\n")
+        e = self.listener.waitFor(gc.EV_SER_RXDATA)
+        self.assertEqual(e.data, "ok\n")
+
+        self.conn.close()
+
+        # lost link shows as port close, not abort, and then open again
+        e = self.listener.waitFor(gc.EV_SER_PORT_CLOSE)
+        self.assertIsNotNone(e)
+        self.conn = self.server.accept()
+        self.assertIsNotNone(self.listener.waitFor(gc.EV_SER_PORT_OPEN))
+
+        self.thread.eventPut(gc.EV_CMD_SER_TXDATA, "G0 X2\n")
+        self.assertEqual(recv_all(self.conn, 6), "G0 X2\n")
+        self.assertTrue(self.thread.isAlive())
+
+
+if __name__ == '__main__':
+    unittest.main()
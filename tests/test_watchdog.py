@@ -0,0 +1,88 @@
+"""----------------------------------------------------------------------------
+   test_watchdog.py
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import time
+import unittest
+
+import modules.watchdog as wd
+
+
+class TestAckWait(unittest.TestCase):
+
+    def setUp(self):
+        self.watchdog = wd.StallWatchdog()
+        self.counts = []
+        self.watchdog.addStallListener(self.counts.append)
+
+        self.hb = self.watchdog.heartbeat("exec")
+        self.watchdog.threshold = 0.05
+        self.watchdog.ackWaitThreshold = 0.2
+
+    def tearDown(self):
+        self.hb.close()
+        self.watchdog.stop()
+
+    def test_idle_is_not_a_stall(self):
+        self.hb.idle()
+        time.sleep(0.4)
+
+        self.assertEqual(self.counts, [])
+        self.assertEqual(self.watchdog.stallCounts(), {'exec': 0})
+
+    def test_long_ack_wait_reported_once(self):
+        # waiting for device data inside an acknowledge wait
+        self.hb.ackWait()
+        self.hb.idle()
+        time.sleep(0.1)
+        self.assertEqual(self.counts, [])
+
+        time.sleep(0.4)
+        self.assertEqual(self.counts, [{'exec': 0, 'exec ack': 1}])
+
+        self.hb.beat()
+        self.hb.ackDone()
+        self.hb.idle()
+
+        # next long wait is a new report
+        self.hb.ackWait()
+        time.sleep(0.4)
+        self.assertEqual(self.watchdog.stallCounts(),
+                         {'exec': 0, 'exec ack': 2})
+
+    def test_short_ack_wait_not_reported(self):
+        for i in range(5):
+            self.hb.ackWait()
+            self.hb.idle()
+            time.sleep(0.1)
+            self.hb.beat()
+            self.hb.ackDone()
+
+        self.hb.idle()
+        time.sleep(0.3)
+        self.assertEqual(self.watchdog.stallCounts(), {'exec': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,608 @@
+#!/usr/bin/env python
+"""----------------------------------------------------------------------------
+   bench_decode.py:
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import gc as gcollect
+import json
+import logging
+import os
+import sys
+import timeit
+from optparse import OptionParser
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.config as gc
+import modules.machif_config as mi
+import modules.serial_capture as sc
+
+__appname__ = "gsat decode benchmark"
+
+__description__ = \
+    "times machine interface decode and encode over recorded traffic for "\
+    "each controller, reports ns/line and objects/line per kind of traffic, "\
+    "runs without wx, results can be saved and compared to catch per line "\
+    "cost regressions"
+
+__version_info__ = (1, 0, 0)
+__version__ = 'v%i.%i.%i' % __version_info__
+__revision__ = __version__
+
+""" Traffic corpora
+
+    Device replies in the order a session sees them, each line tagged with
+    its kind of traffic. Lines are given without line end, the corpus eol
+    is added the way the serial thread hands lines to decode.
+"""
+GCODE_TX = [
+    "G21\n", "G90\n", "G0 Z5.000\n", "G0 X10.000 Y10.000\n",
+    "M3 S12000\n", "G4 P0.5\n", "G1 Z-1.000 F300\n",
+    "G1 X20.000 Y10.000 F800\n", "?",
+    "G2 X25.000 Y15.000 I0.000 J5.000\n", "G1 X25.000 Y20.000\n",
+    "G3 X20.000 Y25.000 I-5.000 J0.000\n", "G1 X10.000 Y25.000\n", "?",
+    "G1 X10.000 Y10.000\n", "G0 Z5.000\n", "M5\n", "G0 X0.000 Y0.000\n",
+]
+
+GRBL_RUN = [
+    ('ack', "ok"),
+    ('ack', "ok"),
+    ('status', "<Run|MPos:12.500,4.250,-1.000|Bf:14,96|FS:800,12000|"
+               "Ov:100,100,100>"),
+    ('ack', "ok"),
+    ('ack', "ok"),
+    ('status', "<Run|MPos:13.102,4.871,-1.000|Bf:13,80|Ln:1042|"
+               "FS:800,12000>"),
+    ('ack', "ok"),
+    ('status', "<Run|MPos:14.730,5.002,-1.000|Bf:12,64|"
+               "FS:800,12000|WCO:0.000,0.000,0.000>"),
+    ('ack', "ok"),
+]
+
+GRBL_CORPUS = {
+    'eol': "\r\n",
+    'tx': GCODE_TX + ["$$\n", "$X\n", "$G\n"],
+    'rx': [
+        ('banner', "Grbl 1.1h ['$' for help]"),
+        ('banner', "[MSG:'$H'|'$X' to unlock]"),
+        ('banner', "[VER:1.1h.20190830:]"),
+        ('banner', "[OPT:V,15,128]"),
+        ('ack', "ok"),
+        ('settings', "$0=10"), ('settings', "$1=25"), ('settings', "$2=0"),
+        ('settings', "$3=0"), ('settings', "$4=0"), ('settings', "$5=0"),
+        ('settings', "$6=0"), ('settings', "$10=1"),
+        ('settings', "$11=0.010"), ('settings', "$12=0.002"),
+        ('settings', "$13=0"), ('settings', "$20=0"), ('settings', "$21=0"),
+        ('settings', "$22=1"), ('settings', "$23=0"),
+        ('settings', "$24=25.000"), ('settings', "$25=500.000"),
+        ('settings', "$26=250"), ('settings', "$27=1.000"),
+        ('settings', "$30=1000"), ('settings', "$31=0"),
+        ('settings', "$32=0"), ('settings', "$100=250.000"),
+        ('settings', "$101=250.000"), ('settings', "$102=250.000"),
+        ('settings', "$110=500.000"), ('settings', "$111=500.000"),
+        ('settings', "$112=500.000"), ('settings', "$120=10.000"),
+        ('settings', "$121=10.000"), ('settings', "$122=10.000"),
+        ('settings', "$130=200.000"), ('settings', "$131=200.000"),
+        ('settings', "$132=200.000"),
+        ('ack', "ok"),
+        ('settings', "[GC:G0 G54 G17 G21 G90 G94 M5 M9 T0 F0 S0]"),
+        ('ack', "ok"),
+        ('status', "<Idle|MPos:0.000,0.000,0.000|FS:0,0|"
+                   "WCO:0.000,0.000,0.000>"),
+    ] + GRBL_RUN * 8 + [
+        ('status', "<Jog|MPos:20.000,0.000,5.000|Bf:15,127|FS:1000,0>"),
+        ('status', "<Hold:0|MPos:25.331,9.004,-1.000|Bf:15,128|FS:0,0|"
+                   "Ov:100,100,100>"),
+        ('error', "error:20"),
+        ('error', "error:9"),
+        ('alarm', "ALARM:1"),
+        ('banner', "[MSG:Reset to continue]"),
+        ('status', "<Alarm|MPos:25.331,9.004,-1.000|Bf:15,128|FS:0,0>"),
+        ('ack', "ok"),
+        ('status', "<Idle|WPos:1.000,2.000,3.000,0.000|FS:0,0|Pn:XYZA|"
+                   "WCO:0.000,0.000,0.000,0.000>"),
+    ],
+}
+
+TINYG_RUN = [
+    ('ack', '{"r":{},"f":[1,0,22,4417]}'),
+    ('ack', '{"r":{},"f":[1,0,26,7781]}'),
+    ('status', '{"sr":{"line":1042,"posx":12.500,"posy":4.250,'
+               '"posz":-1.000,"vel":800.00,"stat":5}}'),
+    ('queue', '{"qr":24,"qi":1,"qo":0}'),
+    ('ack', '{"r":{},"f":[1,0,34,2215]}'),
+    ('status', '{"sr":{"posx":12.811,"posy":4.402,"vel":795.21}}'),
+    ('queue', '{"qr":23,"qi":1,"qo":2}'),
+    ('ack', '{"r":{},"f":[1,0,20,6630]}'),
+]
+
+TINYG_CORPUS = {
+    'eol': "\n",
+    'tx': GCODE_TX + ['{"sr":null}\n', '{"qr":null}\n'],
+    'rx': [
+        ('banner', '{"r":{"fv":0.970,"fb":440.20,"hp":1,"hv":8,'
+                   '"id":"3X3566-YMB","msg":"SYSTEM READY"},'
+                   '"f":[1,0,0,4462]}'),
+        ('settings', '{"r":{"sys":{"fb":440.20,"fv":0.970,"hp":1,"hv":8,'
+                     '"id":"3X3566-YMB","ja":2000000.00,"ct":0.010,"sl":0,'
+                     '"st":0,"mt":2.00,"ej":1,"jv":4,"js":1,"tv":1,"qv":1,'
+                     '"sv":1,"si":100,"spi":0,"spd":1,"gpl":0,"gun":1,'
+                     '"gco":1,"gpa":2,"gdi":0}},"f":[1,0,9,8431]}'),
+        ('settings', '{"r":{"x":{"am":1,"vm":16000,"fr":16000,"tn":0,'
+                     '"tm":150,"jm":5000,"jh":10000,"jd":0.0500,"sn":3,'
+                     '"sv":3000,"lv":100,"lb":20,"zb":3}},'
+                     '"f":[1,0,9,1234]}'),
+        ('settings', '{"r":{"1":{"ma":0,"sa":1.800,"tr":40.000,"mi":8,'
+                     '"po":0,"pm":2}},"f":[1,0,9,3305]}'),
+        ('settings', '{"r":{"sr":{"line":true,"posx":true,"posy":true,'
+                     '"posz":true,"posa":true,"vel":true,"stat":true}},'
+                     '"f":[1,0,10,5120]}'),
+        ('status', '{"sr":{"line":0,"posx":0.000,"posy":0.000,'
+                   '"posz":0.000,"posa":0.000,"vel":0.00,"stat":3}}'),
+    ] + TINYG_RUN * 8 + [
+        ('status', '{"sr":{"mpox":20.000,"mpoy":25.000,"stat":6}}'),
+        ('error', '{"r":{},"f":[1,108,6,0]}'),
+        ('error', '{"r":{"msg":"Unrecognized command"},"f":[1,100,5,1723]}'),
+        ('alarm', '{"er":{"fb":440.20,"st":204,"msg":"Limit switch hit - '
+                  'Shutdown occurred","val":1}}'),
+        ('status', '{"sr":{"stat":2,"vel":0.00}}'),
+    ],
+}
+
+G2CORE_RUN = [
+    ('ack', '{"r":{},"f":[1,0,22]}'),
+    ('ack', '{"r":{},"f":[1,0,26]}'),
+    ('status', '{"sr":{"line":1042,"posx":12.500,"posy":4.250,'
+               '"posz":-1.000,"vel":800.00,"stat":5}}'),
+    ('queue', '{"qr":44,"qi":1,"qo":0}'),
+    ('ack', '{"r":{},"f":[1,0,34]}'),
+    ('status', '{"sr":{"posx":12.811,"posy":4.402,"vel":795.21}}'),
+    ('queue', '{"qr":43,"qi":1,"qo":2}'),
+    ('ack', '{"r":{},"f":[1,0,20]}'),
+]
+
+G2CORE_CORPUS = {
+    'eol': "\n",
+    'tx': GCODE_TX + ['{"sr":null}\n', '{"qr":null}\n'],
+    'rx': [
+        ('banner', '{"r":{"fv":0.99,"fb":101.03,"fbs":"100.26-29-g6d40",'
+                   '"fbc":"settings_shapeoko2.h","hp":3,"hv":0,'
+                   '"id":"0084-d498-d13d-5d1","msg":"SYSTEM READY"},'
+                   '"f":[1,0,0]}'),
+        ('settings', '{"r":{"sys":{"fb":101.03,"fv":0.99,"hp":3,"hv":0,'
+                     '"id":"0084-d498-d13d-5d1","jt":0.75,"ct":0.01,"sl":0,'
+                     '"lim":1,"saf":1,"m48e":1,"mfoe":0,"mfo":1,"mtoe":0,'
+                     '"mto":1,"mt":2,"spep":1,"spdp":0,"spph":1,"spdw":1.5,'
+                     '"ej":1,"jv":4,"qv":1,"sv":1,"si":100,"gpl":0,"gun":1,'
+                     '"gco":1,"gpa":2,"gdi":0}},"f":[1,0,9]}'),
+        ('settings', '{"r":{"1":{"ma":0,"sa":1.8,"tr":40,"su":200,"mi":8,'
+                     '"po":0,"pm":2,"pl":0.5}},"f":[1,0,9]}'),
+        ('settings', '{"r":{"sr":{"line":true,"posx":true,"posy":true,'
+                     '"posz":true,"vel":true,"stat":true}},"f":[1,0,10]}'),
+        ('status', '{"sr":{"line":0,"posx":0.000,"posy":0.000,'
+                   '"posz":0.000,"vel":0.00,"stat":3}}'),
+    ] + G2CORE_RUN * 8 + [
+        ('status', '{"sr":{"stat":6,"vel":0.00}}'),
+        ('error', '{"r":{"msg":"Unrecognized command or config name"},'
+                  '"f":[1,108,5]}'),
+        ('alarm', '{"er":{"fb":101.03,"st":204,"msg":"Limit switch hit - '
+                  'Shutdown occurred"}}'),
+        ('status', '{"sr":{"stat":2}}'),
+    ],
+}
+
+SMOOTHIE_RUN = [
+    ('ack', "ok"),
+    ('ack', "ok"),
+    ('status', "<Run,MPos:12.5000,4.2500,-1.0000,"
+               "WPos:12.5000,4.2500,-1.0000>"),
+    ('ack', "ok"),
+    ('ack', "ok"),
+    ('status', "<Run,MPos:13.1020,4.8710,-1.0000,"
+               "WPos:13.1020,4.8710,-1.0000>"),
+    ('ack', "ok"),
+]
+
+SMOOTHIE_CORPUS = {
+    'eol': "\r\n",
+    'tx': GCODE_TX + ["version\n", "$#\n"],
+    'rx': [
+        ('banner', "Smoothie"),
+        ('ack', "ok"),
+        ('banner', "Build version: edge-3332442, Build date: Apr 22 2019 "
+                   "15:52:55, MCU: LPC1769, System Clock: 120MHz"),
+        ('banner', "  CNC Build 5 axis"),
+        ('settings', "[G54:0.0000,0.0000,0.0000]"),
+        ('settings', "[G55:0.0000,0.0000,0.0000]"),
+        ('settings', "[G28:0.0000,0.0000,0.0000]"),
+        ('settings', "[G92:0.0000,0.0000,0.0000]"),
+        ('settings', "[TLO:0.0000]"),
+        ('settings', "[PRB:0.0000,0.0000,0.0000:0]"),
+        ('ack', "ok"),
+        ('status', "<Idle,MPos:0.0000,0.0000,0.0000,"
+                   "WPos:0.0000,0.0000,0.0000>"),
+    ] + SMOOTHIE_RUN * 8 + [
+        ('status', "<Hold,MPos:25.3310,9.0040,-1.0000,"
+                   "WPos:25.3310,9.0040,-1.0000>"),
+        ('error', "error:Unsupported command"),
+        ('error', "error:Alarm lock"),
+        ('alarm', "ALARM: Kill button pressed - reset or M999 to continue"),
+        ('alarm', "!!"),
+        ('status', "<Alarm,MPos:25.3310,9.0040,-1.0000,"
+                   "WPos:25.3310,9.0040,-1.0000>"),
+    ],
+}
+
+MARLIN_RUN = [
+    ('ack', "ok N12 P15 B3"),
+    ('ack', "ok N13 P14 B3"),
+    ('message', "echo:busy: processing"),
+    ('ack', "ok N14 P14 B2"),
+    ('status', "X:12.50 Y:4.25 Z:-1.00 E:0.00 Count X:1000 Y:340 Z:-400"),
+    ('ack', "ok N15 P15 B3"),
+]
+
+MARLIN_CORPUS = {
+    'eol': "\n",
+    'tx': GCODE_TX + ["M114\n", "M115\n"],
+    'rx': [
+        ('banner', "start"),
+        ('banner', "echo:Marlin 2.0.7.2"),
+        ('banner', "echo: Last Updated: 2020-10-23 | Author: (none, default "
+                   "config)"),
+        ('banner', "echo:Compiled: Oct 23 2020"),
+        ('banner', "echo: Free Memory: 4267  PlannerBufferBytes: 1264"),
+        ('banner', "FIRMWARE_NAME:Marlin 2.0.7.2 (Oct 23 2020 18:12:41) "
+                   "SOURCE_CODE_URL:github.com/MarlinFirmware/Marlin "
+                   "PROTOCOL_VERSION:1.0 MACHINE_TYPE:3D Printer "
+                   "EXTRUDER_COUNT:1 "
+                   "UUID:cede2a2f-41a2-4748-9b12-c55c62f367ff"),
+        ('banner', "Cap:SERIAL_XON_XOFF:0"),
+        ('banner', "Cap:AUTOREPORT_TEMP:1"),
+        ('ack', "ok"),
+        ('settings', "echo:; Steps per unit:"),
+        ('settings', "echo: M92 X80.00 Y80.00 Z400.00 E93.00"),
+        ('settings', "echo:; Maximum feedrates (units/s):"),
+        ('settings', "echo: M203 X300.00 Y300.00 Z5.00 E25.00"),
+        ('settings', "echo:; Maximum Acceleration (units/s2):"),
+        ('settings', "echo: M201 X3000.00 Y3000.00 Z100.00 E10000.00"),
+        ('settings', "echo:; Acceleration (units/s2): P<print_accel> "
+                     "R<retract_accel> T<travel_accel>"),
+        ('settings', "echo: M204 P3000.00 R3000.00 T3000.00"),
+        ('settings', "echo:; Home offset:"),
+        ('settings', "echo: M206 X0.00 Y0.00 Z0.00"),
+        ('ack', "ok"),
+    ] + MARLIN_RUN * 8 + [
+        ('error', "Error:checksum mismatch, Last Line: 41"),
+        ('error', "Resend: 42"),
+        ('ack', "ok"),
+        ('error', "Error:Unknown command: \"G999\""),
+        ('ack', "ok"),
+        ('alarm', "Error:Printer halted. kill() called!"),
+        ('alarm', "!! Printer halted"),
+    ],
+}
+
+CORPORA = {
+    'grbl': GRBL_CORPUS,
+    'TinyG': TINYG_CORPUS,
+    'g2core': G2CORE_CORPUS,
+    'Smoothie': SMOOTHIE_CORPUS,
+    'Marlin': MARLIN_CORPUS,
+}
+
+# lines timed per pass, short kinds of traffic are repeated to get there
+PASS_LINES = 2000
+
+
+def get_cli_params():
+    ''' define, retrieve and error check command line interface (cli) params
+    '''
+
+    usage = \
+        "usage: %prog [options]"
+
+    parser = OptionParser(usage=usage, version="%prog " + __revision__)
+    parser.add_option("-d", "--dev",
+                      dest="dev",
+                      default=None,
+                      help="controller to benchmark (default, all with a "
+                      "built in corpus), one of %s" % ", ".join(
+                        sorted(CORPORA.keys())),
+                      metavar="DEV")
+
+    parser.add_option("-c", "--capture",
+                      dest="capture",
+                      default=None,
+                      help="use traffic in this capture file (gsat "
+                      "--capture) as corpus, needs --dev",
+                      metavar="FILE")
+
+    parser.add_option("-n", "--passes",
+                      dest="passes",
+                      default=10,
+                      type="int",
+                      help="timed passes per measurement, best one is "
+                      "reported (default 10)",
+                      metavar="N")
+
+    parser.add_option("-s", "--save",
+                      dest="save",
+                      default=None,
+                      help="save results to FILE, to compare against later",
+                      metavar="FILE")
+
+    parser.add_option("-b", "--baseline",
+                      dest="baseline",
+                      default=None,
+                      help="compare results to saved FILE, exit status is "
+                      "1 if any measurement got slower than --threshold",
+                      metavar="FILE")
+
+    parser.add_option("-t", "--threshold",
+                      dest="threshold",
+                      default=10.0,
+                      type="float",
+                      help="percent slower than baseline that counts as a "
+                      "regression (default 10)",
+                      metavar="PRCNT")
+
+    (options, args) = parser.parse_args()
+
+    if options.passes < 1:
+        parser.error("invalid number of passes %d" % options.passes)
+
+    if options.dev is not None and options.dev not in CORPORA and \
+       options.capture is None:
+        parser.error("no built in corpus for [%s]" % options.dev)
+
+    if options.capture is not None and options.dev is None:
+        parser.error("--capture needs --dev, the controller it was made "
+                     "with")
+
+    # verbose options used by init_config
+    options.verbose = False
+    options.vverbose = False
+    options.verbose_mask = 0
+
+    return (options, args)
+
+
+def capture_corpus(file_name):
+    """ Corpus from a capture file, rx chunks are put back together into
+        lines as the serial thread does, tx records are the lines as sent
+    """
+    rx = []
+    tx = []
+    rxBuffer = ""
+
+    for recTime, recType, data in sc.read_capture(file_name):
+        if recType == sc.REC_OPEN:
+            rxBuffer = ""
+
+        elif recType == sc.REC_RX:
+            rxBuffer = "".join([rxBuffer, data])
+
+            while '\n' in rxBuffer:
+                line, rxBuffer = rxBuffer.split('\n', 1)
+
+                if line:
+                    rx.append(('capture', line))
+
+        elif recType == sc.REC_TX:
+            tx.extend([line for line in data.splitlines(True) if line])
+
+    return {'eol': "\n", 'rx': rx, 'tx': tx}
+
+
+def new_machif(device_id):
+    """ Fresh machine interface, no serial port
+    """
+    machIf = mi.GetMachIfModule(device_id)
+    machIf.init()
+
+    return machIf
+
+
+def repeat_lines(lines):
+    return lines * max(1, PASS_LINES / len(lines))
+
+
+def time_pass(func, lines):
+    """ Run func over lines, returns (seconds, objects still alive after
+        the pass), results are kept so their objects are counted
+    """
+    # dicts and lists reused from free lists don't count as allocations,
+    # hold enough of them to empty those
+    freeListDrain = [{} for i in range(100)] + [[] for i in range(100)]
+
+    gcollect.collect()
+    gcollect.disable()
+
+    try:
+        objects = gcollect.get_count()[0]
+        start = timeit.default_timer()
+        results = map(func, lines)
+        elapsed = timeit.default_timer() - start
+
+        # don't count the results list itself
+        objects = gcollect.get_count()[0] - objects - 1
+
+    finally:
+        gcollect.enable()
+
+    del results
+    del freeListDrain
+
+    return (elapsed, objects)
+
+
+def measure(device_id, op, lines, prime_lines, passes):
+    """ Best of passes, each on a new machine interface. Decode passes are
+        primed with encoded lines so acks find buffer bookkeeping to undo.
+    """
+    best = None
+    objects = 0
+
+    for i in range(passes):
+        machIf = new_machif(device_id)
+
+        for line in prime_lines:
+            machIf.encode(line)
+
+        elapsed, objects = time_pass(getattr(machIf, op), lines)
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return {
+        'lines': len(lines),
+        'ns': best * 1e9 / len(lines),
+        'objects': float(objects) / len(lines),
+    }
+
+
+def bench_device(device, corpus, passes):
+    """ Per kind of traffic decode results, whole session decode and encode
+    """
+    device_id = mi.GetMachIfId(device)
+    eol = corpus['eol']
+    rx = [(kind, "%s%s" % (line, eol)) for kind, line in corpus['rx']]
+    tx = corpus['tx']
+
+    results = dict()
+
+    kinds = []
+    for kind, line in rx:
+        if kind not in kinds:
+            kinds.append(kind)
+
+    if len(kinds) > 1:
+        kinds.append('all')
+
+    for kind in kinds:
+        lines = repeat_lines(
+            [line for k, line in rx if kind in [k, 'all']])
+        prime = []
+        if tx:
+            prime = (tx * (len(lines) / len(tx) + 1))[:len(lines)]
+
+        results["decode %s" % kind] = measure(
+            device_id, 'decode', lines, prime, passes)
+
+    if tx:
+        results["encode"] = measure(
+            device_id, 'encode', repeat_lines(tx), [], passes)
+
+    return results
+
+
+def report(all_results, baseline, threshold):
+    """ Print results, with change to baseline if given. Returns number of
+        measurements slower than baseline by more than threshold percent
+    """
+    regressions = 0
+
+    print "%-10s %-18s %7s %10s %11s %9s" % (
+        "device", "measurement", "lines", "ns/line", "objs/line",
+        "change" if baseline else "")
+
+    for device in sorted(all_results.keys()):
+        results = all_results[device]
+
+        for name in sorted(results.keys()):
+            r = results[name]
+            change = ""
+
+            b = baseline.get(device, {}).get(name) if baseline else None
+
+            if b is not None and b['ns'] > 0:
+                prcnt = 100.0 * (r['ns'] - b['ns']) / b['ns']
+                change = "%+.1f%%" % prcnt
+
+                if prcnt > threshold:
+                    change = "%s  REGRESSION" % change
+                    regressions += 1
+
+            print "%-10s %-18s %7d %10.0f %11.2f %9s" % (
+                device, name, r['lines'], r['ns'], r['objects'], change)
+
+    return regressions
+
+
+def main():
+    (cmd_line_options, cli_args) = get_cli_params()
+
+    gc.init_config(cmd_line_options, None, None)
+
+    # corpora have errors and alarms, decode logs those on every pass
+    logging.disable(logging.CRITICAL)
+
+    if cmd_line_options.capture is not None:
+        corpora = {
+            cmd_line_options.dev: capture_corpus(cmd_line_options.capture)}
+
+        if not corpora[cmd_line_options.dev]['rx']:
+            print "no rx lines in %s" % cmd_line_options.capture
+            return 1
+
+    elif cmd_line_options.dev is not None:
+        corpora = {cmd_line_options.dev: CORPORA[cmd_line_options.dev]}
+
+    else:
+        corpora = CORPORA
+
+    for device in corpora:
+        if mi.GetMachIfId(device) is mi.MACHIF_NONE:
+            print "unknown controller [%s]" % device
+            return 1
+
+    all_results = dict()
+
+    for device in sorted(corpora.keys()):
+        all_results[device] = bench_device(
+            device, corpora[device], cmd_line_options.passes)
+
+    baseline = None
+    if cmd_line_options.baseline is not None:
+        with open(cmd_line_options.baseline, 'r') as f:
+            baseline = json.load(f)
+
+    regressions = report(all_results, baseline, cmd_line_options.threshold)
+
+    if cmd_line_options.save is not None:
+        with open(cmd_line_options.save, 'w') as f:
+            json.dump(all_results, f, indent=3, sort_keys=True)
+
+    if regressions:
+        print "%d measurements slower than baseline by more than %.1f%%" % (
+            regressions, cmd_line_options.threshold)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
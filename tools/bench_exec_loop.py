@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+"""----------------------------------------------------------------------------
+   bench_exec_loop.py:
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import os
+import Queue
+import sys
+import threading
+import time
+from optparse import OptionParser
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.config as gc
+import modules.serial_thread as st
+import modules.machif_progexec as mi_progexec
+
+__appname__ = "machine interface execute loop benchmark"
+
+__description__ = \
+    "streams a program to a fake grbl device behind a zero latency serial "\
+    "layer and reports lines/s and idle CPU usage of the execute thread "\
+    "loop, with wake up signal and with the old 10ms polling loop. The "\
+    "serial thread is replaced, use bench_reactor.py -m thread for the "\
+    "shipped serial thread on a pseudo terminal"
+
+__version_info__ = (1, 0, 0)
+__version__ = 'v%i.%i.%i' % __version_info__
+__revision__ = __version__
+
+
+def get_cli_params():
+    ''' define, retrieve and error check command line interface (cli) params
+    '''
+
+    usage = \
+        "usage: %prog [options]"
+
+    parser = OptionParser(usage=usage, version="%prog " + __revision__)
+    parser.add_option("-l", "--lines",
+                      dest="lines",
+                      default=1000,
+                      type="int",
+                      help="number of g-code lines to stream (default 1000)",
+                      metavar="N")
+
+    parser.add_option("-i", "--idle",
+                      dest="idle",
+                      default=3.0,
+                      type="float",
+                      help="seconds to measure idle CPU usage (default 3)",
+                      metavar="SEC")
+
+    parser.add_option("-d", "--device_latency",
+                      dest="device_latency",
+                      default=0.0,
+                      type="float",
+                      help="fake device delay before each ok (msec)",
+                      metavar="MSEC")
+
+    parser.add_option("-m", "--mode",
+                      dest="mode",
+                      default="both",
+                      help="wakeup, poll or both (default both)",
+                      metavar="MODE")
+
+    (options, args) = parser.parse_args()
+
+    if options.mode not in ['wakeup', 'poll', 'both']:
+        parser.error("invalid mode %s" % options.mode)
+
+    return (options, args)
+
+
+class FakeGrblSerialPortThread(threading.Thread, gc.EventQueueIf):
+    """ Stands in for SerialPortThread, no serial port and no polling, a
+        minimal grbl answers ok for every line and status for every '?'
+    """
+    deviceLatency = 0.0
+    lineCount = 0
+
+    # optional multiprocessing.Value, to count lines across processes
+    sharedLineCount = None
+
+    def __init__(self, event_handler, port_name, port_baud, event_ids=None):
+        threading.Thread.__init__(self)
+        gc.EventQueueIf.__init__(self)
+        self.daemon = True
+
+        self._txQueue = Queue.Queue()
+
+        if event_handler is not None:
+            self.addEventListener(event_handler, event_ids)
+
+        FakeGrblSerialPortThread.lineCount = 0
+
+        self.start()
+
+    def eventPut(self, event_id, event_data=None, sender=None):
+        self._txQueue.put((event_id, event_data))
+
+    def eventPutPriority(self, event_id, event_data=None, sender=None,
+                         timestamp=None):
+        self._txQueue.put((event_id, event_data))
+
+    def run(self):
+        self.notifyEventListeners(gc.EV_SER_PORT_OPEN, "fake")
+        self.notifyEventListeners(
+            gc.EV_SER_RXDATA, "Grbl 1.1f ['$' for help]\n")
+
+        while True:
+            # blocking get, no timeout
+            event_id, data = self._txQueue.get()
+
+            if event_id == gc.EV_CMD_EXIT:
+                self.notifyEventListeners(gc.EV_EXIT, "")
+                break
+
+            if event_id != gc.EV_CMD_SER_TXDATA or data is None:
+                continue
+
+            for c in data:
+                if c == '?':
+                    self.notifyEventListeners(
+                        gc.EV_SER_RXDATA,
+                        "<Idle|MPos:0.000,0.000,0.000|FS:0,0>\n")
+
+                elif c == '\n':
+                    if self.deviceLatency:
+                        time.sleep(self.deviceLatency)
+
+                    FakeGrblSerialPortThread.lineCount += 1
+
+                    if self.sharedLineCount is not None:
+                        with self.sharedLineCount.get_lock():
+                            self.sharedLineCount.value += 1
+
+                    self.notifyEventListeners(gc.EV_SER_RXDATA, "ok\n")
+
+
+class RunEndListener(object):
+    """ Gets events from execute thread
+    """
+
+    def __init__(self):
+        self.runEnd = threading.Event()
+
+    def eventPut(self, event_id, data=None, sender=None):
+        if event_id == gc.EV_RUN_END:
+            self.runEnd.set()
+
+
+def cpu_time():
+    t = os.times()
+    return t[0] + t[1]
+
+
+def bench(mode, cmd_line_options):
+    st.SerialPortThread = FakeGrblSerialPortThread
+    FakeGrblSerialPortThread.deviceLatency = \
+        cmd_line_options.device_latency / 1000.0
+
+    gc.CONFIG_DATA.set('/machine/Device', "grbl")
+    gc.CONFIG_DATA.set('/machine/Port', "fake")
+
+    if mode == 'poll':
+        # the loop before wake up signal
+        mi_progexec.MachIfExecuteThread.waitForWakeUp = \
+            lambda self: time.sleep(0.01)
+
+    listener = RunEndListener()
+    machifProgExec = mi_progexec.MachIfExecuteThread(
+        listener, [gc.EV_RUN_END])
+
+    # wait for device detect
+    time.sleep(0.5)
+
+    gcodeLines = ["G1 X%.3f Y%.3f F1000\n" % (i * 0.01, i * 0.02)
+                  for i in range(cmd_line_options.lines)]
+
+    startTime = time.time()
+    machifProgExec.eventPut(gc.EV_CMD_RUN, [gcodeLines, 0, set()])
+    listener.runEnd.wait(600)
+    runTime = time.time() - startTime
+
+    startCpu = cpu_time()
+    time.sleep(cmd_line_options.idle)
+    idleCpu = (cpu_time() - startCpu) / cmd_line_options.idle
+
+    machifProgExec.eventPut(gc.EV_CMD_EXIT)
+    machifProgExec.join(5)
+
+    print "%-8s %8d lines %8.3f s %10.1f lines/s %8.1f%% idle cpu" % (
+        mode, FakeGrblSerialPortThread.lineCount, runTime,
+        cmd_line_options.lines / runTime, idleCpu * 100)
+
+
+def main():
+    (cmd_line_options, cli_args) = get_cli_params()
+
+    gc.init_config(cmd_line_options, None, None)
+
+    modes = ['wakeup', 'poll']
+    if cmd_line_options.mode != 'both':
+        modes = [cmd_line_options.mode]
+
+    for mode in modes:
+        bench(mode, cmd_line_options)
+
+
+if __name__ == '__main__':
+    main()
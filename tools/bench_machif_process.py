@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+"""----------------------------------------------------------------------------
+   bench_machif_process.py:
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import os
+import multiprocessing
+import Queue
+import random
+import sys
+import threading
+import time
+from optparse import OptionParser
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.config as gc
+import modules.serial_thread as st
+import modules.machif_progexec as mi_progexec
+import modules.machif_process as mi_process
+
+from bench_exec_loop import FakeGrblSerialPortThread
+
+__appname__ = "machine interface process benchmark"
+
+__description__ = \
+    "streams a program to a fake grbl device while the main thread "\
+    "simulates GUI load (long calls holding the GIL), reports line rate "\
+    "with machine interface in a thread and in a separate process "\
+    "(POSIX only, relies on fork to pass the fake device to the child)"
+
+__version_info__ = (1, 0, 0)
+__version__ = 'v%i.%i.%i' % __version_info__
+__revision__ = __version__
+
+# line rate sample period (seconds)
+SAMPLE_PERIOD = 0.1
+
+
+def get_cli_params():
+    ''' define, retrieve and error check command line interface (cli) params
+    '''
+
+    usage = \
+        "usage: %prog [options]"
+
+    parser = OptionParser(usage=usage, version="%prog " + __revision__)
+    parser.add_option("-l", "--lines",
+                      dest="lines",
+                      default=3000,
+                      type="int",
+                      help="number of g-code lines to stream (default 3000)",
+                      metavar="N")
+
+    parser.add_option("-d", "--device_latency",
+                      dest="device_latency",
+                      default=1.0,
+                      type="float",
+                      help="fake device delay before each ok (default 1 "
+                      "msec)",
+                      metavar="MSEC")
+
+    parser.add_option("--gl", "--gui_load",
+                      dest="gui_load",
+                      default=50.0,
+                      type="float",
+                      help="duration of each simulated GUI stall (default 50 "
+                      "msec)",
+                      metavar="MSEC")
+
+    (options, args) = parser.parse_args()
+
+    return (options, args)
+
+
+class GuiListener(object):
+    """ Stands in for the main window event queue
+    """
+
+    def __init__(self):
+        self.queue = Queue.Queue()
+        self.runEnd = threading.Event()
+
+    def eventPut(self, event_id, data=None, sender=None):
+        self.queue.put((event_id, data))
+
+        if event_id == gc.EV_RUN_END:
+            self.runEnd.set()
+
+
+class GuiLoad(object):
+    """ Long running C call that holds the GIL, like a big restyle or
+        bitmap conversion in the GUI thread
+    """
+
+    def __init__(self, stall_time):
+        self.data = [random.random() for i in xrange(10000)]
+        self.reps = 0
+
+        if stall_time > 0:
+            startTime = time.time()
+            sorted(self.data)
+            sortTime = max(time.time() - startTime, 1e-6)
+
+            # one call, sized to stall for about stall_time
+            self.data = self.data * max(1, int(stall_time / sortTime))
+            self.reps = 1
+
+    def stall(self):
+        for i in range(self.reps):
+            sorted(self.data)
+
+
+def bench(mode, gui_load, cmd_line_options):
+    lineCount = multiprocessing.Value('i', 0)
+
+    st.SerialPortThread = FakeGrblSerialPortThread
+    FakeGrblSerialPortThread.deviceLatency = \
+        cmd_line_options.device_latency / 1000.0
+    FakeGrblSerialPortThread.sharedLineCount = lineCount
+
+    gc.CONFIG_DATA.set('/machine/Device', "grbl")
+    gc.CONFIG_DATA.set('/machine/Port', "fake")
+
+    listener = GuiListener()
+
+    if mode == 'process':
+        machifProgExec = mi_process.MachIfProcess(listener)
+    else:
+        machifProgExec = mi_progexec.MachIfExecuteThread(listener)
+
+    # wait for device detect
+    time.sleep(1)
+
+    gcodeLines = ["G1 X%.3f Y%.3f F1000\n" % (i * 0.01, i * 0.02)
+                  for i in range(cmd_line_options.lines)]
+
+    samples = []
+
+    def sampler():
+        lastTime = time.time()
+        lastCount = lineCount.value
+
+        while not listener.runEnd.is_set():
+            time.sleep(SAMPLE_PERIOD)
+            now = time.time()
+            count = lineCount.value
+            samples.append((count - lastCount) / (now - lastTime))
+            lastTime = now
+            lastCount = count
+
+    samplerThread = threading.Thread(target=sampler)
+    samplerThread.daemon = True
+
+    startTime = time.time()
+    machifProgExec.eventPut(gc.EV_CMD_RUN, [gcodeLines, 0, set()])
+    samplerThread.start()
+
+    # main thread is the GUI, handle events and stall now and then
+    while not listener.runEnd.is_set():
+        try:
+            while True:
+                listener.queue.get_nowait()
+        except Queue.Empty:
+            pass
+
+        gui_load.stall()
+        time.sleep(0.005)
+
+    runTime = time.time() - startTime
+    samplerThread.join()
+
+    machifProgExec.eventPut(gc.EV_CMD_EXIT)
+    time.sleep(0.5)
+
+    # drop last partial sample
+    samples = samples[:-1] or [0]
+
+    print "%-8s %-5s %8.1f lines/s, per %dms min %8.1f max %8.1f" % (
+        mode, "load" if gui_load.reps else "idle",
+        cmd_line_options.lines / runTime, SAMPLE_PERIOD * 1000,
+        min(samples), max(samples))
+
+
+def main():
+    (cmd_line_options, cli_args) = get_cli_params()
+
+    gc.init_config(cmd_line_options, None, None)
+
+    noLoad = GuiLoad(0)
+    load = GuiLoad(cmd_line_options.gui_load / 1000.0)
+
+    for mode in ['thread', 'process']:
+        for gui_load in [noLoad, load]:
+            bench(mode, gui_load, cmd_line_options)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+"""----------------------------------------------------------------------------
+   bench_reactor.py:
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import os
+import random
+import re
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from optparse import OptionParser
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.config as gc
+import modules.machif_progexec as mi_progexec
+import modules.machif_reactor as mi_reactor
+
+__appname__ = "machine interface core benchmark"
+
+__description__ = \
+    "streams a program to a fake grbl device on a pseudo terminal or a "\
+    "local TCP socket and reports lines/s, idle CPU usage and thread "\
+    "count of the threaded machine interface core and the single thread "\
+    "select() core (POSIX only)"
+
+__version_info__ = (1, 0, 0)
+__version__ = 'v%i.%i.%i' % __version_info__
+__revision__ = __version__
+
+
+def get_cli_params():
+    ''' define, retrieve and error check command line interface (cli) params
+    '''
+
+    usage = \
+        "usage: %prog [options]"
+
+    parser = OptionParser(usage=usage, version="%prog " + __revision__)
+    parser.add_option("-l", "--lines",
+                      dest="lines",
+                      default=1000,
+                      type="int",
+                      help="number of g-code lines to stream (default 1000)",
+                      metavar="N")
+
+    parser.add_option("-i", "--idle",
+                      dest="idle",
+                      default=3.0,
+                      type="float",
+                      help="seconds to measure idle CPU usage (default 3)",
+                      metavar="SEC")
+
+    parser.add_option("-m", "--mode",
+                      dest="mode",
+                      default="both",
+                      help="thread, reactor or both (default both)",
+                      metavar="MODE")
+
+    parser.add_option("-t", "--transport",
+                      dest="transport",
+                      default="pty",
+                      help="pty or tcp (default pty)",
+                      metavar="TRANSPORT")
+
+    parser.add_option("--dev", "--device",
+                      dest="device",
+                      default="grbl",
+                      help="fake device grbl or Marlin (default grbl)",
+                      metavar="DEVICE")
+
+    parser.add_option("-e", "--error_rate",
+                      dest="error_rate",
+                      default=0.0,
+                      type="float",
+                      help="Marlin only, fraction of lines the fake device "
+                      "rejects with checksum error (default 0)",
+                      metavar="RATE")
+
+    (options, args) = parser.parse_args()
+
+    if options.mode not in ['thread', 'reactor', 'both']:
+        parser.error("invalid mode %s" % options.mode)
+
+    if options.transport not in ['pty', 'tcp']:
+        parser.error("invalid transport %s" % options.transport)
+
+    if options.device not in ['grbl', 'Marlin']:
+        parser.error("invalid device %s" % options.device)
+
+    return (options, args)
+
+
+def fake_grbl(fd):
+    """ Minimal grbl on the device side of a pty or socket, ok for every
+        line and status for every '?'
+    """
+    os.write(fd, "\r\nGrbl 1.1f ['$' for help]\r\n")
+
+    while True:
+        try:
+            data = os.read(fd, 4096)
+        except OSError:
+            break
+
+        if not data:
+            break
+
+        reply = []
+        for c in data:
+            if c == '?':
+                reply.append("<Idle|MPos:0.000,0.000,0.000|FS:0,0>\r\n")
+            elif c == '\n':
+                reply.append("ok\r\n")
+            elif c == '\x18':
+                reply.append("\r\nGrbl 1.1f ['$' for help]\r\n")
+
+        if reply:
+            os.write(fd, "".join(reply))
+
+
+def fake_marlin(fd, error_rate=0.0):
+    """ Minimal Marlin with ADVANCED_OK, checks line number and checksum,
+        rejects error_rate of the lines as if corrupted on the link
+    """
+    reLine = re.compile(r'^N(\d+) (.*)\*(\d+)$')
+    lastLine = [0]
+
+    def process(line):
+        ack = "ok P15 B3\n"
+
+        cmdLine = reLine.match(line)
+        if cmdLine is not None:
+            lineNumber = int(cmdLine.group(1))
+
+            checksum = 0
+            for c in line[:line.index('*')]:
+                checksum ^= ord(c)
+
+            if checksum != int(cmdLine.group(3)) or \
+               random.random() < error_rate:
+                return "Error:checksum mismatch, Last Line: %d\n"\
+                    "Resend: %d\nok\n" % (lastLine[0], lastLine[0] + 1)
+
+            # M110 sets line number, no sequence check
+            if cmdLine.group(2).startswith("M110"):
+                lastLine[0] = lineNumber
+                return "ok N%d P15 B3\n" % lineNumber
+
+            if lineNumber != lastLine[0] + 1:
+                return "Error:Line Number is not Last Line Number+1, "\
+                    "Last Line: %d\nResend: %d\nok\n" % (
+                        lastLine[0], lastLine[0] + 1)
+
+            lastLine[0] = lineNumber
+            line = cmdLine.group(2)
+            ack = "ok N%d P15 B3\n" % lineNumber
+
+        if line.startswith("M110"):
+            lastLine[0] = 0
+            return ack
+
+        if line.startswith("M115"):
+            return "FIRMWARE_NAME:Marlin 2.0.7.2 (fake) "\
+                "SOURCE_CODE_URL:github.com/MarlinFirmware/Marlin\n" + ack
+
+        if line.startswith("M114"):
+            return "X:0.00 Y:0.00 Z:0.00 E:0.00 Count X:0 Y:0 Z:0\n" + ack
+
+        return ack
+
+    os.write(fd, "start\n")
+
+    rxBuffer = ""
+    while True:
+        try:
+            data = os.read(fd, 4096)
+        except OSError:
+            break
+
+        if not data:
+            break
+
+        rxBuffer = "".join([rxBuffer, data])
+        reply = []
+
+        while '\n' in rxBuffer:
+            line, rxBuffer = rxBuffer.split('\n', 1)
+            line = line.strip()
+
+            if line:
+                reply.append(process(line))
+
+        if reply:
+            os.write(fd, "".join(reply))
+
+
+class RunEndListener(object):
+    """ Gets events from machine interface core
+    """
+
+    def __init__(self):
+        self.runEnd = threading.Event()
+
+    def eventPut(self, event_id, data=None, sender=None):
+        if event_id == gc.EV_RUN_END:
+            self.runEnd.set()
+
+
+def cpu_time():
+    t = os.times()
+    return t[0] + t[1]
+
+
+def fake_device(fd, cmd_line_options):
+    if cmd_line_options.device == 'Marlin':
+        fake_marlin(fd, cmd_line_options.error_rate)
+    else:
+        fake_grbl(fd)
+
+
+def start_pty_device(cmd_line_options):
+    """ Fake grbl on a pseudo terminal, returns (port name, pid, fd to
+        close when done)
+    """
+    masterFd, slaveFd = os.openpty()
+
+    devicePid = os.fork()
+    if devicePid == 0:
+        os.close(slaveFd)
+        fake_device(masterFd, cmd_line_options)
+        os._exit(0)
+
+    os.close(masterFd)
+
+    return (os.ttyname(slaveFd), devicePid, slaveFd)
+
+
+def start_tcp_device(cmd_line_options):
+    """ Fake grbl behind a local socket, like ser2net, returns (port name,
+        pid, fd to close when done)
+    """
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+
+    devicePid = os.fork()
+    if devicePid == 0:
+        while True:
+            conn, address = server.accept()
+            fake_device(conn.fileno(), cmd_line_options)
+            conn.close()
+
+    portName = "tcp://127.0.0.1:%d" % server.getsockname()[1]
+    serverFd = os.dup(server.fileno())
+    server.close()
+
+    return (portName, devicePid, serverFd)
+
+
+def bench(mode, cmd_line_options):
+    if cmd_line_options.transport == 'tcp':
+        portName, devicePid, deviceFd = start_tcp_device(cmd_line_options)
+    else:
+        portName, devicePid, deviceFd = start_pty_device(cmd_line_options)
+
+    gc.CONFIG_DATA.set('/machine/Device', cmd_line_options.device)
+    gc.CONFIG_DATA.set('/machine/Port', portName)
+    gc.CONFIG_DATA.set('/machine/Baud', "115200")
+
+    listener = RunEndListener()
+
+    if mode == 'reactor':
+        machifProgExec = mi_reactor.MachIfReactor(listener, [gc.EV_RUN_END])
+    else:
+        machifProgExec = mi_progexec.MachIfExecuteThread(
+            listener, [gc.EV_RUN_END])
+
+    # wait for device detect
+    time.sleep(1)
+
+    threadCount = threading.active_count()
+
+    gcodeLines = ["G1 X%.3f Y%.3f F1000\n" % (i * 0.01, i * 0.02)
+                  for i in range(cmd_line_options.lines)]
+
+    startTime = time.time()
+    machifProgExec.eventPut(gc.EV_CMD_RUN, [gcodeLines, 0, set()])
+    listener.runEnd.wait(600)
+    runTime = time.time() - startTime
+
+    startCpu = cpu_time()
+    time.sleep(cmd_line_options.idle)
+    idleCpu = (cpu_time() - startCpu) / cmd_line_options.idle
+
+    machifProgExec.eventPut(gc.EV_CMD_EXIT)
+    machifProgExec.join(5)
+
+    os.close(deviceFd)
+    os.kill(devicePid, signal.SIGTERM)
+    os.waitpid(devicePid, 0)
+
+    print "%-8s %-6s %-4s %8.3f s %10.1f lines/s %8.1f%% idle cpu %3d "\
+        "threads" % (
+            mode, cmd_line_options.device, cmd_line_options.transport,
+            runTime, cmd_line_options.lines / runTime, idleCpu * 100,
+            threadCount)
+
+
+def main():
+    (cmd_line_options, cli_args) = get_cli_params()
+
+    gc.init_config(cmd_line_options, None, None)
+
+    modes = ['thread', 'reactor']
+    if cmd_line_options.mode != 'both':
+        modes = [cmd_line_options.mode]
+
+    for mode in modes:
+        bench(mode, cmd_line_options)
+
+
+if __name__ == '__main__':
+    main()
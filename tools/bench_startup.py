@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+"""----------------------------------------------------------------------------
+   bench_startup.py:
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import time
+
+# as close to process start as we can get
+START_TIME = time.time()
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from optparse import OptionParser, SUPPRESS_HELP
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+__appname__ = "gsat startup benchmark"
+
+__description__ = \
+    "starts gsat in a fresh process several times and reports how long "\
+    "imports, main window construction and first idle take, and which gsat "\
+    "modules got loaded on the way"
+
+__version_info__ = (1, 0, 0)
+__version__ = 'v%i.%i.%i' % __version_info__
+__revision__ = __version__
+
+PHASES = [
+    ('wx', "import wx"),
+    ('import', "import gsat modules"),
+    ('app', "create wx.App"),
+    ('window', "create main window"),
+    ('ready', "first idle"),
+]
+
+
+def get_cli_params():
+    ''' define, retrieve and error check command line interface (cli) params
+    '''
+
+    usage = \
+        "usage: %prog [options]"
+
+    parser = OptionParser(usage=usage, version="%prog " + __revision__)
+    parser.add_option("-n", "--runs",
+                      dest="runs",
+                      default=5,
+                      type="int",
+                      help="number of times to start gsat (default 5)",
+                      metavar="N")
+
+    parser.add_option("-c", "--config",
+                      dest="config",
+                      default=None,
+                      help="start from a copy of this configuration file, "
+                      "layout decides which panels are shown (default, "
+                      "built in defaults)",
+                      metavar="FILE")
+
+    parser.add_option("-i", "--imports_only",
+                      dest="imports_only",
+                      action="store_true",
+                      default=False,
+                      help="only time imports, no display needed")
+
+    parser.add_option("-m", "--modules",
+                      dest="modules",
+                      action="store_true",
+                      default=False,
+                      help="list gsat modules loaded at startup")
+
+    parser.add_option("--child",
+                      dest="child",
+                      action="store_true",
+                      default=False,
+                      help=SUPPRESS_HELP)
+
+    (options, args) = parser.parse_args()
+
+    if options.runs < 1:
+        parser.error("invalid number of runs %d" % options.runs)
+
+    return (options, args)
+
+
+def child(cmd_line_options):
+    """ One gsat start up, prints phase times (seconds since process start)
+        as json
+    """
+    times = dict()
+
+    import wx
+    times['wx'] = time.time() - START_TIME
+
+    import modules.config as gc
+    import modules.wnd_main as mw
+    times['import'] = time.time() - START_TIME
+
+    if not cmd_line_options.imports_only:
+        cmd_line_options.verbose = False
+        cmd_line_options.vverbose = False
+        cmd_line_options.verbose_mask = 0
+
+        gc.init_config(cmd_line_options, cmd_line_options.config, None)
+
+        app = wx.App(0)
+        times['app'] = time.time() - START_TIME
+
+        window = mw.gsatMainWindow(
+            None, title=mw.__appname__, cmd_line_options=cmd_line_options)
+        times['window'] = time.time() - START_TIME
+
+        def on_ready():
+            times['ready'] = time.time() - START_TIME
+            window.Close()
+
+        wx.CallAfter(on_ready)
+        app.MainLoop()
+
+    times['modules'] = sorted([
+        name for name, module in sys.modules.items()
+        if module is not None and name.split('.')[0] in ['modules', 'images']
+    ])
+
+    print json.dumps(times)
+
+
+def run(cmd_line_options, config_fname):
+    """ Start child process, return its phase times
+    """
+    cmd = [sys.executable, os.path.abspath(__file__), "--child"]
+
+    if cmd_line_options.imports_only:
+        cmd.append("-i")
+    else:
+        cmd.extend(["-c", config_fname])
+
+    output = subprocess.check_output(cmd)
+
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    (cmd_line_options, cli_args) = get_cli_params()
+
+    if cmd_line_options.child:
+        child(cmd_line_options)
+        return
+
+    tempDir = tempfile.mkdtemp()
+    results = []
+
+    try:
+        for i in range(cmd_line_options.runs):
+            # gsat saves config on exit, start each run from same config
+            config_fname = os.path.join(tempDir, "gsat-%d.json" % i)
+
+            if cmd_line_options.config is not None:
+                shutil.copyfile(cmd_line_options.config, config_fname)
+
+            results.append(run(cmd_line_options, config_fname))
+
+    finally:
+        shutil.rmtree(tempDir, True)
+
+    print "%-22s %10s %10s %10s" % ("phase", "min", "median", "max")
+
+    for key, label in PHASES:
+        values = sorted([r[key] for r in results if key in r])
+
+        if not values:
+            continue
+
+        print "%-22s %8.3f s %8.3f s %8.3f s" % (
+            label, values[0], values[len(values) / 2], values[-1])
+
+    loadedModules = results[-1]['modules']
+    print "%d gsat modules loaded" % len(loadedModules)
+
+    if cmd_line_options.modules:
+        for name in loadedModules:
+            print "    %s" % name
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,494 @@
+#!/usr/bin/env python
+"""----------------------------------------------------------------------------
+   replay_capture.py:
+
+   Copyright (C) 2020-2020 Wilhelm Duembeg
+
+   This file is part of gsat. gsat is a cross-platform GCODE debug/step for
+   Grbl like GCODE interpreters. With features similar to software debuggers.
+   Features such as breakpoint, change current program counter, inspection
+   and modification of variables.
+
+   gsat is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 2 of the License, or
+   (at your option) any later version.
+
+   gsat is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with gsat.  If not, see <http://www.gnu.org/licenses/>.
+
+----------------------------------------------------------------------------"""
+
+import os
+import sys
+import threading
+import time
+from optparse import OptionParser
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.config as gc
+import modules.serial_capture as sc
+import modules.serial_thread as st
+import modules.machif_config as mi
+import modules.machif_progexec as mi_progexec
+
+__appname__ = "serial capture replay"
+
+__description__ = \
+    "replays a serial capture (gsat --capture) into a machine interface "\
+    "decoder, or into the execute thread through a fake port, to check "\
+    "input buffer accounting and profile decode/exec on real traffic"
+
+__version_info__ = (1, 0, 0)
+__version__ = 'v%i.%i.%i' % __version_info__
+__revision__ = __version__
+
+# no progress for this long in exec mode means replay is stuck (seconds)
+STALL_TIMEOUT = 5.0
+
+# no tx for this long after connect, device init is done (seconds)
+INIT_SETTLE_TIME = 0.5
+
+
+def get_cli_params():
+    ''' define, retrieve and error check command line interface (cli) params
+    '''
+
+    usage = \
+        "usage: %prog [options] capture_file"
+
+    parser = OptionParser(usage=usage, version="%prog " + __revision__)
+    parser.add_option("-m", "--mode",
+                      dest="mode",
+                      default="decode",
+                      help="decode, exec or list (default decode)",
+                      metavar="MODE")
+
+    parser.add_option("--dev", "--device",
+                      dest="device",
+                      default="grbl",
+                      help="machine interface that decodes the capture "
+                      "(default grbl)",
+                      metavar="DEVICE")
+
+    parser.add_option("-s", "--session",
+                      dest="session",
+                      default=1,
+                      type="int",
+                      help="session to replay, one per port open, 1 is "
+                      "first (default 1)",
+                      metavar="N")
+
+    parser.add_option("--speed",
+                      dest="speed",
+                      default=0.0,
+                      type="float",
+                      help="exec mode, device response time relative to "
+                      "capture, 1 recorded speed, 0 as fast as possible "
+                      "(default 0)",
+                      metavar="FACTOR")
+
+    (options, args) = parser.parse_args()
+
+    if len(args) != 1:
+        parser.error("capture file is required")
+
+    if options.mode not in ['decode', 'exec', 'list']:
+        parser.error("invalid mode %s" % options.mode)
+
+    if options.speed < 0:
+        parser.error("invalid speed %f" % options.speed)
+
+    return (options, args)
+
+
+def load_sessions(file_name):
+    """ Capture records grouped per port open, list of
+        (open time, port name, [(time, type, data), ...])
+    """
+    sessions = []
+
+    for recTime, recType, data in sc.read_capture(file_name):
+        if recType == sc.REC_OPEN:
+            sessions.append((recTime, data, []))
+
+        elif sessions:
+            sessions[-1][2].append((recTime, recType, data))
+
+    return sessions
+
+
+def tx_lines(data, status_cmd):
+    """ Complete lines in tx data, not counting status requests, these are
+        timer driven and differ from run to run
+    """
+    return [line for line in data.splitlines(True)
+            if line.endswith('\n') and line != status_cmd]
+
+
+def new_machif(device):
+    machIfId = mi.GetMachIfId(device)
+    machIf = mi.GetMachIfModule(machIfId)
+
+    if machIf is None:
+        print "** unknown device %s, known devices %s" % (
+            device, ", ".join(mi.GetMachIfList()))
+        sys.exit(1)
+
+    return machIf
+
+
+def list_sessions(sessions):
+    print "%-3s %-19s %-24s %8s %8s %8s %8s %9s" % (
+        "#", "open", "port", "tx", "tx bytes", "rx", "rx bytes", "duration")
+
+    for i, (openTime, port, records) in enumerate(sessions):
+        tx = [r for r in records if r[1] == sc.REC_TX]
+        rx = [r for r in records if r[1] == sc.REC_RX]
+        duration = records[-1][0] if records else 0.0
+
+        print "%-3d %-19s %-24s %8d %8d %8d %8d %7.1f s" % (
+            i + 1, time.strftime("%Y-%m-%d %H:%M:%S",
+                                 time.localtime(openTime)),
+            port[:24], len(tx), sum([len(r[2]) for r in tx]),
+            len(rx), sum([len(r[2]) for r in rx]), duration)
+
+
+class NullTxRx(object):
+    """ Stands in for serial thread in decode mode, writes go nowhere
+    """
+
+    def eventPut(self, event_id, data=None, sender=None):
+        pass
+
+    def eventPutPriority(self, event_id, data=None, sender=None,
+                         timestamp=None):
+        pass
+
+
+def replay_decode(records, cmd_line_options):
+    """ TX records go through encode (input buffer bookkeeping), RX lines
+        through decode, in capture order
+    """
+    machIf = new_machif(cmd_line_options.device)
+    machIf._serialTxRxThread = NullTxRx()
+    statusCmd = machIf.getStatusCmd()
+
+    rxBuffer = ""
+    decodeCount = 0
+    decodeTime = 0.0
+    decodeMax = 0.0
+    bufferMin = bufferMax = machIf._inputBufferSize
+    overflows = []
+
+    for index, (recTime, recType, data) in enumerate(records):
+        if recType == sc.REC_TX:
+            for line in data.splitlines(True):
+                # realtime commands have no input buffer bookkeeping
+                if not line.endswith('\n') and line != statusCmd:
+                    continue
+
+                try:
+                    machIf.encode(line)
+                except UnicodeError:
+                    pass
+
+        elif recType == sc.REC_RX:
+            rxBuffer = "".join([rxBuffer, data])
+
+            while '\n' in rxBuffer:
+                line, rxBuffer = rxBuffer.split('\n', 1)
+
+                if not line:
+                    continue
+
+                startTime = time.time()
+                machIf.decode("%s\n" % line)
+                lineTime = time.time() - startTime
+
+                decodeCount += 1
+                decodeTime += lineTime
+                decodeMax = max(decodeMax, lineTime)
+
+        bufferSize = machIf._inputBufferSize
+        bufferMin = min(bufferMin, bufferSize)
+        bufferMax = max(bufferMax, bufferSize)
+
+        if bufferSize < 0 or bufferSize > machIf._inputBufferMaxSize:
+            overflows.append((index, recTime, bufferSize))
+
+    print "decode   %8d lines %8.3f s %10.1f lines/s, avg %.1f us, "\
+        "max %.1f us" % (
+            decodeCount, decodeTime,
+            decodeCount / decodeTime if decodeTime else 0.0,
+            decodeTime * 1e6 / decodeCount if decodeCount else 0.0,
+            decodeMax * 1e6)
+
+    print "input buffer bookkeeping min %d, max %d of %d, at end %d" % (
+        bufferMin, bufferMax, machIf._inputBufferMaxSize,
+        machIf._inputBufferSize)
+
+    for index, recTime, bufferSize in overflows[:10]:
+        print "** record %d at %.3f s input buffer %d out of range" % (
+            index, recTime, bufferSize)
+
+    return len(overflows) == 0
+
+
+class ReplayPortThread(threading.Thread, gc.EventQueueIf):
+    """ Stands in for SerialPortThread, plays captured RX back. Each RX
+        record waits until as many lines were written as were written
+        before it in the capture, replay follows the execute thread
+        regardless of timing.
+    """
+    records = []
+    statusCmd = ''
+    speed = 0.0
+
+    def __init__(self, event_handler, port_name, port_baud, event_ids=None):
+        threading.Thread.__init__(self)
+        gc.EventQueueIf.__init__(self)
+        self.daemon = True
+
+        if event_handler is not None:
+            self.addEventListener(event_handler, event_ids)
+
+        self.condition = threading.Condition()
+        self.txLines = []
+        self.lastTxTime = time.time()
+        self.rxIndex = 0
+        self.rxCount = 0
+        self.rxDone = False
+        self.stalled = False
+        self.endThread = False
+
+        self.start()
+
+    def eventPut(self, event_id, data=None, sender=None):
+        if event_id == gc.EV_CMD_SER_TXDATA and data:
+            with self.condition:
+                self.txLines.extend(tx_lines(data, self.statusCmd))
+                self.lastTxTime = time.time()
+                self.condition.notify()
+
+        elif event_id == gc.EV_CMD_EXIT:
+            with self.condition:
+                self.endThread = True
+                self.condition.notify()
+
+    def eventPutPriority(self, event_id, data=None, sender=None,
+                         timestamp=None):
+        self.eventPut(event_id, data, sender)
+
+    def run(self):
+        self.notifyEventListeners(gc.EV_SER_PORT_OPEN, "replay")
+
+        linesBefore = 0
+        lastTxRecTime = 0.0
+        rxBuffer = ""
+
+        for index, (recTime, recType, data) in enumerate(self.records):
+            if recType == sc.REC_TX:
+                linesBefore += len(tx_lines(data, self.statusCmd))
+                lastTxRecTime = recTime
+                continue
+
+            if recType != sc.REC_RX:
+                continue
+
+            with self.condition:
+                while len(self.txLines) < linesBefore and \
+                   not self.endThread:
+                    waitStart = time.time()
+                    self.condition.wait(STALL_TIMEOUT)
+
+                    if time.time() - waitStart >= STALL_TIMEOUT and \
+                       len(self.txLines) < linesBefore:
+                        self.stalled = True
+                        break
+
+                txTime = self.lastTxTime
+
+            if self.endThread or self.stalled:
+                break
+
+            # keep device response time
+            if self.speed:
+                delay = txTime + (recTime - lastTxRecTime) * self.speed - \
+                    time.time()
+
+                if delay > 0:
+                    time.sleep(delay)
+
+            self.rxIndex = index
+            rxBuffer = "".join([rxBuffer, data])
+
+            while '\n' in rxBuffer:
+                line, rxBuffer = rxBuffer.split('\n', 1)
+
+                if line:
+                    self.rxCount += 1
+                    self.notifyEventListeners(
+                        gc.EV_SER_RXDATA, "%s\n" % line)
+
+        self.rxDone = not self.stalled
+
+        with self.condition:
+            while not self.endThread:
+                self.condition.wait(1.0)
+
+        self.notifyEventListeners(gc.EV_EXIT, "")
+
+
+class RunEndListener(object):
+    """ Gets events from execute thread
+    """
+
+    def __init__(self):
+        self.runEnd = threading.Event()
+
+    def eventPut(self, event_id, data=None, sender=None):
+        if event_id in [gc.EV_RUN_END, gc.EV_ABORT]:
+            self.runEnd.set()
+
+
+def wait_tx_settle(port):
+    """ Wait for device init writes to stop
+    """
+    while True:
+        time.sleep(INIT_SETTLE_TIME / 5)
+
+        with port.condition:
+            if time.time() - port.lastTxTime >= INIT_SETTLE_TIME:
+                return len(port.txLines)
+
+
+def replay_exec(records, cmd_line_options):
+    """ Recorded TX lines not written by device init are the program, run
+        it through the execute thread against the replay port and check
+        it writes the captured lines
+    """
+    machIf = new_machif(cmd_line_options.device)
+
+    ReplayPortThread.records = records
+    ReplayPortThread.statusCmd = machIf.getStatusCmd()
+    ReplayPortThread.speed = cmd_line_options.speed
+    st.SerialPortThread = ReplayPortThread
+
+    gc.CONFIG_DATA.set('/machine/Device', machIf.getName())
+    gc.CONFIG_DATA.set('/machine/Port', "replay")
+
+    recordedLines = []
+    for recTime, recType, data in records:
+        if recType == sc.REC_TX:
+            recordedLines.extend(tx_lines(data, machIf.getStatusCmd()))
+
+    listener = RunEndListener()
+    machifProgExec = mi_progexec.MachIfExecuteThread(
+        listener, [gc.EV_RUN_END, gc.EV_ABORT])
+
+    # whatever the device module writes on its own at connect is not
+    # program
+    port = None
+    while port is None:
+        time.sleep(0.01)
+        if machifProgExec.machIfModule is not None:
+            port = machifProgExec.machIfModule.getSerialTxRx()
+
+    initLineCount = wait_tx_settle(port)
+    gcodeLines = recordedLines[initLineCount:]
+
+    startTime = time.time()
+    startRx = port.rxCount
+    machifProgExec.eventPut(gc.EV_CMD_RUN, [gcodeLines, 0, set()])
+
+    while not listener.runEnd.wait(0.1):
+        if port.stalled or port.rxDone:
+            break
+
+    # device replies after run end, or run end after last reply
+    while not port.rxDone and not port.stalled:
+        time.sleep(0.01)
+
+    runTime = time.time() - startTime
+    runEnded = listener.runEnd.wait(1.0)
+
+    # disconnect writes (status report restore) are not part of the run
+    with port.condition:
+        txLines = list(port.txLines)
+
+    machifProgExec.eventPut(gc.EV_CMD_EXIT)
+    machifProgExec.join(5)
+
+    rxLines = port.rxCount - startRx
+
+    print "exec     %8d lines %8.3f s %10.1f lines/s, %d rx lines, %d "\
+        "init lines" % (
+            len(gcodeLines), runTime,
+            len(gcodeLines) / runTime if runTime else 0.0, rxLines,
+            initLineCount)
+
+    ok = True
+
+    for index, (live, recorded) in enumerate(zip(txLines, recordedLines)):
+        if live != recorded:
+            print "** tx line %d differs, wrote %r, capture %r" % (
+                index, live, recorded)
+            ok = False
+            break
+
+    if ok and len(txLines) != len(recordedLines):
+        print "** wrote %d tx lines, capture has %d" % (
+            len(txLines), len(recordedLines))
+        ok = False
+
+    if not runEnded and not port.stalled:
+        # i.e. lines written while disconnecting
+        print "run did not end, capture has no reply to last lines"
+
+    if port.stalled:
+        print "** replay stalled at record %d, waiting for tx line %d" % (
+            port.rxIndex, len(txLines) + 1)
+        ok = False
+
+    if ok:
+        print "tx lines match capture"
+
+    return ok
+
+
+def main():
+    (cmd_line_options, cli_args) = get_cli_params()
+
+    gc.init_config(cmd_line_options, None, None)
+
+    sessions = load_sessions(cli_args[0])
+
+    if cmd_line_options.mode == 'list':
+        list_sessions(sessions)
+        return
+
+    if not 0 < cmd_line_options.session <= len(sessions):
+        print "** session %d not in capture, it has %d" % (
+            cmd_line_options.session, len(sessions))
+        sys.exit(1)
+
+    openTime, port, records = sessions[cmd_line_options.session - 1]
+
+    if cmd_line_options.mode == 'decode':
+        ok = replay_decode(records, cmd_line_options)
+    else:
+        ok = replay_exec(records, cmd_line_options)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()